@@ -8,6 +8,7 @@ ZOOMMIN=$4
 ZOOMMAX=$5
 FORMAT=$6    # png, jpeg, webp
 STORE=$7     # dir, mbtiles
+PROCESSES=${TMS_TILER_PROCESSES:-$(nproc)}
 
 FILENAME=$(basename "$INPUT")
 EXT="${FILENAME##*.}"
@@ -35,7 +36,7 @@ echo ">> [3/6] Erzeuge Tiles…"
 mkdir -p "$OUTPUT"
 gdal2tiles.py \
     -z "$ZOOMMIN"-"$ZOOMMAX" \
-    --processes=4 \
+    --processes="$PROCESSES" \
     --resampling=bilinear \
     --webviewer=none \
     --tile-format="$FORMAT" \
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Kachelung direkt aus dem GeoPDF vs. über ein einmal gerastertes COG
+mit abgeleiteten Zoomstufen (Pyramide) und dünn besetzt (nur Kacheln mit Geometrie)
+
+Konvertiert das Beispiel-DXF (examples/) zu einem GeoPDF (benötigt QGIS) oder
+verwendet ein vorhandenes GeoPDF (--pdf) und erzeugt die TMS-Kacheln auf vier Wegen:
+
+    pdf       der Tiler liest das PDF direkt (PDF-Treiber rendert pro Lesezugriff)
+    cog       raster_source.prepare_raster_source + Tiler auf dem COG
+    pyramid   wie cog, Tiler nur für maxzoom, tiefere Stufen per 2x2-Verkleinerung
+    sparse    wie pyramid, maxzoom nur für Kacheln, die laut Feature-Index DXF-Geometrie enthalten
+
+Die COG-Zeiten enthalten das Rastern. Gemeldet werden Gesamtzeit, Kachelanzahl,
+Kacheln/s und Platzbedarf. Anschließend wird maxzoom aus dem COG mit
+1, 2, 4, ... Prozessen (bis --processes) gerendert, um die Skalierung des Tilers
+zu zeigen, und mit allen Prozessen für jede Metakachel-Größe aus --metatiles
+(1 = ein Warp pro Kachel). Benötigt GDAL mit PDF-Treiber.
+
+Aufruf:
+    python benchmarks/bench_cog_tiling.py [--pdf datei.pdf] [--maxzoom 18] [--crs 2056] [--processes 8]
+                                          [--metatiles 1,4,8,16]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+
+from convert_dxf_to_geopdf import convert_pdf_to_tms, dxf_to_geopdf
+from raster_source import cog_paths, prepare_raster_source
+from tiler import METATILE_SIZE, TILER_PROCESSES, render_levels
+from feature_index import build_feature_index
+
+EXAMPLE_DXF = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "examples", "AV Berninaplatz Bergauer.dxf")
+
+
+def count_tiles(tms_dir: str) -> int:
+    return sum(1 for _, _, files in os.walk(tms_dir) for name in files if name.endswith(".png"))
+
+
+def disk_usage(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+
+
+def run(pdf_path: str, out_dir: str, minzoom: int, maxzoom: int, srs: str, use_cog: bool, pyramid: bool,
+        feature_index=None):
+    for path in cog_paths(pdf_path):
+        if os.path.exists(path):
+            os.remove(path)
+    started = time.perf_counter()
+    convert_pdf_to_tms(pdf_path, out_dir, minzoom=minzoom, maxzoom=maxzoom, srs=srs, use_raster_cache=use_cog,
+                       pyramid=pyramid, feature_index=feature_index)
+    return time.perf_counter() - started, count_tiles(out_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", help="Vorhandenes GeoPDF statt Konvertierung des Beispiel-DXF")
+    parser.add_argument("--dxf", default=EXAMPLE_DXF)
+    parser.add_argument("--crs", type=int, default=2056, help="EPSG-Code des DXF (Beispiel: LV95)")
+    parser.add_argument("--page-size", default="A3")
+    parser.add_argument("--dpi", type=int, default=300)
+    parser.add_argument("--minzoom", type=int, default=14)
+    parser.add_argument("--maxzoom", type=int, default=19)
+    parser.add_argument("--processes", type=int, default=TILER_PROCESSES, help="Höchste Prozesszahl für die Skalierung")
+    parser.add_argument("--metatiles", default=f"1,4,{METATILE_SIZE}", help="Metakachel-Größen (Kacheln pro Kante)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        pdf_path = os.path.join(root, "source.pdf")
+        if args.pdf:
+            shutil.copy(args.pdf, pdf_path)
+        else:
+            started = time.perf_counter()
+            dxf_to_geopdf(args.dxf, pdf_path, crs_epsg=args.crs, page_size=args.page_size, dpi=args.dpi)
+            print(f"DXF -> GeoPDF: {time.perf_counter() - started:.2f} s")
+        srs = f"EPSG:{args.crs}"
+        print(f"Zoom {args.minzoom}-{args.maxzoom}")
+        print(f"{'Quelle':<8} {'Zeit s':>8} {'Kacheln':>8} {'Kacheln/s':>10} {'MB':>8}")
+        results = {}
+        for mode in ("pdf", "cog", "pyramid", "sparse"):
+            out_dir = os.path.join(root, mode)
+            started = time.perf_counter()
+            index = build_feature_index(args.dxf, srs) if mode == "sparse" else None
+            duration, tiles = run(pdf_path, out_dir, args.minzoom, args.maxzoom, srs,
+                                  mode != "pdf", mode in ("pyramid", "sparse"), index)
+            duration = time.perf_counter() - started
+            results[mode] = duration
+            print(f"{mode:<8} {duration:>8.2f} {tiles:>8} {tiles / duration:>10.1f} {disk_usage(out_dir) / 1e6:>8.1f}")
+        print(f"Beschleunigung COG: {results['pdf'] / results['cog']:.1f}x, "
+              f"COG + Pyramide: {results['pdf'] / results['pyramid']:.1f}x, "
+              f"dünn besetzt: {results['pdf'] / results['sparse']:.1f}x")
+
+        # Skalierung des Tilers: nur Rendern von maxzoom aus dem (vorhandenen) COG
+        cog = prepare_raster_source(pdf_path, args.maxzoom, srs)
+        print(f"\nTiler, Zoom {args.maxzoom} aus dem COG")
+        print(f"{'Prozesse':<8} {'Zeit s':>8} {'Kacheln':>8} {'Kacheln/s':>10} {'Speedup':>8}")
+        processes, baseline = 1, None
+        while processes <= args.processes:
+            out_dir = os.path.join(root, f"tiler-{processes}")
+            started = time.perf_counter()
+            render_levels(cog["path"], out_dir, [args.maxzoom], cog["srs"], processes=processes, metatile=METATILE_SIZE)
+            duration = time.perf_counter() - started
+            baseline = baseline or duration
+            tiles = count_tiles(out_dir)
+            print(f"{processes:<8} {duration:>8.2f} {tiles:>8} {tiles / duration:>10.1f} {baseline / duration:>7.1f}x")
+            processes *= 2
+
+        print(f"\nMetakacheln, Zoom {args.maxzoom}, {args.processes} Prozesse")
+        print(f"{'Kante':<8} {'Zeit s':>8} {'Kacheln':>8} {'Kacheln/s':>10} {'Speedup':>8}")
+        baseline = None
+        for metatile in sorted({int(size) for size in args.metatiles.split(",")}):
+            out_dir = os.path.join(root, f"metatile-{metatile}")
+            started = time.perf_counter()
+            render_levels(cog["path"], out_dir, [args.maxzoom], cog["srs"], processes=args.processes, metatile=metatile)
+            duration = time.perf_counter() - started
+            baseline = baseline or duration
+            tiles = count_tiles(out_dir)
+            print(f"{metatile:<8} {duration:>8.2f} {tiles:>8} {tiles / duration:>10.1f} {baseline / duration:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
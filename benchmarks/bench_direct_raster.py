@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Kachelung über das GeoPDF vs. DXF direkt gerastert (ohne Drucklayout und PDF)
+
+Beide Wege werden von Anfang bis Ende gemessen, jeweils mit kaltem Cache:
+
+    pdf      dxf_to_geopdf (QGIS-Layout, PDF-Export) + prepare_raster_source (PDF-Treiber -> COG)
+             + convert_pdf_to_tms
+    direct   dxf_to_raster (QgsMapRendererParallelJob -> COG in EPSG:3857) + convert_pdf_to_tms
+
+Gemeldet werden die Zeiten der Einzelschritte, die Gesamtzeit, Kachelanzahl und
+Platzbedarf sowie die Beschleunigung des direkten Wegs. Benötigt QGIS und GDAL
+mit PDF-Treiber.
+
+Aufruf:
+    python benchmarks/bench_direct_raster.py [--dxf plan.dxf] [--crs 2056] [--minzoom 14] [--maxzoom 19]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+
+from convert_dxf_to_geopdf import DXFToGeoPDFConverter, convert_pdf_to_tms, dxf_to_geopdf, dxf_to_raster
+from raster_source import prepare_raster_source
+
+EXAMPLE_DXF = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "examples", "AV Berninaplatz Bergauer.dxf")
+
+
+def count_tiles(tms_dir: str) -> int:
+    return sum(1 for _, _, files in os.walk(tms_dir) for name in files if name.endswith(".png"))
+
+
+def disk_usage(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+
+
+def timed(steps: list, name: str, func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    steps.append((name, time.perf_counter() - started))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dxf", default=EXAMPLE_DXF)
+    parser.add_argument("--crs", type=int, default=2056, help="EPSG-Code des DXF (Beispiel: LV95)")
+    parser.add_argument("--page-size", default="A3")
+    parser.add_argument("--dpi", type=int, default=300)
+    parser.add_argument("--minzoom", type=int, default=14)
+    parser.add_argument("--maxzoom", type=int, default=19)
+    args = parser.parse_args()
+    srs = f"EPSG:{args.crs}"
+
+    with tempfile.TemporaryDirectory() as root, DXFToGeoPDFConverter() as converter:
+        results = {}
+        # Weg 1: DXF -> Layout -> GeoPDF -> COG -> Kacheln
+        steps = []
+        pdf_path = os.path.join(root, "source.pdf")
+        timed(steps, "DXF -> GeoPDF", dxf_to_geopdf, args.dxf, pdf_path, crs_epsg=args.crs,
+              page_size=args.page_size, dpi=args.dpi, converter=converter)
+        cog = timed(steps, "GeoPDF -> COG", prepare_raster_source, pdf_path, args.maxzoom, srs)
+        pdf_dir = os.path.join(root, "pdf")
+        timed(steps, "Kacheln", convert_pdf_to_tms, cog["path"], pdf_dir, minzoom=args.minzoom,
+              maxzoom=args.maxzoom, srs=cog["srs"])
+        results["pdf"] = (steps, pdf_dir)
+
+        # Weg 2: DXF -> COG (paralleler Map-Renderer) -> Kacheln
+        steps = []
+        tif_path = os.path.join(root, "direct.tif")
+        timed(steps, "DXF -> COG", dxf_to_raster, args.dxf, tif_path, args.maxzoom, srs=srs, dpi=args.dpi,
+              converter=converter)
+        direct_dir = os.path.join(root, "direct")
+        timed(steps, "Kacheln", convert_pdf_to_tms, tif_path, direct_dir, minzoom=args.minzoom, maxzoom=args.maxzoom)
+        results["direct"] = (steps, direct_dir)
+
+        print(f"Zoom {args.minzoom}-{args.maxzoom}, {args.dpi} DPI")
+        print(f"{'Weg':<8} {'Schritt':<16} {'Zeit s':>8}")
+        totals = {}
+        for mode, (steps, out_dir) in results.items():
+            for name, duration in steps:
+                print(f"{mode:<8} {name:<16} {duration:>8.2f}")
+            totals[mode] = sum(duration for _, duration in steps)
+            print(f"{mode:<8} {'gesamt':<16} {totals[mode]:>8.2f}   "
+                  f"{count_tiles(out_dir)} Kacheln, {disk_usage(out_dir) / 1e6:.1f} MB")
+        print(f"Beschleunigung direkt: {totals['pdf'] / totals['direct']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
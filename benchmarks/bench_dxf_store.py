@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Benchmark: DXF über OGR lesen vs. DXF-Index (GeoPackage mit R-Tree)
+
+    dxf      DXF-Treiber öffnen und alle Features lesen (bisher in jeder Stufe)
+    build    DXF einmalig in den Index übernehmen (beim Upload)
+    open     Index öffnen (Anzahl Features aus dem Header)
+    bbox     Features in einem Ausschnitt über den R-Tree lesen (--window in % der Ausdehnung)
+
+Benötigt GDAL mit DXF- und GPKG-Treiber.
+
+Aufruf:
+    python benchmarks/bench_dxf_store.py [--dxf plan.dxf] [--window 10]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+
+from osgeo import ogr
+from dxf_store import build_dxf_store, store_paths
+
+EXAMPLE_DXF = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "examples", "AV Berninaplatz Bergauer.dxf")
+
+
+def read_all(path: str, bounds=None) -> int:
+    source = ogr.Open(path)
+    layer = source.GetLayer(0)
+    if bounds:
+        layer.SetSpatialFilterRect(*bounds)
+    return sum(1 for _ in layer)
+
+
+def timed(name: str, func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    print(f"{name:<8} {time.perf_counter() - started:>8.3f} s   {result}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dxf", default=EXAMPLE_DXF)
+    parser.add_argument("--window", type=float, default=10.0, help="Ausschnitt in Prozent der Ausdehnung")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        dxf_path = os.path.join(root, "plan.dxf")
+        shutil.copyfile(args.dxf, dxf_path)
+        print(f"{'Schritt':<8} {'Zeit':>8}     Features")
+        timed("dxf", read_all, dxf_path)
+        info = timed("build", lambda: build_dxf_store(dxf_path)["features"])
+        gpkg_path = store_paths(dxf_path)[0]
+        timed("open", lambda: ogr.Open(gpkg_path).GetLayer(0).GetFeatureCount())
+        extent = build_dxf_store(dxf_path)["extent"]
+        if info and extent:
+            cx, cy = (extent[0] + extent[2]) / 2, (extent[1] + extent[3]) / 2
+            half_w = (extent[2] - extent[0]) * args.window / 200
+            half_h = (extent[3] - extent[1]) * args.window / 200
+            bounds = (cx - half_w, cy - half_h, cx + half_w, cy + half_h)
+            timed("bbox", read_all, gpkg_path, bounds)
+            timed("dxf bbox", read_all, dxf_path, bounds)
+
+
+if __name__ == "__main__":
+    main()
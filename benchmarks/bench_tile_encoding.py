@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Kodierprofile der Kacheln (Bytes pro Kachel und Kodierzeit)
+
+Liest die Kacheln eines vorhandenen Layers (--tiles, z. B. uploads/nodes/static/<id>)
+oder rendert die höchste Zoomstufe des Beispiel-DXF (examples/, benötigt QGIS)
+aus dem COG. Alle Kacheln werden dekodiert und mit jedem Profil neu kodiert:
+
+    png          RGBA-PNG, zlevel 6 (wie bisher)
+    png-z1/z9    RGBA-PNG mit schneller bzw. maximaler Kompression
+    png8         8-Bit-Paletten-PNG
+    webp         verlustfreies WebP
+    webp-q80     verlustbehaftetes WebP, Qualität 80
+    jpeg-q85     JPEG, Qualität 85 (transparent -> weiß)
+
+Gemeldet werden mittlere Bytes pro Kachel, Summe in MB, ms pro Kachel und das
+Verhältnis zu png. Benötigt GDAL (mit WEBP-Treiber für die WebP-Profile) und NumPy.
+
+Aufruf:
+    python benchmarks/bench_tile_encoding.py [--tiles layer_dir] [--zoom 19] [--limit 500]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+
+from tile_codec import decode_tile, encode_tile, encoding_profile
+from tile_store import iter_directory_tiles
+
+EXAMPLE_DXF = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "examples", "AV Berninaplatz Bergauer.dxf")
+
+PROFILES = {
+    "png": "png",
+    "png-z1": {"format": "png", "zlevel": 1},
+    "png-z9": {"format": "png", "zlevel": 9},
+    "png8": "png8",
+    "webp": "webp",
+    "webp-q80": {"format": "webp", "lossless": False, "quality": 80},
+    "jpeg-q85": {"format": "jpeg", "quality": 85},
+}
+
+
+def render_example(root: str, zoom: int, crs: int) -> str:
+    """Beispiel-DXF -> GeoPDF -> COG -> Kacheln der Zoomstufe zoom"""
+    from convert_dxf_to_geopdf import dxf_to_geopdf
+    from raster_source import prepare_raster_source
+    from feature_index import build_feature_index
+    from tiler import render_levels
+    pdf_path = os.path.join(root, "source.pdf")
+    dxf_to_geopdf(EXAMPLE_DXF, pdf_path, crs_epsg=crs, page_size="A3", dpi=300)
+    cog = prepare_raster_source(pdf_path, zoom, f"EPSG:{crs}")
+    index = build_feature_index(EXAMPLE_DXF, f"EPSG:{crs}")
+    tiles_dir = os.path.join(root, "tiles")
+    render_levels(cog["path"], tiles_dir, [zoom], cog["srs"], tiles_for=index.tiles)
+    return tiles_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tiles", help="Vorhandener Kachelbaum {z}/{x}/{y}.png")
+    parser.add_argument("--zoom", type=int, default=19, help="Zoomstufe beim Rendern des Beispiels")
+    parser.add_argument("--crs", type=int, default=2056)
+    parser.add_argument("--limit", type=int, default=500, help="Höchstens so viele Kacheln kodieren")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bench-encoding-")
+    try:
+        tiles_dir = args.tiles or render_example(root, args.zoom, args.crs)
+        arrays = []
+        for _, _, _, path in sorted(iter_directory_tiles(tiles_dir))[:args.limit]:
+            with open(path, "rb") as f:
+                arrays.append(decode_tile(f.read()))
+        if not arrays:
+            sys.exit(f"Keine Kacheln in {tiles_dir}")
+        print(f"{len(arrays)} Kacheln aus {tiles_dir}")
+        print(f"{'Profil':<10} {'Bytes/Kachel':>12} {'MB':>8} {'ms/Kachel':>10} {'Größe':>7}")
+        baseline = None
+        for name, spec in PROFILES.items():
+            profile = encoding_profile(spec)
+            started = time.perf_counter()
+            try:
+                sizes = [len(encode_tile(array, profile)) for array in arrays]
+            except Exception as e:
+                print(f"{name:<10} nicht verfügbar: {e}")
+                continue
+            duration = time.perf_counter() - started
+            total = sum(sizes)
+            baseline = baseline or total
+            print(f"{name:<10} {total / len(sizes):>12.0f} {total / 1e6:>8.2f} "
+                  f"{duration * 1000 / len(sizes):>10.2f} {total / baseline:>6.0%}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
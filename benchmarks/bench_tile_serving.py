@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Kachel-Auslieferung aus Verzeichnis, MBTiles und PMTiles
+
+Erzeugt einen synthetischen Layer (Zoom 0..--maxzoom, zur Hälfte identische
+Kacheln), packt ihn in alle drei Formate und misst Kacheln/s bei
+verschiedenen Parallelitätsstufen.
+
+    --mode store   Lesen über TileStorePool (ohne HTTP)
+    --mode http    GET /api/tiles/... gegen einen lokalen uvicorn (benötigt fastapi/uvicorn)
+
+Aufruf:
+    python benchmarks/bench_tile_serving.py [--mode store|http] [--concurrency 1 8 32 64]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+
+from tile_store import pack_directory, tile_store_pool
+
+PNG = b"\x89PNG\r\n\x1a\n"
+
+
+def make_layer(root: str, maxzoom: int, tile_bytes: int):
+    src = os.path.join(root, "src")
+    keys = []
+    blank = PNG + b"\0" * tile_bytes
+    for z in range(maxzoom + 1):
+        for x in range(2 ** z):
+            os.makedirs(os.path.join(src, str(z), str(x)))
+            for y in range(2 ** z):
+                data = blank if random.random() < 0.5 else PNG + os.urandom(tile_bytes)
+                with open(os.path.join(src, str(z), str(x), f"{y}.png"), "wb") as f:
+                    f.write(data)
+                keys.append((z, x, y))
+    for fmt in ("mbtiles", "pmtiles"):
+        os.makedirs(os.path.join(root, fmt))
+        pack_directory(src, os.path.join(root, fmt), fmt)
+    os.rename(src, os.path.join(root, "directory"))
+    return keys
+
+
+def run_store(layer_dir: str, keys, concurrency: int, requests: int):
+    sample = [random.choice(keys) for _ in range(requests)]
+    latencies = []
+
+    def fetch(key):
+        started = time.perf_counter()
+        tile_store_pool.get(layer_dir).get_tile(*key)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(fetch, sample))
+    return time.perf_counter() - started, latencies
+
+
+def start_server(root: str) -> int:
+    import socket
+    import uvicorn
+    from fastapi import FastAPI
+    from routes import tile_routes
+
+    tile_routes.TILE_ROOT = root
+    app = FastAPI()
+    app.include_router(tile_routes.router, prefix="/api")
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return port
+
+
+def run_http(port: int, layer: str, keys, concurrency: int, requests: int, revalidate: bool):
+    sample = [random.choice(keys) for _ in range(requests)]
+    latencies = []
+    local = threading.local()
+    etags = {}
+
+    def fetch(key):
+        conn = getattr(local, "conn", None)
+        if conn is None:
+            conn = local.conn = http.client.HTTPConnection("127.0.0.1", port)
+        headers = {"If-None-Match": etags[key]} if revalidate and key in etags else {}
+        started = time.perf_counter()
+        conn.request("GET", f"/api/tiles/{layer}/{key[0]}/{key[1]}/{key[2]}.png", headers=headers)
+        response = conn.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - started)
+        etags[key] = response.getheader("ETag")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(fetch, sample))
+    return time.perf_counter() - started, latencies
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["store", "http"], default="store")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--maxzoom", type=int, default=7)
+    parser.add_argument("--tile-bytes", type=int, default=8000)
+    parser.add_argument("--revalidate", action="store_true", help="If-None-Match senden (misst 304-Antworten)")
+    args = parser.parse_args()
+
+    random.seed(42)
+    with tempfile.TemporaryDirectory() as root:
+        keys = make_layer(root, args.maxzoom, args.tile_bytes)
+        port = start_server(root) if args.mode == "http" else None
+        print(f"{len(keys)} Kacheln, Modus {args.mode}")
+        print(f"{'Format':<10} {'Parallel':>8} {'Kacheln/s':>10} {'p50 ms':>8} {'p99 ms':>8}")
+        for fmt in ("directory", "mbtiles", "pmtiles"):
+            for concurrency in args.concurrency:
+                if args.mode == "http":
+                    duration, latencies = run_http(port, fmt, keys, concurrency, args.requests, args.revalidate)
+                else:
+                    duration, latencies = run_store(os.path.join(root, fmt), keys, concurrency, args.requests)
+                print(f"{fmt:<10} {concurrency:>8} {args.requests / duration:>10.0f} "
+                      f"{percentile(latencies, 0.5):>8.3f} {percentile(latencies, 0.99):>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
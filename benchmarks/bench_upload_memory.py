@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Speicherbedarf beim Speichern von Uploads
+
+Vergleicht das bisherige Vorgehen (gesamte Datei lesen, dann schreiben) mit
+upload_store.stream_to_disk. Gemessen wird der Python-Heap-Peak per tracemalloc;
+beim Streaming bleibt er unabhängig von der Dateigröße bei etwa einer Blockgröße.
+
+Aufruf:
+    python benchmarks/bench_upload_memory.py [--sizes 16 64 256] [--chunk-size 1048576]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+
+from upload_store import stream_to_disk, UPLOAD_CHUNK_SIZE
+
+
+def make_source(path: str, size_mb: int) -> None:
+    block = os.urandom(1024 * 1024)
+    with open(path, "wb") as f:
+        for _ in range(size_mb):
+            f.write(block)
+
+
+def read_all(source_path: str, dest_path: str) -> None:
+    with open(source_path, "rb") as src:
+        content = src.read()
+    with open(dest_path, "wb") as f:
+        f.write(content)
+
+
+def streamed(source_path: str, dest_path: str, chunk_size: int) -> None:
+    with open(source_path, "rb") as src:
+        stream_to_disk(src, dest_path, chunk_size)
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    started = time.perf_counter()
+    func(*args)
+    duration = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak, duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[16, 64, 256], help="Dateigrößen in MB")
+    parser.add_argument("--chunk-size", type=int, default=UPLOAD_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    print(f"{'MB':>6} {'read() Peak MB':>15} {'read() s':>9} {'Stream Peak MB':>15} {'Stream s':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_mb in args.sizes:
+            source = os.path.join(tmp, f"source_{size_mb}.bin")
+            make_source(source, size_mb)
+            full_peak, full_time = measure(read_all, source, os.path.join(tmp, "full.bin"))
+            stream_peak, stream_time = measure(streamed, source, os.path.join(tmp, "stream.bin"), args.chunk_size)
+            print(f"{size_mb:>6} {full_peak / 2**20:>15.1f} {full_time:>9.2f} {stream_peak / 2**20:>15.1f} {stream_time:>9.2f}")
+            os.remove(source)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Vektorkacheln (MVT in MBTiles) vs. Rasterkacheln (TMS) für denselben Plan
+
+    raster   GeoPDF -> COG (prepare_raster_source) -> Tiler -> MBTiles (dünn besetzt, Pyramide)
+    mvt      DXF über OGR -> MVT mit Zuschnitt und Vereinfachung pro Zoomstufe -> MBTiles
+
+Das GeoPDF wird aus dem Beispiel-DXF erzeugt (benötigt QGIS) oder mit --pdf
+übergeben; es muss zum DXF passen. Gemeldet werden Zeit, Kachelanzahl, Größe und
+das Verhältnis MVT/Raster. Mit --simplification werden zusätzlich mehrere
+Vereinfachungstoleranzen (Kacheleinheiten) für die Vektorkacheln verglichen.
+
+Aufruf:
+    python benchmarks/bench_vector_tiles.py [--dxf plan.dxf] [--pdf plan.pdf] [--crs 2056]
+                                            [--minzoom 14] [--maxzoom 19] [--simplification 0,1,4,8]
+"""
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+
+import vector_tiles
+from convert_dxf_to_geopdf import convert_pdf_to_tms, dxf_to_geopdf
+from feature_index import build_feature_index
+
+EXAMPLE_DXF = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "examples", "AV Berninaplatz Bergauer.dxf")
+
+
+def count_tiles(mbtiles_path: str) -> int:
+    with sqlite3.connect(mbtiles_path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM tiles").fetchone()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dxf", default=EXAMPLE_DXF)
+    parser.add_argument("--pdf", help="Vorhandenes GeoPDF des DXF statt Konvertierung")
+    parser.add_argument("--crs", type=int, default=2056, help="EPSG-Code des DXF (Beispiel: LV95)")
+    parser.add_argument("--page-size", default="A3")
+    parser.add_argument("--dpi", type=int, default=300)
+    parser.add_argument("--minzoom", type=int, default=14)
+    parser.add_argument("--maxzoom", type=int, default=19)
+    parser.add_argument("--simplification", default="", help="Toleranzen für den Vergleich, z.B. 0,1,4,8")
+    args = parser.parse_args()
+    srs = f"EPSG:{args.crs}"
+
+    with tempfile.TemporaryDirectory() as root:
+        pdf_path = args.pdf
+        if not pdf_path:
+            pdf_path = os.path.join(root, "source.pdf")
+            dxf_to_geopdf(args.dxf, pdf_path, crs_epsg=args.crs, page_size=args.page_size, dpi=args.dpi)
+
+        print(f"Zoom {args.minzoom}-{args.maxzoom}")
+        print(f"{'Typ':<8} {'Zeit s':>8} {'Kacheln':>8} {'MB':>8}")
+        raster_dir = os.path.join(root, "raster")
+        started = time.perf_counter()
+        index = build_feature_index(args.dxf, srs)
+        convert_pdf_to_tms(pdf_path, raster_dir, minzoom=args.minzoom, maxzoom=args.maxzoom, srs=srs,
+                           tile_store="mbtiles", feature_index=index if len(index) else None)
+        raster_time = time.perf_counter() - started
+        raster_path = os.path.join(raster_dir, "tiles.mbtiles")
+        raster_size = os.path.getsize(raster_path)
+        print(f"{'raster':<8} {raster_time:>8.2f} {count_tiles(raster_path):>8} {raster_size / 1e6:>8.1f}")
+
+        mvt_path = os.path.join(root, "vector.mbtiles")
+        result = vector_tiles.build_vector_tiles(args.dxf, mvt_path, args.minzoom, args.maxzoom, srs)
+        mvt_time = result["duration_ms"] / 1000.0
+        print(f"{'mvt':<8} {mvt_time:>8.2f} {result['tiles']:>8} {result['size'] / 1e6:>8.1f}")
+        print(f"MVT/Raster: Zeit {mvt_time / raster_time:.0%}, Größe {result['size'] / raster_size:.0%}")
+
+        tolerances = [float(value) for value in args.simplification.split(",") if value]
+        if tolerances:
+            print(f"\nVereinfachung unterhalb von maxzoom (Kacheleinheiten von {vector_tiles.MVT_EXTENT})")
+            print(f"{'Toleranz':<8} {'Zeit s':>8} {'Kacheln':>8} {'MB':>8}")
+        for tolerance in tolerances:
+            vector_tiles.MVT_SIMPLIFICATION = tolerance
+            result = vector_tiles.build_vector_tiles(args.dxf, mvt_path, args.minzoom, args.maxzoom, srs)
+            print(f"{tolerance:<8} {result['duration_ms'] / 1000.0:>8.2f} {result['tiles']:>8} "
+                  f"{result['size'] / 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
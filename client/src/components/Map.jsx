@@ -1,7 +1,112 @@
-import { useState, useEffect, useRef } from 'react'
-import { MapContainer, TileLayer, useMap, Marker, Popup } from 'react-leaflet'
+import { useState, useEffect, useRef, useCallback } from 'react'
+import { MapContainer, TileLayer, GeoJSON, useMap, useMapEvents, Marker, Popup } from 'react-leaflet'
+import L from 'leaflet'
 import 'leaflet/dist/leaflet.css'
 
+// Overlay erst ab dieser Zoomstufe, darunter wären zu viele Features im Ausschnitt
+const FEATURE_OVERLAY_MIN_ZOOM = 16
+// Höchstzahl Features im Overlay (mehrere Seiten à FEATURES_PAGE_SIZE)
+const FEATURE_OVERLAY_MAX = 20000
+// Suchradius beim Identifizieren in Pixeln
+const IDENTIFY_TOLERANCE_PX = 5
+
+// Eine Seite DXF-Features im Ausschnitt [west, süd, ost, nord] (GeoJSON, WGS84)
+async function fetchFeaturePage(fileId, bbox, { zoom, offset = 0, limit, signal } = {}) {
+  const params = new URLSearchParams({ bbox: bbox.join(','), offset: String(offset) })
+  if (zoom != null) params.set('zoom', String(zoom))
+  if (limit) params.set('limit', String(limit))
+  const res = await fetch(`/api/files/${fileId}/features?${params}`, {
+    headers: { 'Authorization': `Bearer ${localStorage.getItem('token')}` },
+    signal
+  })
+  if (!res.ok) throw new Error(`Feature-Abfrage fehlgeschlagen: HTTP ${res.status}`)
+  return res.json()
+}
+
+const boundsToBbox = (bounds) => [bounds.getWest(), bounds.getSouth(), bounds.getEast(), bounds.getNorth()]
+
+// DXF-Geometrie des Ausschnitts als Overlay und Identifizieren per Klick
+function DxfFeatures({ fileId, showOverlay }) {
+  const map = useMap()
+  const [overlay, setOverlay] = useState(null)
+  const [identified, setIdentified] = useState(null)
+  const abortRef = useRef(null)
+
+  const loadOverlay = useCallback(async () => {
+    abortRef.current?.abort()
+    if (!showOverlay || map.getZoom() < FEATURE_OVERLAY_MIN_ZOOM) {
+      setOverlay(null)
+      return
+    }
+    const controller = new AbortController()
+    abortRef.current = controller
+    const bbox = boundsToBbox(map.getBounds())
+    const zoom = map.getZoom()
+    const features = []
+    try {
+      let offset = 0
+      while (offset != null && features.length < FEATURE_OVERLAY_MAX) {
+        const page = await fetchFeaturePage(fileId, bbox, { zoom, offset, signal: controller.signal })
+        features.push(...page.features)
+        offset = page.next
+      }
+      setOverlay({ type: 'FeatureCollection', features, key: `${bbox.join(',')}/${zoom}` })
+    } catch (error) {
+      if (error.name !== 'AbortError') console.warn(error)
+    }
+  }, [map, fileId, showOverlay])
+
+  useEffect(() => {
+    loadOverlay()
+    return () => abortRef.current?.abort()
+  }, [loadOverlay])
+
+  useMapEvents({
+    moveend: loadOverlay,
+    click: async (event) => {
+      const point = map.latLngToContainerPoint(event.latlng)
+      const southWest = map.containerPointToLatLng([point.x - IDENTIFY_TOLERANCE_PX, point.y + IDENTIFY_TOLERANCE_PX])
+      const northEast = map.containerPointToLatLng([point.x + IDENTIFY_TOLERANCE_PX, point.y - IDENTIFY_TOLERANCE_PX])
+      try {
+        const page = await fetchFeaturePage(fileId, [southWest.lng, southWest.lat, northEast.lng, northEast.lat], { limit: 20 })
+        setIdentified({ latlng: event.latlng, features: page.features })
+      } catch (error) {
+        console.warn(error)
+      }
+    }
+  })
+
+  return (
+    <>
+      {overlay && (
+        <GeoJSON
+          key={overlay.key}
+          data={overlay}
+          style={{ color: '#e11d48', weight: 1 }}
+          pointToLayer={(feature, latlng) => L.circleMarker(latlng, { radius: 2 })}
+        />
+      )}
+      {identified && (
+        <Popup position={identified.latlng} eventHandlers={{ remove: () => setIdentified(null) }}>
+          {identified.features.length === 0 ? (
+            <div className="text-sm">Keine DXF-Features an dieser Stelle</div>
+          ) : (
+            <ul className="text-sm max-h-48 overflow-auto">
+              {identified.features.map(feature => (
+                <li key={feature.id} className="mb-1">
+                  <strong>{feature.properties.Layer || 'Ohne Layer'}</strong>
+                  {feature.properties.SubClasses && ` • ${feature.properties.SubClasses}`}
+                  {feature.properties.Text && <div>{feature.properties.Text}</div>}
+                </li>
+              ))}
+            </ul>
+          )}
+        </Popup>
+      )}
+    </>
+  )
+}
+
 // Helper component to handle map updates
 function MapController({ selectedLayer, onBoundsStatusChange }) {
   const map = useMap()
@@ -72,6 +177,7 @@ function MapController({ selectedLayer, onBoundsStatusChange }) {
 function Map({ tmsLayers = [], onDeleteLayer }) {
   const [selected, setSelected] = useState('')
   const [useMapServer, setUseMapServer] = useState(false)
+  const [showFeatures, setShowFeatures] = useState(false)
   const [boundsStatus, setBoundsStatus] = useState({ found: true, message: '' });
 
   // Layer-Liste aus Props
@@ -80,7 +186,8 @@ function Map({ tmsLayers = [], onDeleteLayer }) {
   // Helper für TileLayer-URL (Leaflet erwartet absoluten Pfad)
   const getTileLayerUrl = (layer) => {
     if (!layer) return '';
-    return `${layer.url}/{z}/{x}/{y}.png`;
+    // Endung laut Kodierprofil des Layers (png, webp, jpg)
+    return `${layer.url}/{z}/{x}/{y}.${layer.config?.tile_format || 'png'}`;
   };
 
   const selectedLayer = layers.find(l => l.id === selected)
@@ -140,6 +247,23 @@ return (
               {useMapServer ? 'MapServer aktiv' : 'Swiss Topo aktiv'}
             </button>
           </div>
+          <div className="flex flex-col">
+            <label className="block text-sm font-medium text-gray-700 mb-2">
+              DXF-Geometrie
+            </label>
+            <button
+              onClick={() => setShowFeatures(!showFeatures)}
+              disabled={!selectedLayer}
+              title={`Overlay ab Zoom ${FEATURE_OVERLAY_MIN_ZOOM}, Klick in die Karte identifiziert Features`}
+              className={`px-4 py-2 rounded-md text-sm font-medium transition-colors disabled:opacity-50 ${
+                showFeatures
+                  ? 'bg-blue-600 text-white hover:bg-blue-700'
+                  : 'bg-gray-200 text-gray-700 hover:bg-gray-300'
+              }`}
+            >
+              {showFeatures ? 'Overlay aktiv' : 'Overlay aus'}
+            </button>
+          </div>
         </div>
         {/* Layer Info + Delete Button */}
         {selectedLayer && (
@@ -238,9 +362,14 @@ return (
               opacity={0.8}
               attribution="TMS Layer"
               errorTileUrl="" // Prevent error tile display
-              maxZoom={selectedLayer.config?.maxzoom || 22}
+              maxZoom={selectedLayer.config?.overzoom_maxzoom || selectedLayer.config?.maxzoom || 22}
             />
           )}
+
+          {/* DXF-Features des Ausschnitts (Overlay, Identifizieren per Klick) */}
+          {selectedLayer && (
+            <DxfFeatures key={selectedLayer.id} fileId={selectedLayer.id} showOverlay={showFeatures} />
+          )}
         </MapContainer>
       </div>
       
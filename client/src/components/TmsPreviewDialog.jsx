@@ -21,15 +21,45 @@ const TmsPreviewDialog = ({ file, onClose }) => {
       maxZoom: 22,
       crs: L.CRS.EPSG3857,
     });
-    L.tileLayer(tmsUrl, {
+    const tileLayer = L.tileLayer(tmsUrl, {
       tms: true,
       maxZoom: 22,
       attribution: 'TMS Preview',
       errorTileUrl: '',
     }).addTo(leafletMap.current);
+    // Ausschnitt an den Server melden: während der Kachelung werden diese Kacheln zuerst gerendert
+    let redrawTimer = null;
+    const reportViewport = () => {
+      const map = leafletMap.current;
+      if (!map) return;
+      const bounds = map.getBounds();
+      fetch(`/api/tms/${file.id}/viewport`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          bounds: [bounds.getWest(), bounds.getSouth(), bounds.getEast(), bounds.getNorth()],
+          zoom: map.getZoom(),
+        }),
+      })
+        .then((res) => (res.ok ? res.json() : null))
+        .then((data) => {
+          // Solange gekachelt wird, fehlende Kacheln regelmässig neu anfragen
+          clearTimeout(redrawTimer);
+          if (data?.seeding) {
+            redrawTimer = setTimeout(() => {
+              tileLayer.redraw();
+              reportViewport();
+            }, 3000);
+          }
+        })
+        .catch(() => {});
+    };
+    leafletMap.current.on('moveend', reportViewport);
+    reportViewport();
     // Optional: Fit to bounds, falls Metadaten vorhanden
     // leafletMap.current.fitBounds([[minLat, minLng], [maxLat, maxLng]]);
     return () => {
+      clearTimeout(redrawTimer);
       if (leafletMap.current) {
         leafletMap.current.remove();
         leafletMap.current = null;
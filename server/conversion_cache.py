@@ -0,0 +1,197 @@
+# conversion_cache.py - Inhaltsadressierter Cache für Konvertierungsergebnisse
+"""
+Cache für GeoPDF-Ergebnisse, adressiert über den SHA-256 der Eingabedatei und
+die Konvertierungsparameter (Seitengröße, DPI, EPSG, Symbolisierung).
+Bei einem Treffer wird das gespeicherte GeoPDF per Hardlink (bzw. Kopie)
+bereitgestellt und BBox/SRS/Layer-Info aus dem Index übernommen.
+
+Der Index liegt in der SQLite-Datenbank der Anwendung, die PDFs im
+Cache-Verzeichnis. Überschreitet der Cache die Maximalgröße, werden die am
+längsten nicht genutzten Einträge entfernt (LRU).
+
+Konfiguration über Umgebungsvariablen:
+    CONVERSION_CACHE_DIR      Cache-Verzeichnis (Default: output/cache)
+    CONVERSION_CACHE_MAX_MB   Maximale Größe in MB (Default: 2048)
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+CONVERSION_CACHE_DIR = os.environ.get("CONVERSION_CACHE_DIR", os.path.join("output", "cache"))
+CONVERSION_CACHE_MAX_BYTES = int(os.environ.get("CONVERSION_CACHE_MAX_MB", "2048")) * 1024 * 1024
+
+# Bei Änderungen an der Render-Pipeline erhöhen, damit alte Einträge nicht mehr getroffen werden
+CACHE_VERSION = 1
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path: str, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    """SHA-256 einer Datei blockweise berechnen (konstanter Speicherbedarf)"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def link_or_copy(src: str, dst: str) -> None:
+    """Datei per Hardlink bereitstellen, bei anderem Dateisystem kopieren. Ein vorhandenes Ziel wird ersetzt."""
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def link_tree(src_dir: str, dst_dir: str) -> None:
+    """Verzeichnisbaum mit Hardlinks statt Kopien duplizieren (Fallback: Kopie)"""
+    shutil.copytree(src_dir, dst_dir, copy_function=link_or_copy, dirs_exist_ok=True)
+
+
+class ConversionCache:
+    """Größenbeschränkter LRU-Cache für GeoPDF-Konvertierungen"""
+
+    def __init__(self, db_path: str, cache_dir: str = CONVERSION_CACHE_DIR,
+                 max_bytes: int = CONVERSION_CACHE_MAX_BYTES):
+        self.db_path = db_path
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS conversion_cache (
+                key TEXT PRIMARY KEY,
+                path TEXT,
+                size INTEGER,
+                bbox TEXT,
+                srs TEXT,
+                layer_info TEXT,
+                params TEXT,
+                created_at TEXT,
+                last_access REAL,
+                hits INTEGER DEFAULT 0
+            )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_conversion_cache_access ON conversion_cache(last_access)")
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS conversion_cache_stats (
+                name TEXT PRIMARY KEY,
+                value INTEGER DEFAULT 0
+            )
+            """)
+            conn.execute("INSERT OR IGNORE INTO conversion_cache_stats (name, value) VALUES ('hits', 0), ('misses', 0), ('evictions', 0)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL;")
+        return conn
+
+    @staticmethod
+    def make_key(source_sha256: str, params: Dict[str, Any]) -> str:
+        """Cache-Schlüssel aus Eingabe-Hash und (normalisierten) Parametern bilden"""
+        payload = json.dumps({"v": CACHE_VERSION, "source": source_sha256, "params": params}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _count(self, conn: sqlite3.Connection, name: str, amount: int = 1) -> None:
+        conn.execute("UPDATE conversion_cache_stats SET value = value + ? WHERE name = ?", (amount, name))
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Eintrag nachschlagen und als zuletzt genutzt markieren
+
+        Returns:
+            dict: {path, bbox, srs, layer_info} oder None bei Cache-Miss
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT path, bbox, srs, layer_info FROM conversion_cache WHERE key = ?", (key,)).fetchone()
+            if row and not os.path.exists(row[0]):
+                # Datei wurde extern entfernt: Eintrag verwerfen
+                conn.execute("DELETE FROM conversion_cache WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self._count(conn, "misses")
+                return None
+            conn.execute("UPDATE conversion_cache SET last_access = ?, hits = hits + 1 WHERE key = ?", (time.time(), key))
+            self._count(conn, "hits")
+        return {
+            "path": row[0],
+            "bbox": json.loads(row[1]) if row[1] else None,
+            "srs": row[2],
+            "layer_info": json.loads(row[3]) if row[3] else None,
+        }
+
+    def params(self, key: str) -> Optional[Dict[str, Any]]:
+        """Konvertierungsparameter eines Eintrags (ohne ihn als genutzt zu markieren)"""
+        if not key:
+            return None
+        with self._connect() as conn:
+            row = conn.execute("SELECT params FROM conversion_cache WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def store(self, key: str, pdf_path: str, params: Dict[str, Any], bbox=None, srs: Optional[str] = None,
+              layer_info=None) -> None:
+        """Konvertierungsergebnis in den Cache aufnehmen (Hardlink auf das erzeugte GeoPDF)"""
+        cache_path = os.path.join(self.cache_dir, f"{key}.pdf")
+        link_or_copy(pdf_path, cache_path)
+        size = os.path.getsize(cache_path)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO conversion_cache (key, path, size, bbox, srs, layer_info, params, created_at, last_access, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                (key, cache_path, size, json.dumps(bbox) if bbox is not None else None, srs,
+                 json.dumps(layer_info) if layer_info is not None else None, json.dumps(params, sort_keys=True),
+                 datetime.utcnow().isoformat(), time.time())
+            )
+        self.evict()
+
+    def evict(self) -> int:
+        """Am längsten nicht genutzte Einträge entfernen, bis die Maximalgröße eingehalten ist"""
+        removed = 0
+        with self._lock, self._connect() as conn:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM conversion_cache").fetchone()[0]
+            if total <= self.max_bytes:
+                return 0
+            for key, path, size in conn.execute("SELECT key, path, size FROM conversion_cache ORDER BY last_access ASC").fetchall():
+                if total <= self.max_bytes:
+                    break
+                try:
+                    if os.path.exists(path):
+                        os.remove(path)
+                except OSError as e:
+                    logger.warning(f"Cache-Datei konnte nicht entfernt werden {path}: {e}")
+                    continue
+                conn.execute("DELETE FROM conversion_cache WHERE key = ?", (key,))
+                total -= size or 0
+                removed += 1
+            if removed:
+                self._count(conn, "evictions", removed)
+                logger.info(f"Konvertierungs-Cache: {removed} Einträge entfernt (LRU)")
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """Trefferzähler und Belegung des Caches"""
+        with self._connect() as conn:
+            counters = dict(conn.execute("SELECT name, value FROM conversion_cache_stats").fetchall())
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM conversion_cache").fetchone()
+        hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+        return {
+            "hits": hits,
+            "misses": misses,
+            "evictions": counters.get("evictions", 0),
+            "hit_ratio": round(hits / (hits + misses), 3) if hits + misses else None,
+            "entries": entries,
+            "size_bytes": size,
+            "max_bytes": self.max_bytes,
+        }
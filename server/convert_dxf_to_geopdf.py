@@ -2,9 +2,13 @@ from __future__ import annotations
 
 import sys
 import os
+import json
+import math
+import time
 import logging
 import shutil # Hinzugefügt
-from typing import Optional
+from contextlib import nullcontext
+from typing import Callable, Optional
 
 try:
     from qgis.core import (
@@ -12,10 +16,11 @@ try:
         QgsLayoutExporter, QgsLayoutPoint, QgsLayoutSize, QgsUnitTypes, QgsLineSymbol,
         QgsFillSymbol, QgsMarkerSymbol, QgsCoordinateReferenceSystem, QgsSingleSymbolRenderer, # Added QgsSingleSymbolRenderer
         QgsLayoutItem,
-        QgsLayoutItemLabel, QgsLayoutItemScaleBar, QgsLayoutItemLegend
+        QgsLayoutItemLabel, QgsLayoutItemScaleBar, QgsLayoutItemLegend,
+        QgsMapSettings, QgsMapRendererParallelJob, QgsRectangle, QgsCoordinateTransform
     )
-    from qgis.PyQt.QtCore import QSizeF
-    from qgis.PyQt.QtGui import QColor, QFont
+    from qgis.PyQt.QtCore import QSize, QSizeF
+    from qgis.PyQt.QtGui import QColor, QFont, QImage
     QGIS_AVAILABLE = True
 except ModuleNotFoundError:  # pragma: no cover - executed only without QGIS
     QGIS_AVAILABLE = False
@@ -23,6 +28,36 @@ except ModuleNotFoundError:  # pragma: no cover - executed only without QGIS
 # Logging konfigurieren
 logger = logging.getLogger(__name__)
 
+# Kantenlänge der Ausschnitte (Pixel), in denen render_to_raster rendert: begrenzt den Speicher pro QImage
+RASTER_CHUNK_SIZE = int(os.environ.get("DXF_RASTER_CHUNK", "4096"))
+
+# Standard-Symbolisierung (entspricht den Defaults von apply_symbolization)
+DEFAULT_SYMBOLIZATION = {
+    "line_color": "#333333",
+    "line_width": 0.5,
+    "fill_color": "#E0E0E0",
+    "point_color": "#FF0000",
+    "point_size": 2.0,
+}
+
+def normalize_symbolization(symbolization: Optional[dict] = None) -> dict:
+    """
+    Symbolisierung mit den Defaults zusammenführen und unbekannte Schlüssel verwerfen
+
+    Args:
+        symbolization: Teilweise Angaben, z.B. {"line_color": "#000000"}
+
+    Returns:
+        dict: Vollständige Symbolisierung (Argumente für apply_symbolization)
+    """
+    normalized = dict(DEFAULT_SYMBOLIZATION)
+    for key, value in (symbolization or {}).items():
+        if key not in DEFAULT_SYMBOLIZATION:
+            logger.warning(f"Unbekannter Symbolisierungs-Parameter ignoriert: {key}")
+            continue
+        normalized[key] = float(value) if key in ("line_width", "point_size") else str(value)
+    return normalized
+
 class DXFToGeoPDFConverter:
     """
     Klasse für die Konvertierung von DXF-Dateien zu georeferenzierten PDFs
@@ -70,6 +105,14 @@ class DXFToGeoPDFConverter:
                 logger.info("QGIS cleanup completed")
         except Exception as e:
             logger.warning(f"Error during QGIS cleanup: {e}")
+
+    def reset_project(self):
+        """Projekt leeren, damit eine laufende QGIS-Instanz für den nächsten Job wiederverwendet werden kann"""
+        try:
+            if self.project:
+                self.project.clear()
+        except Exception as e:
+            logger.warning(f"Error while resetting QGIS project: {e}")
     
     def load_dxf_layer(self, dxf_path: str, layer_name: str = "dxf_layer") -> QgsVectorLayer:
         """
@@ -373,6 +416,122 @@ class DXFToGeoPDFConverter:
             logger.error(f"Fehler beim PDF-Export: {e}")
             raise
 
+    def generalize_layer(self, layer: QgsVectorLayer, source_path: str, key: str,
+                         tolerance: float) -> QgsVectorLayer:
+        """
+        Layer durch seine generalisierte Fassung ersetzen (siehe generalize.py)
+
+        Args:
+            layer: Geladener DXF-Layer (CRS bereits gesetzt)
+            source_path: Pfad der Quelle, neben der die Generalisierung zwischengespeichert wird
+            key: Ziel der Generalisierung (Cache-Eintrag), z.B. "z19"
+            tolerance: Toleranz in Einheiten des Layer-CRS
+
+        Returns:
+            QgsVectorLayer: Generalisierter Layer im Projekt
+        """
+        from generalize import generalize
+        try:
+            crs = layer.crs()
+            result = generalize(source_path, key, tolerance, srs=crs.authid() or crs.toWkt())
+            self.project.removeMapLayer(layer.id())
+            generalized = self.load_dxf_layer(result["path"], "dxf_layer")
+            generalized.setCrs(crs)
+            logger.info(f"Generalisierung {key}: {result['vertices_in']} -> {result['vertices_out']} Stützstellen, "
+                        f"{result['dropped']} Features verworfen")
+            return generalized
+        except Exception as e:
+            logger.error(f"Failed to generalize layer: {e}")
+            raise
+
+    def render_to_raster(self, layers, tif_path: str, resolution: float, dpi: int = 300,
+                         crs: str = "EPSG:3857", chunk_size: int = RASTER_CHUNK_SIZE) -> dict:
+        """
+        Layer ohne Drucklayout direkt in ein georeferenziertes GeoTIFF rendern.
+
+        Gerendert wird mit dem parallelen Map-Renderer von QGIS (QgsMapRendererParallelJob,
+        ein Thread pro Layer) in Ausschnitten von höchstens chunk_size x chunk_size Pixeln;
+        leere Ausschnitte bleiben im GeoTIFF ungeschrieben (SPARSE_OK).
+
+        Args:
+            layers: Zu rendernde Layer (Reihenfolge wie im Projekt)
+            tif_path: Zielpfad des (unkomprimierten, gekachelten) GeoTIFF
+            resolution: Pixelgröße in Einheiten von crs
+            dpi: Ausgabe-DPI (bestimmt Linienbreiten und Symbolgrößen in mm)
+            crs: Ziel-Koordinatensystem
+
+        Returns:
+            dict: {bounds, width, height, resolution}
+        """
+        import numpy as np
+        from osgeo import gdal
+        try:
+            dest_crs = QgsCoordinateReferenceSystem(crs)
+            extent = None
+            for layer in layers:
+                transform = QgsCoordinateTransform(layer.crs(), dest_crs, self.project)
+                layer_extent = transform.transformBoundingBox(layer.extent())
+                if extent is None:
+                    extent = QgsRectangle(layer_extent)
+                else:
+                    extent.combineExtentWith(layer_extent)
+            if extent is None or extent.isEmpty():
+                raise Exception("Keine Geometrie zum Rendern")
+            # Ausdehnung auf das Pixelraster ausrichten
+            minx = math.floor(extent.xMinimum() / resolution) * resolution
+            miny = math.floor(extent.yMinimum() / resolution) * resolution
+            maxx = math.ceil(extent.xMaximum() / resolution) * resolution
+            maxy = math.ceil(extent.yMaximum() / resolution) * resolution
+            width = max(1, int(round((maxx - minx) / resolution)))
+            height = max(1, int(round((maxy - miny) / resolution)))
+
+            settings = QgsMapSettings()
+            settings.setLayers(list(layers))
+            settings.setDestinationCrs(dest_crs)
+            settings.setOutputDpi(dpi)
+            settings.setBackgroundColor(QColor(0, 0, 0, 0))
+            settings.setFlag(QgsMapSettings.Antialiasing, True)
+
+            ds = gdal.GetDriverByName("GTiff").Create(
+                tif_path, width, height, 4, gdal.GDT_Byte,
+                ["TILED=YES", "BLOCKXSIZE=512", "BLOCKYSIZE=512", "SPARSE_OK=TRUE", "BIGTIFF=IF_SAFER"])
+            if ds is None:
+                raise Exception(f"GeoTIFF kann nicht angelegt werden: {tif_path}")
+            ds.SetGeoTransform((minx, resolution, 0.0, maxy, 0.0, -resolution))
+            ds.SetProjection(dest_crs.toWkt())
+            for index, interpretation in enumerate((gdal.GCI_RedBand, gdal.GCI_GreenBand,
+                                                     gdal.GCI_BlueBand, gdal.GCI_AlphaBand)):
+                ds.GetRasterBand(index + 1).SetColorInterpretation(interpretation)
+
+            chunks = 0
+            for row in range(0, height, chunk_size):
+                for col in range(0, width, chunk_size):
+                    w, h = min(chunk_size, width - col), min(chunk_size, height - row)
+                    settings.setOutputSize(QSize(w, h))
+                    settings.setExtent(QgsRectangle(minx + col * resolution, maxy - (row + h) * resolution,
+                                                    minx + (col + w) * resolution, maxy - row * resolution))
+                    job = QgsMapRendererParallelJob(settings)
+                    job.start()
+                    job.waitForFinished()
+                    # Vormultipliziertes ARGB32 in RGBA (Bytefolge) umwandeln
+                    image = job.renderedImage().convertToFormat(QImage.Format_RGBA8888)
+                    bits = image.constBits()
+                    bits.setsize(image.bytesPerLine() * h)
+                    pixels = np.frombuffer(bits, dtype=np.uint8).reshape(h, image.bytesPerLine())[:, :w * 4]
+                    pixels = pixels.reshape(h, w, 4)
+                    if not pixels[:, :, 3].any():
+                        continue
+                    for band in range(4):
+                        ds.GetRasterBand(band + 1).WriteArray(pixels[:, :, band], col, row)
+                    chunks += 1
+            ds.FlushCache()
+            ds = None
+            logger.info(f"DXF direkt gerastert: {width}x{height} px, {chunks} Ausschnitte mit Inhalt -> {tif_path}")
+            return {"bounds": [minx, miny, maxx, maxy], "width": width, "height": height, "resolution": resolution}
+        except Exception as e:
+            logger.error(f"Fehler beim direkten Rastern: {e}")
+            raise
+
 # Zusätzliche Hilfsfunktion für Seitengrößen-Validierung
 def get_supported_page_sizes():
     """
@@ -419,12 +578,28 @@ def validate_page_size(page_size: str) -> tuple:
         logger.warning(f"Unsupported page size: {page_size}")
         return None
 
+def pdf_tolerance(extent, page_size: str, dpi: int) -> float:
+    """
+    Generalisierungstoleranz (Einheiten des Layers) für den GeoPDF-Export: GENERALIZE_TOLERANCE_PX
+    Druckpixel bei der Kartengröße, die create_print_layout für die Seite verwendet
+    """
+    from generalize import GENERALIZE_TOLERANCE_PX
+    width, height, margins = validate_page_size(page_size) or validate_page_size("A4")
+    # Querformat, Titelbereich und 5 % Puffer um den Extent wie in create_print_layout
+    map_width = max(width, height) - 2 * margins
+    map_height = min(width, height) - 2 * margins - 20
+    ground_per_mm = max(extent.width() / map_width, extent.height() / map_height) * 1.1
+    return ground_per_mm * 25.4 / dpi * GENERALIZE_TOLERANCE_PX
+
 # Verbesserte Hauptfunktion mit Seitgrößen-Validierung
 def dxf_to_geopdf(dxf_path: str, pdf_path: str,
                  crs_epsg: Optional[int] = 3857,
                  page_size: str = "A4",
                  dpi: int = 300,
-                 return_metadata: bool = False) -> dict | None:
+                 return_metadata: bool = False,
+                 converter: Optional[DXFToGeoPDFConverter] = None,
+                 symbolization: Optional[dict] = None,
+                 generalize: Optional[bool] = None) -> dict | None:
     """
     Hauptfunktion: DXF zu GeoPDF konvertieren mit korrekter Seitengröße
     
@@ -435,6 +610,10 @@ def dxf_to_geopdf(dxf_path: str, pdf_path: str,
         page_size: Seitengröße (A0, A1, A2, A3, A4, A5)
         dpi: Auflösung für PDF-Export
         return_metadata: Metadaten zurückgeben
+        converter: Bereits initialisierter Converter (z.B. aus dem QGIS-Worker-Pool).
+            Ohne Angabe wird QGIS für diesen Aufruf gestartet und wieder beendet.
+        symbolization: Farben/Linienbreiten für apply_symbolization (siehe DEFAULT_SYMBOLIZATION)
+        generalize: Geometrie vorher auf die Druckauflösung vereinfachen (Default: GENERALIZE)
         
     Returns:
         dict: Metadaten wenn return_metadata=True, sonst None
@@ -459,9 +638,12 @@ def dxf_to_geopdf(dxf_path: str, pdf_path: str,
         
         metadata = None
         
-        with DXFToGeoPDFConverter() as converter:
-            # DXF-Layer laden
-            layer = converter.load_dxf_layer(dxf_path)
+        # Mit übergebenem Converter bleibt QGIS nach der Konvertierung aktiv
+        context = DXFToGeoPDFConverter() if converter is None else nullcontext(converter)
+        with context as converter:
+            # DXF-Layer laden (aus dem Index mit R-Tree, falls vorhanden)
+            from dxf_store import feature_source
+            layer = converter.load_dxf_layer(feature_source(dxf_path))
             
             # SRS prüfen und ggf. setzen
             crs = layer.crs()
@@ -480,10 +662,18 @@ def dxf_to_geopdf(dxf_path: str, pdf_path: str,
                 else:
                     logger.warning(f"Invalid EPSG code: {crs_epsg}")
             
+            # Stützstellen unterhalb der Druckauflösung entfernen
+            from generalize import GENERALIZE_ENABLED
+            if (GENERALIZE_ENABLED if generalize is None else generalize):
+                if not layer.extent().isEmpty():
+                    layer = converter.generalize_layer(layer, dxf_path, f"pdf-{page_size.upper()}-{dpi}",
+                                                       pdf_tolerance(layer.extent(), page_size, dpi))
+
             # Symbolisierung anwenden (alle Layer im Projekt)
+            style = normalize_symbolization(symbolization)
             for layer_id, layer_obj in converter.project.mapLayers().items():
                 if isinstance(layer_obj, QgsVectorLayer):
-                    converter.apply_symbolization(layer_obj)
+                    converter.apply_symbolization(layer_obj, **style)
             
             # *** KORRIGIERT: page_size Parameter wird jetzt korrekt verwendet ***
             layout = converter.create_print_layout(layer, page_size=page_size)
@@ -492,6 +682,8 @@ def dxf_to_geopdf(dxf_path: str, pdf_path: str,
             converter.export_to_pdf(layout, pdf_path, dpi=dpi, georeference=True)
             
             logger.info(f"DXF to GeoPDF conversion completed successfully ({page_size} format)")
+
+            converter.reset_project()
         
         # Metadaten falls gewünscht
         if return_metadata:
@@ -503,30 +695,173 @@ def dxf_to_geopdf(dxf_path: str, pdf_path: str,
         # Fehlertext für API-Response und Debugging ausführlich machen
         raise Exception(f"Conversion failed: {str(e)}\nType: {type(e).__name__}\nDetails: {repr(e)}")
 
-def convert_pdf_to_tms(pdf_path: str, tms_dir: str, minzoom: int = 0, maxzoom: int = 6, srs: Optional[str] = None) -> bool:
+def dxf_to_raster(dxf_path: str, tif_path: str, maxzoom: int,
+                  srs: Optional[str] = None,
+                  dpi: int = 300,
+                  converter: Optional[DXFToGeoPDFConverter] = None,
+                  symbolization: Optional[dict] = None,
+                  generalize: Optional[bool] = None) -> dict:
     """
-    Konvertiert ein GeoPDF oder Raster (TIF/TIFF) in einen TMS-Ordner (Tiles) mit gdal2tiles.
-    Für Rasterdaten oder PDFs ohne Georeferenz wird -p raster verwendet.
+    DXF ohne Drucklayout und PDF direkt in ein Cloud-Optimized GeoTIFF (EPSG:3857) rendern.
+
+    Für die Kachelung ersetzt das den Weg DXF -> Layout -> GeoPDF -> PDF-Treiber -> COG:
+    QGIS rendert den Layer mit der Auflösung von maxzoom (begrenzt durch COG_MAX_PIXELS),
+    der Tiler liest danach das COG. Metadaten liegen in <tif_path>.json; ein vorhandenes
+    Raster wird wiederverwendet, solange DXF und Parameter gleich sind.
+
+    Args:
+        dxf_path: Pfad zur DXF-Eingabedatei
+        tif_path: Zielpfad des COG
+        maxzoom: Zoomstufe, deren Auflösung das Raster haben soll
+        srs: Koordinatensystem des DXF (z.B. "EPSG:2056"), falls nicht in der Datei
+        dpi: Ausgabe-DPI für Linienbreiten und Symbolgrößen (wie beim PDF-Export)
+        converter: Bereits initialisierter Converter (z.B. aus dem QGIS-Worker-Pool)
+        symbolization: Farben/Linienbreiten für apply_symbolization (siehe DEFAULT_SYMBOLIZATION)
+        generalize: Geometrie vorher auf die Auflösung von maxzoom vereinfachen (Default: GENERALIZE)
+
+    Returns:
+        dict: {path, bounds, width, height, resolution, reused, duration_ms}
+    """
+    from osgeo import gdal
+    from dxf_store import feature_source
+    from generalize import GENERALIZE_ENABLED, generalization_params, mercator_to_source_distance
+    from raster_source import COG_MAX_PIXELS, cog_options
+    from tile_grid import MercatorGrid
+
+    if not QGIS_AVAILABLE:
+        raise ModuleNotFoundError(
+            "QGIS Python bindings are required. Install QGIS or run the conversion inside the provided Docker container."
+        )
+    style = normalize_symbolization(symbolization)
+    if generalize is None:
+        generalize = GENERALIZE_ENABLED
+    stat = os.stat(dxf_path)
+    meta_path = f"{tif_path}.json"
+    params = {"source_mtime_ns": stat.st_mtime_ns, "source_size": stat.st_size, "srs": srs, "maxzoom": maxzoom,
+              "dpi": dpi, "symbolization": style, "generalize": generalization_params() if generalize else None}
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        meta = None
+    if meta and os.path.exists(tif_path) and all(meta.get(key) == value for key, value in params.items()):
+        return {"path": tif_path, "bounds": meta["bounds"], "width": meta["width"], "height": meta["height"],
+                "resolution": meta["resolution"], "reused": True, "duration_ms": 0}
+
+    started = time.perf_counter()
+    work_path = f"{tif_path}.{os.getpid()}.render.tif"
+    tmp_path = f"{tif_path}.{os.getpid()}.tmp"
+    context = DXFToGeoPDFConverter() if converter is None else nullcontext(converter)
+    try:
+        with context as converter:
+            layer = converter.load_dxf_layer(feature_source(dxf_path))
+            if srs:
+                crs = QgsCoordinateReferenceSystem(srs)
+                if crs.isValid():
+                    layer.setCrs(crs)
+                else:
+                    logger.warning(f"Ungültiges SRS: {srs}")
+            # Auflösung von maxzoom, bei sehr großen Plänen auf COG_MAX_PIXELS begrenzt
+            resolution = MercatorGrid().resolution(maxzoom)
+            dest_crs = QgsCoordinateReferenceSystem("EPSG:3857")
+            extent = QgsCoordinateTransform(layer.crs(), dest_crs, converter.project).transformBoundingBox(layer.extent())
+            pixels = (extent.width() / resolution) * (extent.height() / resolution)
+            if pixels > COG_MAX_PIXELS:
+                resolution *= math.sqrt(pixels / COG_MAX_PIXELS)
+                logger.warning(f"Direktes Raster für {dxf_path} auf {COG_MAX_PIXELS} Pixel begrenzt")
+            if generalize and not extent.isEmpty():
+                # Toleranz in Pixeln der Zoomstufe, umgerechnet in Einheiten des DXF
+                from generalize import GENERALIZE_TOLERANCE_PX
+                center = (extent.center().x(), extent.center().y())
+                tolerance = mercator_to_source_distance(resolution * GENERALIZE_TOLERANCE_PX, center,
+                                                        layer.crs().toWkt())
+                layer = converter.generalize_layer(layer, dxf_path, f"z{maxzoom}", tolerance)
+            for layer_obj in converter.project.mapLayers().values():
+                if isinstance(layer_obj, QgsVectorLayer):
+                    converter.apply_symbolization(layer_obj, **style)
+            layers = [layer_obj for layer_obj in converter.project.mapLayers().values()
+                      if isinstance(layer_obj, QgsVectorLayer)]
+            info = converter.render_to_raster(layers, work_path, resolution, dpi=dpi)
+            converter.reset_project()
+        # COG mit Übersichten, damit tiefe Zoomstufen nicht das volle Raster lesen
+        if gdal.Translate(tmp_path, work_path, format="COG", creationOptions=cog_options()) is None:
+            raise RuntimeError(f"COG-Erstellung fehlgeschlagen: {tif_path}")
+        os.replace(tmp_path, tif_path)
+    finally:
+        for path in (work_path, tmp_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    duration_ms = int((time.perf_counter() - started) * 1000)
+    meta = dict(params, bounds=info["bounds"], width=info["width"], height=info["height"],
+                resolution=info["resolution"], duration_ms=duration_ms)
+    with open(meta_path, "w") as f:
+        json.dump(meta, f, indent=2)
+    logger.info(f"DXF -> COG ohne PDF: {tif_path} (Zoom {maxzoom}, {duration_ms} ms)")
+    return dict(info, path=tif_path, reused=False, duration_ms=duration_ms)
+
+# Arbeitsverzeichnis im Layer-Verzeichnis, wenn die Kacheln in ein Archiv gepackt werden
+TMS_SCRATCH_DIR = ".tiles-work"
+
+def convert_pdf_to_tms(pdf_path: str, tms_dir: str, minzoom: int = 0, maxzoom: int = 6, srs: Optional[str] = None,
+                       tile_store: str = "directory", use_raster_cache: Optional[bool] = None,
+                       pyramid: Optional[bool] = None, existing_levels: Optional[tuple] = None,
+                       feature_index=None, progress: Optional[Callable[[float], None]] = None,
+                       encoding: Optional[dict] = None, scheduler=None) -> bool:
+    """
+    Konvertiert ein GeoPDF oder Raster (TIF/TIFF) in einen TMS-Ordner (Tiles).
+    Georeferenzierte Quellen (auch GeoTIFFs aus dxf_to_raster) werden mit dem parallelen Tiler
+    (tiler.py) gerendert, Quellen ohne Georeferenz weiterhin mit gdal2tiles -p raster.
+    Bei tile_store "mbtiles"/"pmtiles" landen die Kacheln in einem Archiv im TMS-Ordner.
+    GeoPDFs werden vorher einmal zu einem COG gerastert (use_raster_cache, Default TMS_RASTER_CACHE).
+    Mit pyramid (Default TMS_PYRAMID) wird nur maxzoom gerendert, tiefere Stufen werden verkleinert.
+    existing_levels (min, max): im Verzeichnis vorhandene, gültige Zoomstufen; nur fehlende werden erzeugt.
+    Mit feature_index (FeatureIndex in EPSG:3857) werden nur Kacheln mit Geometrie gerendert.
+    progress: Callback mit dem Fortschritt in Prozent (0-100)
+    encoding: Kodierprofil der Kacheln (tile_codec.encoding_profile); Default TMS_TILE_ENCODING
+    scheduler: tile_seeder.SeedScheduler für die Reihenfolge der Metakacheln (Viewport zuerst)
+    Ein abgebrochener Lauf mit gleichen Parametern wird anhand des Journals (tiler.TileJournal) fortgesetzt.
     """
     import subprocess
-    import re
+    from tile_store import pack_directory
+    from raster_source import RASTER_CACHE_ENABLED, prepare_raster_source
+    from tile_pyramid import PYRAMID_ENABLED, AncestorBuilder, build_pyramid
+    from tile_codec import encoding_extension, encoding_profile
+    from tiler import (JOURNAL_FILE, METATILE_SIZE, TILER_PROCESSES, TileJournal, block_key, remove_partial_tiles,
+                       render_levels as render_tiles, transcode_tiles)
+    tiles_dir = tms_dir
+    journal = None
+    # Signatur des Laufs: nur ein Lauf mit gleicher Quelle und gleichen Parametern darf fortgesetzt werden
+    source_stat = os.stat(pdf_path)
+    signature = {"source": os.path.abspath(pdf_path), "size": source_stat.st_size, "mtime_ns": source_stat.st_mtime_ns,
+                 "srs": srs, "minzoom": minzoom, "maxzoom": maxzoom, "tile_store": tile_store,
+                 "raster_cache": use_raster_cache, "pyramid": pyramid, "encoding": encoding_profile(encoding),
+                 "sparse": feature_index is not None, "metatile": METATILE_SIZE,
+                 "existing_levels": list(existing_levels) if existing_levels else None}
     try:
         if not os.path.exists(tms_dir):
             os.makedirs(tms_dir)
-
-        # Finde gdal2tiles.py im PATH
-        gdal2tiles_executable = shutil.which('gdal2tiles.py')
-        if not gdal2tiles_executable:
-            logger.error("'gdal2tiles.py' nicht im Systempfad (PATH) gefunden.")
-            raise FileNotFoundError("[Errno 2] No such file or directory: 'gdal2tiles.py'")
+        # Für Archive wird in ein Arbeitsverzeichnis gekachelt, das danach gepackt wird
+        tiles_dir = tms_dir if tile_store == "directory" else os.path.join(tms_dir, TMS_SCRATCH_DIR)
+        os.makedirs(tiles_dir, exist_ok=True)
 
         # Dateityp prüfen
         ext = os.path.splitext(pdf_path)[1].lower()
         is_raster = ext in ['.tif', '.tiff']
         needs_raster_profile = False
+        if use_raster_cache is None:
+            use_raster_cache = RASTER_CACHE_ENABLED
 
-        # Prüfe auf Georeferenz (für PDFs)
-        if not is_raster:
+        if not is_raster and use_raster_cache:
+            # GeoPDF einmal rastern; der Tiler liest das COG (bereits in EPSG:3857, kein Quell-SRS mehr)
+            source = prepare_raster_source(pdf_path, maxzoom, srs)
+            pdf_path = source["path"]
+            srs = source["srs"]
+            needs_raster_profile = not source["georeferenced"]
+            if needs_raster_profile:
+                logger.warning(f"Keine Georeferenz im PDF gefunden, setze -p raster für {pdf_path}")
+        # Prüfe auf Georeferenz (PDFs ohne COG, Rasterdaten wie das direkt gerenderte DXF-Raster)
+        else:
             try:
                 from osgeo import gdal
                 ds = gdal.Open(pdf_path)
@@ -539,38 +874,166 @@ def convert_pdf_to_tms(pdf_path: str, tms_dir: str, minzoom: int = 0, maxzoom: i
                     ds = None
                 if not has_georef:
                     needs_raster_profile = True
-                    logger.warning(f"Keine Georeferenz im PDF gefunden, setze -p raster für {pdf_path}")
+                    logger.warning(f"Keine Georeferenz in der Quelle gefunden, setze -p raster für {pdf_path}")
             except Exception as e:
                 needs_raster_profile = True
                 logger.warning(f"Fehler beim Prüfen der Georeferenz: {e}. Setze -p raster für {pdf_path}")
+
+        if pyramid is None:
+            pyramid = PYRAMID_ENABLED
+        encoding = encoding_profile(encoding)
+        tile_ext = encoding_extension(encoding)
+
+        if not needs_raster_profile:
+            journal_path = os.path.join(tms_dir, JOURNAL_FILE)
+            had_journal = os.path.exists(journal_path)
+            journal = TileJournal(journal_path, signature)
+            if journal.resumed:
+                # Abgebrochene Schreibvorgänge verwerfen; betroffene Blöcke und Stufen neu rechnen
+                for z, x, y in remove_partial_tiles(tiles_dir):
+                    journal.discard(block_key(z, x, y))
+                    journal.discard(f"pyramid {z}")
+                logger.info(f"Setze abgebrochene Kachelung fort ({len(journal)} Schritte erledigt): {tms_dir}")
+            elif had_journal:
+                # Kacheln eines anderen, abgebrochenen Laufs sind ungültig
+                for name in os.listdir(tiles_dir):
+                    if name.isdigit() and not (existing_levels and existing_levels[0] <= int(name) <= existing_levels[1]):
+                        shutil.rmtree(os.path.join(tiles_dir, name))
+
+        def run_gdal2tiles(zoom_min: int, zoom_max: int):
+            # Finde gdal2tiles.py im PATH
+            gdal2tiles_executable = shutil.which('gdal2tiles.py')
+            if not gdal2tiles_executable:
+                logger.error("'gdal2tiles.py' nicht im Systempfad (PATH) gefunden.")
+                raise FileNotFoundError("[Errno 2] No such file or directory: 'gdal2tiles.py'")
+            cmd = [
+                gdal2tiles_executable,
+                '-z', f'{zoom_min}-{zoom_max}',
+                '-r', 'bilinear',
+                '-w', 'none',
+                '-p', 'raster',
+                f'--processes={TILER_PROCESSES}',
+            ]
+            if srs:
+                cmd.extend(["--s_srs", srs])
+            cmd.extend([pdf_path, tiles_dir])
+            logger.info(f"Starte gdal2tiles: {' '.join(cmd)}")
+            result = subprocess.run(cmd, capture_output=True, text=True, check=False)
+            logger.info(f"gdal2tiles stdout: {result.stdout}")
+            logger.info(f"gdal2tiles stderr: {result.stderr}")
+            if result.returncode != 0:
+                error_output = result.stderr or result.stdout
+                logger.error(f"gdal2tiles Fehler (Return Code: {result.returncode}): {error_output}")
+                raise Exception(f"gdal2tiles failed (Return Code: {result.returncode}): {error_output}")
+            if encoding != encoding_profile("png"):
+                # gdal2tiles schreibt RGBA-PNG; in das Profil des Layers umwandeln
+                transcode_tiles(tiles_dir, encoding)
+
+        def render_levels(zoom_min: int, zoom_max: int, report: Callable[[float], None]):
+            if needs_raster_profile:
+                run_gdal2tiles(zoom_min, zoom_max)
+                return
+            preview = None
+            if parents_min is not None:
+                # Eltern fertiger Blöcke im Hintergrund ableiten, ohne den Tiler aufzuhalten
+                preview = AncestorBuilder(tiles_dir, zoom_max, parents_min, ext=tile_ext, profile=encoding)
+            try:
+                # Mit Feature-Index nur Kacheln, die Geometrie schneiden; leere Kacheln werden nicht gespeichert
+                counts = render_tiles(pdf_path, tiles_dir, range(zoom_min, zoom_max + 1), srs,
+                                      tiles_for=feature_index.tiles if feature_index is not None else None,
+                                      profile=encoding, journal=journal, scheduler=scheduler,
+                                      on_block=(lambda z, block: preview.add(block)) if preview else None,
+                                      progress=lambda done, total: report(done / total if total else 1.0))
+            finally:
+                # Vor dem vollständigen Ableiten beenden, damit nicht zwei Stellen dieselben Kacheln schreiben
+                if preview is not None:
+                    preview.close()
+            for z in sorted(counts):
+                logger.info(f"Zoomstufe {z}: {counts[z]} Kacheln gerendert")
+
+        # Vorhandene Zoomstufen nur bei Verzeichnisablage und überlappendem Bereich weiterverwenden
+        if existing_levels and (tile_store != "directory" or existing_levels[0] > maxzoom or existing_levels[1] < minzoom):
+            existing_levels = None
+        if existing_levels:
+            kept_min, kept_max = existing_levels
+            for name in os.listdir(tiles_dir):
+                if name.isdigit() and not minzoom <= int(name) <= maxzoom:
+                    shutil.rmtree(os.path.join(tiles_dir, name))
+            logger.info(f"TMS-Zoomstufen {max(kept_min, minzoom)}-{min(kept_max, maxzoom)} werden weiterverwendet")
         else:
-            needs_raster_profile = True
-            logger.info(f"Rasterdatei erkannt ({pdf_path}), setze -p raster")
-
-        cmd = [
-            gdal2tiles_executable,
-            '-z', f'{minzoom}-{maxzoom}',
-            '-r', 'bilinear',
-            '-w', 'none',
-        ]
-        if needs_raster_profile:
-            cmd.extend(['-p', 'raster'])
-        if srs:
-            cmd.extend(["--s_srs", srs])
-        cmd.extend([pdf_path, tms_dir])
-        logger.info(f"Starte gdal2tiles: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=True, check=False)
-        logger.info(f"gdal2tiles stdout: {result.stdout}")
-        logger.info(f"gdal2tiles stderr: {result.stderr}")
-        if result.returncode != 0:
-            error_output = result.stderr or result.stdout
-            logger.error(f"gdal2tiles Fehler (Return Code: {result.returncode}): {error_output}")
-            raise Exception(f"gdal2tiles failed (Return Code: {result.returncode}): {error_output}")
+            kept_min, kept_max = maxzoom + 1, maxzoom
+
+        # Arbeitsschritte (Art, von, bis); Rendern aus der Quelle wiegt im Fortschritt schwerer als Verkleinern
+        steps = []
+        # Tiefste Stufe, bis zu der die Eltern fertiger Blöcke als Vorschau abgeleitet werden
+        parents_min = None
+        # Stufen oberhalb des vorhandenen Bereichs aus der Quelle (bzw. per Pyramide aus maxzoom)
+        if maxzoom > kept_max:
+            upper_min = max(kept_max + 1, minzoom)
+            if pyramid and maxzoom > upper_min:
+                if scheduler is not None and tiles_dir == tms_dir and not needs_raster_profile:
+                    # Vorschau während der Kachelung: tiefe Stufen wachsen mit den Blöcken mit,
+                    # statt erst nach der vollständigen höchsten Stufe zu entstehen
+                    parents_min = upper_min
+                    scheduler.set_derived_levels(upper_min)
+                # Tiefere Zoomstufen durch 2x2-Verkleinerung statt erneutem Rendern der Quelle
+                steps += [("render", maxzoom, maxzoom), ("pyramid", upper_min, maxzoom)]
+            else:
+                steps.append(("render", upper_min, maxzoom))
+        # Stufen unterhalb des vorhandenen Bereichs aus der tiefsten vorhandenen Stufe ableiten
+        if existing_levels and minzoom < kept_min:
+            steps.append(("pyramid", minzoom, kept_min) if pyramid else ("render", minzoom, kept_min - 1))
+        weights = [4.0 if kind == "render" else 1.0 for kind, _, _ in steps]
+        completed = 0.0
+        for (kind, zoom_min, zoom_max), weight in zip(steps, weights):
+            base = completed
+
+            def report(fraction: float, base=base, weight=weight):
+                if progress:
+                    progress(round(100.0 * (base + weight * fraction) / sum(weights), 1))
+
+            if kind == "render":
+                render_levels(zoom_min, zoom_max, report)
+            else:
+                levels = zoom_max - zoom_min
+                # Bereits abgeleitete Stufen (Journal) überspringen; weiter ab der tiefsten fertigen Stufe
+                start = zoom_max
+                while journal is not None and start > zoom_min and f"pyramid {start - 1}" in journal:
+                    start -= 1
+
+                def level_done(z: int, count: int, zoom_max=zoom_max, levels=levels, report=report):
+                    if journal is not None:
+                        journal.record(f"pyramid {z}")
+                    report((zoom_max - z) / levels)
+
+                if start > zoom_min:
+                    build_pyramid(tiles_dir, zoom_min, start, ext=tile_ext, profile=encoding, progress=level_done)
+            report(1.0)
+            completed += weight
+        if tiles_dir != tms_dir:
+            pack_directory(tiles_dir, tms_dir, tile_store, metadata={"srs": srs or ""})
+            # Begleitdateien von gdal2tiles (tilemapresource.xml) behalten
+            for name in os.listdir(tiles_dir):
+                path = os.path.join(tiles_dir, name)
+                if os.path.isfile(path):
+                    shutil.move(path, os.path.join(tms_dir, name))
+        if journal is not None:
+            journal.remove()
+            journal = None
+        if progress:
+            progress(100.0)
         logger.info(f"TMS erfolgreich erzeugt: {tms_dir}")
         return True
     except Exception as e:
         logger.error(f"TMS-Konvertierung fehlgeschlagen: {e}")
         raise
+    finally:
+        if journal is not None:
+            journal.close()
+        # Mit Journal bleibt das Arbeitsverzeichnis für die Fortsetzung erhalten
+        if (tiles_dir != tms_dir and os.path.isdir(tiles_dir)
+                and not os.path.exists(os.path.join(tms_dir, JOURNAL_FILE))):
+            shutil.rmtree(tiles_dir, ignore_errors=True)
 
 def extract_geopdf_metadata(pdf_path: str) -> dict:
     """
@@ -0,0 +1,326 @@
+# dxf_scan.py - Schneller Streaming-Scan von DXF-Dateien ohne QGIS
+"""
+Liest eine ASCII-DXF-Datei einmal als Strom von Gruppencode/Wert-Paaren und
+ermittelt dabei:
+
+* $EXTMIN/$EXTMAX aus dem HEADER
+* den Extent aller Entities der ENTITIES-Section (ohne Blockreferenzen)
+* Anzahl Entities sowie Entity- und Geometrietypen pro Layer
+* auf Wunsch die Eckpunkte von Linien und Polylinien (Index der Kachelung)
+
+Der Speicherbedarf ist unabhängig von der Dateigröße (nur Zähler pro Layer),
+so dass bbox/layer_info schon beim Upload befüllt werden können.
+"""
+import os
+import math
+import time
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Geometrietyp, unter dem OGR (DXF-Treiber) die Entity liefert
+ENTITY_GEOMETRY_TYPES = {
+    "POINT": "Point",
+    "TEXT": "Point",
+    "MTEXT": "Point",
+    "ATTDEF": "Point",
+    "INSERT": "Point",
+    "LINE": "LineString",
+    "LWPOLYLINE": "LineString",
+    "POLYLINE": "LineString",
+    "ARC": "LineString",
+    "CIRCLE": "LineString",
+    "ELLIPSE": "LineString",
+    "SPLINE": "LineString",
+    "DIMENSION": "LineString",
+    "LEADER": "LineString",
+    "HATCH": "Polygon",
+    "SOLID": "Polygon",
+    "TRACE": "Polygon",
+    "3DFACE": "Polygon",
+}
+
+# Entities, deren Koordinaten im Objekt-Koordinatensystem (OCS) liegen
+OCS_ENTITIES = {b"CIRCLE", b"ARC", b"LWPOLYLINE", b"POLYLINE", b"TEXT", b"INSERT", b"HATCH", b"SOLID", b"TRACE", b"ATTDEF"}
+# Entities mit zusätzlichen Eckpunkten in 11/21, 12/22, 13/23
+MULTI_POINT_ENTITIES = {b"LINE", b"3DFACE", b"SOLID", b"TRACE"}
+# Unterobjekte, die zur vorangehenden Entity gehören
+SUB_ENTITIES = {b"VERTEX", b"SEQEND", b"ATTRIB"}
+# Entities ohne eigene Geometrie im Extent: bei INSERT ist nur der Einfügepunkt
+# bekannt, der Blockinhalt kann beliebig weit davon entfernt liegen
+EXTENT_EXCLUDED = {b"INSERT"}
+# Kreisförmige Entities: Extent wird aus Mittelpunkt, Radius/Achsen und Winkeln berechnet
+CURVE_ENTITIES = {b"CIRCLE", b"ARC", b"ELLIPSE"}
+CURVE_CODES = {b"11", b"21", b"40", b"41", b"42", b"50", b"51"}
+# Entities aus geraden Segmenten, deren Eckpunkte auf Wunsch (on_path) geliefert werden
+PATH_ENTITIES = {b"LINE", b"LWPOLYLINE", b"POLYLINE"}
+# POLYLINE-Flags für Polygon-/Polyface-Netze (keine fortlaufende Linie)
+MESH_FLAGS = 16 | 64
+
+INVALID_EXTENT = 1e19
+
+
+def _decode(value: bytes) -> str:
+    try:
+        return value.decode("utf-8")
+    except UnicodeDecodeError:
+        return value.decode("cp1252", errors="replace")
+
+
+def _valid_extent(extent: Optional[List[float]]) -> bool:
+    if not extent or any(v is None for v in extent):
+        return False
+    minx, miny, maxx, maxy = extent
+    return all(abs(v) < INVALID_EXTENT for v in extent) and minx <= maxx and miny <= maxy
+
+
+def _arc_extent(cx: float, cy: float, ux: float, uy: float, vx: float, vy: float,
+                start: float, end: float) -> List[float]:
+    """
+    Extent des Bogens P(t) = C + U·cos(t) + V·sin(t) für t in [start, end]
+
+    Neben den Endpunkten kommen nur die Parameter in Frage, an denen x oder y
+    extremal wird (atan2(Vx, Ux) bzw. atan2(Vy, Uy), jeweils + π).
+    """
+    two_pi = 2 * math.pi
+    span = (end - start) % two_pi or two_pi
+    candidates = [start, start + span]
+    for base in (math.atan2(vx, ux), math.atan2(vy, uy)):
+        for t in (base, base + math.pi):
+            if (t - start) % two_pi <= span:
+                candidates.append(t)
+    xs = [cx + ux * math.cos(t) + vx * math.sin(t) for t in candidates]
+    ys = [cy + uy * math.cos(t) + vy * math.sin(t) for t in candidates]
+    return [min(xs), min(ys), max(xs), max(ys)]
+
+
+def scan_dxf(path: str, walk_entities: bool = True,
+             on_entity: Optional[Callable[[str, str, List[float]], None]] = None,
+             on_path: Optional[Callable[[str, str, List[float]], None]] = None) -> Dict[str, Any]:
+    """
+    DXF-Datei streamend analysieren
+
+    Args:
+        path: Pfad zur (ASCII-)DXF-Datei
+        walk_entities: False liest nur den HEADER (bricht danach ab)
+        on_entity: Callback (Layer, Entity-Typ, [minx, miny, maxx, maxy]) für jede Entity mit Koordinaten;
+            bei INSERT ist das nur der Einfügepunkt
+        on_path: Callback (Layer, Entity-Typ, [x0, y0, x1, y1, ...]) mit den Eckpunkten von Linien und
+            Polylinien ohne Bögen (geschlossene mit dem ersten Punkt am Ende); diese Entities werden
+            dann nicht an on_entity gemeldet
+
+    Returns:
+        dict: {bbox, header_extent, entity_extent, entity_count, layers, dxf_version, duration_ms}
+            bbox ist der Header-Extent, falls gültig, sonst der Entity-Extent
+
+    Raises:
+        ValueError: Bei Binary-DXF oder nicht lesbarer Struktur
+    """
+    started = time.perf_counter()
+    header_min = [None, None]
+    header_max = [None, None]
+    version = None
+    ext = [float("inf"), float("inf"), float("-inf"), float("-inf")]
+    layers: Dict[bytes, Dict[bytes, int]] = {}
+    entity_count = 0
+
+    # Zustand der aktuellen Entity
+    etype = None
+    elayer = b"0"
+    eminx = eminy = float("inf")
+    emaxx = emaxy = float("-inf")
+    mirrored = False
+    skip_point = False
+    pending_x = None
+    curve: Dict[bytes, float] = {}
+    vertices: Optional[List[float]] = None
+    closed = False
+    in_vertex = False
+
+    def finish_entity():
+        nonlocal entity_count
+        if etype is None:
+            return
+        entity_count += 1
+        counts = layers.get(elayer)
+        if counts is None:
+            counts = layers[elayer] = {}
+        counts[etype] = counts.get(etype, 0) + 1
+        if eminx == float("inf"):
+            return
+        if etype in EXTENT_EXCLUDED:
+            if on_entity is not None:
+                x = -eminx if mirrored else eminx
+                on_entity(_decode(elayer), _decode(etype), [x, eminy, x, eminy])
+            return
+        lo_x, lo_y, hi_x, hi_y = eminx, eminy, emaxx, emaxy
+        if etype in CURVE_ENTITIES:
+            # Bei Kreis/Bogen/Ellipse ist (nur) der Mittelpunkt gesammelt
+            if etype == b"ELLIPSE":
+                ux, uy = curve.get(b"11", 0.0), curve.get(b"21", 0.0)
+                ratio = curve.get(b"40", 1.0)
+                start, end = curve.get(b"41", 0.0), curve.get(b"42", 2 * math.pi)
+            else:
+                ux, uy, ratio = curve.get(b"40", 0.0), 0.0, 1.0
+                start = math.radians(curve.get(b"50", 0.0)) if etype == b"ARC" else 0.0
+                end = math.radians(curve.get(b"51", 360.0)) if etype == b"ARC" else 2 * math.pi
+            lo_x, lo_y, hi_x, hi_y = _arc_extent(eminx, eminy, ux, uy, -uy * ratio, ux * ratio, start, end)
+        if mirrored:
+            lo_x, hi_x = -hi_x, -lo_x
+        if vertices is not None and len(vertices) >= 4:
+            coords = list(vertices)
+            if mirrored:
+                coords[0::2] = [-x for x in coords[0::2]]
+            if closed:
+                coords += coords[:2]
+            on_path(_decode(elayer), _decode(etype), coords)
+        elif on_entity is not None:
+            on_entity(_decode(elayer), _decode(etype), [lo_x, lo_y, hi_x, hi_y])
+        if lo_x < ext[0]:
+            ext[0] = lo_x
+        if lo_y < ext[1]:
+            ext[1] = lo_y
+        if hi_x > ext[2]:
+            ext[2] = hi_x
+        if hi_y > ext[3]:
+            ext[3] = hi_y
+
+    with open(path, "rb") as f:
+        if f.read(18) == b"AutoCAD Binary DXF":
+            raise ValueError("Binary-DXF wird nicht unterstützt")
+        f.seek(0)
+        section = None
+        expect_section_name = False
+        header_var = None
+        for code_line in f:
+            value = f.readline()
+            if not value:
+                break
+            code = code_line.strip()
+            value = value.strip()
+
+            if code == b"0":
+                if section == b"ENTITIES":
+                    if value in SUB_ENTITIES:
+                        # VERTEX/ATTRIB gehören zur vorangehenden POLYLINE/INSERT
+                        skip_point = False
+                        in_vertex = True
+                        continue
+                    finish_entity()
+                    etype = None
+                if value == b"SECTION":
+                    expect_section_name = True
+                elif value == b"ENDSEC":
+                    if section == b"HEADER" and not walk_entities:
+                        break
+                    section = None
+                elif value == b"EOF":
+                    break
+                elif section == b"ENTITIES":
+                    etype = value
+                    elayer = b"0"
+                    eminx = eminy = float("inf")
+                    emaxx = emaxy = float("-inf")
+                    mirrored = False
+                    # POLYLINE/HATCH: erster Punkt ist nur ein Höhen-Dummy
+                    skip_point = value in (b"POLYLINE", b"HATCH")
+                    pending_x = None
+                    curve = {}
+                    vertices = [] if on_path is not None and value in PATH_ENTITIES else None
+                    closed = False
+                    in_vertex = False
+                continue
+
+            if expect_section_name:
+                if code == b"2":
+                    section = value
+                    expect_section_name = False
+                continue
+
+            if section == b"ENTITIES":
+                if etype is None:
+                    continue
+                if code == b"10" or (etype in MULTI_POINT_ENTITIES and code in (b"11", b"12", b"13")):
+                    pending_x = float(value)
+                elif pending_x is not None and code in (b"20", b"21", b"22", b"23"):
+                    if skip_point:
+                        skip_point = False
+                    else:
+                        y = float(value)
+                        if pending_x < eminx:
+                            eminx = pending_x
+                        if pending_x > emaxx:
+                            emaxx = pending_x
+                        if y < eminy:
+                            eminy = y
+                        if y > emaxy:
+                            emaxy = y
+                        if vertices is not None:
+                            vertices += (pending_x, y)
+                    pending_x = None
+                elif code == b"8":
+                    elayer = value
+                elif vertices is not None and code == b"42":
+                    # Bögen weichen von der Sehne ab: nur die Ausdehnung melden
+                    if float(value) != 0:
+                        vertices = None
+                elif vertices is not None and code == b"70" and not in_vertex:
+                    flags = int(value)
+                    closed = bool(flags & 1)
+                    if flags & MESH_FLAGS:
+                        vertices = None
+                elif etype in CURVE_ENTITIES and code in CURVE_CODES:
+                    # Radius/Winkel bzw. Hauptachse (relativ zum Mittelpunkt), Achsverhältnis, Parameter
+                    curve[code] = float(value)
+                elif code == b"230" and etype in OCS_ENTITIES:
+                    mirrored = float(value) < 0
+            elif section == b"HEADER":
+                if code == b"9":
+                    header_var = value
+                elif header_var == b"$ACADVER" and code == b"1":
+                    version = _decode(value)
+                elif header_var in (b"$EXTMIN", b"$EXTMAX") and code in (b"10", b"20"):
+                    target = header_min if header_var == b"$EXTMIN" else header_max
+                    target[0 if code == b"10" else 1] = float(value)
+
+        if section == b"ENTITIES":
+            finish_entity()
+
+    header_extent = [header_min[0], header_min[1], header_max[0], header_max[1]]
+    header_extent = header_extent if _valid_extent(header_extent) else None
+    entity_extent = ext if _valid_extent(ext) else None
+
+    layer_list = []
+    for name, counts in sorted(layers.items()):
+        geometry_types: Dict[str, int] = {}
+        for entity_type, count in counts.items():
+            geometry_type = ENTITY_GEOMETRY_TYPES.get(_decode(entity_type), "Unknown")
+            geometry_types[geometry_type] = geometry_types.get(geometry_type, 0) + count
+        layer_list.append({
+            "name": _decode(name),
+            "entity_count": sum(counts.values()),
+            "entity_types": {_decode(k): v for k, v in sorted(counts.items())},
+            "geometry_types": geometry_types,
+        })
+
+    duration_ms = round((time.perf_counter() - started) * 1000, 1)
+    logger.info(f"DXF-Scan {os.path.basename(path)}: {entity_count} Entities, {len(layer_list)} Layer in {duration_ms} ms")
+    return {
+        "bbox": header_extent or entity_extent,
+        "header_extent": header_extent,
+        "entity_extent": entity_extent,
+        "entity_count": entity_count,
+        "layers": layer_list,
+        "dxf_version": version,
+        "duration_ms": duration_ms,
+    }
+
+
+def layer_info_from_scan(scan: Dict[str, Any]) -> Dict[str, Any]:
+    """Scan-Ergebnis in die Struktur der layer_info-Spalte überführen"""
+    return {
+        "dxf_version": scan.get("dxf_version"),
+        "entity_count": scan.get("entity_count"),
+        "layers": scan.get("layers", []),
+    }
@@ -0,0 +1,135 @@
+# dxf_store.py - DXF einmalig in ein GeoPackage mit R-Tree übernehmen
+"""
+OGR liest DXF-Dateien immer vollständig und sequentiell: jede Stufe, die die
+Geometrie braucht (Konvertierung, Generalisierung, Vektorkacheln, Index der
+Kachelung), hat bisher die ganze Datei neu geparst. Beim Upload wird die DXF
+deshalb einmal in ein GeoPackage neben der Datei übernommen
+(<datei>.gpkg, Layer "entities", Metadaten in <datei>.gpkg.json):
+
+* Die Geometrie liegt mit allen Attributen des DXF-Treibers (Layer, Linetype,
+  Text, ...) im Quell-SRS vor, Blockreferenzen sind wie beim DXF-Treiber aufgelöst.
+* Der R-Tree (rtree_entities_geom) erlaubt Abfragen nach Ausdehnung, ohne die
+  übrigen Features zu lesen; QGIS nutzt ihn beim Rendern automatisch.
+* Öffnen kostet nur das Lesen des Headers, unabhängig von der Anzahl Entities.
+
+Das GeoPackage wird wiederverwendet, solange Größe und Änderungszeit der DXF
+übereinstimmen; fehlt es oder ist es veraltet, lesen alle Stufen wie bisher
+direkt die DXF (feature_source).
+
+Konfiguration über Umgebungsvariablen:
+    DXF_INDEX   1 = DXF beim Upload in ein GeoPackage mit R-Tree übernehmen (Default: 1)
+"""
+import os
+import json
+import time
+import sqlite3
+import logging
+from typing import List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DXF_INDEX_ENABLED = os.environ.get("DXF_INDEX", "1") not in ("0", "false", "no")
+STORE_LAYER = "entities"
+RTREE_TABLE = f"rtree_{STORE_LAYER}_geom"
+
+Box = Tuple[float, float, float, float]
+
+
+def store_paths(dxf_path: str) -> Tuple[str, str]:
+    """GeoPackage und Metadaten des Index einer DXF-Datei"""
+    gpkg_path = f"{dxf_path}.gpkg"
+    return gpkg_path, f"{gpkg_path}.json"
+
+
+def load_store_meta(dxf_path: str) -> Optional[dict]:
+    """Metadaten des Index; None, wenn er fehlt oder nicht mehr zur DXF passt"""
+    gpkg_path, meta_path = store_paths(dxf_path)
+    try:
+        stat = os.stat(dxf_path)
+        with open(meta_path) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (meta.get("source_mtime_ns") != stat.st_mtime_ns or meta.get("source_size") != stat.st_size
+            or not os.path.exists(gpkg_path)):
+        return None
+    return meta
+
+
+def feature_source(dxf_path: str) -> str:
+    """Pfad, über den die Geometrie gelesen wird: aktueller Index, sonst die DXF selbst"""
+    if DXF_INDEX_ENABLED and load_store_meta(dxf_path) is not None:
+        return store_paths(dxf_path)[0]
+    return dxf_path
+
+
+def build_dxf_store(dxf_path: str) -> dict:
+    """
+    DXF in ein GeoPackage mit R-Tree übernehmen (ersetzt einen veralteten Index atomar).
+
+    Returns:
+        dict: {path, features, extent, reused, duration_ms}
+    """
+    gpkg_path, meta_path = store_paths(dxf_path)
+    meta = load_store_meta(dxf_path)
+    if meta is not None:
+        return {"path": gpkg_path, "features": meta["features"], "extent": meta["extent"], "reused": True,
+                "duration_ms": 0}
+
+    from osgeo import gdal
+    started = time.perf_counter()
+    stat = os.stat(dxf_path)
+    tmp_path = f"{gpkg_path}.{os.getpid()}.tmp.gpkg"
+    try:
+        # R-Tree wird erst nach dem Einfügen aller Features in einem Durchgang aufgebaut
+        result = gdal.VectorTranslate(
+            tmp_path, dxf_path, format="GPKG", layerName=STORE_LAYER,
+            layerCreationOptions=["SPATIAL_INDEX=YES"], skipFailures=True,
+        )
+        if result is None:
+            raise RuntimeError(f"DXF-Index konnte nicht erstellt werden: {dxf_path}")
+        result = None
+        os.replace(tmp_path, gpkg_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    features, extent = store_summary(gpkg_path)
+    duration_ms = int((time.perf_counter() - started) * 1000)
+    with open(meta_path, "w") as f:
+        json.dump({"source_mtime_ns": stat.st_mtime_ns, "source_size": stat.st_size, "features": features,
+                   "extent": extent, "duration_ms": duration_ms}, f, indent=2)
+    logger.info(f"DXF-Index erstellt: {gpkg_path} ({features} Features, {duration_ms} ms)")
+    return {"path": gpkg_path, "features": features, "extent": extent, "reused": False, "duration_ms": duration_ms}
+
+
+def store_summary(gpkg_path: str) -> Tuple[int, Optional[List[float]]]:
+    """Anzahl Features und Ausdehnung [minx, miny, maxx, maxy] aus dem R-Tree"""
+    with sqlite3.connect(gpkg_path) as conn:
+        row = conn.execute(f"SELECT COUNT(*), MIN(minx), MIN(miny), MAX(maxx), MAX(maxy) FROM {RTREE_TABLE}").fetchone()
+    extent = list(row[1:]) if row[0] else None
+    return row[0], extent
+
+
+def store_boxes(dxf_path: str, bounds: Optional[Sequence[float]] = None) -> Optional[List[Box]]:
+    """
+    Bounding Boxes der Features aus dem R-Tree, optional auf eine Ausdehnung im Quell-SRS begrenzt.
+
+    Liest nur die R-Tree-Tabelle, nicht die Geometrie; None, wenn kein aktueller Index vorliegt.
+    """
+    if not DXF_INDEX_ENABLED or load_store_meta(dxf_path) is None:
+        return None
+    query = f"SELECT minx, miny, maxx, maxy FROM {RTREE_TABLE}"
+    args: tuple = ()
+    if bounds is not None:
+        query += " WHERE maxx >= ? AND minx <= ? AND maxy >= ? AND miny <= ?"
+        args = (bounds[0], bounds[2], bounds[1], bounds[3])
+    with sqlite3.connect(store_paths(dxf_path)[0]) as conn:
+        return [tuple(row) for row in conn.execute(query, args)]
+
+
+def remove_dxf_store(dxf_path: str) -> None:
+    """Index einer DXF-Datei entfernen"""
+    for path in store_paths(dxf_path):
+        if os.path.exists(path):
+            os.remove(path)
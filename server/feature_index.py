@@ -0,0 +1,285 @@
+# feature_index.py - Räumlicher Index der DXF-Geometrie für die Kachelung
+"""
+CAD-Pläne bestehen größtenteils aus Weißraum. Der FeatureIndex hält die
+Bounding Boxes aller DXF-Entities (in EPSG:3857) in einem Gitterindex, damit
+der Tiler nur Kacheln rendert, die Geometrie schneiden, und die Auslieferung
+leere Kacheln erkennt, ohne zu rendern.
+
+Die Boxen stammen aus dem R-Tree des DXF-Index (dxf_store), sonst aus dem
+Streaming-Scan (dxf_scan.scan_dxf). Linien und Polylinien werden entlang ihrer
+Segmente in Boxen von höchstens SPARSE_SEGMENT_SIZE zerlegt: ein Planrahmen oder
+eine lange Leitung markiert so nur die Kacheln, die sie tatsächlich kreuzt, nicht
+alle unter ihrer Ausdehnung. Aus dem DXF-Index wird dafür nur die Geometrie der
+Features gelesen, deren R-Tree-Box größer ist. Punktartige Entities (Text, Punkte, im
+Scan auch Blockreferenzen) haben nur einen Einfügepunkt und werden um
+SPARSE_POINT_BUFFER (Einheiten des Quell-SRS) erweitert, damit Beschriftung
+und Blockinhalt nicht abgeschnitten werden. Abfragen werden
+zusätzlich um einige Pixel gepuffert (Linienbreite, Symbole).
+
+Der Index wird als features.idx (Folge von float64-Boxen) im Layer-Verzeichnis abgelegt.
+
+Konfiguration über Umgebungsvariablen:
+    TMS_SPARSE            1 = nur Kacheln mit Geometrie rendern (Default: 1)
+    SPARSE_POINT_BUFFER   Puffer um punktartige Entities in Quell-Einheiten (Default: 5.0)
+    SPARSE_BUFFER_PX      Puffer der Abfragen in Pixeln (Default: 4)
+    SPARSE_SEGMENT_SIZE   Größe der Boxen entlang von Linien in Quell-Einheiten, 0 = ganze Ausdehnung (Default: 20.0)
+"""
+import os
+import math
+import logging
+import threading
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from tile_grid import MercatorGrid
+
+logger = logging.getLogger(__name__)
+
+SPARSE_ENABLED = os.environ.get("TMS_SPARSE", "1") not in ("0", "false", "no")
+SPARSE_POINT_BUFFER = float(os.environ.get("SPARSE_POINT_BUFFER", "5.0"))
+SPARSE_BUFFER_PX = int(os.environ.get("SPARSE_BUFFER_PX", "4"))
+SPARSE_SEGMENT_SIZE = float(os.environ.get("SPARSE_SEGMENT_SIZE", "20.0"))
+INDEX_FILE = "features.idx"
+
+POINT_ENTITIES = {"POINT", "TEXT", "MTEXT", "ATTDEF", "INSERT"}
+# OGR-Geometrien, deren Teile einzeln zerlegt werden
+COLLECTION_TYPES = {"MULTIPOINT", "MULTILINESTRING", "MULTICURVE", "COMPOUNDCURVE", "MULTIPOLYGON", "MULTISURFACE",
+                    "GEOMETRYCOLLECTION"}
+# Boxen, die mehr Zellen überdecken, werden linear geprüft statt in jede Zelle eingetragen
+MAX_CELLS_PER_BOX = 64
+
+Box = Tuple[float, float, float, float]
+
+
+class FeatureIndex:
+    """Gitterindex über Bounding Boxes (minx, miny, maxx, maxy)"""
+
+    def __init__(self, boxes: Iterable[Box]):
+        self.boxes: List[Box] = [tuple(b) for b in boxes]
+        self.bounds: Optional[Box] = None
+        self._cells: Dict[Tuple[int, int], List[int]] = {}
+        self._large: List[int] = []
+        self.cell_size = 1.0
+        if not self.boxes:
+            return
+        minx = min(b[0] for b in self.boxes)
+        miny = min(b[1] for b in self.boxes)
+        maxx = max(b[2] for b in self.boxes)
+        maxy = max(b[3] for b in self.boxes)
+        self.bounds = (minx, miny, maxx, maxy)
+        # Etwa eine Box pro Zelle bei gleichmäßiger Verteilung
+        self.cell_size = max(maxx - minx, maxy - miny, 1e-9) / max(1.0, math.sqrt(len(self.boxes)))
+        for index, box in enumerate(self.boxes):
+            x0, y0, x1, y1 = self._cell_range(box)
+            if (x1 - x0 + 1) * (y1 - y0 + 1) > MAX_CELLS_PER_BOX:
+                self._large.append(index)
+                continue
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1):
+                    self._cells.setdefault((cx, cy), []).append(index)
+
+    def __len__(self) -> int:
+        return len(self.boxes)
+
+    def _cell_range(self, box: Box) -> Tuple[int, int, int, int]:
+        size = self.cell_size
+        return (int(math.floor(box[0] / size)), int(math.floor(box[1] / size)),
+                int(math.floor(box[2] / size)), int(math.floor(box[3] / size)))
+
+    def intersects(self, bounds: Box) -> bool:
+        """True, wenn mindestens eine Box die Ausdehnung berührt"""
+        if self.bounds is None or not _touches(bounds, self.bounds):
+            return False
+        for index in self._large:
+            if _touches(bounds, self.boxes[index]):
+                return True
+        x0, y0, x1, y1 = self._cell_range(bounds)
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > len(self._cells):
+            return any(_touches(bounds, self.boxes[i]) for ids in self._cells.values() for i in ids)
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                for index in self._cells.get((cx, cy), ()):
+                    if _touches(bounds, self.boxes[index]):
+                        return True
+        return False
+
+    def tiles(self, z: int, buffer_px: int = SPARSE_BUFFER_PX, grid: Optional[MercatorGrid] = None) -> Set[Tuple[int, int]]:
+        """Kacheln (x, y) im TMS-Schema auf Zoomstufe z, die Geometrie enthalten"""
+        grid = grid or MercatorGrid()
+        pad = buffer_px * grid.resolution(z)
+        tiles = set()
+        for box in self.boxes:
+            x0, y0, x1, y1 = grid.tile_range([box[0] - pad, box[1] - pad, box[2] + pad, box[3] + pad], z)
+            for x in range(x0, x1 + 1):
+                for y in range(y0, y1 + 1):
+                    tiles.add((x, y))
+        return tiles
+
+    def save(self, path: str) -> None:
+        values = array("d", (v for box in self.boxes for v in box))
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            values.tofile(f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "FeatureIndex":
+        values = array("d")
+        with open(path, "rb") as f:
+            values.frombytes(f.read())
+        return cls(tuple(values[i:i + 4]) for i in range(0, len(values), 4))
+
+
+def _touches(a: Box, b: Box) -> bool:
+    return a[0] <= b[2] and a[2] >= b[0] and a[1] <= b[3] and a[3] >= b[1]
+
+
+def path_boxes(coords: Sequence[float], max_size: float = SPARSE_SEGMENT_SIZE) -> List[List[float]]:
+    """
+    Boxen entlang eines Linienzugs [x0, y0, x1, y1, ...]
+
+    Aufeinanderfolgende Segmente werden zusammengefasst, solange die Box höchstens max_size
+    breit und hoch ist; längere Segmente werden in Stücke dieser Größe geteilt.
+    """
+    xs, ys = coords[0::2], coords[1::2]
+    if max_size <= 0:
+        return [[min(xs), min(ys), max(xs), max(ys)]]
+    px, py = xs[0], ys[0]
+    box = [px, py, px, py]
+    boxes = []
+    for x1, y1 in zip(xs[1:], ys[1:]):
+        x0, y0 = px, py
+        steps = max(1, int(math.ceil(max(abs(x1 - x0), abs(y1 - y0)) / max_size)))
+        for step in range(1, steps + 1):
+            x = x0 + (x1 - x0) * step / steps
+            y = y0 + (y1 - y0) * step / steps
+            if max(box[2], x) - min(box[0], x) > max_size or max(box[3], y) - min(box[1], y) > max_size:
+                boxes.append(box)
+                box = [min(px, x), min(py, y), max(px, x), max(py, y)]
+            else:
+                box = [min(box[0], x), min(box[1], y), max(box[2], x), max(box[3], y)]
+            px, py = x, y
+    boxes.append(box)
+    return boxes
+
+
+def geometry_boxes(geom, max_size: float = SPARSE_SEGMENT_SIZE) -> List[List[float]]:
+    """Boxen einer OGR-Geometrie: Linien entlang ihrer Segmente (path_boxes), Flächen und Punkte als Ganzes"""
+    if geom.GetGeometryName() in COLLECTION_TYPES:
+        boxes = []
+        for i in range(geom.GetGeometryCount()):
+            boxes.extend(geometry_boxes(geom.GetGeometryRef(i), max_size))
+        return boxes
+    if geom.GetDimension() == 1:
+        points = geom.GetLinearGeometry().GetPoints() or []
+        if len(points) >= 2:
+            return path_boxes([c for point in points for c in point[:2]], max_size)
+    minx, maxx, miny, maxy = geom.GetEnvelope()
+    return [[minx, miny, maxx, maxy]]
+
+
+def _store_path_boxes(dxf_path: str, min_size: float) -> List[List[float]]:
+    """Boxen entlang der Geometrie aller Features im DXF-Index, deren R-Tree-Box größer als min_size ist"""
+    from osgeo import ogr
+    from dxf_store import RTREE_TABLE, STORE_LAYER, store_paths
+    source = ogr.Open(store_paths(dxf_path)[0])
+    if source is None:
+        raise RuntimeError(f"DXF-Index kann nicht geöffnet werden: {dxf_path}")
+    result = source.ExecuteSQL(
+        f'SELECT e.* FROM "{STORE_LAYER}" e JOIN {RTREE_TABLE} r ON e.fid = r.id '
+        f"WHERE r.maxx - r.minx > {min_size!r} OR r.maxy - r.miny > {min_size!r}")
+    boxes = []
+    try:
+        for feature in result:
+            geom = feature.GetGeometryRef()
+            if geom is not None:
+                boxes.extend(geometry_boxes(geom, min_size))
+    finally:
+        source.ReleaseResultSet(result)
+    return boxes
+
+
+def dxf_feature_boxes(dxf_path: str, point_buffer: float = SPARSE_POINT_BUFFER,
+                      segment_size: float = SPARSE_SEGMENT_SIZE) -> List[List[float]]:
+    """Bounding Boxes aller DXF-Entities im Quell-SRS (punktartige Entities gepuffert, Linien zerlegt)"""
+    from dxf_scan import scan_dxf
+    from dxf_store import store_boxes
+    indexed = store_boxes(dxf_path)
+    if indexed is not None:
+        # Im Index sind Blöcke aufgelöst, nur Punkte und Texte haben keine Ausdehnung
+        boxes = []
+        large = False
+        for b in indexed:
+            if b[0] == b[2] and b[1] == b[3]:
+                boxes.append([b[0] - point_buffer, b[1] - point_buffer, b[2] + point_buffer, b[3] + point_buffer])
+            elif segment_size > 0 and (b[2] - b[0] > segment_size or b[3] - b[1] > segment_size):
+                large = True
+            else:
+                boxes.append(list(b))
+        if large:
+            boxes.extend(_store_path_boxes(dxf_path, segment_size))
+        return boxes
+    boxes = []
+
+    def collect(layer: str, entity_type: str, box: List[float]):
+        if entity_type in POINT_ENTITIES:
+            box = [box[0] - point_buffer, box[1] - point_buffer, box[2] + point_buffer, box[3] + point_buffer]
+        boxes.append(box)
+
+    def collect_path(layer: str, entity_type: str, coords: List[float]):
+        boxes.extend(path_boxes(coords, segment_size))
+
+    scan_dxf(dxf_path, on_entity=collect, on_path=collect_path)
+    return boxes
+
+
+def to_mercator(boxes: List[List[float]], srs: str) -> List[Box]:
+    """Boxen aus dem Quell-SRS nach EPSG:3857 transformieren (Ecken, umschließende Box)"""
+    from osgeo import osr
+    source = osr.SpatialReference()
+    source.SetFromUserInput(srs)
+    source.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    mercator = osr.SpatialReference()
+    mercator.ImportFromEPSG(3857)
+    mercator.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    if source.IsSame(mercator):
+        return [tuple(box) for box in boxes]
+    transform = osr.CoordinateTransformation(source, mercator)
+    corners = [(x, y) for b in boxes for x, y in ((b[0], b[1]), (b[0], b[3]), (b[2], b[1]), (b[2], b[3]))]
+    points = transform.TransformPoints(corners)
+    result = []
+    for i in range(0, len(points), 4):
+        xs = [p[0] for p in points[i:i + 4]]
+        ys = [p[1] for p in points[i:i + 4]]
+        result.append((min(xs), min(ys), max(xs), max(ys)))
+    return result
+
+
+def build_feature_index(dxf_path: str, srs: str, layer_dir: Optional[str] = None) -> FeatureIndex:
+    """Index aus einer DXF-Datei aufbauen und optional im Layer-Verzeichnis ablegen"""
+    index = FeatureIndex(to_mercator(dxf_feature_boxes(dxf_path), srs))
+    if layer_dir:
+        index.save(os.path.join(layer_dir, INDEX_FILE))
+    logger.info(f"Feature-Index für {os.path.basename(dxf_path)}: {len(index)} Boxen")
+    return index
+
+
+_loaded: Dict[str, Tuple[int, FeatureIndex]] = {}
+_loaded_lock = threading.Lock()
+
+
+def load_layer_index(layer_dir: str) -> Optional[FeatureIndex]:
+    """Index eines Layers laden (zwischengespeichert bis zur nächsten Änderung); None ohne Index"""
+    path = os.path.join(layer_dir, INDEX_FILE)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    with _loaded_lock:
+        cached = _loaded.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    index = FeatureIndex.load(path)
+    with _loaded_lock:
+        _loaded[path] = (mtime, index)
+    return index
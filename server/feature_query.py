@@ -0,0 +1,215 @@
+# feature_query.py - DXF-Features eines Kartenausschnitts als GeoJSON
+"""
+Für Abfragen in der Karte (Identifizieren per Klick, Overlays) werden nur
+die Features eines Ausschnitts gelesen: OGR filtert räumlich auf dem
+DXF-Index (dxf_store, R-Tree) bzw. ohne Index auf der DXF, optional zusätzlich
+nach DXF-Layer. Das Ergebnis wird als GeoJSON-FeatureCollection (WGS84)
+Feature für Feature gestreamt:
+
+* Seiten zu höchstens FEATURES_MAX_PAGE_SIZE Features; "next" enthält den
+  Offset der nächsten Seite (null auf der letzten).
+* Mit Zoomstufe wird der Ausschnitt auf das Kachelraster dieser Stufe
+  erweitert, damit benachbarte Anfragen denselben Cache-Eintrag treffen, und
+  die Geometrie auf die Auflösung der Stufe generalisiert (generalize.py).
+* Vollständig gestreamte Seiten landen in einem LRU-Cache (FEATURES_CACHE_MB);
+  der Schlüssel enthält Änderungszeit und SRS der Quelle.
+
+Konfiguration über Umgebungsvariablen:
+    FEATURES_PAGE_SIZE       Features pro Seite ohne limit-Parameter (Default: 1000)
+    FEATURES_MAX_PAGE_SIZE   Höchstwert für limit (Default: 10000)
+    FEATURES_CACHE_MB        Größe des Cache für Antworten in MB (Default: 64)
+"""
+import os
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from tile_grid import MercatorGrid, lonlat_to_mercator
+
+logger = logging.getLogger(__name__)
+
+FEATURES_PAGE_SIZE = int(os.environ.get("FEATURES_PAGE_SIZE", "1000"))
+FEATURES_MAX_PAGE_SIZE = int(os.environ.get("FEATURES_MAX_PAGE_SIZE", "10000"))
+FEATURES_CACHE_MB = int(os.environ.get("FEATURES_CACHE_MB", "64"))
+# Nachkommastellen der WGS84-Koordinaten (7 entspricht etwa 1 cm)
+COORDINATE_PRECISION = 7
+
+Bounds = Tuple[float, float, float, float]
+
+
+class FeatureCache:
+    """LRU-Cache für Antworten, begrenzt durch die Summe ihrer Größen"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[bytes]:
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def put(self, key: tuple, data: bytes) -> None:
+        # Einzelne Antworten dürfen den Cache nicht allein füllen
+        if len(data) > self.max_bytes // 4:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._entries[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def stream(self, key: tuple, chunks: Iterable[str]) -> Iterator[bytes]:
+        """Chunks weiterreichen und die vollständige Antwort danach zwischenspeichern"""
+        parts = []
+        for chunk in chunks:
+            data = chunk.encode("utf-8")
+            parts.append(data)
+            yield data
+        self.put(key, b"".join(parts))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+feature_cache = FeatureCache(FEATURES_CACHE_MB * 1024 * 1024)
+
+
+def query_window(bbox: Sequence[float], zoom: Optional[int] = None,
+                 grid: Optional[MercatorGrid] = None) -> Bounds:
+    """
+    Ausschnitt [west, süd, ost, nord] in WGS84 nach EPSG:3857; mit Zoomstufe auf die
+    überdeckten Kacheln dieser Stufe erweitert
+    """
+    minx, miny = lonlat_to_mercator(bbox[0], bbox[1])
+    maxx, maxy = lonlat_to_mercator(bbox[2], bbox[3])
+    if zoom is None:
+        return minx, miny, maxx, maxy
+    grid = grid or MercatorGrid()
+    x0, y0, x1, y1 = grid.tile_range([minx, miny, maxx, maxy], zoom)
+    return grid.tile_bounds(zoom, x0, y0)[:2] + grid.tile_bounds(zoom, x1, y1)[2:]
+
+
+def layer_filter(layers: Optional[List[str]]) -> Optional[str]:
+    """Attributfilter auf die DXF-Layer (OGR-SQL, Namen mit Anführungszeichen maskiert)"""
+    if not layers:
+        return None
+    names = ", ".join("'" + name.replace("'", "''") + "'" for name in layers)
+    return f'"Layer" IN ({names})'
+
+
+def _transform(source_srs: str, target_srs: str):
+    from osgeo import osr
+    refs = []
+    for srs in (source_srs, target_srs):
+        ref = osr.SpatialReference()
+        if ref.SetFromUserInput(srs) != 0:
+            raise ValueError(f"Ungültiges SRS: {srs}")
+        ref.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+        refs.append(ref)
+    if refs[0].IsSame(refs[1]):
+        return None
+    return osr.CoordinateTransformation(*refs)
+
+
+class FeatureReader:
+    """
+    Geöffnete Quelle mit Raum- und Layer-Filter für eine Abfrage.
+
+    Der Konstruktor macht alles, was fehlschlagen kann (Öffnen, Filter, Transformationen),
+    damit Fehler vor dem Streamen als HTTP-Status gemeldet werden können.
+    """
+
+    def __init__(self, source_path: str, window: Bounds, srs: Optional[str] = None,
+                 layers: Optional[List[str]] = None, zoom: Optional[int] = None):
+        """
+        Args:
+            source_path: DXF-Index oder DXF (siehe dxf_store.feature_source)
+            window: Ausschnitt in EPSG:3857 (siehe query_window)
+            srs: Koordinatensystem der Quelle (Default: EPSG:3857 wie bei der Konvertierung)
+            layers: Nur Features dieser DXF-Layer
+            zoom: Zoomstufe, auf deren Auflösung die Geometrie generalisiert wird
+
+        Raises:
+            RuntimeError: Quelle kann nicht geöffnet werden
+            ValueError: Ungültiges SRS oder ungültiger Layer-Filter
+        """
+        from osgeo import ogr
+        from generalize import GENERALIZE_ENABLED, GENERALIZE_TOLERANCE_PX, mercator_to_source_distance
+        srs = srs or "EPSG:3857"
+        self.source = ogr.Open(source_path)
+        if self.source is None:
+            raise RuntimeError(f"Quelle kann nicht geöffnet werden: {source_path}")
+        self.layer = self.source.GetLayer(0)
+        # Ausschnitt ins Quell-SRS (umschließende Box der Ecken)
+        to_source = _transform("EPSG:3857", srs)
+        corners = [(window[0], window[1]), (window[0], window[3]), (window[2], window[1]), (window[2], window[3])]
+        if to_source is not None:
+            corners = to_source.TransformPoints(corners)
+        xs = [p[0] for p in corners]
+        ys = [p[1] for p in corners]
+        self.layer.SetSpatialFilterRect(min(xs), min(ys), max(xs), max(ys))
+        if self.layer.SetAttributeFilter(layer_filter(layers)) != 0:
+            raise ValueError("Ungültiger Layer-Filter")
+        self.to_wgs84 = _transform(srs, "EPSG:4326")
+        self.tolerance = 0.0
+        if zoom is not None and GENERALIZE_ENABLED:
+            center = ((window[0] + window[2]) / 2, (window[1] + window[3]) / 2)
+            self.tolerance = mercator_to_source_distance(
+                MercatorGrid().resolution(zoom) * GENERALIZE_TOLERANCE_PX, center, srs)
+
+    def close(self) -> None:
+        self.layer = None
+        self.source = None
+
+
+def iter_features(reader: FeatureReader, offset: int = 0, limit: int = FEATURES_PAGE_SIZE) -> Iterator[str]:
+    """
+    Seite einer GeoJSON-FeatureCollection aus einem FeatureReader als Text-Chunks.
+
+    Features, deren Geometrie sich nicht transformieren lässt oder bei der Generalisierung
+    wegfällt, werden übersprungen; offset zählt sie trotzdem mit ("next" der vorigen Seite).
+    """
+    from generalize import simplify_geometry
+    options = [f"COORDINATE_PRECISION={COORDINATE_PRECISION}"]
+    try:
+        yield '{"type": "FeatureCollection", "features": ['
+        position, returned = 0, 0
+        more = False
+        for feature in reader.layer:
+            if position < offset:
+                position += 1
+                continue
+            if returned >= limit:
+                more = True
+                break
+            position += 1
+            geom = feature.GetGeometryRef()
+            if geom is None:
+                continue
+            geom = geom.Clone()
+            if reader.tolerance > 0:
+                geom = simplify_geometry(geom, reader.tolerance)
+                if geom is None:
+                    continue
+            if reader.to_wgs84 is not None and geom.Transform(reader.to_wgs84) != 0:
+                logger.warning(f"Feature {feature.GetFID()} lässt sich nicht nach WGS84 transformieren")
+                continue
+            properties = {key: value for key, value in feature.items().items() if value is not None}
+            separator = ", " if returned else ""
+            yield (f'{separator}{{"type": "Feature", "id": {feature.GetFID()}, '
+                   f'"geometry": {geom.ExportToJson(options)}, "properties": {json.dumps(properties)}}}')
+            returned += 1
+        yield f'], "numberReturned": {returned}, "next": {json.dumps(position if more else None)}}}'
+    finally:
+        reader.close()
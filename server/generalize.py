@@ -0,0 +1,287 @@
+# generalize.py - Generalisierung der DXF-Geometrie für Zielmaßstab bzw. Zoomstufe
+"""
+QGIS zeichnet jede Stützstelle jeder Entity, auch wenn viele davon auf
+dasselbe Ausgabepixel fallen. Dichte Höhenlinienpläne exportieren dadurch
+minutenlang und ergeben große PDFs bzw. Kacheln. Vor dem Rendern wird die
+Geometrie deshalb auf die Pixeltoleranz des Ziels vereinfacht:
+
+* Douglas-Peucker mit Topologieerhalt (OGR SimplifyPreserveTopology, GEOS)
+  oder Visvalingam-Whyatt (effektive Dreiecksfläche, Flächen mit
+  Topologieprüfung und Rückfall auf Douglas-Peucker)
+* Linien kürzer als die Toleranz und Flächen kleiner als Toleranz² fallen weg
+* Punkte und Texte bleiben unverändert
+
+Die Vereinfachung arbeitet Feature für Feature: der Topologieerhalt gilt nur
+innerhalb einer Geometrie (keine Selbstüberschneidung, Löcher bleiben in der
+Fläche). Gemeinsame Kanten benachbarter Entities (z.B. Parzellen, die als
+getrennte Polylinien gezeichnet sind) werden unabhängig vereinfacht und können
+sich um bis zu die Toleranz voneinander lösen oder überlappen. Bei einer
+Toleranz unter einem Ausgabepixel ist das im Bild nicht sichtbar; für
+kantengenaue Daten GENERALIZE=0 setzen.
+
+Die Toleranz ist GENERALIZE_TOLERANCE_PX Ausgabepixel in Einheiten der
+Quelle: beim GeoPDF aus Seitengröße und DPI, beim direkten Rastern aus der
+Auflösung der Zoomstufe. Das Ergebnis wird pro Ziel (z.B. z19 oder
+pdf-A3-300) als GeoPackage neben der Quelle abgelegt (<quelle>.gen/<ziel>.gpkg,
+Metadaten in <ziel>.json) und wiederverwendet, solange Quelle, Toleranz und
+Verfahren gleich sind.
+
+Konfiguration über Umgebungsvariablen:
+    GENERALIZE                1 = vor dem Rendern generalisieren (Default: 1)
+    GENERALIZE_TOLERANCE_PX   Toleranz in Ausgabepixeln (Default: 0.5)
+    GENERALIZE_ALGORITHM      douglas-peucker oder visvalingam (Default: douglas-peucker)
+"""
+import os
+import json
+import time
+import heapq
+import shutil
+import logging
+from typing import List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+GENERALIZE_ENABLED = os.environ.get("GENERALIZE", "1") not in ("0", "false", "no")
+GENERALIZE_TOLERANCE_PX = float(os.environ.get("GENERALIZE_TOLERANCE_PX", "0.5"))
+GENERALIZE_ALGORITHM = os.environ.get("GENERALIZE_ALGORITHM", "douglas-peucker")
+ALGORITHMS = ("douglas-peucker", "visvalingam")
+
+Point = Sequence[float]
+
+
+def generalization_params() -> Optional[dict]:
+    """Parameter der Generalisierung für Cache-Schlüssel; None, wenn abgeschaltet"""
+    if not GENERALIZE_ENABLED:
+        return None
+    return {"tolerance_px": GENERALIZE_TOLERANCE_PX, "algorithm": GENERALIZE_ALGORITHM}
+
+
+def _triangle_area(a: Point, b: Point, c: Point) -> float:
+    return abs((b[0] - a[0]) * (c[1] - a[1]) - (c[0] - a[0]) * (b[1] - a[1])) / 2.0
+
+
+def visvalingam(points: List[Point], min_area: float, closed: bool = False) -> List[Point]:
+    """
+    Visvalingam-Whyatt: Stützstellen mit der kleinsten effektiven Dreiecksfläche entfernen,
+    bis alle verbleibenden mindestens min_area haben. Endpunkte bleiben erhalten; geschlossene
+    Ringe (erster = letzter Punkt) behalten mindestens vier Punkte, Linien mindestens zwei.
+    """
+    count = len(points)
+    minimum = 4 if closed else 2
+    if count <= minimum:
+        return list(points)
+    prev = list(range(-1, count - 1))
+    nxt = list(range(1, count + 1))
+    areas = [float("inf")] * count
+    heap = []
+    for i in range(1, count - 1):
+        areas[i] = _triangle_area(points[i - 1], points[i], points[i + 1])
+        heap.append((areas[i], i))
+    heapq.heapify(heap)
+    remaining = count
+    removed = [False] * count
+    while heap and remaining > minimum:
+        area, i = heapq.heappop(heap)
+        if removed[i] or area != areas[i]:
+            continue
+        if area >= min_area:
+            break
+        removed[i] = True
+        remaining -= 1
+        p, n = prev[i], nxt[i]
+        nxt[p], prev[n] = n, p
+        # Effektive Fläche der Nachbarn neu berechnen, nie kleiner als die gerade entfernte
+        for j in (p, n):
+            if 0 < j < count - 1:
+                areas[j] = max(area, _triangle_area(points[prev[j]], points[j], points[nxt[j]]))
+                heapq.heappush(heap, (areas[j], j))
+    return [point for i, point in enumerate(points) if not removed[i]]
+
+
+def count_vertices(geom) -> int:
+    """Anzahl Stützstellen einer OGR-Geometrie (rekursiv über Teile und Ringe)"""
+    if geom is None:
+        return 0
+    parts = geom.GetGeometryCount()
+    if parts:
+        return sum(count_vertices(geom.GetGeometryRef(i)) for i in range(parts))
+    return geom.GetPointCount()
+
+
+def _visvalingam_geometry(geom, tolerance: float):
+    """OGR-Geometrie mit Visvalingam vereinfachen; None, wenn sie dabei zerfällt"""
+    from osgeo import ogr
+    gtype = ogr.GT_Flatten(geom.GetGeometryType())
+    min_area = tolerance * tolerance
+    if gtype == ogr.wkbLineString:
+        line = ogr.Geometry(ogr.wkbLineString)
+        for x, y, *_ in visvalingam(geom.GetPoints() or [], min_area):
+            line.AddPoint_2D(x, y)
+        return line
+    if gtype == ogr.wkbPolygon:
+        polygon = ogr.Geometry(ogr.wkbPolygon)
+        for index in range(geom.GetGeometryCount()):
+            points = visvalingam(geom.GetGeometryRef(index).GetPoints() or [], min_area, closed=True)
+            if len(points) < 4:
+                if index == 0:
+                    return None
+                continue
+            ring = ogr.Geometry(ogr.wkbLinearRing)
+            for x, y, *_ in points:
+                ring.AddPoint_2D(x, y)
+            polygon.AddGeometry(ring)
+        return polygon
+    # Multi-Geometrien teilweise vereinfachen, zerfallene Teile verwerfen
+    result = ogr.Geometry(gtype)
+    for index in range(geom.GetGeometryCount()):
+        part = _visvalingam_geometry(geom.GetGeometryRef(index), tolerance)
+        if part is not None:
+            result.AddGeometry(part)
+    return result
+
+
+def simplify_geometry(geom, tolerance: float, algorithm: str = GENERALIZE_ALGORITHM):
+    """
+    OGR-Geometrie auf tolerance (Einheiten der Geometrie) vereinfachen.
+
+    Topologie bleibt nur innerhalb dieser Geometrie erhalten, nicht zu Nachbar-Features.
+
+    Returns:
+        Vereinfachte Geometrie, unveränderte Punkte oder None, wenn die Geometrie zerfällt
+    """
+    from osgeo import ogr
+    gtype = ogr.GT_Flatten(geom.GetGeometryType())
+    if gtype in (ogr.wkbPoint, ogr.wkbMultiPoint):
+        return geom
+    if gtype == ogr.wkbGeometryCollection:
+        collection = ogr.Geometry(ogr.wkbGeometryCollection)
+        for index in range(geom.GetGeometryCount()):
+            part = simplify_geometry(geom.GetGeometryRef(index), tolerance, algorithm)
+            if part is not None:
+                collection.AddGeometry(part)
+        return collection if collection.GetGeometryCount() else None
+    if gtype in (ogr.wkbLineString, ogr.wkbMultiLineString):
+        if geom.Length() < tolerance:
+            return None
+    elif gtype in (ogr.wkbPolygon, ogr.wkbMultiPolygon):
+        if geom.Area() < tolerance * tolerance:
+            return None
+    simplified = None
+    if algorithm == "visvalingam":
+        simplified = _visvalingam_geometry(geom, tolerance)
+        if simplified is not None and gtype in (ogr.wkbPolygon, ogr.wkbMultiPolygon) and not simplified.IsValid():
+            # Visvalingam erhält die Topologie nicht: ungültige Flächen mit Douglas-Peucker vereinfachen
+            simplified = geom.SimplifyPreserveTopology(tolerance)
+    else:
+        simplified = geom.SimplifyPreserveTopology(tolerance)
+    if simplified is None or simplified.IsEmpty():
+        return None
+    return simplified
+
+
+def mercator_to_source_distance(distance: float, center: Tuple[float, float], srs: str) -> float:
+    """Strecke in EPSG:3857 an einem Punkt (EPSG:3857) in Einheiten von srs umrechnen"""
+    from osgeo import osr
+    mercator = osr.SpatialReference()
+    mercator.ImportFromEPSG(3857)
+    target = osr.SpatialReference()
+    target.SetFromUserInput(srs)
+    for ref in (mercator, target):
+        ref.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    transform = osr.CoordinateTransformation(mercator, target)
+    x0, y0, _ = transform.TransformPoint(center[0], center[1])
+    x1, y1, _ = transform.TransformPoint(center[0] + distance, center[1])
+    return ((x1 - x0) ** 2 + (y1 - y0) ** 2) ** 0.5
+
+
+def generalized_paths(source_path: str, key: str) -> Tuple[str, str]:
+    """GeoPackage und Metadaten der generalisierten Geometrie eines Ziels"""
+    base = os.path.join(f"{source_path}.gen", key)
+    return f"{base}.gpkg", f"{base}.json"
+
+
+def generalize(source_path: str, key: str, tolerance: float, srs: Optional[str] = None,
+               algorithm: str = GENERALIZE_ALGORITHM) -> dict:
+    """
+    Geometrie der Quelle (DXF oder anderes OGR-Format) vereinfachen und pro Ziel zwischenspeichern.
+
+    Args:
+        key: Ziel, z.B. "z19" oder "pdf-A3-300" (Dateiname im Cache)
+        tolerance: Toleranz in Einheiten der Quelle
+        srs: Koordinatensystem der Quelle, falls nicht in der Datei
+        algorithm: "douglas-peucker" oder "visvalingam"
+
+    Returns:
+        dict: {path, tolerance, features, dropped, vertices_in, vertices_out, reused, duration_ms}
+    """
+    from osgeo import ogr, osr
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"Unbekanntes Verfahren '{algorithm}' (erlaubt: {', '.join(ALGORITHMS)})")
+    gpkg_path, meta_path = generalized_paths(source_path, key)
+    stat = os.stat(source_path)
+    params = {"source_mtime_ns": stat.st_mtime_ns, "source_size": stat.st_size, "srs": srs,
+              "tolerance": tolerance, "algorithm": algorithm}
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        meta = None
+    if meta and os.path.exists(gpkg_path) and all(meta.get(k) == v for k, v in params.items()):
+        return dict(meta["stats"], path=gpkg_path, tolerance=tolerance, reused=True, duration_ms=0)
+
+    from dxf_store import feature_source
+    started = time.perf_counter()
+    source = ogr.Open(feature_source(source_path))
+    if source is None:
+        raise RuntimeError(f"Quelle kann nicht geöffnet werden: {source_path}")
+    layer = source.GetLayer(0)
+    ref = layer.GetSpatialRef()
+    if srs:
+        ref = osr.SpatialReference()
+        ref.SetFromUserInput(srs)
+    os.makedirs(os.path.dirname(gpkg_path), exist_ok=True)
+    tmp_path = f"{gpkg_path}.{os.getpid()}.tmp.gpkg"
+    stats = {"features": 0, "dropped": 0, "vertices_in": 0, "vertices_out": 0}
+    try:
+        target = ogr.GetDriverByName("GPKG").CreateDataSource(tmp_path)
+        out_layer = target.CreateLayer(layer.GetName(), ref, ogr.wkbUnknown, ["SPATIAL_INDEX=YES"])
+        definition = layer.GetLayerDefn()
+        for index in range(definition.GetFieldCount()):
+            out_layer.CreateField(definition.GetFieldDefn(index))
+        out_definition = out_layer.GetLayerDefn()
+        out_layer.StartTransaction()
+        for feature in layer:
+            geom = feature.GetGeometryRef()
+            if geom is None:
+                continue
+            stats["vertices_in"] += count_vertices(geom)
+            simplified = simplify_geometry(geom, tolerance, algorithm)
+            if simplified is None:
+                stats["dropped"] += 1
+                continue
+            out_feature = ogr.Feature(out_definition)
+            out_feature.SetFrom(feature)
+            out_feature.SetGeometry(simplified)
+            out_layer.CreateFeature(out_feature)
+            stats["features"] += 1
+            stats["vertices_out"] += count_vertices(simplified)
+        out_layer.CommitTransaction()
+        target = None
+        os.replace(tmp_path, gpkg_path)
+    finally:
+        source = None
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    duration_ms = int((time.perf_counter() - started) * 1000)
+    with open(meta_path, "w") as f:
+        json.dump(dict(params, stats=stats, duration_ms=duration_ms), f, indent=2)
+    logger.info(f"Generalisiert ({key}, Toleranz {tolerance:.3g}, {algorithm}): {stats['features']} Features, "
+                f"{stats['dropped']} verworfen, Stützstellen {stats['vertices_in']} -> {stats['vertices_out']} "
+                f"in {duration_ms} ms")
+    return dict(stats, path=gpkg_path, tolerance=tolerance, reused=False, duration_ms=duration_ms)
+
+
+def remove_generalized(source_path: str) -> None:
+    """Alle zwischengespeicherten Generalisierungen einer Quelle entfernen"""
+    shutil.rmtree(f"{source_path}.gen", ignore_errors=True)
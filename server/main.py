@@ -5,14 +5,16 @@ import subprocess
 import json
 import logging
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import shutil
 import math
+import asyncio
 import docker
 
 import jwt
 from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Request, Query, Body
-from fastapi.responses import FileResponse, HTMLResponse, PlainTextResponse
+from fastapi.responses import FileResponse, HTMLResponse, PlainTextResponse, JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 from fastapi.staticfiles import StaticFiles
 from fastapi.openapi.docs import get_swagger_ui_html
 from fastapi.openapi.utils import get_openapi
@@ -24,13 +26,33 @@ from docker import from_env
 import sqlite3
 
 # Import der DXF- und Raster-Konvertierungsfunktionen
-from convert_dxf_to_geopdf import dxf_to_geopdf, convert_pdf_to_tms
-from convert_raster_to_geopdf import raster_to_geopdf
+from convert_dxf_to_geopdf import convert_pdf_to_tms, normalize_symbolization
+from conversion_cache import ConversionCache, file_sha256, link_or_copy, link_tree
+from dxf_scan import scan_dxf, layer_info_from_scan
+from tile_store import TILE_STORE_FORMATS, DEFAULT_TILE_STORE, ARCHIVE_NAMES, detect_format, tile_store_pool
+from tile_codec import encoding_extension, encoding_profile
+from tile_renderer import DYNAMIC_MAX_ZOOM, dynamic_tiles
+from raster_source import RASTER_CACHE_ENABLED, native_maxzoom, prepare_raster_source, remove_raster_source
+from tile_pyramid import PYRAMID_ENABLED
+from feature_index import SPARSE_ENABLED, build_feature_index
+from generalize import generalization_params
+from dxf_store import feature_source
+from feature_query import (FEATURES_MAX_PAGE_SIZE, FEATURES_PAGE_SIZE, FeatureReader, feature_cache, iter_features,
+                           query_window)
+from tiler import JOURNAL_FILE, METATILE_SIZE
+from tile_seeder import SeedScheduler, seeding
+from vector_tiles import (build_vector_tiles, ensure_tileserver_config, register_tileserver_layer,
+                          unregister_tileserver_layer, vector_tiles_path)
+from tms_manifest import build_manifest, load_config, render_params, reusable_levels, write_config as write_layer_config
+from upload_store import ALLOWED_UPLOAD_EXTENSIONS, stream_to_disk, register_upload, blob_path, release_blob
+from qgis_worker_pool import get_worker_pool, shutdown_worker_pool
 from controllers.jobController import get_all_jobs, jobs_db, thread_lock
 from routes.jobRoutes import router as job_router
 import threading
 
 from routes.workflow_routes import router as workflow_router, init_workflow_tables
+from routes.upload_routes import router as upload_router, init_upload_tables
+from routes.tile_routes import router as tile_router, serve_tile, TMS_MAX_ZOOM_CAP, TMS_OVERZOOM_LEVELS
 
 # Logging konfigurieren - FRÜHER DEFINIEREN
 logging.basicConfig(level=logging.INFO)
@@ -71,6 +93,13 @@ OUTPUT_DIR = "output"
 STATIC_ROOT = os.path.join(UPLOAD_DIR, "nodes", "static")
 TEMPLATES_DIR = "templates"
 
+# Maximale Anzahl ausstehender Konvertierungen pro uvicorn-Worker (Admission Control)
+CONVERSION_MAX_PENDING = int(os.environ.get("CONVERSION_MAX_PENDING", "8"))
+# Quelle der Kachelung: "pdf" (GeoPDF -> COG) oder "direct" (DXF mit QGIS direkt gerastert, ohne PDF)
+TMS_RENDER_SOURCE = os.environ.get("TMS_RENDER_SOURCE", "pdf")
+# Laufende Hintergrund-Konvertierungen (asyncio-Tasks)
+background_tasks = set()
+
 SECRET_KEY = os.environ.get("SECRET_KEY", "your-secret-key-change-in-production")
 ADMIN_USERNAME = os.environ.get("ADMIN_USERNAME", "admin")
 ADMIN_PASSWORD = os.environ.get("ADMIN_PASSWORD", "admin123")
@@ -165,18 +194,33 @@ with sqlite3.connect(DB_PATH) as conn:
         cursor.execute("ALTER TABLE files ADD COLUMN srs TEXT")
     except sqlite3.OperationalError:
         pass
+    try:
+        cursor.execute("ALTER TABLE files ADD COLUMN sha256 TEXT")
+    except sqlite3.OperationalError:
+        pass
+    try:
+        cursor.execute("ALTER TABLE files ADD COLUMN conversion_key TEXT")
+    except sqlite3.OperationalError:
+        pass
     conn.commit()
 
 # Nach der DB-Initialisierung:
 with sqlite3.connect(DB_PATH) as conn:
     init_workflow_tables(conn)
+    init_upload_tables(conn)
 
 # Router registrieren:
 app.include_router(workflow_router, prefix="/api")
+app.include_router(upload_router, prefix="/api")
+app.include_router(tile_router, prefix="/api")
+
+# Cache für Konvertierungsergebnisse (Index in files.db)
+conversion_cache = ConversionCache(DB_PATH)
 
 # Verzeichnisse erstellen
 for directory in [UPLOAD_DIR, OUTPUT_DIR, STATIC_ROOT, TEMPLATES_DIR]:
     os.makedirs(directory, exist_ok=True)
+ensure_tileserver_config()
 
 # Static files und Templates
 app.mount("/static", StaticFiles(directory=STATIC_ROOT), name="static")
@@ -187,6 +231,11 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "timestamp": datetime.utcnow()}
 
+@app.on_event("shutdown")
+def stop_worker_pool():
+    """QGIS-Worker-Prozesse beim Herunterfahren beenden"""
+    shutdown_worker_pool()
+
 def custom_openapi():
     """Custom OpenAPI Schema"""
     if app.openapi_schema:
@@ -221,27 +270,12 @@ async def login(credentials: dict):
         raise HTTPException(status_code=500, detail="Login failed")
 
 def pdf_to_tms(pdf_path: str, out_dir: str, minzoom: int = 0, maxzoom: int = 6) -> None:
-    """PDF zu TMS Tiles konvertieren"""
+    """PDF zu TMS Tiles konvertieren (paralleler Tiler, siehe convert_pdf_to_tms)"""
     try:
-        if not os.path.exists(out_dir):
-            os.makedirs(out_dir)
-        
-        cmd = [
-            "gdal2tiles.py",
-            "-z", f"{minzoom}-{maxzoom}",
-            "-r", "bilinear",
-            "-w", "none",
-            pdf_path, out_dir
-        ]
-        
-        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+        convert_pdf_to_tms(pdf_path, out_dir, minzoom=minzoom, maxzoom=maxzoom)
         logger.info(f"TMS generation completed for {pdf_path}")
-        
-    except subprocess.CalledProcessError as e:
-        logger.error(f"TMS generation failed: {e.stderr}")
-        raise Exception(f"TMS generation failed: {e.stderr}")
     except Exception as e:
-        logger.error(f"Unexpected error in TMS generation: {e}")
+        logger.error(f"TMS generation failed: {e}")
         raise
 
 def write_config(bounds: List[float], srs: str, resolution: float, minzoom: int, maxzoom: int, out_dir: str) -> None:
@@ -373,31 +407,23 @@ async def upload_file(file: UploadFile = File(...), user: str = Depends(verify_t
         logger.debug(f"Dateiname: {file.filename}")
 
         # Dateivalidierung: Erlaube DXF und TIF/GeoTIFF
-        allowed_ext = ['.dxf', '.tif', '.tiff', '.geotiff']
         ext = os.path.splitext(file.filename)[1].lower()
-        if ext not in allowed_ext:
+        if ext not in ALLOWED_UPLOAD_EXTENSIONS:
             logger.warning(f"Ungültige Dateiendung: {ext}")
             raise HTTPException(status_code=400, detail="Only DXF and TIF/GeoTIFF files are allowed")
 
         file_id = str(uuid.uuid4())
         save_path = os.path.join(UPLOAD_DIR, f"{file_id}{ext}")
 
-        # Datei speichern
-        content = await file.read()
-        logger.debug(f"Dateigröße: {len(content)} Bytes")
-        with open(save_path, "wb") as f:
-            f.write(content)
+        # Datei blockweise speichern (konstanter Speicherbedarf, Hash und Größe nebenbei)
+        size, sha256 = await asyncio.to_thread(stream_to_disk, file.file, save_path)
+        logger.debug(f"Dateigröße: {size} Bytes, SHA-256: {sha256}")
 
-        # Metadaten in SQLite speichern
-        cursor = db.cursor()
-        cursor.execute(
-            "INSERT INTO files (id, name, path, size, converted, uploaded_at, uploaded_by) VALUES (?, ?, ?, ?, ?, ?, ?)",
-            (file_id, file.filename, save_path, len(content), False, datetime.utcnow().isoformat(), user)
-        )
-        db.commit()
+        # Metadaten (inkl. DXF-Scan für BBox/Layer) in SQLite speichern
+        entry = await asyncio.to_thread(register_upload, db, file_id, file.filename, save_path, size, sha256, user)
 
         logger.info(f"Datei erfolgreich hochgeladen: {file.filename} (ID: {file_id})")
-        return {"id": file_id, "name": file.filename, "path": save_path, "size": len(content), "converted": False, "uploaded_at": datetime.utcnow().isoformat(), "uploaded_by": user}
+        return entry
 
     except Exception as e:
         logger.error(f"Upload fehlgeschlagen: {e}")
@@ -504,67 +530,265 @@ async def get_file_details(file_id: str, user: str = Depends(verify_token), db:
         logger.error(f"Fehler beim Abrufen der Dateidetails: {e}")
         raise HTTPException(status_code=500, detail="Fehler beim Abrufen der Dateidetails")
 
+@app.get("/api/files/{file_id}/features")
+async def get_file_features(
+    file_id: str,
+    bbox: str = Query(..., description="Ausschnitt west,süd,ost,nord in WGS84"),
+    layers: Optional[str] = Query(None, description="Kommagetrennte DXF-Layer"),
+    zoom: Optional[int] = Query(None, ge=0, le=30, description="Zoomstufe für Cache-Raster und Generalisierung"),
+    offset: int = Query(0, ge=0, description="Offset aus 'next' der vorigen Seite"),
+    limit: int = Query(FEATURES_PAGE_SIZE, ge=1, le=FEATURES_MAX_PAGE_SIZE),
+    user: str = Depends(verify_token),
+    db: sqlite3.Connection = Depends(get_db)
+):
+    """DXF-Features eines Ausschnitts als GeoJSON (WGS84), gestreamt und seitenweise"""
+    try:
+        window = [float(value) for value in bbox.split(",")]
+    except ValueError:
+        window = []
+    if len(window) != 4 or window[0] > window[2] or window[1] > window[3]:
+        raise HTTPException(status_code=400, detail="bbox muss west,süd,ost,nord sein")
+    cursor = db.cursor()
+    cursor.execute("SELECT * FROM files WHERE id = ?", (file_id,))
+    row = cursor.fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="Datei nicht gefunden")
+    sha256 = row[12] if len(row) > 12 else None
+    dxf_path = blob_path(db, sha256)
+    if not dxf_path:
+        # Eintrag ohne abgelegte Datei (oder Datei von der Platte entfernt)
+        raise HTTPException(status_code=404 if sha256 else 400, detail="DXF-Datei nicht vorhanden")
+    if not dxf_path.lower().endswith(".dxf"):
+        raise HTTPException(status_code=400, detail="Feature-Abfragen benötigen eine DXF-Quelle")
+    file_srs = row[11] if len(row) > 11 else None
+    if not file_srs or file_srs.strip() == '' or file_srs.lower() == 'none':
+        file_srs = None
+    layer_names = sorted({name.strip() for name in layers.split(",") if name.strip()}) if layers else None
+    source_path = feature_source(dxf_path)
+    try:
+        mtime_ns = os.stat(source_path).st_mtime_ns
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="DXF-Datei nicht vorhanden")
+    query_bounds = query_window(window, zoom)
+    key = (source_path, mtime_ns, file_srs, query_bounds, tuple(layer_names or ()), zoom, offset, limit)
+    cached = feature_cache.get(key)
+    if cached is not None:
+        return Response(content=cached, media_type="application/geo+json")
+    # Öffnen und Filtern vor dem Streamen, damit Fehler nicht erst nach Status 200 auftreten
+    try:
+        reader = await asyncio.to_thread(FeatureReader, source_path, query_bounds, file_srs, layer_names, zoom)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Feature-Abfrage für {file_id} fehlgeschlagen: {e}")
+        raise HTTPException(status_code=500, detail=f"Feature-Abfrage fehlgeschlagen: {e}")
+    return StreamingResponse(feature_cache.stream(key, iter_features(reader, offset, limit)),
+                             media_type="application/geo+json")
+
+def check_conversion_admission() -> None:
+    """Neue Konvertierungen ablehnen, wenn der Worker-Pool bereits voll ausgelastet ist"""
+    pending = get_worker_pool().pending_jobs()
+    if pending >= CONVERSION_MAX_PENDING:
+        logger.warning(f"Konvertierung abgelehnt: {pending} Jobs ausstehend (Limit {CONVERSION_MAX_PENDING})")
+        raise HTTPException(
+            status_code=503,
+            detail="Zu viele laufende Konvertierungen, bitte später erneut versuchen",
+            headers={"Retry-After": "30"}
+        )
+
+async def run_file_conversion(file_id: str, input_path: str, page_size: str = "A4", dpi: int = 300,
+                              crs_epsg: int = 3857, symbolization: dict = None) -> dict:
+    """
+    Konvertierung im QGIS-Worker-Pool ausführen und Ergebnis in der DB speichern.
+    Es wird nur auf das Future gewartet, der Event-Loop bleibt frei.
+    Ergebnisse werden über Eingabe-Hash und Parameter im Konvertierungs-Cache abgelegt.
+
+    Returns:
+        dict: {geopdf_path, bbox, layer_info, srs, cached}
+    """
+    ext = os.path.splitext(input_path)[1].lower()
+    geopdf_path = os.path.join(OUTPUT_DIR, f"{file_id}.pdf")
+    pool = get_worker_pool()
+    try:
+        bbox, layer_info, srs = None, None, None
+        if ext == ".dxf":
+            params = {"type": "dxf", "page_size": page_size.upper(), "dpi": dpi, "crs_epsg": crs_epsg,
+                      "symbolization": normalize_symbolization(symbolization), "generalize": generalization_params()}
+        else:
+            params = {"type": "raster", "page_size": page_size.upper(), "dpi": dpi}
+        # Hash abgelegter Uploads ist bekannt, sonst (Altbestand) berechnen
+        with sqlite3.connect(DB_PATH) as conn:
+            blob = conn.execute("SELECT sha256 FROM blobs WHERE path = ?", (input_path,)).fetchone()
+        source_sha256 = blob[0] if blob else await asyncio.to_thread(file_sha256, input_path)
+        cache_key = ConversionCache.make_key(source_sha256, params)
+        cached = conversion_cache.lookup(cache_key)
+        if cached:
+            await asyncio.to_thread(link_or_copy, cached["path"], geopdf_path)
+            logger.info(f"Konvertierungs-Cache-Treffer für {file_id} ({cache_key[:12]})")
+            bbox_str = json.dumps(cached["bbox"]) if cached["bbox"] is not None else None
+            layer_info_str = json.dumps(cached["layer_info"]) if cached["layer_info"] is not None else None
+            with sqlite3.connect(DB_PATH) as conn:
+                conn.execute("UPDATE files SET converted = ?, path = ?, status = ?, error_message = NULL, bbox = ?, layer_info = ?, srs = ?, conversion_key = ? WHERE id = ?", (True, geopdf_path, "converted", bbox_str, layer_info_str, cached["srs"], cache_key, file_id))
+            return {"geopdf_path": geopdf_path, "bbox": cached["bbox"], "layer_info": cached["layer_info"], "srs": cached["srs"], "cached": True}
+        # Vorhandenes Ergebnis entfernen statt überschreiben: es kann als Hardlink im Cache liegen
+        if os.path.exists(geopdf_path):
+            os.remove(geopdf_path)
+        if ext == ".dxf":
+            result = await asyncio.wrap_future(pool.submit("dxf_to_geopdf", input_path, geopdf_path, crs_epsg=crs_epsg, page_size=page_size, dpi=dpi, return_metadata=True, symbolization=symbolization))
+            if isinstance(result, dict):
+                bbox = result.get('bbox')
+                layer_info = result.get('layer_info')
+                srs = result.get('srs')
+        elif ext in [".tif", ".tiff", ".geotiff"]:
+            await asyncio.wrap_future(pool.submit("raster_to_geopdf", input_path, geopdf_path, dpi=dpi, page_size=page_size))
+        else:
+            raise HTTPException(status_code=400, detail="Unsupported file type for conversion")
+        # --- Fallbacks und Typkorrektur für bbox und srs ---
+        if ext == ".dxf" and (layer_info is None or bbox is None or not (isinstance(bbox, list) and len(bbox) == 4)):
+            # Fallback: Extent und Layer aus dem DXF-Streaming-Scan (ohne zweiten QGIS-Start)
+            try:
+                scan = await asyncio.to_thread(scan_dxf, input_path)
+                if bbox is None or not (isinstance(bbox, list) and len(bbox) == 4):
+                    bbox = scan["bbox"]
+                if layer_info is None:
+                    layer_info = layer_info_from_scan(scan)
+            except Exception as e:
+                logger.warning(f"DXF-Scan fehlgeschlagen für {file_id}: {e}")
+        if bbox is None or not (isinstance(bbox, list) and len(bbox) == 4):
+            bbox = [0, 0, 0, 0]
+        if not srs:
+            srs = f"EPSG:{crs_epsg}" if ext == ".dxf" else "EPSG:3857"
+        # bbox als JSON-Array speichern, niemals als String
+        bbox_str = json.dumps(bbox) if bbox is not None else None
+        layer_info_str = json.dumps(layer_info) if layer_info is not None else None
+        with sqlite3.connect(DB_PATH) as conn:
+            conn.execute("UPDATE files SET converted = ?, path = ?, status = ?, error_message = NULL, bbox = ?, layer_info = ?, srs = ?, conversion_key = ? WHERE id = ?", (True, geopdf_path, "converted", bbox_str, layer_info_str, srs, cache_key, file_id))
+        try:
+            await asyncio.to_thread(conversion_cache.store, cache_key, geopdf_path, params, bbox=bbox, srs=srs, layer_info=layer_info)
+        except Exception as e:
+            logger.warning(f"Ergebnis konnte nicht im Konvertierungs-Cache abgelegt werden: {e}")
+        return {"geopdf_path": geopdf_path, "bbox": bbox, "layer_info": layer_info, "srs": srs, "cached": False}
+    except Exception as e:
+        with sqlite3.connect(DB_PATH) as conn:
+            conn.execute("UPDATE files SET status = ?, error_message = ? WHERE id = ?", ("error", str(e), file_id))
+        logger.error(f"Error converting file {file_id}: {e}")
+        raise
+
+async def _conversion_job(job_id: str, file_id: str, input_path: str, page_size: str, dpi: int,
+                          crs_epsg: int, symbolization: dict) -> None:
+    """Hintergrund-Task für /api/convert?background=true, aktualisiert den Job-Eintrag"""
+    job = jobs_db[job_id]
+    job['status'] = 'running'
+    job['startedAt'] = datetime.now().isoformat()
+    try:
+        await run_file_conversion(file_id, input_path, page_size=page_size, dpi=dpi, crs_epsg=crs_epsg, symbolization=symbolization)
+        job['status'] = 'completed'
+        job['progress'] = 100
+        job['artifacts'] = [{
+            'name': f'{file_id}.pdf',
+            'type': 'application/pdf',
+            'url': f'/api/download/{file_id}',
+            'viewable': True
+        }]
+    except Exception as e:
+        job['status'] = 'failed'
+        job['error'] = e.detail if isinstance(e, HTTPException) else str(e)
+    finally:
+        job['completedAt'] = datetime.now().isoformat()
+        background_tasks.discard(asyncio.current_task())
+
+def register_tms_job(file_id: str, row, minzoom: int, maxzoom: int, tile_store: str) -> dict:
+    """Kachelung eines TMS-Layers als laufenden Job eintragen; der Tiler meldet den Fortschritt"""
+    job = {
+        'id': str(uuid.uuid4()),
+        'name': f"TMS für {row[1]}",
+        'type': 'tms',
+        'status': 'running',
+        'createdAt': datetime.now().isoformat(),
+        'startedAt': datetime.now().isoformat(),
+        'inputFile': {'name': row[1], 'size': row[3]},
+        'parameters': {'fileId': file_id, 'minzoom': minzoom, 'maxzoom': maxzoom, 'tileStore': tile_store},
+        'artifacts': [],
+        'error': None,
+        'progress': 0
+    }
+    with thread_lock:
+        jobs_db[job['id']] = job
+    return job
+
+def finish_tms_job(job: dict, error: Optional[Exception] = None, url: Optional[str] = None) -> None:
+    """TMS-Job abschließen (erfolgreich mit Layer-URL oder fehlgeschlagen)"""
+    with thread_lock:
+        job['completedAt'] = datetime.now().isoformat()
+        if error is None:
+            job['status'] = 'completed'
+            job['progress'] = 100
+            job['artifacts'] = [{'name': job['parameters']['fileId'], 'type': 'tiles', 'url': url, 'viewable': True}]
+        else:
+            job['status'] = 'failed'
+            job['progress'] = None
+            job['error'] = str(error)
+
+def start_conversion_job(file_id: str, row, input_path: str, page_size: str, dpi: int, crs_epsg: int = 3857,
+                         symbolization: dict = None) -> str:
+    """Konvertierung als Job im Job-System registrieren und im Hintergrund starten"""
+    job_id = str(uuid.uuid4())
+    job = {
+        'id': job_id,
+        'name': f"Konvertierung {row[1]}",
+        'type': 'convert',
+        'status': 'queued',
+        'createdAt': datetime.now().isoformat(),
+        'inputFile': {'name': row[1], 'size': row[3]},
+        'parameters': {'pageSize': page_size, 'dpi': dpi, 'crsEpsg': crs_epsg},
+        'artifacts': [],
+        'error': None,
+        'progress': None
+    }
+    with thread_lock:
+        jobs_db[job_id] = job
+    # Referenz halten, damit der Task nicht vorzeitig vom GC entfernt wird
+    task = asyncio.create_task(_conversion_job(job_id, file_id, input_path, page_size, dpi, crs_epsg, symbolization))
+    background_tasks.add(task)
+    return job_id
+
 @app.post("/api/convert/{file_id}")
 async def convert_file(
     file_id: str,
     user: str = Depends(verify_token),
     page_size: str = "A4",
     dpi: int = 300,
-    db: sqlite3.Connection = Depends(get_db)
+    crs_epsg: int = 3857,
+    background: bool = Query(False, description="Sofort mit Job-ID antworten statt auf das Ergebnis zu warten"),
+    db: sqlite3.Connection = Depends(get_db),
+    body: dict = Body(default=None)
 ):
     """DXF oder Raster zu GeoPDF konvertieren und Metadaten speichern (mit Parametern)"""
+    symbolization = body.get('symbolization') if body else None
     try:
         cursor = db.cursor()
-        cursor.execute("UPDATE files SET status = ? WHERE id = ?", ("converting", file_id))
-        db.commit()
         cursor.execute("SELECT * FROM files WHERE id = ?", (file_id,))
         row = cursor.fetchone()
         if not row:
             raise HTTPException(status_code=404, detail="File not found")
-        input_path = row[2]
+        # Quelle ist die abgelegte Upload-Datei; path zeigt nach einer Konvertierung auf das GeoPDF
+        input_path = blob_path(db, row[12] if len(row) > 12 else None) or row[2]
         ext = os.path.splitext(input_path)[1].lower()
-        geopdf_path = os.path.join(OUTPUT_DIR, f"{file_id}.pdf")
+        if ext not in [".dxf", ".tif", ".tiff", ".geotiff"]:
+            raise HTTPException(status_code=400, detail="Unsupported file type for conversion")
+        check_conversion_admission()
+        cursor.execute("UPDATE files SET status = ? WHERE id = ?", ("converting", file_id))
+        db.commit()
+        if background:
+            job_id = start_conversion_job(file_id, row, input_path, page_size, dpi, crs_epsg, symbolization)
+            return JSONResponse(status_code=202, content={"job_id": job_id, "status": "queued", "fileName": row[1]})
         try:
-            bbox, layer_info, srs = None, None, None
-            if ext == ".dxf":
-                try:
-                    result = dxf_to_geopdf(input_path, geopdf_path, page_size=page_size, dpi=dpi, return_metadata=True)
-                    if isinstance(result, dict):
-                        bbox = result.get('bbox')
-                        layer_info = result.get('layer_info')
-                        srs = result.get('srs')
-                except TypeError:
-                    dxf_to_geopdf(input_path, geopdf_path, page_size=page_size, dpi=dpi)
-            elif ext in [".tif", ".tiff", ".geotiff"]:
-                raster_to_geopdf(input_path, geopdf_path, dpi=dpi, page_size=page_size)
-            else:
-                raise HTTPException(status_code=400, detail="Unsupported file type for conversion")
-            # --- Fallbacks und Typkorrektur für bbox und srs ---
-            if bbox is None or not (isinstance(bbox, list) and len(bbox) == 4):
-                # Versuche Layer-Extent aus QGIS zu holen (als Fallback)
-                try:
-                    from convert_dxf_to_geopdf import DXFToGeoPDFConverter
-                    with DXFToGeoPDFConverter() as converter:
-                        layer = converter.load_dxf_layer(input_path)
-                        extent = layer.extent()
-                        bbox = [extent.xMinimum(), extent.yMinimum(), extent.xMaximum(), extent.yMaximum()]
-                        if not srs or srs.lower() in ("", "none", None):
-                            srs = layer.crs().authid() or "EPSG:3857"
-                except Exception as e:
-                    bbox = [0, 0, 0, 0]
-                    if not srs:
-                        srs = "EPSG:3857"
-            # bbox als JSON-Array speichern, niemals als String
-            bbox_str = json.dumps(bbox) if bbox is not None else None
-            layer_info_str = json.dumps(layer_info) if layer_info is not None else None
-            cursor.execute("UPDATE files SET converted = ?, path = ?, status = ?, error_message = NULL, bbox = ?, layer_info = ?, srs = ? WHERE id = ?", (True, geopdf_path, "converted", bbox_str, layer_info_str, srs, file_id))
-            db.commit()
-            return {"message": "File converted successfully", "fileName": row[1], "page_size": page_size, "dpi": dpi, "bbox": bbox, "srs": srs}
-        except Exception as e:
-            cursor.execute("UPDATE files SET status = ?, error_message = ? WHERE id = ?", ("error", str(e), file_id))
-            db.commit()
-            logger.error(f"Error converting file {file_id}: {e}")
+            result = await run_file_conversion(file_id, input_path, page_size=page_size, dpi=dpi, crs_epsg=crs_epsg, symbolization=symbolization)
+        except Exception:
             raise HTTPException(status_code=500, detail="Conversion failed")
+        return {"message": "File converted successfully", "fileName": row[1], "page_size": page_size, "dpi": dpi, "bbox": result["bbox"], "srs": result["srs"], "cached": result["cached"]}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error converting file {file_id}: {e}")
         raise HTTPException(status_code=500, detail="Conversion failed")
@@ -579,27 +803,75 @@ async def dxf_to_geopdf_endpoint(file_id: str, user: str = Depends(verify_token)
         if not row:
             raise HTTPException(status_code=404, detail="File not found")
 
-        dxf_path = row[2]
+        dxf_path = blob_path(db, row[12] if len(row) > 12 else None) or row[2]
         geopdf_path = os.path.join(OUTPUT_DIR, f"{file_id}.pdf")
+        check_conversion_admission()
 
-        # Konvertierung durchführen
-        dxf_to_geopdf(dxf_path, geopdf_path)
+        # Konvertierung im QGIS-Worker-Pool durchführen, ohne den Event-Loop zu blockieren
+        await asyncio.wrap_future(get_worker_pool().submit("dxf_to_geopdf", dxf_path, geopdf_path))
 
         # Datei als konvertiert markieren
         cursor.execute("UPDATE files SET converted = ?, path = ?, status = ? WHERE id = ?", (True, geopdf_path, "converted", file_id))
         db.commit()
 
         return {"message": "File converted successfully", "fileName": row[1]}
+    except HTTPException:
+        raise
     except Exception as e:
         cursor.execute("UPDATE files SET status = ?, error_message = ? WHERE id = ?", ("error", str(e), file_id))
         db.commit()
         logger.error(f"Error converting file {file_id}: {e}")
         raise HTTPException(status_code=500, detail="Conversion failed")
 
+def tms_url(tms_id: str, tile_store: str, via_api: bool = False) -> str:
+    """Basis-URL der Kacheln: Verzeichnisse über /static; Archive, dynamische und dünn besetzte Layer über den Kachel-Endpoint"""
+    return f"/static/{tms_id}" if tile_store == "directory" and not via_api else f"/api/tms/{tms_id}"
+
+def direct_raster_paths(file_id: str) -> tuple:
+    """Direkt aus dem DXF gerendertes COG einer Datei und seine Metadaten"""
+    tif_path = os.path.join(OUTPUT_DIR, f"{file_id}.direct.tif")
+    return tif_path, f"{tif_path}.json"
+
+async def render_direct_raster(file_id: str, dxf_path: str, maxzoom: int, srs: str, dpi: int,
+                               symbolization: Optional[dict] = None) -> str:
+    """DXF ohne GeoPDF im QGIS-Worker-Pool zu einem COG rastern (oder vorhandenes wiederverwenden)"""
+    tif_path = direct_raster_paths(file_id)[0]
+    result = await asyncio.wrap_future(get_worker_pool().submit(
+        "dxf_to_raster", dxf_path, tif_path, maxzoom, srs=srs, dpi=int(dpi), symbolization=symbolization))
+    logger.info(f"Direktes Raster für {file_id}: {result['width']}x{result['height']} px, "
+                f"{'wiederverwendet' if result['reused'] else str(result['duration_ms']) + ' ms'}")
+    return tif_path
+
+def find_shared_tms(db: sqlite3.Connection, file_id: str, conversion_key: str, minzoom: int, maxzoom: int, srs: str,
+                    tile_store: str = "directory", sparse: bool = False, encoding: Optional[dict] = None,
+                    render: str = "pdf"):
+    """TMS-Verzeichnis einer anderen Datei mit gleichem GeoPDF (Konvertierungs-Schlüssel) und gleichen Parametern suchen"""
+    if not conversion_key:
+        return None
+    cursor = db.cursor()
+    cursor.execute("SELECT id FROM files WHERE conversion_key = ? AND id != ?", (conversion_key, file_id))
+    for (other_id,) in cursor.fetchall():
+        config_path = os.path.join(STATIC_ROOT, other_id, "config.json")
+        if not os.path.exists(config_path):
+            continue
+        try:
+            with open(config_path) as f:
+                config = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if (config.get("conversion_key") == conversion_key and config.get("minzoom") == minzoom
+                and config.get("maxzoom") == maxzoom and config.get("srs") == srs
+                and config.get("tile_store", "directory") == tile_store and config.get("mode", "static") == "static"
+                and config.get("sparse", False) == sparse and config.get("render", "pdf") == render
+                and config.get("encoding", encoding_profile("png")) == (encoding or encoding_profile("png"))):
+            return os.path.join(STATIC_ROOT, other_id)
+    return None
+
 @app.post("/api/tms/{file_id}")
 async def create_tms_layer(
     file_id: str,
-    maxzoom: int = 6,
+    maxzoom: Optional[int] = None,
+    background: bool = Query(False, description="Sofort mit Job-ID antworten und im Hintergrund kacheln"),
     user: str = Depends(verify_token),
     db: sqlite3.Connection = Depends(get_db),
     body: dict = Body(default=None)
@@ -624,42 +896,230 @@ async def create_tms_layer(
         else:
             logger.info(f"Verwende SRS '{file_srs}' für TMS-Generierung von {file_id}")
         tms_dir = os.path.join(STATIC_ROOT, file_id)
-        # Bounds ggf. an convert_pdf_to_tms übergeben (optional, falls Funktion unterstützt)
-        convert_pdf_to_tms(geopdf_path, tms_dir, minzoom=0, maxzoom=body['maxzoom'] if body and 'maxzoom' in body else maxzoom, srs=file_srs)
-        # --- Bounding Box und SRS aus GeoPDF extrahieren und in config.json schreiben ---
+        # "dynamic": Layer nur registrieren, Kacheln werden beim ersten Abruf gerendert
+        mode = (body.get('mode') if body else None) or "static"
+        if mode not in ("static", "dynamic"):
+            raise HTTPException(status_code=400, detail="mode muss 'static' oder 'dynamic' sein")
+        dynamic = mode == "dynamic"
+        requested_maxzoom = int(body['maxzoom']) if body and body.get('maxzoom') is not None else maxzoom
+        minzoom = body['minzoom'] if body and 'minzoom' in body else 0
+        # Kachelablage: Verzeichnisbaum oder ein Archiv (MBTiles/PMTiles) pro Layer
+        tile_store = (body.get('tile_store') if body else None) or DEFAULT_TILE_STORE
+        if tile_store not in TILE_STORE_FORMATS:
+            raise HTTPException(status_code=400, detail=f"tile_store muss einer von {', '.join(TILE_STORE_FORMATS)} sein")
+        if dynamic and tile_store != "directory":
+            raise HTTPException(status_code=400, detail="Dynamische Layer unterstützen nur tile_store 'directory'")
+        # Kodierprofil: "png", "png8", "webp", "jpeg" oder {"format": ..., "quality"/"lossless"/"zlevel"/"colors": ...}
+        try:
+            encoding = encoding_profile(body.get('encoding') if body else None)
+        except (ValueError, TypeError) as e:
+            raise HTTPException(status_code=400, detail=f"Ungültiges Kodierprofil: {e}")
+        conversion_key = row[13] if len(row) > 13 else None
+        # Sinnvolle höchste Zoomstufe aus der Auflösung, mit der das GeoPDF erzeugt wurde
+        # (nicht aus der Anfrage); tiefere Zoomstufen werden per Overzoom ausgeliefert
+        conversion_params = conversion_cache.params(conversion_key) or {}
+        dpi = conversion_params.get('dpi') or 300
         try:
-            config_path = os.path.join(tms_dir, "config.json")
-            config = {}
-            if os.path.exists(config_path):
-                with open(config_path) as f:
-                    config = json.load(f)
-            # Bounds aus Request übernehmen, falls vorhanden
-            if body and 'bounds' in body and isinstance(body['bounds'], list) and len(body['bounds']) == 4:
-                bounds = [float(x) for x in body['bounds']]
-                config["bounds"] = bounds
-                logger.info(f"Bounds aus Request übernommen: {bounds}")
+            native = await asyncio.to_thread(native_maxzoom, geopdf_path, float(dpi), file_srs)
+        except Exception as e:
+            logger.warning(f"Native Zoomstufe für {file_id} nicht bestimmbar: {e}")
+            native = None
+        if native is None:
+            maxzoom = requested_maxzoom if requested_maxzoom is not None else (DYNAMIC_MAX_ZOOM if dynamic else 6)
+        else:
+            maxzoom = native if requested_maxzoom is None else min(requested_maxzoom, native)
+        maxzoom = min(maxzoom, TMS_MAX_ZOOM_CAP)
+        minzoom = min(minzoom, maxzoom)
+        overzoom_maxzoom = min(TMS_MAX_ZOOM_CAP, max(requested_maxzoom or 0, maxzoom + TMS_OVERZOOM_LEVELS))
+        if requested_maxzoom is not None and requested_maxzoom > maxzoom:
+            logger.info(f"maxzoom {requested_maxzoom} für {file_id} auf {maxzoom} begrenzt (native Auflösung bei {dpi} DPI)")
+        # Manifest: vorhandene Zoomstufen sind gültig, solange Quelle und Render-Parameter gleich sind
+        source_sha256 = None if dynamic else await asyncio.to_thread(file_sha256, geopdf_path)
+        # Dünn besetzte Kachelung nur mit DXF-Quelle (Geometrie für den räumlichen Index)
+        dxf_path = blob_path(db, row[12] if len(row) > 12 else None)
+        has_dxf = bool(dxf_path and dxf_path.lower().endswith(".dxf") and os.path.exists(dxf_path))
+        sparse = bool(SPARSE_ENABLED and has_dxf)
+        # "direct": DXF mit dem parallelen Map-Renderer von QGIS direkt rastern statt über das GeoPDF
+        requested_render = body.get('render') if body else None
+        render = requested_render or TMS_RENDER_SOURCE
+        if render not in ("pdf", "direct"):
+            raise HTTPException(status_code=400, detail="render muss 'pdf' oder 'direct' sein")
+        if render == "direct" and not has_dxf:
+            if requested_render:
+                raise HTTPException(status_code=400, detail="render 'direct' benötigt eine DXF-Quelle")
+            render = "pdf"
+        params = render_params(file_srs, tile_store, PYRAMID_ENABLED, RASTER_CACHE_ENABLED, sparse=sparse,
+                               encoding=encoding, render=render)
+        existing_levels = None
+        if not dynamic and tile_store == "directory":
+            existing_levels = reusable_levels(load_config(tms_dir), source_sha256, params)
+        # Abgebrochener Lauf (z. B. Neustart des Containers): Kacheln und Journal behalten, der Tiler setzt fort
+        resumable = not dynamic and os.path.exists(os.path.join(tms_dir, JOURNAL_FILE))
+        if existing_levels:
+            # Nur Begleitdateien ersetzen; Kacheln bleiben, neue Kacheln werden atomar angelegt
+            for name in os.listdir(tms_dir):
+                path = os.path.join(tms_dir, name)
+                if os.path.isfile(path) and name not in ("config.json", JOURNAL_FILE):
+                    os.remove(path)
+        elif os.path.isdir(tms_dir) and not resumable:
+            # Vorhandene Kacheln entfernen statt überschreiben: sie können per Hardlink geteilt sein
+            await asyncio.to_thread(shutil.rmtree, tms_dir)
+        dynamic_tiles.invalidate(tms_dir)
+        shared_tms = None
+        if not dynamic and not existing_levels and not resumable:
+            shared_tms = find_shared_tms(db, file_id, conversion_key, minzoom, maxzoom, file_srs, tile_store, sparse,
+                                         encoding, render)
+        feature_index = None
+        if sparse:
+            # Räumlicher Index der DXF-Geometrie: nur Kacheln mit Inhalt rendern bzw. ausliefern
+            try:
+                os.makedirs(tms_dir, exist_ok=True)
+                feature_index = await asyncio.to_thread(build_feature_index, dxf_path, file_srs, tms_dir)
+            except Exception as e:
+                logger.warning(f"Feature-Index für {file_id} nicht erstellt, kachle vollständig: {e}")
+            if feature_index is not None and not len(feature_index):
+                feature_index = None
+            params["sparse"] = feature_index is not None
+        source = None
+        tms_job = None
+        if dynamic:
+            # GeoPDF (bzw. DXF direkt) einmal zu einem COG rastern; der Renderer liest nur noch das COG
+            if render == "direct":
+                source = {"path": await render_direct_raster(file_id, dxf_path, maxzoom, file_srs, dpi,
+                                                             conversion_params.get("symbolization")),
+                          "srs": None, "georeferenced": True}
             else:
-                # Bounds aus PDF extrahieren
-                ds = gdal.Open(geopdf_path)
-                if ds is not None:
-                    gt = ds.GetGeoTransform()
-                    xsize = ds.RasterXSize
-                    ysize = ds.RasterYSize
-                    minx = gt[0]
-                    maxy = gt[3]
-                    maxx = minx + gt[1] * xsize
-                    miny = maxy + gt[5] * ysize
-                    bounds = [minx, miny, maxx, maxy]
+                source = await asyncio.to_thread(prepare_raster_source, geopdf_path, maxzoom, file_srs)
+            if source["georeferenced"] is False:
+                raise HTTPException(status_code=400, detail="Quelle ohne Georeferenz kann nicht dynamisch gekachelt werden")
+            await asyncio.to_thread(dynamic_tiles.renderer, os.path.abspath(source["path"]), source["srs"])
+            os.makedirs(tms_dir, exist_ok=True)
+            logger.info(f"Dynamischer TMS-Layer für {file_id} registriert (maxzoom {maxzoom})")
+        elif shared_tms:
+            # Gleicher Inhalt, gleiche Parameter: Kacheln der anderen Datei übernehmen
+            await asyncio.to_thread(link_tree, shared_tms, tms_dir)
+            logger.info(f"TMS für {file_id} von {os.path.basename(shared_tms)} übernommen")
+        url = tms_url(file_id, tile_store, dynamic or feature_index is not None or overzoom_maxzoom > maxzoom)
+
+        def update_layer_config(seeding_run: bool = False) -> None:
+            """Bounding Box und SRS aus dem GeoPDF in config.json schreiben (während des Seedings ohne Manifest)"""
+            try:
+                config_path = os.path.join(tms_dir, "config.json")
+                config = load_config(tms_dir)
+                # Bounds aus Request übernehmen, falls vorhanden
+                if body and 'bounds' in body and isinstance(body['bounds'], list) and len(body['bounds']) == 4:
+                    bounds = [float(x) for x in body['bounds']]
                     config["bounds"] = bounds
-                    logger.info(f"Bounds aus PDF extrahiert: {bounds}")
-                    ds = None
-            config["srs"] = file_srs
-            with open(config_path, "w") as f:
-                json.dump(config, f, indent=2)
-            logger.info(f"TMS config.json mit Bounds und SRS aktualisiert: {config_path}")
-        except Exception as e:
-            logger.error(f"Fehler beim Extrahieren der Bounding Box aus GeoPDF: {e}")
-        return {"message": "TMS erfolgreich erzeugt", "tms_dir": tms_dir, "url": f"/static/{file_id}"}
+                    logger.info(f"Bounds aus Request übernommen: {bounds}")
+                else:
+                    # Bounds aus PDF extrahieren
+                    ds = gdal.Open(geopdf_path)
+                    if ds is not None:
+                        gt = ds.GetGeoTransform()
+                        xsize = ds.RasterXSize
+                        ysize = ds.RasterYSize
+                        minx = gt[0]
+                        maxy = gt[3]
+                        maxx = minx + gt[1] * xsize
+                        miny = maxy + gt[5] * ysize
+                        bounds = [minx, miny, maxx, maxy]
+                        config["bounds"] = bounds
+                        logger.info(f"Bounds aus PDF extrahiert: {bounds}")
+                        ds = None
+                config["srs"] = file_srs
+                config["minzoom"] = minzoom
+                config["maxzoom"] = maxzoom
+                config["conversion_key"] = conversion_key
+                config["tile_store"] = tile_store
+                config["mode"] = mode
+                config["sparse"] = feature_index is not None
+                config["native_maxzoom"] = native
+                config["overzoom_maxzoom"] = overzoom_maxzoom
+                config["encoding"] = encoding
+                config["tile_format"] = encoding_extension(encoding)
+                config["render"] = render
+                if dynamic:
+                    config["source"] = os.path.abspath(source["path"])
+                    config["source_srs"] = source["srs"]
+                elif seeding_run:
+                    # Kacheln entstehen noch: ein vorhandenes Manifest gilt erst nach Abschluss für den neuen Bereich
+                    config["seeding"] = True
+                else:
+                    config.pop("seeding", None)
+                    config["manifest"] = build_manifest(source_sha256, params, minzoom, maxzoom)
+                write_layer_config(tms_dir, config)
+                logger.info(f"TMS config.json mit Bounds und SRS aktualisiert: {config_path}")
+            except Exception as e:
+                logger.error(f"Fehler beim Extrahieren der Bounding Box aus GeoPDF: {e}")
+
+        def result(status: str = "completed") -> dict:
+            return {"message": "TMS erfolgreich erzeugt" if status == "completed" else "TMS-Erzeugung gestartet",
+                    "status": status, "tms_dir": tms_dir, "url": url,
+                    "tile_store": tile_store, "mode": mode, "shared": bool(shared_tms),
+                    "reused_levels": list(existing_levels) if existing_levels else None,
+                    "maxzoom": maxzoom, "requested_maxzoom": requested_maxzoom, "native_maxzoom": native,
+                    "overzoom_maxzoom": overzoom_maxzoom, "encoding": encoding, "tile_format": encoding_extension(encoding),
+                    "render": render,
+                    "job_id": tms_job['id'] if tms_job else None}
+
+        if dynamic or shared_tms:
+            tile_store_pool.invalidate(tms_dir)
+            update_layer_config()
+            return result()
+
+        # Der Tiler rendert in einem Prozesspool; im Thread warten, damit der Event-Loop frei bleibt.
+        # Während des Laufs bestimmt der Scheduler die Reihenfolge: Viewport der Vorschau und
+        # angefragte Kacheln zuerst (siehe tile_seeder.py)
+        tms_job = register_tms_job(file_id, row, minzoom, maxzoom, tile_store)
+        scheduler = seeding.register(file_id, SeedScheduler(METATILE_SIZE))
+        if tile_store == "directory":
+            # Vorläufige config.json: fertige Kacheln sind schon während des Laufs abrufbar
+            os.makedirs(tms_dir, exist_ok=True)
+            update_layer_config(seeding_run=True)
+
+        def report_progress(percent: float) -> None:
+            with thread_lock:
+                tms_job['progress'] = percent
+
+        async def generate() -> None:
+            try:
+                tile_source, tile_srs = geopdf_path, file_srs
+                if render == "direct":
+                    # Das COG liegt bereits in EPSG:3857, kein Quell-SRS für den Tiler
+                    tile_source = await render_direct_raster(file_id, dxf_path, maxzoom, file_srs, dpi,
+                                                             conversion_params.get("symbolization"))
+                    tile_srs = None
+                await asyncio.to_thread(convert_pdf_to_tms, tile_source, tms_dir, minzoom=minzoom, maxzoom=maxzoom, srs=tile_srs,
+                                        tile_store=tile_store, existing_levels=existing_levels,
+                                        feature_index=feature_index, progress=report_progress, encoding=encoding,
+                                        scheduler=scheduler)
+                tile_store_pool.invalidate(tms_dir)
+                # Während der Kachelung gecachte Overzoom-Kacheln stammen aus vorläufigen Eltern
+                dynamic_tiles.invalidate(tms_dir)
+                update_layer_config()
+                finish_tms_job(tms_job, url=url)
+            except Exception as e:
+                logger.error(f"Kachelung von {file_id} fehlgeschlagen: {e}")
+                finish_tms_job(tms_job, error=e)
+                config = load_config(tms_dir)
+                if existing_levels or config.pop("seeding", None):
+                    # Teilweise aktualisierter Baum: beim nächsten Mal vollständig neu rechnen
+                    config.pop("manifest", None)
+                    write_layer_config(tms_dir, config)
+                if not background:
+                    raise
+            finally:
+                seeding.unregister(file_id)
+                background_tasks.discard(asyncio.current_task())
+
+        if background:
+            # Sofort antworten; die Vorschau zeigt fertige Kacheln und meldet ihren Ausschnitt
+            background_tasks.add(asyncio.create_task(generate()))
+            return JSONResponse(status_code=202, content=result("running"))
+        await generate()
+        return result()
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"TMS-Erstellung fehlgeschlagen: {e}")
         raise HTTPException(status_code=500, detail=f"TMS-Erstellung fehlgeschlagen: {e}")
@@ -682,9 +1142,14 @@ async def list_tms(db: sqlite3.Connection = Depends(get_db)):
                     cursor = db.cursor()
                     cursor.execute("SELECT name, bbox, srs FROM files WHERE id = ?", (name,))
                     row = cursor.fetchone()
+                    tile_store = detect_format(path)
                     layers.append({
                         "id": name,
-                        "url": f"/static/{name}",
+                        "url": tms_url(name, tile_store, config.get("mode") == "dynamic" or config.get("sparse", False)
+                                       or config.get("overzoom_maxzoom", 0) > config.get("maxzoom", 0)),
+                        "tile_store": tile_store,
+                        # Für unveränderliches Caching: /api/tiles/{id}/{z}/{x}/{y}.png?v=<version>
+                        "version": str(int(os.path.getmtime(config_path))) if os.path.exists(config_path) else None,
                         "config": config,
                         "fileName": row[0] if row else name,
                         "bbox": row[1] if row else None,
@@ -709,8 +1174,12 @@ async def delete_tms_layer(tms_id: str, user: str = Depends(verify_token)):
             logger.warning(f"TMS-Layer Verzeichnis nicht gefunden: {tms_layer_path}")
             raise HTTPException(status_code=404, detail="TMS-Layer nicht gefunden")
 
-        shutil.rmtree(tms_layer_path) # shutil importieren, falls noch nicht geschehen
-        logger.info(f"TMS-Layer {tms_id} erfolgreich gelöscht von Benutzer {user}")
+        tile_store = detect_format(tms_layer_path)
+        # Bei Archiven sind nur wenige Dateien zu löschen, bei Verzeichnisbäumen im Thread warten
+        await asyncio.to_thread(shutil.rmtree, tms_layer_path)
+        tile_store_pool.invalidate(tms_layer_path)
+        dynamic_tiles.invalidate(tms_layer_path)
+        logger.info(f"TMS-Layer {tms_id} ({tile_store}) erfolgreich gelöscht von Benutzer {user}")
         return {"message": f"TMS-Layer {tms_id} erfolgreich gelöscht"}
     except HTTPException:
         raise
@@ -718,6 +1187,92 @@ async def delete_tms_layer(tms_id: str, user: str = Depends(verify_token)):
         logger.error(f"Fehler beim Löschen des TMS-Layers {tms_id}: {e}")
         raise HTTPException(status_code=500, detail=f"Fehler beim Löschen des TMS-Layers: {e}")
 
+def _tms_layer_dir(tms_id: str) -> str:
+    # Sicherheitsüberprüfung für tms_id, um Path Traversal zu verhindern
+    if not tms_id or ".." in tms_id or "/" in tms_id or "\\" in tms_id:
+        raise HTTPException(status_code=400, detail="Ungültige TMS ID")
+    layer_dir = os.path.join(STATIC_ROOT, tms_id)
+    if not os.path.isdir(layer_dir):
+        raise HTTPException(status_code=404, detail="TMS-Layer nicht gefunden")
+    return layer_dir
+
+@app.get("/api/tms/{tms_id}/download")
+async def download_tms_layer(tms_id: str, user: str = Depends(verify_token)):
+    """TMS-Layer herunterladen: Archive direkt, Verzeichnisbäume als ZIP"""
+    layer_dir = _tms_layer_dir(tms_id)
+    tile_store = detect_format(layer_dir)
+    if tile_store != "directory":
+        archive = ARCHIVE_NAMES[tile_store]
+        return FileResponse(os.path.join(layer_dir, archive), filename=f"{tms_id}.{tile_store}",
+                            media_type="application/octet-stream")
+    zip_base = os.path.join(OUTPUT_DIR, f"tms_{tms_id}_{uuid.uuid4().hex}")
+    zip_path = await asyncio.to_thread(shutil.make_archive, zip_base, "zip", layer_dir)
+    return FileResponse(zip_path, filename=f"{tms_id}.zip", media_type="application/zip",
+                        background=BackgroundTask(os.remove, zip_path))
+
+@app.get("/api/tms/{tms_id}/{z}/{x}/{y}.{ext}")
+async def get_tms_tile(tms_id: str, z: int, x: int, y: int, ext: str, request: Request):
+    """Einzelne Kachel (TMS-Schema) aus Verzeichnis oder Archiv liefern, siehe /api/tiles"""
+    return await serve_tile(request, tms_id, z, x, y, ext)
+
+@app.post("/api/mvt/{file_id}")
+async def create_vector_tiles(
+    file_id: str,
+    user: str = Depends(verify_token),
+    db: sqlite3.Connection = Depends(get_db),
+    body: dict = Body(default=None)
+):
+    """DXF als Vektorkacheln (MVT in MBTiles) erzeugen und über den Tileserver veröffentlichen"""
+    try:
+        cursor = db.cursor()
+        cursor.execute("SELECT * FROM files WHERE id = ?", (file_id,))
+        row = cursor.fetchone()
+        if not row:
+            raise HTTPException(status_code=404, detail="Datei nicht gefunden")
+        dxf_path = blob_path(db, row[12] if len(row) > 12 else None)
+        if not dxf_path or not dxf_path.lower().endswith(".dxf") or not os.path.exists(dxf_path):
+            raise HTTPException(status_code=400, detail="Vektorkacheln benötigen eine DXF-Quelle")
+        file_srs = (body.get('srs') if body else None) or (row[11] if len(row) > 11 else None)
+        if not file_srs or file_srs.strip() == '' or file_srs.lower() == 'none':
+            file_srs = None
+            logger.warning(f"Kein SRS für {file_id}, DXF-Koordinaten werden als EPSG:3857 interpretiert")
+        minzoom = int(body['minzoom']) if body and body.get('minzoom') is not None else 0
+        maxzoom = int(body['maxzoom']) if body and body.get('maxzoom') is not None else 18
+        maxzoom = min(maxzoom, TMS_MAX_ZOOM_CAP)
+        if not 0 <= minzoom <= maxzoom:
+            raise HTTPException(status_code=400, detail="minzoom muss zwischen 0 und maxzoom liegen")
+        mbtiles_path = vector_tiles_path(file_id)
+        result = await asyncio.to_thread(build_vector_tiles, dxf_path, mbtiles_path, minzoom, maxzoom,
+                                         file_srs or "EPSG:3857", row[1])
+        await asyncio.to_thread(register_tileserver_layer, file_id, mbtiles_path)
+        return {"message": "Vektorkacheln erfolgreich erzeugt", "minzoom": minzoom, "maxzoom": maxzoom,
+                "tiles": result["tiles"], "size": result["size"], "duration_ms": result["duration_ms"],
+                "url": f"/mapserver/data/{file_id}/{{z}}/{{x}}/{{y}}.pbf",
+                "tilejson": f"/mapserver/data/{file_id}.json"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erzeugung der Vektorkacheln fehlgeschlagen: {e}")
+        raise HTTPException(status_code=500, detail=f"Erzeugung der Vektorkacheln fehlgeschlagen: {e}")
+
+async def remove_vector_tiles(file_id: str) -> bool:
+    """Vektorkacheln einer Datei aus dem Tileserver austragen und löschen; False, wenn keine vorhanden"""
+    registered = await asyncio.to_thread(unregister_tileserver_layer, file_id)
+    mbtiles_path = vector_tiles_path(file_id)
+    if os.path.exists(mbtiles_path):
+        os.remove(mbtiles_path)
+        return True
+    return registered
+
+@app.delete("/api/mvt/{file_id}")
+async def delete_vector_tiles(file_id: str, user: str = Depends(verify_token)):
+    """Vektorkacheln einer Datei löschen"""
+    if not file_id or ".." in file_id or "/" in file_id or "\\" in file_id:
+        raise HTTPException(status_code=400, detail="Ungültige Datei-ID")
+    if not await remove_vector_tiles(file_id):
+        raise HTTPException(status_code=404, detail="Keine Vektorkacheln vorhanden")
+    return {"message": f"Vektorkacheln von {file_id} gelöscht"}
+
 @app.get("/api/download/{file_id}")
 async def download_file(file_id: str, request: Request, user: str = Depends(verify_token), db: sqlite3.Connection = Depends(get_db)):
     """GeoPDF Datei herunterladen"""
@@ -748,14 +1303,20 @@ async def download_file(file_id: str, request: Request, user: str = Depends(veri
 async def delete_file(file_id: str, user: str = Depends(verify_token), db: sqlite3.Connection = Depends(get_db)):
     try:
         cursor = db.cursor()
-        cursor.execute("SELECT path FROM files WHERE id = ?", (file_id,))
+        cursor.execute("SELECT path, sha256 FROM files WHERE id = ?", (file_id,))
         row = cursor.fetchone()
         if not row:
             logger.warning(f"Löschversuch für nicht vorhandene Datei-ID: {file_id}")
             raise HTTPException(status_code=404, detail="File not found")
-        file_path = row[0]
-        logger.info(f"Attempting to delete file: {file_path}")
-        if os.path.exists(file_path):
+        file_path, sha256 = row
+        if sha256:
+            # Upload-Datei wird geteilt: nur beim letzten Verweis löschen
+            shared_path = blob_path(db, sha256)
+            release_blob(db, sha256)
+            if file_path == shared_path:
+                file_path = None
+        if file_path and os.path.exists(file_path):
+            logger.info(f"Attempting to delete file: {file_path}")
             try:
                 os.remove(file_path)
                 logger.info(f"Successfully deleted file: {file_path}")
@@ -766,8 +1327,15 @@ async def delete_file(file_id: str, user: str = Depends(verify_token), db: sqlit
             if os.path.exists(file_path):
                 logger.error(f"Datei existiert nach Löschversuch immer noch: {file_path}")
                 raise HTTPException(status_code=500, detail="Datei konnte nicht gelöscht werden (existiert noch)")
-        else:
+            # Gerastertes COG des GeoPDF mit entfernen
+            remove_raster_source(file_path)
+        elif file_path:
             logger.warning(f"Datei nicht auf dem Dateisystem gefunden: {file_path}")
+        # Direkt aus dem DXF gerendertes COG (render "direct") und Vektorkacheln mit entfernen
+        for path in direct_raster_paths(file_id):
+            if os.path.exists(path):
+                os.remove(path)
+        await remove_vector_tiles(file_id)
         cursor.execute("DELETE FROM files WHERE id = ?", (file_id,))
         db.commit()
         return {"message": "Datei erfolgreich gelöscht"}
@@ -1145,6 +1713,24 @@ async def container_logs(
         logger.error(f"Error fetching container logs: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch container logs: {str(e)}")
 
+@app.get("/api/cache/stats")
+async def conversion_cache_stats(user: str = Depends(verify_token)):
+    """Treffer-/Fehlzähler und Belegung des Konvertierungs-Caches"""
+    try:
+        return conversion_cache.stats()
+    except Exception as e:
+        logger.error(f"Error fetching conversion cache stats: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to fetch cache stats: {str(e)}")
+
+@app.get("/api/system/workers")
+async def worker_pool_health(user: str = Depends(verify_token)):
+    """Zustand der QGIS-Worker-Prozesse (Jobs, Recycling, laufender Job)"""
+    try:
+        return get_worker_pool().health()
+    except Exception as e:
+        logger.error(f"Error fetching worker pool health: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to fetch worker pool health: {str(e)}")
+
 # Health Check für System-Monitoring
 @app.get("/api/system/health")
 async def system_health():
@@ -0,0 +1,347 @@
+# qgis_worker_pool.py - Langlebige QGIS-Worker-Prozesse für Konvertierungen
+"""
+Pool von Worker-Prozessen, die QGIS jeweils nur einmal initialisieren und
+Konvertierungsjobs über eine Queue entgegennehmen. Dadurch entfällt der
+QgsApplication-Start (initQgis/exitQgis) pro Konvertierung.
+
+Konfiguration über Umgebungsvariablen:
+    QGIS_POOL_SIZE          Anzahl Worker-Prozesse (Default: 2)
+    QGIS_WORKER_MAX_JOBS    Worker wird nach N Jobs recycelt (Default: 50)
+    QGIS_JOB_TIMEOUT        Maximale Laufzeit eines Jobs in Sekunden, 0 = unbegrenzt (Default: 0)
+"""
+import os
+import time
+import uuid
+import queue
+import threading
+import logging
+import multiprocessing as mp
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+QGIS_POOL_SIZE = int(os.environ.get("QGIS_POOL_SIZE", "2"))
+QGIS_WORKER_MAX_JOBS = int(os.environ.get("QGIS_WORKER_MAX_JOBS", "50"))
+QGIS_JOB_TIMEOUT = float(os.environ.get("QGIS_JOB_TIMEOUT", "0"))
+
+
+def _run_dxf_to_geopdf(converter, *args, **kwargs):
+    from convert_dxf_to_geopdf import dxf_to_geopdf
+    if converter is None:
+        raise RuntimeError("QGIS ist in diesem Worker nicht initialisiert")
+    return dxf_to_geopdf(*args, converter=converter, **kwargs)
+
+
+def _run_dxf_to_raster(converter, *args, **kwargs):
+    from convert_dxf_to_geopdf import dxf_to_raster
+    if converter is None:
+        raise RuntimeError("QGIS ist in diesem Worker nicht initialisiert")
+    return dxf_to_raster(*args, converter=converter, **kwargs)
+
+
+def _run_raster_to_geopdf(converter, *args, **kwargs):
+    from convert_raster_to_geopdf import raster_to_geopdf
+    return raster_to_geopdf(*args, **kwargs)
+
+
+# Jobtypen, die ein Worker ausführen kann (Name -> Funktion(converter, *args, **kwargs))
+JOB_HANDLERS = {
+    "dxf_to_geopdf": _run_dxf_to_geopdf,
+    "dxf_to_raster": _run_dxf_to_raster,
+    "raster_to_geopdf": _run_raster_to_geopdf,
+}
+
+
+def _worker_main(worker_id: int, task_queue, result_queue, max_jobs: int, job_slot=None):
+    """
+    Hauptschleife eines Worker-Prozesses: QGIS einmal starten, dann Jobs abarbeiten
+
+    job_slot (geteilter Speicher) enthält die ID des zuletzt angenommenen Jobs. Nachrichten
+    über die result_queue gehen bei einem Absturz verloren, solange sie noch nicht geschrieben
+    sind; so kann der Pool den abgebrochenen Job trotzdem zuordnen.
+    """
+    logging.basicConfig(level=logging.INFO)
+    converter = None
+    qgis_error = None
+    try:
+        from convert_dxf_to_geopdf import DXFToGeoPDFConverter
+        converter = DXFToGeoPDFConverter()
+        converter.initialize_qgis()
+    except Exception as e:
+        # Ohne QGIS können weiterhin Raster-Jobs verarbeitet werden
+        converter = None
+        qgis_error = str(e)
+    result_queue.put(("ready", worker_id, os.getpid(), qgis_error))
+
+    jobs_done = 0
+    try:
+        while max_jobs <= 0 or jobs_done < max_jobs:
+            task = task_queue.get()
+            if task is None:
+                break
+            job_id, name, args, kwargs = task
+            if job_slot is not None:
+                job_slot.value = job_id.encode()
+            result_queue.put(("started", worker_id, job_id, None))
+            try:
+                handler = JOB_HANDLERS[name]
+                result_queue.put(("done", worker_id, job_id, handler(converter, *args, **kwargs)))
+            except Exception as e:
+                result_queue.put(("failed", worker_id, job_id, f"{type(e).__name__}: {e}"))
+            finally:
+                if converter is not None:
+                    converter.reset_project()
+            jobs_done += 1
+    finally:
+        if converter is not None:
+            converter.cleanup_qgis()
+        result_queue.put(("exit", worker_id, os.getpid(), jobs_done))
+
+
+class QgisWorkerPool:
+    """Verwaltet langlebige QGIS-Worker-Prozesse und verteilt Jobs über eine gemeinsame Queue"""
+
+    def __init__(self, size: int = QGIS_POOL_SIZE, max_jobs_per_worker: int = QGIS_WORKER_MAX_JOBS,
+                 job_timeout: float = QGIS_JOB_TIMEOUT):
+        self.size = max(1, size)
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.job_timeout = job_timeout
+        # "spawn", damit keine Threads/Sockets des uvicorn-Prozesses geforkt werden
+        self._ctx = mp.get_context("spawn")
+        self._task_queue = self._ctx.Queue()
+        self._result_queue = self._ctx.Queue()
+        self._futures: Dict[str, Future] = {}
+        self._workers: Dict[int, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._dispatcher = None
+        self._running = False
+
+    def start(self):
+        """Worker-Prozesse und Dispatcher-Thread starten"""
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            for worker_id in range(self.size):
+                self._spawn_worker(worker_id)
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="qgis-pool-dispatcher", daemon=True)
+        self._dispatcher.start()
+        logger.info(f"QGIS-Worker-Pool gestartet ({self.size} Worker, Recycling nach {self.max_jobs_per_worker} Jobs)")
+
+    def _spawn_worker(self, worker_id: int):
+        previous = self._workers.get(worker_id)
+        job_slot = self._ctx.Array("c", 64, lock=False)
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker_id, self._task_queue, self._result_queue, self.max_jobs_per_worker, job_slot),
+            name=f"qgis-worker-{worker_id}",
+            daemon=True,
+        )
+        process.start()
+        self._workers[worker_id] = {
+            "process": process,
+            "state": "starting",
+            "jobs_done": 0,
+            "current_job": None,
+            "job_slot": job_slot,
+            "job_started_at": None,
+            "started_at": datetime.utcnow().isoformat(),
+            "last_activity": time.time(),
+            "qgis_error": None,
+            "restarts": previous["restarts"] + 1 if previous else 0,
+            "crash_streak": previous["crash_streak"] if previous else 0,
+            "spawned_at": time.time(),
+        }
+
+    def submit(self, name: str, *args, **kwargs) -> Future:
+        """
+        Job an den Pool übergeben
+
+        Args:
+            name: Jobtyp (siehe JOB_HANDLERS)
+            *args, **kwargs: Argumente für die Konvertierungsfunktion (müssen picklebar sein)
+
+        Returns:
+            Future: Wird mit dem Rückgabewert der Konvertierung bzw. einer Exception erfüllt
+        """
+        if name not in JOB_HANDLERS:
+            raise ValueError(f"Unbekannter Jobtyp: {name}")
+        if not self._running:
+            self.start()
+        job_id = str(uuid.uuid4())
+        future = Future()
+        with self._lock:
+            self._futures[job_id] = future
+        self._task_queue.put((job_id, name, args, kwargs))
+        return future
+
+    def pending_jobs(self) -> int:
+        """Anzahl angenommener, noch nicht abgeschlossener Jobs"""
+        with self._lock:
+            return len(self._futures)
+
+    def health(self) -> Dict[str, Any]:
+        """Zustand aller Worker für Monitoring-Endpunkte"""
+        now = time.time()
+        workers: List[Dict[str, Any]] = []
+        with self._lock:
+            for worker_id, info in sorted(self._workers.items()):
+                process = info["process"]
+                workers.append({
+                    "worker_id": worker_id,
+                    "pid": process.pid,
+                    "alive": process.is_alive(),
+                    "state": info["state"],
+                    "jobs_done": info["jobs_done"],
+                    "max_jobs": self.max_jobs_per_worker,
+                    "current_job": info["current_job"],
+                    "job_runtime": round(now - info["job_started_at"], 1) if info["job_started_at"] else None,
+                    "started_at": info["started_at"],
+                    "idle_seconds": round(now - info["last_activity"], 1),
+                    "restarts": info["restarts"],
+                    "qgis_error": info["qgis_error"],
+                })
+            pending = len(self._futures)
+        return {"running": self._running, "size": self.size, "pending_jobs": pending, "workers": workers}
+
+    def _dispatch_loop(self):
+        while self._running:
+            try:
+                message = self._result_queue.get(timeout=1.0)
+                while message is not None:
+                    self._handle_message(*message)
+                    # Alle anstehenden Nachrichten verarbeiten, bevor Worker geprüft werden
+                    message = self._result_queue.get_nowait()
+            except queue.Empty:
+                pass
+            except (EOFError, OSError):
+                break
+            self._supervise()
+
+    def _handle_message(self, kind: str, worker_id: int, ref: Any, payload: Any):
+        with self._lock:
+            info = self._workers.get(worker_id)
+            if info is None:
+                return
+            if kind in ("ready", "exit") and ref != info["process"].pid:
+                # Nachricht eines bereits ersetzten Prozesses
+                return
+            info["last_activity"] = time.time()
+            if kind == "ready":
+                info["state"] = "idle"
+                info["crash_streak"] = 0
+                info["qgis_error"] = payload
+                if payload:
+                    logger.warning(f"QGIS-Worker {worker_id} ohne QGIS gestartet: {payload}")
+                return
+            if kind == "exit":
+                info["state"] = "recycling"
+                return
+            future = self._futures.get(ref)
+            if kind == "started":
+                info["state"] = "busy"
+                info["current_job"] = ref
+                info["job_started_at"] = time.time()
+                if future is not None and not future.set_running_or_notify_cancel():
+                    self._futures.pop(ref, None)
+                return
+            # "done" / "failed"
+            info["state"] = "idle"
+            info["current_job"] = None
+            info["job_started_at"] = None
+            info["jobs_done"] += 1
+            future = self._futures.pop(ref, None)
+        if future is None or future.done():
+            return
+        if kind == "done":
+            future.set_result(payload)
+        else:
+            future.set_exception(RuntimeError(payload))
+
+    def _supervise(self):
+        """Abgestürzte, recycelte oder hängende Worker ersetzen"""
+        failed = []
+        with self._lock:
+            if not self._running:
+                return
+            for worker_id, info in list(self._workers.items()):
+                process = info["process"]
+                timed_out = (self.job_timeout > 0 and info["job_started_at"]
+                             and time.time() - info["job_started_at"] > self.job_timeout)
+                if timed_out:
+                    logger.error(f"QGIS-Worker {worker_id} überschreitet Job-Timeout ({self.job_timeout}s), wird beendet")
+                    process.terminate()
+                    process.join(5)
+                if process.is_alive():
+                    continue
+                # Ohne "started"-Nachricht (Absturz direkt nach Jobannahme) aus dem geteilten Speicher
+                job_id = info["current_job"] or info["job_slot"].value.decode() or None
+                if job_id:
+                    future = self._futures.pop(job_id, None)
+                    if future is not None:
+                        reason = "Timeout" if timed_out else f"Exit-Code {process.exitcode}"
+                        failed.append((future, f"QGIS-Worker {worker_id} abgebrochen ({reason})"))
+                    info["current_job"] = None
+                    info["job_started_at"] = None
+                if info["state"] == "starting":
+                    # Absturz beim Start: Neustart mit exponentiellem Backoff
+                    backoff = min(60, 2 ** info["crash_streak"])
+                    if time.time() - info["spawned_at"] < backoff:
+                        continue
+                    info["crash_streak"] += 1
+                    logger.warning(f"QGIS-Worker {worker_id} beim Start beendet (Exit-Code {process.exitcode}), Neustart")
+                elif info["state"] != "recycling":
+                    logger.warning(f"QGIS-Worker {worker_id} unerwartet beendet (Exit-Code {process.exitcode})")
+                self._spawn_worker(worker_id)
+        for future, reason in failed:
+            if not future.done():
+                future.set_exception(RuntimeError(reason))
+
+    def shutdown(self, wait: bool = True, timeout: float = 10.0):
+        """Pool beenden; offene Jobs werden mit einem Fehler abgeschlossen"""
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+            workers = [info["process"] for info in self._workers.values()]
+        for _ in workers:
+            self._task_queue.put(None)
+        if wait:
+            deadline = time.time() + timeout
+            for process in workers:
+                process.join(max(0.0, deadline - time.time()))
+        for process in workers:
+            if process.is_alive():
+                process.terminate()
+        with self._lock:
+            futures = list(self._futures.values())
+            self._futures.clear()
+        for future in futures:
+            if not future.done():
+                future.set_exception(RuntimeError("QGIS-Worker-Pool wurde beendet"))
+        logger.info("QGIS-Worker-Pool beendet")
+
+
+_pool: Optional[QgisWorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_pool() -> QgisWorkerPool:
+    """Prozessweiten Pool liefern (wird beim ersten Zugriff gestartet)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = QgisWorkerPool()
+            _pool.start()
+        return _pool
+
+
+def shutdown_worker_pool():
+    """Prozessweiten Pool beenden, falls gestartet"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
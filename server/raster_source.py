@@ -0,0 +1,190 @@
+# raster_source.py - GeoPDF einmalig zu einem Cloud-Optimized GeoTIFF rastern
+"""
+Der PDF-Treiber von GDAL rendert den Vektorinhalt bei jedem Lesezugriff neu.
+gdal2tiles liest die Quelle pro Kachel und Zoomstufe, ein GeoPDF wird also
+vielfach gerastert. Stattdessen wird das GeoPDF hier einmal in ein intern
+gekacheltes, komprimiertes COG (EPSG:3857, Übersichten bis Zoom 0) mit der
+Auflösung der Ziel-Zoomstufe gewarpt. Kachelung, dynamische Layer und Vorschauen
+lesen danach nur noch das COG.
+
+Das COG liegt neben dem PDF (<name>.cog.tif), Metadaten in <name>.cog.json.
+Es wird wiederverwendet, solange das PDF unverändert ist und die Auflösung für
+die angefragte Zoomstufe reicht.
+
+Konfiguration über Umgebungsvariablen:
+    TMS_RASTER_CACHE   1 = über COG kacheln, 0 = PDF direkt an gdal2tiles (Default: 1)
+    COG_MAX_PIXELS     Obergrenze für Breite x Höhe des COG (Default: 400000000)
+    COG_COMPRESSION    Kompression der COG-Kacheln (Default: DEFLATE)
+"""
+import os
+import json
+import math
+import time
+import logging
+from typing import Optional, Tuple
+
+from tile_grid import MercatorGrid
+
+logger = logging.getLogger(__name__)
+
+RASTER_CACHE_ENABLED = os.environ.get("TMS_RASTER_CACHE", "1") not in ("0", "false", "no")
+COG_MAX_PIXELS = int(os.environ.get("COG_MAX_PIXELS", "400000000"))
+COG_COMPRESSION = os.environ.get("COG_COMPRESSION", "DEFLATE")
+# Standardauflösung des GDAL-PDF-Treibers, falls das Dataset keine angibt
+PDF_DEFAULT_DPI = 150.0
+RASTER_EXTENSIONS = (".tif", ".tiff")
+
+
+def cog_paths(source_path: str) -> Tuple[str, str]:
+    """Pfade des COG und seiner Metadaten neben der Quelle"""
+    stem = os.path.splitext(source_path)[0]
+    return f"{stem}.cog.tif", f"{stem}.cog.json"
+
+
+def source_srs(ds, srs: Optional[str] = None):
+    """Quell-SRS als osr.SpatialReference (Override vor eingebetteter Projektion); None ohne Georeferenz"""
+    from osgeo import osr
+    if not srs and not ds.GetProjectionRef():
+        return None
+    ref = osr.SpatialReference()
+    if srs:
+        ref.SetFromUserInput(srs)
+    else:
+        ref.ImportFromWkt(ds.GetProjectionRef())
+    ref.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    return ref
+
+
+def mercator_bounds(ds, srs: Optional[str] = None) -> Tuple[float, float, float, float]:
+    """Ausdehnung eines Datasets in EPSG:3857 (Ecken und Kantenmitten transformiert)"""
+    from osgeo import osr
+    ref = source_srs(ds, srs)
+    if ref is None:
+        raise ValueError("Quelle ohne Georeferenz")
+    mercator = osr.SpatialReference()
+    mercator.ImportFromEPSG(3857)
+    mercator.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    transform = osr.CoordinateTransformation(ref, mercator)
+    gt = ds.GetGeoTransform()
+    width, height = ds.RasterXSize, ds.RasterYSize
+    xs, ys = [], []
+    for px in (0, width / 2, width):
+        for py in (0, height / 2, height):
+            x, y, _ = transform.TransformPoint(gt[0] + px * gt[1] + py * gt[2], gt[3] + px * gt[4] + py * gt[5])
+            xs.append(x)
+            ys.append(y)
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def native_maxzoom(source_path: str, dpi: float, srs: Optional[str] = None) -> Optional[int]:
+    """
+    Sinnvolle höchste Zoomstufe: Auflösung des bei dpi gerenderten GeoPDF, umgerechnet nach EPSG:3857.
+    None ohne Georeferenz.
+    """
+    from osgeo import gdal
+    ds = gdal.Open(source_path)
+    if ds is None:
+        raise RuntimeError(f"Quelle kann nicht geöffnet werden: {source_path}")
+    if not ds.GetGeoTransform(can_return_null=True) or source_srs(ds, srs) is None:
+        return None
+    minx, _, maxx, _ = mercator_bounds(ds, srs)
+    # Der PDF-Treiber öffnet mit seiner Standardauflösung; auf die Render-DPI umrechnen
+    open_dpi = float(ds.GetMetadataItem("DPI") or PDF_DEFAULT_DPI)
+    resolution = (maxx - minx) / ds.RasterXSize * open_dpi / dpi
+    return MercatorGrid().zoom_for_resolution(resolution)
+
+
+def _load_meta(meta_path: str) -> Optional[dict]:
+    try:
+        with open(meta_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def cog_options():
+    """Creation-Options der COGs (auch für direkt gerenderte DXF-Raster)"""
+    return [f"COMPRESS={COG_COMPRESSION}", "PREDICTOR=YES", "BLOCKSIZE=512", "OVERVIEWS=AUTO",
+            "OVERVIEW_RESAMPLING=AVERAGE", "BIGTIFF=IF_SAFER", "NUM_THREADS=ALL_CPUS"]
+
+
+def prepare_raster_source(source_path: str, maxzoom: int, srs: Optional[str] = None) -> dict:
+    """
+    GeoPDF für die Kachelung bis maxzoom einmalig zu einem COG rastern (oder vorhandenes wiederverwenden).
+
+    Returns:
+        dict: {path, georeferenced, srs (Override für gdal2tiles/Warp, None beim COG in EPSG:3857),
+               resolution, reused, duration_ms}
+    """
+    from osgeo import gdal
+
+    if os.path.splitext(source_path)[1].lower() in RASTER_EXTENSIONS:
+        # Rasterdaten werden bereits direkt gelesen
+        return {"path": source_path, "georeferenced": None, "srs": srs, "resolution": None,
+                "reused": True, "duration_ms": 0}
+
+    cog_path, meta_path = cog_paths(source_path)
+    stat = os.stat(source_path)
+    target_resolution = MercatorGrid().resolution(maxzoom)
+    meta = _load_meta(meta_path)
+    if (meta and os.path.exists(cog_path) and meta.get("source_mtime_ns") == stat.st_mtime_ns
+            and meta.get("source_size") == stat.st_size and meta.get("srs") == srs
+            and (not meta["georeferenced"] or meta.get("maxzoom", -1) >= maxzoom or meta.get("capped"))):
+        return {"path": cog_path, "georeferenced": meta["georeferenced"],
+                "srs": None if meta["georeferenced"] else srs, "resolution": meta.get("resolution"),
+                "reused": True, "duration_ms": 0}
+
+    started = time.perf_counter()
+    ds = gdal.Open(source_path)
+    if ds is None:
+        raise RuntimeError(f"Quelle kann nicht geöffnet werden: {source_path}")
+    georeferenced = bool(ds.GetGeoTransform(can_return_null=True)) and source_srs(ds, srs) is not None
+    tmp_path = f"{cog_path}.{os.getpid()}.tmp"
+    capped = False
+    resolution = None
+    try:
+        if georeferenced:
+            minx, miny, maxx, maxy = mercator_bounds(ds, srs)
+            width = (maxx - minx) / target_resolution
+            height = (maxy - miny) / target_resolution
+            scale = 1.0
+            if width * height > COG_MAX_PIXELS:
+                scale = math.sqrt(COG_MAX_PIXELS / (width * height))
+                capped = True
+                logger.warning(f"COG für {source_path} auf {COG_MAX_PIXELS} Pixel begrenzt (Faktor {scale:.3f})")
+            resolution = target_resolution / scale
+            # PDF in der Auflösung öffnen, die das COG braucht: einmal rendern, ohne Neuabtastung im Warp
+            base_dpi = float(ds.GetMetadataItem("DPI") or PDF_DEFAULT_DPI)
+            dpi = base_dpi * (width * scale) / ds.RasterXSize
+            ds = gdal.OpenEx(source_path, gdal.OF_RASTER, open_options=[f"DPI={dpi:.2f}"])
+            result = gdal.Warp(
+                tmp_path, ds, format="COG", srcSRS=srs or None, dstSRS="EPSG:3857",
+                xRes=resolution, yRes=resolution, resampleAlg="bilinear", dstAlpha=True,
+                multithread=True, creationOptions=cog_options(),
+            )
+        else:
+            result = gdal.Translate(tmp_path, ds, format="COG", creationOptions=cog_options())
+        if result is None:
+            raise RuntimeError(f"COG-Erstellung fehlgeschlagen: {source_path}")
+        result = None
+        ds = None
+        os.replace(tmp_path, cog_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    duration_ms = int((time.perf_counter() - started) * 1000)
+    meta = {"source_mtime_ns": stat.st_mtime_ns, "source_size": stat.st_size, "srs": srs, "maxzoom": maxzoom,
+            "georeferenced": georeferenced, "resolution": resolution, "capped": capped, "duration_ms": duration_ms}
+    with open(meta_path, "w") as f:
+        json.dump(meta, f, indent=2)
+    logger.info(f"COG erzeugt: {cog_path} (Zoom {maxzoom}, {duration_ms} ms)")
+    return {"path": cog_path, "georeferenced": georeferenced, "srs": None if georeferenced else srs,
+            "resolution": resolution, "reused": False, "duration_ms": duration_ms}
+
+
+def remove_raster_source(source_path: str) -> None:
+    """COG und Metadaten einer Quelle entfernen"""
+    for path in cog_paths(source_path):
+        if os.path.exists(path):
+            os.remove(path)
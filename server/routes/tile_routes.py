@@ -0,0 +1,241 @@
+# tile_routes.py - Auslieferung von Kacheln aus Verzeichnis- und Archiv-Stores
+"""
+GET /api/tiles/{layer}/{z}/{x}/{y}.{fmt}
+
+Liest Kacheln aus dem Store des Layers (Verzeichnis, MBTiles, PMTiles) über den
+TileStorePool, d.h. ohne Öffnen pro Anfrage. Antworten tragen einen starken ETag
+(Hash des Inhalts); passende If-None-Match-Anfragen werden mit 304 beantwortet.
+
+Kachelkoordinaten folgen dem TMS-Schema (wie gdal2tiles), mit ?scheme=xyz wird
+die y-Achse umgedreht. Mit ?v=<Version> (z.B. config.json "created") gilt die
+Antwort als unveränderlich und wird ein Jahr gecacht.
+
+Dynamische Layer (config.json "mode": "dynamic") werden nicht vorab gekachelt;
+fehlende Kacheln rendert der DynamicTileService bei Bedarf (siehe tile_renderer.py).
+Bei dünn besetzten Layern (config.json "sparse": true) und dynamischen Layern
+werden leere Kacheln im Zoombereich nicht gespeichert; sie werden je nach
+TILE_EMPTY_RESPONSE als gemeinsame transparente Kachel, 204 oder 404 beantwortet.
+
+Während ein Layer gekachelt wird, zieht eine Anfrage auf eine fehlende Kachel
+deren Metakachel vor und wartet bis SEED_WAIT_MS auf sie; ist sie dann noch
+nicht fertig, folgt 404 mit Cache-Control: no-store. Die Vorschau meldet ihren
+Ausschnitt über POST /api/tms/{layer}/viewport (siehe tile_seeder.py).
+
+Zoomstufen oberhalb von "maxzoom" bis "overzoom_maxzoom" werden nicht erzeugt,
+sondern aus der Kachel auf maxzoom vergrößert (Overzoom) und im In-Memory-LRU
+gehalten.
+
+Konfiguration über Umgebungsvariablen:
+    TILE_CACHE_MAX_AGE   max-age in Sekunden für unversionierte Anfragen (Default: 3600)
+    TILE_EMPTY_RESPONSE  Antwort für leere Kacheln: blank, 204 oder 404 (Default: blank)
+    TMS_OVERZOOM_LEVELS  Zoomstufen, die über maxzoom hinaus per Overzoom bedient werden (Default: 4)
+    TMS_MAX_ZOOM_CAP     Höchste Zoomstufe überhaupt (Default: 22)
+"""
+import os
+import asyncio
+import json
+import hashlib
+import threading
+from typing import Dict, Optional, Tuple
+
+from fastapi import APIRouter, Body, HTTPException, Query, Request, Response
+
+from tile_store import TileStoreClosed, flip_y, tile_store_pool
+from tile_renderer import dynamic_tiles
+from tile_codec import blank_png, upsample_tile
+from tile_grid import lonlat_to_mercator
+from tile_seeder import SEED_WAIT_MS, seeding
+
+router = APIRouter()
+
+# Wie STATIC_ROOT in main.py
+TILE_ROOT = os.path.join("uploads", "nodes", "static")
+TILE_CACHE_MAX_AGE = int(os.environ.get("TILE_CACHE_MAX_AGE", "3600"))
+IMMUTABLE_MAX_AGE = 31536000
+TILE_EMPTY_RESPONSE = os.environ.get("TILE_EMPTY_RESPONSE", "blank")
+TMS_OVERZOOM_LEVELS = int(os.environ.get("TMS_OVERZOOM_LEVELS", "4"))
+TMS_MAX_ZOOM_CAP = int(os.environ.get("TMS_MAX_ZOOM_CAP", "22"))
+
+MEDIA_TYPES = {
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+    "pbf": "application/x-protobuf",
+    "mvt": "application/vnd.mapbox-vector-tile",
+}
+RASTER_FORMATS = ("png", "jpg", "jpeg", "webp")
+
+
+def layer_dir(layer: str) -> str:
+    """Layer-Verzeichnis bestimmen (mit Schutz gegen Path Traversal)"""
+    if not layer or ".." in layer or "/" in layer or "\\" in layer:
+        raise HTTPException(status_code=400, detail="Ungültige Layer-ID")
+    return os.path.join(TILE_ROOT, layer)
+
+
+_config_cache: Dict[str, Tuple[int, dict]] = {}
+_config_lock = threading.Lock()
+
+
+def layer_config(path: str) -> dict:
+    """config.json eines Layers lesen (zwischengespeichert bis zur nächsten Änderung)"""
+    config_path = os.path.join(path, "config.json")
+    try:
+        mtime = os.stat(config_path).st_mtime_ns
+    except OSError:
+        return {}
+    with _config_lock:
+        cached = _config_cache.get(config_path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    try:
+        with open(config_path) as f:
+            config = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    with _config_lock:
+        _config_cache[config_path] = (mtime, config)
+    return config
+
+
+def tile_etag(data: bytes) -> str:
+    return '"' + hashlib.blake2b(data, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match auswerten (Liste von ETags oder *; schwache Validatoren zählen bei GET)"""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == "*" or tag == etag:
+            return True
+    return False
+
+
+async def read_tile(path: str, config: dict, z: int, x: int, y: int) -> Optional[bytes]:
+    """Kachel aus dem Store bzw. vom DynamicTileService lesen; None, wenn es sie nicht gibt"""
+    if config.get("mode") == "dynamic":
+        try:
+            return await dynamic_tiles.get_tile(path, config, z, x, y)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Rendern der Kachel fehlgeschlagen: {e}")
+    for attempt in range(2):
+        store = tile_store_pool.get(path)
+        if store is None:
+            raise HTTPException(status_code=404, detail="Layer nicht gefunden")
+        try:
+            data = await asyncio.to_thread(store.get_tile, z, x, y)
+            break
+        except TileStoreClosed:
+            # Archiv wurde zwischenzeitlich ersetzt: einmal mit dem neuen Store versuchen
+            if attempt:
+                raise
+    return bytes(data) if data is not None else None
+
+
+async def overzoom_tile(path: str, config: dict, z: int, x: int, y: int) -> Optional[bytes]:
+    """Kachel oberhalb von maxzoom aus dem Ausschnitt der maxzoom-Kachel vergrößern (mit Cache)"""
+    key = (path, z, x, y)
+    data = dynamic_tiles.cache.get(key)
+    if data is not None:
+        return data
+    levels = z - config["maxzoom"]
+    parent = await read_tile(path, config, config["maxzoom"], x >> levels, y >> levels)
+    if parent is None:
+        return None
+    col = x - ((x >> levels) << levels)
+    # TMS: y zählt nach Norden, Bildzeilen von oben
+    row = (1 << levels) - 1 - (y - ((y >> levels) << levels))
+    data = await asyncio.to_thread(upsample_tile, parent, levels, col, row, profile=config.get("encoding"))
+    dynamic_tiles.cache.put(key, data)
+    return data
+
+
+async def serve_tile(request: Request, layer: str, z: int, x: int, y: int, fmt: str,
+                     scheme: str = "tms", version: Optional[str] = None) -> Response:
+    """Kachel mit ETag/Cache-Headern ausliefern (gemeinsam für /api/tiles und /api/tms)"""
+    if z < 0 or x < 0 or y < 0 or z > 30:
+        raise HTTPException(status_code=400, detail="Ungültige Kachelkoordinaten")
+    if scheme == "xyz":
+        y = flip_y(z, y)
+    path = layer_dir(layer)
+    config = layer_config(path)
+    maxzoom = config.get("maxzoom", z)
+    overzoom_maxzoom = config.get("overzoom_maxzoom", maxzoom)
+    # Rasterkacheln werden im Format des Layers (Kodierprofil) ausgeliefert, unabhängig von der Endung der URL
+    raster = fmt in RASTER_FORMATS
+    media_type = MEDIA_TYPES.get(config.get("tile_format", fmt) if raster else fmt, "application/octet-stream")
+    if maxzoom < z <= overzoom_maxzoom and raster:
+        data = await overzoom_tile(path, config, z, x, y)
+    else:
+        data = await read_tile(path, config, z, x, y)
+    scheduler = seeding.get(layer)
+    if data is None and scheduler is not None:
+        # Layer wird noch gekachelt: Block der Kachel vorziehen und kurz auf ihn warten
+        levels = max(0, z - maxzoom)
+        event = scheduler.bump(z - levels, x >> levels, y >> levels)
+        if event is not None and await asyncio.to_thread(event.wait, SEED_WAIT_MS / 1000.0):
+            data = await (overzoom_tile(path, config, z, x, y) if levels else read_tile(path, config, z, x, y))
+        if data is None:
+            # Noch nicht gerendert: nicht als leere Kachel cachen lassen
+            raise HTTPException(status_code=404, detail="Kachel wird noch erzeugt", headers={"Cache-Control": "no-store"})
+    if data is None:
+        in_range = config.get("minzoom", 0) <= z <= max(maxzoom, overzoom_maxzoom)
+        if not (config.get("sparse") or config.get("mode") == "dynamic") or not in_range or not raster:
+            raise HTTPException(status_code=404, detail="Kachel nicht gefunden")
+        # Leere Kachel eines dünn besetzten Layers
+        if TILE_EMPTY_RESPONSE == "204":
+            return Response(status_code=204, headers={"Cache-Control": f"public, max-age={TILE_CACHE_MAX_AGE}"})
+        if TILE_EMPTY_RESPONSE == "404":
+            raise HTTPException(status_code=404, detail="Leere Kachel")
+        data = blank_png()
+        media_type = MEDIA_TYPES["png"]
+    data = bytes(data)
+
+    etag = tile_etag(data)
+    cache_control = (f"public, max-age={IMMUTABLE_MAX_AGE}, immutable" if version
+                     else f"public, max-age={TILE_CACHE_MAX_AGE}")
+    if scheduler is not None and scheduler.partial(z):
+        # Vorläufige Elternkachel während der Kachelung: wird mit jedem Block vollständiger
+        cache_control = "no-store"
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=data, media_type=media_type, headers=headers)
+
+
+@router.get("/tiles/{layer}/{z}/{x}/{y}.{fmt}")
+async def get_tile(
+    layer: str,
+    z: int,
+    x: int,
+    y: int,
+    fmt: str,
+    request: Request,
+    scheme: str = Query("tms", pattern="^(tms|xyz)$"),
+    v: Optional[str] = Query(None, description="Layer-Version für unveränderliches Caching")
+):
+    """Kachel eines TMS-Layers aus Verzeichnis, MBTiles oder PMTiles"""
+    return await serve_tile(request, layer, z, x, y, fmt, scheme=scheme, version=v)
+
+
+@router.post("/tms/{layer}/viewport")
+async def report_viewport(layer: str, body: dict = Body(...)):
+    """Ausschnitt der Vorschau (bounds [west, süd, ost, nord] in WGS84) für die Kachelreihenfolge melden"""
+    layer_dir(layer)
+    bounds = body.get("bounds") if isinstance(body, dict) else None
+    if not isinstance(bounds, list) or len(bounds) != 4:
+        raise HTTPException(status_code=400, detail="bounds muss [west, süd, ost, nord] sein")
+    try:
+        west, south, east, north = (float(value) for value in bounds)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="bounds muss aus Zahlen bestehen")
+    scheduler = seeding.get(layer)
+    if scheduler is None:
+        return {"seeding": False}
+    scheduler.set_viewport(lonlat_to_mercator(west, south) + lonlat_to_mercator(east, north))
+    return {"seeding": True, "pending": len(scheduler)}
@@ -0,0 +1,362 @@
+# upload_routes.py - Fortsetzbare Uploads in Blöcken
+"""
+Protokoll für große Uploads, die bei Verbindungsabbrüchen fortgesetzt werden können:
+
+    POST   /api/uploads                        Upload anlegen {filename, size, sha256?}
+    PUT    /api/uploads/{upload_id}?offset=N   Block ab Offset N (Body = Rohdaten, Header X-Chunk-SHA256)
+    GET    /api/uploads/{upload_id}            Status und bereits empfangene Blöcke
+    POST   /api/uploads/{upload_id}/finalize   Vollständigkeit prüfen und Datei registrieren
+    DELETE /api/uploads/{upload_id}            Upload abbrechen
+
+Die Zieldatei wird beim Anlegen in voller Größe (sparse) vorbelegt, jeder Block
+wird direkt an seinen Offset geschrieben. Blöcke dürfen daher parallel und in
+beliebiger Reihenfolge eintreffen, ein Zusammensetzen entfällt. Der Zustand liegt
+in files.db, so dass ein Upload auch nach einem Server-Neustart fortgesetzt werden kann.
+Scheitert ein Block (Prüfsumme, Größe, Verbindungsabbruch), nachdem bereits Daten
+geschrieben wurden, gelten alle bestätigten Blöcke in diesem Bereich wieder als
+fehlend und müssen erneut gesendet werden.
+
+Der Gesamt-Hash wird beim Empfang fortgeschrieben, solange die Blöcke lückenlos in
+Reihenfolge eintreffen (der übliche Fall bei sequentiellen Clients); finalize muss
+die Datei dann nicht erneut lesen. Treffen Blöcke parallel, außer der Reihe, bei
+einem anderen Worker-Prozess oder nach einem Neustart ein, lässt sich SHA-256 nicht
+aus den Block-Hashes zusammensetzen: finalize liest die Datei dann einmal vollständig.
+"""
+import os
+import uuid
+import asyncio
+import hashlib
+import shutil
+import sqlite3
+from datetime import datetime, timedelta
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request
+
+from deps import verify_token, get_db, logger
+from conversion_cache import file_sha256
+from upload_store import (
+    BLOB_DIR, UPLOAD_DIR, ALLOWED_UPLOAD_EXTENSIONS, blob_path, init_blob_table, register_upload
+)
+
+router = APIRouter()
+
+UPLOAD_SESSION_CHUNK_SIZE = int(os.environ.get("UPLOAD_SESSION_CHUNK_SIZE", str(8 * 1024 * 1024)))
+UPLOAD_SESSION_MAX_CHUNK = int(os.environ.get("UPLOAD_SESSION_MAX_CHUNK", str(64 * 1024 * 1024)))
+UPLOAD_SESSION_TTL_HOURS = int(os.environ.get("UPLOAD_SESSION_TTL_HOURS", "48"))
+
+# Fortgeschriebener Gesamt-Hash je Upload: {"position", "digest", "chunks": [(offset, sha256)]}
+_running_hashes: dict = {}
+
+
+def init_upload_tables(conn):
+    """Erstellt die Tabellen für fortsetzbare Uploads und räumt abgelaufene Uploads auf"""
+    init_blob_table(conn)
+    cursor = conn.cursor()
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS upload_sessions (
+        id TEXT PRIMARY KEY,
+        filename TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        chunk_size INTEGER,
+        sha256 TEXT,
+        temp_path TEXT,
+        status TEXT DEFAULT 'active',
+        file_id TEXT,
+        created_at TEXT,
+        updated_at TEXT,
+        created_by TEXT
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS upload_chunks (
+        upload_id TEXT NOT NULL,
+        offset INTEGER NOT NULL,
+        length INTEGER NOT NULL,
+        sha256 TEXT,
+        received_at TEXT,
+        PRIMARY KEY (upload_id, offset)
+    )
+    """)
+
+    expired = (datetime.utcnow() - timedelta(hours=UPLOAD_SESSION_TTL_HOURS)).isoformat()
+    stale = cursor.execute(
+        "SELECT id, temp_path FROM upload_sessions WHERE status = 'active' AND updated_at < ?", (expired,)
+    ).fetchall()
+    for upload_id, temp_path in stale:
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+        cursor.execute("DELETE FROM upload_chunks WHERE upload_id = ?", (upload_id,))
+        cursor.execute("UPDATE upload_sessions SET status = 'expired' WHERE id = ?", (upload_id,))
+    if stale:
+        logger.info(f"{len(stale)} abgelaufene Uploads entfernt")
+    conn.commit()
+
+
+def _get_session(db: sqlite3.Connection, upload_id: str, user: str) -> dict:
+    row = db.execute(
+        "SELECT id, filename, size, chunk_size, sha256, temp_path, status, file_id, created_by FROM upload_sessions WHERE id = ?",
+        (upload_id,)
+    ).fetchone()
+    if not row or row[8] != user:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return {"id": row[0], "filename": row[1], "size": row[2], "chunk_size": row[3], "sha256": row[4],
+            "temp_path": row[5], "status": row[6], "file_id": row[7]}
+
+
+def _received_ranges(db: sqlite3.Connection, upload_id: str) -> list:
+    return [{"offset": offset, "length": length}
+            for offset, length in db.execute(
+                "SELECT offset, length FROM upload_chunks WHERE upload_id = ? ORDER BY offset", (upload_id,))]
+
+
+def _missing_ranges(ranges: list, size: int) -> list:
+    """Lücken zwischen den empfangenen Blöcken bestimmen"""
+    missing = []
+    position = 0
+    for chunk in ranges:
+        if chunk["offset"] > position:
+            missing.append({"offset": position, "length": chunk["offset"] - position})
+        position = max(position, chunk["offset"] + chunk["length"])
+    if position < size:
+        missing.append({"offset": position, "length": size - position})
+    return missing
+
+
+def _discard_range(db: sqlite3.Connection, upload_id: str, start: int, end: int) -> None:
+    """Vermerkte Blöcke, die [start, end) überlappen, und den fortgeschriebenen Hash verwerfen"""
+    _running_hashes.pop(upload_id, None)
+    db.execute("DELETE FROM upload_chunks WHERE upload_id = ? AND offset < ? AND offset + length > ?",
+               (upload_id, end, start))
+    db.commit()
+
+
+def _running_sha256(db: sqlite3.Connection, upload_id: str, size: int):
+    """
+    Fortgeschriebenen Gesamt-Hash übernehmen, wenn er genau die vermerkten Blöcke abdeckt
+
+    Returns:
+        str: Hex-Digest oder None, wenn die Datei neu gelesen werden muss
+    """
+    running = _running_hashes.pop(upload_id, None)
+    if running is None or running["position"] != size:
+        return None
+    chunks = [tuple(row) for row in db.execute(
+        "SELECT offset, sha256 FROM upload_chunks WHERE upload_id = ? ORDER BY offset", (upload_id,))]
+    # Ein erneut gesendeter Block (z.B. über einen anderen Worker) macht den Hash ungültig
+    if chunks != running["chunks"]:
+        return None
+    return running["digest"].hexdigest()
+
+
+def _restore_upload(db: sqlite3.Connection, temp_path: str, save_path: str, sha256: str) -> None:
+    """Nach fehlgeschlagener Registrierung die Daten wieder unter temp_path ablegen"""
+    db.rollback()
+    if os.path.exists(save_path):
+        os.replace(save_path, temp_path)
+        return
+    existing = blob_path(db, sha256)
+    if existing:
+        # Inhalt war bereits vorhanden, store_blob hat die Datei verworfen
+        shutil.copyfile(existing, temp_path)
+        return
+    # Von store_blob verschoben, der Verweis wurde aber nicht gespeichert
+    moved = os.path.join(BLOB_DIR, f"{sha256}{os.path.splitext(save_path)[1].lower()}")
+    if os.path.exists(moved):
+        os.replace(moved, temp_path)
+
+
+@router.post("/uploads")
+async def create_upload(
+    data: dict = Body(...),
+    user: str = Depends(verify_token),
+    db: sqlite3.Connection = Depends(get_db)
+):
+    """Fortsetzbaren Upload anlegen und Zieldatei vorbelegen"""
+    filename = data.get("filename") or ""
+    ext = os.path.splitext(filename)[1].lower()
+    if ext not in ALLOWED_UPLOAD_EXTENSIONS:
+        raise HTTPException(status_code=400, detail="Only DXF and TIF/GeoTIFF files are allowed")
+    try:
+        size = int(data.get("size"))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="size is required")
+    if size <= 0:
+        raise HTTPException(status_code=400, detail="size must be positive")
+    chunk_size = min(int(data.get("chunk_size") or UPLOAD_SESSION_CHUNK_SIZE), UPLOAD_SESSION_MAX_CHUNK)
+
+    upload_id = str(uuid.uuid4())
+    temp_path = os.path.join(UPLOAD_DIR, f".{upload_id}{ext}.upload")
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    with open(temp_path, "wb") as f:
+        f.truncate(size)
+
+    now = datetime.utcnow().isoformat()
+    db.execute(
+        "INSERT INTO upload_sessions (id, filename, size, chunk_size, sha256, temp_path, status, created_at, updated_at, created_by) "
+        "VALUES (?, ?, ?, ?, ?, ?, 'active', ?, ?, ?)",
+        (upload_id, filename, size, chunk_size, (data.get("sha256") or "").lower() or None, temp_path, now, now, user)
+    )
+    db.commit()
+    logger.info(f"Upload angelegt: {filename} ({size} Bytes, ID: {upload_id})")
+    return {"upload_id": upload_id, "size": size, "chunk_size": chunk_size,
+            "total_chunks": (size + chunk_size - 1) // chunk_size}
+
+
+@router.get("/uploads/{upload_id}")
+async def get_upload(upload_id: str, user: str = Depends(verify_token), db: sqlite3.Connection = Depends(get_db)):
+    """Status eines Uploads inkl. empfangener und fehlender Bereiche (zum Fortsetzen)"""
+    session = _get_session(db, upload_id, user)
+    ranges = _received_ranges(db, upload_id)
+    return {
+        "upload_id": upload_id,
+        "filename": session["filename"],
+        "size": session["size"],
+        "chunk_size": session["chunk_size"],
+        "status": session["status"],
+        "file_id": session["file_id"],
+        "received_bytes": sum(chunk["length"] for chunk in ranges),
+        "received": ranges,
+        "missing": _missing_ranges(ranges, session["size"]),
+    }
+
+
+@router.put("/uploads/{upload_id}")
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0),
+    user: str = Depends(verify_token),
+    db: sqlite3.Connection = Depends(get_db)
+):
+    """Block ab offset schreiben. Die Prüfsumme (Header X-Chunk-SHA256) wird beim Schreiben berechnet und verglichen."""
+    session = _get_session(db, upload_id, user)
+    if session["status"] != "active":
+        raise HTTPException(status_code=409, detail=f"Upload is {session['status']}")
+    if offset >= session["size"]:
+        raise HTTPException(status_code=416, detail="Offset outside of file")
+    expected = (request.headers.get("x-chunk-sha256") or "").lower() or None
+
+    # Schließt der Block lückenlos an, wird der Gesamt-Hash gleich mit fortgeschrieben
+    running = _running_hashes.get(upload_id)
+    if running is None and offset == 0:
+        running = {"position": 0, "digest": hashlib.sha256(), "chunks": []}
+    total = running["digest"].copy() if running is not None and running["position"] == offset else None
+
+    digest = hashlib.sha256()
+    length = 0
+    written = 0
+    limit = min(UPLOAD_SESSION_MAX_CHUNK, session["size"] - offset)
+    fd = os.open(session["temp_path"], os.O_WRONLY)
+    try:
+        try:
+            buffer = bytearray()
+            async for part in request.stream():
+                length += len(part)
+                if length > limit:
+                    raise HTTPException(status_code=413, detail="Chunk exceeds file size or maximum chunk size")
+                digest.update(part)
+                if total is not None:
+                    total.update(part)
+                buffer += part
+                if len(buffer) >= 1024 * 1024:
+                    await asyncio.to_thread(os.pwrite, fd, bytes(buffer), offset + written)
+                    written += len(buffer)
+                    buffer.clear()
+            if buffer:
+                await asyncio.to_thread(os.pwrite, fd, bytes(buffer), offset + written)
+                written += len(buffer)
+        finally:
+            os.close(fd)
+
+        if length == 0:
+            raise HTTPException(status_code=400, detail="Empty chunk")
+        checksum = digest.hexdigest()
+        if expected and expected != checksum:
+            logger.warning(f"Prüfsumme von Block {offset} für Upload {upload_id} stimmt nicht")
+            raise HTTPException(status_code=422, detail="Chunk checksum mismatch")
+    except BaseException:
+        if written:
+            # Die Daten wurden schon geschrieben: bereits bestätigte Blöcke in diesem Bereich
+            # sind überschrieben und müssen erneut gesendet werden
+            _discard_range(db, upload_id, offset, offset + written)
+        raise
+
+    now = datetime.utcnow().isoformat()
+    db.execute(
+        "INSERT OR REPLACE INTO upload_chunks (upload_id, offset, length, sha256, received_at) VALUES (?, ?, ?, ?, ?)",
+        (upload_id, offset, length, checksum, now)
+    )
+    db.execute("UPDATE upload_sessions SET updated_at = ? WHERE id = ?", (now, upload_id))
+    db.commit()
+    # Nur übernehmen, wenn kein anderer Block den Stand inzwischen verändert hat
+    if total is not None and _running_hashes.get(upload_id, running) is running:
+        _running_hashes[upload_id] = {"position": offset + length, "digest": total,
+                                      "chunks": running["chunks"] + [(offset, checksum)]}
+    return {"upload_id": upload_id, "offset": offset, "length": length, "sha256": checksum}
+
+
+@router.post("/uploads/{upload_id}/finalize")
+async def finalize_upload(upload_id: str, user: str = Depends(verify_token), db: sqlite3.Connection = Depends(get_db)):
+    """Vollständigkeit prüfen, Gesamt-Hash bilden und die Datei wie bei /api/upload registrieren"""
+    session = _get_session(db, upload_id, user)
+    if session["status"] == "completed":
+        return {"upload_id": upload_id, "file_id": session["file_id"], "status": "completed"}
+    if session["status"] != "active":
+        raise HTTPException(status_code=409, detail=f"Upload is {session['status']}")
+
+    missing = _missing_ranges(_received_ranges(db, upload_id), session["size"])
+    if missing:
+        raise HTTPException(status_code=409, detail={"message": "Upload incomplete", "missing": missing})
+
+    # Gleichzeitige Finalize-Aufrufe ausschließen
+    claimed = db.execute("UPDATE upload_sessions SET status = 'finalizing' WHERE id = ? AND status = 'active'", (upload_id,))
+    db.commit()
+    if claimed.rowcount != 1:
+        raise HTTPException(status_code=409, detail="Upload is already being finalized")
+    save_path = None
+    try:
+        sha256 = _running_sha256(db, upload_id, session["size"])
+        if sha256 is None:
+            sha256 = await asyncio.to_thread(file_sha256, session["temp_path"])
+        if session["sha256"] and session["sha256"] != sha256:
+            raise HTTPException(status_code=422, detail="File checksum mismatch")
+
+        file_id = str(uuid.uuid4())
+        ext = os.path.splitext(session["filename"])[1].lower()
+        save_path = os.path.join(UPLOAD_DIR, f"{file_id}{ext}")
+        os.replace(session["temp_path"], save_path)
+        entry = await asyncio.to_thread(register_upload, db, file_id, session["filename"], save_path, session["size"], sha256, user)
+    except BaseException:
+        # Daten zurücklegen, damit finalize wiederholt werden kann
+        status = "active"
+        if save_path is not None:
+            try:
+                _restore_upload(db, session["temp_path"], save_path, sha256)
+            except OSError as e:
+                logger.error(f"Upload {upload_id} konnte nicht wiederhergestellt werden: {e}")
+            if not os.path.exists(session["temp_path"]):
+                status = "failed"
+        db.execute("UPDATE upload_sessions SET status = ? WHERE id = ?", (status, upload_id))
+        db.commit()
+        raise
+
+    db.execute("UPDATE upload_sessions SET status = 'completed', file_id = ?, temp_path = NULL, updated_at = ? WHERE id = ?",
+               (file_id, datetime.utcnow().isoformat(), upload_id))
+    db.execute("DELETE FROM upload_chunks WHERE upload_id = ?", (upload_id,))
+    db.commit()
+    logger.info(f"Fortsetzbarer Upload abgeschlossen: {session['filename']} (ID: {file_id})")
+    return {"upload_id": upload_id, "status": "completed", **entry}
+
+
+@router.delete("/uploads/{upload_id}")
+async def abort_upload(upload_id: str, user: str = Depends(verify_token), db: sqlite3.Connection = Depends(get_db)):
+    """Upload abbrechen und bereits empfangene Daten verwerfen"""
+    session = _get_session(db, upload_id, user)
+    if session["status"] == "active" and session["temp_path"] and os.path.exists(session["temp_path"]):
+        os.remove(session["temp_path"])
+    _running_hashes.pop(upload_id, None)
+    db.execute("DELETE FROM upload_chunks WHERE upload_id = ?", (upload_id,))
+    db.execute("UPDATE upload_sessions SET status = 'aborted', temp_path = NULL, updated_at = ? WHERE id = ?",
+               (datetime.utcnow().isoformat(), upload_id))
+    db.commit()
+    return {"upload_id": upload_id, "status": "aborted"}
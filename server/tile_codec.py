@@ -0,0 +1,236 @@
+# tile_codec.py - Kacheln dekodieren und kodieren (GDAL /vsimem, NumPy)
+"""
+Kacheln werden als NumPy-Arrays der Form (Bänder, Höhe, Breite) in uint8
+verarbeitet. PNG-Dekodierung und -Kodierung laufen über GDAL im Speicher
+(/vsimem), damit keine weitere Bildbibliothek nötig ist.
+
+Kodierprofile pro Layer (config.json "encoding"):
+
+    png    RGBA-PNG, zlevel 1-9 (Default 6)
+    png8   8-Bit-Paletten-PNG (Median-Cut, colors <= 256), binäre Transparenz
+    webp   WebP, lossless (Default) oder quality 1-100
+    jpeg   JPEG mit quality 1-100 (Default 85), transparente Bereiche weiß
+
+Konfiguration über Umgebungsvariablen:
+    TMS_TILE_ENCODING   Standardprofil (Formatname, Default: png)
+"""
+import os
+import uuid
+import zlib
+import struct
+from functools import lru_cache
+from typing import Optional, Union
+
+DEFAULT_ENCODING = os.environ.get("TMS_TILE_ENCODING", "png")
+ENCODING_DEFAULTS = {
+    "png": {"zlevel": 6},
+    "png8": {"colors": 256, "zlevel": 6},
+    "webp": {"lossless": True, "quality": 90},
+    "jpeg": {"quality": 85},
+}
+ENCODING_EXTENSIONS = {"png": "png", "png8": "png", "webp": "webp", "jpeg": "jpg"}
+
+
+def _parse_bool(key: str, value) -> bool:
+    """Boolesche Option aus JSON oder Formularwerten ("false" ist False)"""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in ("1", "true", "yes", "on", "0", "false", "no", "off"):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    raise ValueError(f"{key} muss true oder false sein")
+
+
+def _parse_int(key: str, value) -> int:
+    if isinstance(value, bool):
+        raise ValueError(f"{key} muss eine ganze Zahl sein")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{key} muss eine ganze Zahl sein")
+
+
+def encoding_profile(spec: Union[str, dict, None] = None) -> dict:
+    """
+    Kodierprofil normalisieren (Formatname oder dict mit "format" und Optionen).
+
+    Raises:
+        ValueError: unbekanntes Format, ungültiger Typ oder Option außerhalb des Wertebereichs
+    """
+    if spec is None:
+        spec = DEFAULT_ENCODING
+    if isinstance(spec, str):
+        spec = {"format": spec}
+    if not isinstance(spec, dict):
+        raise ValueError("Kodierprofil muss ein Formatname oder ein Objekt sein")
+    fmt = str(spec.get("format", DEFAULT_ENCODING)).lower()
+    if fmt == "jpg":
+        fmt = "jpeg"
+    if fmt not in ENCODING_DEFAULTS:
+        raise ValueError(f"Unbekanntes Kachelformat '{fmt}' (erlaubt: {', '.join(ENCODING_DEFAULTS)})")
+    profile = {"format": fmt}
+    for key, default in ENCODING_DEFAULTS[fmt].items():
+        value = spec.get(key, default)
+        profile[key] = _parse_bool(key, value) if isinstance(default, bool) else _parse_int(key, value)
+    limits = {"zlevel": (1, 9), "quality": (1, 100), "colors": (2, 256)}
+    for key, (low, high) in limits.items():
+        if key in profile and not low <= profile[key] <= high:
+            raise ValueError(f"{key} muss zwischen {low} und {high} liegen")
+    return profile
+
+
+def encoding_extension(profile: Optional[dict] = None) -> str:
+    """Dateiendung der Kacheln eines Profils"""
+    return ENCODING_EXTENSIONS[(profile or encoding_profile())["format"]]
+
+
+@lru_cache(maxsize=4)
+def blank_png(size: int = 256) -> bytes:
+    """Vollständig transparente RGBA-Kachel (gemeinsam für alle leeren Kacheln)"""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    rows = (b"\0" + b"\0" * 4 * size) * size
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 6, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(rows, 9)) + chunk(b"IEND", b""))
+
+
+def read_vsimem(path: str) -> bytes:
+    """Inhalt einer /vsimem-Datei lesen"""
+    from osgeo import gdal
+    handle = gdal.VSIFOpenL(path, "rb")
+    if handle is None:
+        raise RuntimeError(f"{path} kann nicht gelesen werden")
+    try:
+        gdal.VSIFSeekL(handle, 0, 2)
+        length = gdal.VSIFTellL(handle)
+        gdal.VSIFSeekL(handle, 0, 0)
+        return bytes(gdal.VSIFReadL(1, length, handle))
+    finally:
+        gdal.VSIFCloseL(handle)
+
+
+def encode_dataset(ds, fmt: str = "PNG", options: Optional[list] = None) -> bytes:
+    """GDAL-Dataset in ein Bildformat kodieren"""
+    from osgeo import gdal
+    path = f"/vsimem/tile_{uuid.uuid4().hex}.{fmt.lower()}"
+    try:
+        if gdal.Translate(path, ds, format=fmt, creationOptions=options or []) is None:
+            raise RuntimeError(f"Kodierung als {fmt} fehlgeschlagen")
+        return read_vsimem(path)
+    finally:
+        gdal.Unlink(path)
+
+
+def encode_array(array, fmt: str = "PNG", options: Optional[list] = None) -> bytes:
+    """Array (Bänder, Höhe, Breite) uint8 kodieren"""
+    from osgeo import gdal
+    bands, height, width = array.shape
+    ds = gdal.GetDriverByName("MEM").Create("", width, height, bands, gdal.GDT_Byte)
+    for index in range(bands):
+        ds.GetRasterBand(index + 1).WriteArray(array[index])
+    if bands in (2, 4):
+        ds.GetRasterBand(bands).SetColorInterpretation(gdal.GCI_AlphaBand)
+    return encode_dataset(ds, fmt, options)
+
+
+def _encode_palette(array, colors: int, zlevel: int) -> bytes:
+    """RGBA-Array auf eine Palette mit colors Einträgen reduzieren (letzter Eintrag transparent)"""
+    from osgeo import gdal
+    bands, height, width = array.shape
+    rgb = gdal.GetDriverByName("MEM").Create("", width, height, 3, gdal.GDT_Byte)
+    for index in range(3):
+        rgb.GetRasterBand(index + 1).WriteArray(array[min(index, bands - 1)])
+    table = gdal.ColorTable()
+    opaque = colors - 1 if bands in (2, 4) else colors
+    gdal.ComputeMedianCutPCT(rgb.GetRasterBand(1), rgb.GetRasterBand(2), rgb.GetRasterBand(3), opaque, table)
+    paletted = gdal.GetDriverByName("MEM").Create("", width, height, 1, gdal.GDT_Byte)
+    gdal.DitherRGB2PCT(rgb.GetRasterBand(1), rgb.GetRasterBand(2), rgb.GetRasterBand(3),
+                       paletted.GetRasterBand(1), table)
+    if bands in (2, 4):
+        indices = paletted.GetRasterBand(1).ReadAsArray()
+        indices[array[-1] < 128] = opaque
+        paletted.GetRasterBand(1).WriteArray(indices)
+        table.SetColorEntry(opaque, (0, 0, 0, 0))
+    paletted.GetRasterBand(1).SetRasterColorTable(table)
+    return encode_dataset(paletted, "PNG", [f"ZLEVEL={zlevel}"])
+
+
+def encode_tile(array, profile: Optional[dict] = None) -> bytes:
+    """Kachel (Bänder, Höhe, Breite) uint8 mit einem Kodierprofil (siehe encoding_profile) kodieren"""
+    profile = profile or encoding_profile()
+    fmt = profile["format"]
+    if fmt == "png":
+        return encode_array(array, "PNG", [f"ZLEVEL={profile['zlevel']}"])
+    if fmt == "png8":
+        return _encode_palette(array, profile["colors"], profile["zlevel"])
+    if fmt == "webp":
+        options = ["LOSSLESS=TRUE"] if profile["lossless"] else [f"QUALITY={profile['quality']}"]
+        return encode_array(array, "WEBP", options)
+    # JPEG kennt keine Transparenz: auf Weiß (Planhintergrund) überblenden
+    import numpy as np
+    if array.shape[0] in (2, 4):
+        alpha = array[-1:].astype(np.uint16)
+        color = array[:-1].astype(np.uint16)
+        array = ((color * alpha + 255 * (255 - alpha) + 127) // 255).astype(np.uint8)
+    return encode_array(array, "JPEG", [f"QUALITY={profile['quality']}"])
+
+
+def _open_expanded(path: str):
+    """Kachel öffnen; Paletten-PNGs werden (inkl. Transparenz) in RGBA aufgelöst"""
+    from osgeo import gdal
+    ds = gdal.Open(path)
+    if ds is None:
+        raise RuntimeError("Kachel kann nicht dekodiert werden")
+    if ds.RasterCount == 1 and ds.GetRasterBand(1).GetColorTable() is not None:
+        ds = gdal.Translate("", ds, format="MEM", rgbExpand="rgba")
+    return ds
+
+
+def upsample_tile(data: bytes, levels: int, col: int, row: int, tile_size: int = 256,
+                  resampling: str = "bilinear", profile: Optional[dict] = None) -> bytes:
+    """
+    Ausschnitt einer Kachel auf volle Kachelgröße vergrößern (Overzoom).
+
+    Args:
+        levels: Zoomstufen unterhalb der Kachel (Ausschnitt = tile_size / 2**levels Pixel)
+        col, row: Position des Ausschnitts, Zeile von oben gezählt
+    """
+    from osgeo import gdal
+    size = tile_size / (2 ** levels)
+    src_path = f"/vsimem/overzoom_{uuid.uuid4().hex}"
+    gdal.FileFromMemBuffer(src_path, data)
+    try:
+        src = _open_expanded(src_path)
+        ds = gdal.Translate("", src, format="MEM", srcWin=[col * size, row * size, size, size],
+                            width=tile_size, height=tile_size, resampleAlg=resampling)
+        if ds is None:
+            raise RuntimeError("Overzoom der Kachel fehlgeschlagen")
+        return encode_tile(ds.ReadAsArray(), profile)
+    finally:
+        gdal.Unlink(src_path)
+
+
+def decode_tile(data: bytes, bands: int = 4):
+    """Kachel in ein Array (bands, Höhe, Breite) dekodieren; Graustufen/RGB werden auf bands erweitert"""
+    import numpy as np
+    from osgeo import gdal
+    path = f"/vsimem/decode_{uuid.uuid4().hex}"
+    gdal.FileFromMemBuffer(path, data)
+    try:
+        ds = _open_expanded(path)
+        array = ds.ReadAsArray()
+        ds = None
+    finally:
+        gdal.Unlink(path)
+    if array.ndim == 2:
+        array = array[np.newaxis]
+    if array.shape[0] == bands:
+        return array
+    # Fehlende Farb- bzw. Alphabänder ergänzen (Graustufen -> RGB, ohne Alpha -> deckend)
+    color = array[:1].repeat(3, axis=0) if array.shape[0] in (1, 2) else array[:3]
+    if bands == 3:
+        return np.ascontiguousarray(color)
+    alpha = array[-1:] if array.shape[0] in (2, 4) else np.full_like(array[:1], 255)
+    return np.concatenate([color, alpha])
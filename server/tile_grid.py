@@ -0,0 +1,63 @@
+# tile_grid.py - Kachelraster (Web Mercator, TMS-Schema wie gdal2tiles)
+"""
+Geometrie des globalen Web-Mercator-Kachelrasters (EPSG:3857), wie es
+gdal2tiles im Standardprofil "mercator" verwendet. Zeilen werden im TMS-Schema
+gezählt (y = 0 unten).
+"""
+import math
+from typing import List, Tuple
+
+TILE_SIZE = 256
+ORIGIN_SHIFT = 2 * math.pi * 6378137 / 2.0  # 20037508.342789244
+MAX_ZOOM = 30
+
+
+class MercatorGrid:
+    """Globales Web-Mercator-Kachelraster"""
+    srs = "EPSG:3857"
+
+    def __init__(self, tile_size: int = TILE_SIZE):
+        self.tile_size = tile_size
+        self.initial_resolution = 2 * ORIGIN_SHIFT / tile_size
+
+    def resolution(self, z: int) -> float:
+        """Meter pro Pixel auf Zoomstufe z"""
+        return self.initial_resolution / (2 ** z)
+
+    def tile_bounds(self, z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+        """Ausdehnung einer Kachel (minx, miny, maxx, maxy) in EPSG:3857"""
+        span = 2 * ORIGIN_SHIFT / (2 ** z)
+        minx = -ORIGIN_SHIFT + x * span
+        miny = -ORIGIN_SHIFT + y * span
+        return minx, miny, minx + span, miny + span
+
+    def tile_range(self, bounds: List[float], z: int) -> Tuple[int, int, int, int]:
+        """Kachelbereich (minx, miny, maxx, maxy) inkl., der die Ausdehnung in EPSG:3857 abdeckt"""
+        span = 2 * ORIGIN_SHIFT / (2 ** z)
+        last = 2 ** z - 1
+
+        def clamp(value: int) -> int:
+            return max(0, min(last, value))
+
+        return (clamp(int(math.floor((bounds[0] + ORIGIN_SHIFT) / span))),
+                clamp(int(math.floor((bounds[1] + ORIGIN_SHIFT) / span))),
+                clamp(int(math.ceil((bounds[2] + ORIGIN_SHIFT) / span)) - 1),
+                clamp(int(math.ceil((bounds[3] + ORIGIN_SHIFT) / span)) - 1))
+
+    def zoom_for_resolution(self, resolution: float) -> int:
+        """Kleinste Zoomstufe, deren Auflösung mindestens so fein ist wie resolution"""
+        if resolution <= 0:
+            return MAX_ZOOM
+        return max(0, min(MAX_ZOOM, int(math.ceil(math.log2(self.initial_resolution / resolution)))))
+
+
+def intersects(a: Tuple[float, float, float, float], b: Tuple[float, float, float, float]) -> bool:
+    return a[0] < b[2] and a[2] > b[0] and a[1] < b[3] and a[3] > b[1]
+
+
+def lonlat_to_mercator(lon: float, lat: float) -> Tuple[float, float]:
+    """WGS84-Koordinaten nach EPSG:3857 (Breite auf den Gültigkeitsbereich begrenzt)"""
+    lat = max(-85.05112878, min(85.05112878, lat))
+    x = lon * ORIGIN_SHIFT / 180.0
+    y = math.log(math.tan((90 + lat) * math.pi / 360.0)) * 6378137
+    return x, y
@@ -0,0 +1,223 @@
+# tile_pyramid.py - Untere Zoomstufen aus der höchsten Zoomstufe ableiten
+"""
+Nur die Kacheln der höchsten Zoomstufe werden aus der Quelle gerendert. Jede
+tiefere Stufe entsteht durch 2x2-Verkleinerung der vier Kindkacheln
+(alphagewichteter Mittelwert, mit NumPy vektorisiert). Die Eltern einer Stufe
+werden blockweise in einem Prozesspool berechnet; die Stufen selbst laufen
+nacheinander, da jede auf der vorherigen aufbaut.
+
+Kachelbaum im TMS-Schema wie gdal2tiles: {z}/{x}/{y}.{ext}, y = 0 unten. Die
+Eltern werden mit dem Kodierprofil des Layers kodiert (tile_codec.encode_tile).
+
+Während ein Layer für die Vorschau gekachelt wird (tile_seeder), leitet ein
+AncestorBuilder die Eltern fertiger Blöcke im Hintergrund bis minzoom ab, damit
+tiefe Zoomstufen nicht erst nach dem Rendern der gesamten höchsten Stufe
+erscheinen. Er sammelt die Blöcke und bildet höchstens alle
+TMS_PREVIEW_INTERVAL_MS jede betroffene Elternkachel einmal; der Tiler wird
+dadurch nicht aufgehalten. Diese Vorschau ist vorläufig: nach dem Rendern folgt
+wie ohne Vorschau ein vollständiger, paralleler build_pyramid-Durchgang.
+
+Konfiguration über Umgebungsvariablen:
+    TMS_PYRAMID           1 = nur maxzoom rendern und ableiten, 0 = jede Stufe rendern (Default: 1)
+    TMS_PYRAMID_WORKERS   Prozesse für die Verkleinerung (Default: Anzahl CPUs)
+    TMS_PREVIEW_INTERVAL_MS  Mindestabstand der Vorschau-Durchgänge während der Kachelung (Default: 1000)
+"""
+import os
+import time
+import logging
+import threading
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from tile_codec import decode_tile, encode_array, encode_tile
+
+logger = logging.getLogger(__name__)
+
+PYRAMID_ENABLED = os.environ.get("TMS_PYRAMID", "1") not in ("0", "false", "no")
+TMS_PYRAMID_WORKERS = int(os.environ.get("TMS_PYRAMID_WORKERS", str(os.cpu_count() or 2)))
+TMS_PREVIEW_INTERVAL_MS = int(os.environ.get("TMS_PREVIEW_INTERVAL_MS", "1000"))
+# Eltern pro Auftrag an den Prozesspool
+PYRAMID_BATCH_SIZE = 64
+
+
+def downsample(mosaic):
+    """Array (Bänder, 2h, 2b) auf (Bänder, h, b) verkleinern; bei 4 Bändern alphagewichtet"""
+    import numpy as np
+    bands, height, width = mosaic.shape
+    blocks = mosaic.astype(np.uint32).reshape(bands, height // 2, 2, width // 2, 2)
+    if bands not in (2, 4):
+        return ((blocks.sum(axis=(2, 4)) + 2) // 4).astype(np.uint8)
+    alpha = blocks[-1]
+    alpha_sum = alpha.sum(axis=(1, 3))
+    color = (blocks[:-1] * alpha[np.newaxis]).sum(axis=(2, 4))
+    out = np.empty((bands, height // 2, width // 2), dtype=np.uint8)
+    out[:-1] = np.where(alpha_sum > 0, (color + alpha_sum // 2) // np.maximum(alpha_sum, 1), 0)
+    out[-1] = (alpha_sum + 2) // 4
+    return out
+
+
+def _tile_path(tiles_dir: str, z: int, x: int, y: int, ext: str) -> str:
+    return os.path.join(tiles_dir, str(z), str(x), f"{y}.{ext}")
+
+
+def build_parent(tiles_dir: str, z: int, x: int, y: int, tile_size: int = 256, ext: str = "png",
+                 profile: Optional[dict] = None) -> bool:
+    """
+    Kachel z/x/y aus ihren vier Kindern auf z+1 bilden; False, wenn kein Kind existiert oder alles leer ist.
+
+    In diesem Fall wird eine vorhandene Kachel z/x/y (z. B. aus einem früheren Lauf) gelöscht.
+    """
+    import numpy as np
+    mosaic = None
+    # TMS: y zählt nach Norden, die Kinder 2y+1 liegen im Bild oben
+    for dx, dy, row, col in ((0, 1, 0, 0), (1, 1, 0, 1), (0, 0, 1, 0), (1, 0, 1, 1)):
+        path = _tile_path(tiles_dir, z + 1, 2 * x + dx, 2 * y + dy, ext)
+        if not os.path.exists(path):
+            continue
+        with open(path, "rb") as f:
+            child = decode_tile(f.read())
+        if mosaic is None:
+            mosaic = np.zeros((child.shape[0], 2 * tile_size, 2 * tile_size), dtype=np.uint8)
+        mosaic[:, row * tile_size:(row + 1) * tile_size, col * tile_size:(col + 1) * tile_size] = child
+    parent = downsample(mosaic) if mosaic is not None else None
+    if parent is None or (parent.shape[0] == 4 and not parent[3].any()):
+        try:
+            os.remove(_tile_path(tiles_dir, z, x, y, ext))
+        except FileNotFoundError:
+            pass
+        return False
+    tile_dir = os.path.join(tiles_dir, str(z), str(x))
+    os.makedirs(tile_dir, exist_ok=True)
+    tmp_path = os.path.join(tile_dir, f".{y}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(encode_tile(parent, profile) if profile else encode_array(parent, ext.upper()))
+    os.replace(tmp_path, _tile_path(tiles_dir, z, x, y, ext))
+    return True
+
+
+def _build_batch(args: Tuple[str, int, List[Tuple[int, int]], int, str, Optional[dict]]) -> int:
+    tiles_dir, z, parents, tile_size, ext, profile = args
+    return sum(build_parent(tiles_dir, z, x, y, tile_size, ext, profile) for x, y in parents)
+
+
+def build_ancestors(tiles_dir: str, z: int, tiles: List[Tuple[int, int]], minzoom: int, tile_size: int = 256,
+                    ext: str = "png", profile: Optional[dict] = None) -> int:
+    """
+    Eltern der Kacheln (x, y) von Stufe z bis minzoom neu bilden, z. B. nach einem fertigen Block.
+
+    Eltern, deren übrige Kinder noch fehlen, entstehen vorläufig und werden beim nächsten
+    fertigen Block darunter erneut gebildet. Returns: Anzahl geschriebener Kacheln
+    """
+    count = 0
+    current = set(tiles)
+    for level in range(z - 1, minzoom - 1, -1):
+        current = {(x // 2, y // 2) for x, y in current}
+        count += sum(build_parent(tiles_dir, level, x, y, tile_size, ext, profile) for x, y in sorted(current))
+    return count
+
+
+class AncestorBuilder:
+    """
+    Eltern fertiger Blöcke während der Kachelung im Hintergrund ableiten (Vorschau).
+
+    add() merkt die Kacheln nur vor; ein Thread leitet die Eltern aller seitdem
+    fertigen Blöcke gemeinsam ab, so dass tiefe Elternkacheln einmal pro Durchgang
+    statt einmal pro Block entstehen.
+    """
+
+    def __init__(self, tiles_dir: str, z: int, minzoom: int, tile_size: int = 256, ext: str = "png",
+                 profile: Optional[dict] = None, interval: float = TMS_PREVIEW_INTERVAL_MS / 1000.0):
+        self.tiles_dir = tiles_dir
+        self.z = z
+        self.minzoom = minzoom
+        self.tile_size = tile_size
+        self.ext = ext
+        self.profile = profile
+        self.interval = interval
+        self.built = 0
+        self._pending: Set[Tuple[int, int]] = set()
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="pyramid-preview", daemon=True)
+        self._thread.start()
+
+    def add(self, tiles: Iterable[Tuple[int, int]]) -> None:
+        """Kacheln (x, y) der Stufe z eines fertigen Blocks vormerken"""
+        with self._cond:
+            self._pending.update(tiles)
+            self._cond.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if self._closed:
+                    return
+                tiles, self._pending = self._pending, set()
+            try:
+                self.built += build_ancestors(self.tiles_dir, self.z, sorted(tiles), self.minzoom, self.tile_size,
+                                              self.ext, self.profile)
+            except Exception as e:
+                logger.warning(f"Vorschau der tieferen Zoomstufen fehlgeschlagen: {e}")
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed, timeout=self.interval)
+
+    def close(self) -> None:
+        """Thread beenden (ein laufender Durchgang wird abgeschlossen, vorgemerkte verworfen)"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+
+def level_tiles(tiles_dir: str, z: int, ext: str = "png") -> List[Tuple[int, int]]:
+    """Vorhandene Kacheln (x, y) einer Zoomstufe"""
+    level_dir = os.path.join(tiles_dir, str(z))
+    tiles = []
+    if not os.path.isdir(level_dir):
+        return tiles
+    suffix = f".{ext}"
+    for x_name in os.listdir(level_dir):
+        if not x_name.isdigit():
+            continue
+        for name in os.listdir(os.path.join(level_dir, x_name)):
+            if name.endswith(suffix) and name[:-len(suffix)].isdigit():
+                tiles.append((int(x_name), int(name[:-len(suffix)])))
+    return tiles
+
+
+def build_pyramid(tiles_dir: str, minzoom: int, maxzoom: int, workers: int = TMS_PYRAMID_WORKERS,
+                  tile_size: int = 256, ext: str = "png",
+                  progress: Optional[Callable[[int, int], None]] = None,
+                  profile: Optional[dict] = None) -> Dict[int, int]:
+    """
+    Stufen maxzoom-1 bis minzoom aus den vorhandenen Kacheln von maxzoom ableiten.
+
+    Args:
+        progress: Callback (zoom, erzeugte Kacheln) nach jeder fertigen Stufe
+        profile: Kodierprofil der Eltern (ext muss zur Endung des Profils passen)
+    Returns:
+        dict: {zoom: Anzahl erzeugter Kacheln}
+    """
+    counts = {}
+    executor = None
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"))
+    try:
+        for z in range(maxzoom - 1, minzoom - 1, -1):
+            started = time.perf_counter()
+            parents = sorted({(x // 2, y // 2) for x, y in level_tiles(tiles_dir, z + 1, ext)})
+            batches = [(tiles_dir, z, parents[i:i + PYRAMID_BATCH_SIZE], tile_size, ext, profile)
+                       for i in range(0, len(parents), PYRAMID_BATCH_SIZE)]
+            if executor is not None and len(batches) > 1:
+                counts[z] = sum(executor.map(_build_batch, batches))
+            else:
+                counts[z] = sum(map(_build_batch, batches))
+            logger.info(f"Zoomstufe {z}: {counts[z]} Kacheln in {time.perf_counter() - started:.2f} s abgeleitet")
+            if progress:
+                progress(z, counts[z])
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return counts
@@ -0,0 +1,235 @@
+# tile_renderer.py - Kacheln bei Bedarf aus GeoPDF/GeoTIFF rendern
+"""
+Dynamische TMS-Layer werden nicht vorab gekachelt. Eine Kachel wird beim ersten
+Abruf mit der GDAL-Python-API aus dem COG des Layers (siehe raster_source.py) gerendert (Warp nach EPSG:3857 in ein MEM-Dataset,
+PNG-Kodierung über /vsimem) und dann
+
+* im größenbeschränkten In-Memory-LRU gehalten und
+* in den Kachelbaum des Layers geschrieben (write-through, {z}/{x}/{y}.{ext}).
+
+Gleichzeitige Anfragen nach derselben Kachel warten auf ein gemeinsames Rendering.
+
+Konfiguration über Umgebungsvariablen:
+    TILE_MEMORY_CACHE_MB   Größe des In-Memory-LRU in MB (Default: 64)
+    TILE_RENDER_WORKERS    Threads für das Rendern (Default: Anzahl CPUs)
+    DYNAMIC_MAX_ZOOM       Standard-Maxzoom dynamischer Layer (Default: 20)
+"""
+import os
+import uuid
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Set, Tuple
+
+from tile_grid import MercatorGrid, intersects
+from raster_source import mercator_bounds
+from tile_codec import encode_dataset, encode_tile, encoding_extension
+from feature_index import SPARSE_BUFFER_PX, load_layer_index
+
+logger = logging.getLogger(__name__)
+
+TILE_MEMORY_CACHE_BYTES = int(os.environ.get("TILE_MEMORY_CACHE_MB", "64")) * 1024 * 1024
+TILE_RENDER_WORKERS = int(os.environ.get("TILE_RENDER_WORKERS", str(os.cpu_count() or 4)))
+DYNAMIC_MAX_ZOOM = int(os.environ.get("DYNAMIC_MAX_ZOOM", "20"))
+
+TileKey = Tuple[str, int, int, int]
+
+
+class TileMemoryCache:
+    """Thread-sicherer LRU für kodierte Kacheln, begrenzt über die Summe der Bytes"""
+
+    def __init__(self, max_bytes: int = TILE_MEMORY_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._tiles: "OrderedDict[TileKey, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: TileKey) -> Optional[bytes]:
+        with self._lock:
+            data = self._tiles.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._tiles.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key: TileKey, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._tiles.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._tiles[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self._tiles.popitem(last=False)
+                self.size -= len(evicted)
+
+    def invalidate(self, layer: str) -> None:
+        """Alle Kacheln eines Layers verwerfen"""
+        with self._lock:
+            for key in [key for key in self._tiles if key[0] == layer]:
+                self.size -= len(self._tiles.pop(key))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._tiles), "size_bytes": self.size, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+
+class TileRenderer:
+    """Rendert Web-Mercator-Kacheln (TMS-Schema) aus einer georeferenzierten Rasterquelle"""
+
+    def __init__(self, source_path: str, srs: Optional[str] = None, tile_size: int = 256,
+                 resampling: str = "bilinear"):
+        self.source_path = source_path
+        self.srs = srs
+        self.grid = MercatorGrid(tile_size)
+        self.resampling = resampling
+        self._local = threading.local()
+        self.bounds = self._source_bounds()
+
+    def _dataset(self):
+        # GDAL-Datasets sind nicht thread-sicher: ein Handle pro Thread
+        ds = getattr(self._local, "ds", None)
+        if ds is None:
+            from osgeo import gdal
+            ds = self._local.ds = gdal.Open(self.source_path)
+            if ds is None:
+                raise RuntimeError(f"Quelle kann nicht geöffnet werden: {self.source_path}")
+        return ds
+
+    def _source_bounds(self) -> Tuple[float, float, float, float]:
+        try:
+            return mercator_bounds(self._dataset(), self.srs)
+        except ValueError:
+            raise ValueError("Quelle ohne Georeferenz kann nicht dynamisch gekachelt werden")
+
+    def warp(self, bounds: Tuple[float, float, float, float], width: int, height: int):
+        """Ausschnitt (EPSG:3857) in ein MEM-Dataset mit Alphaband warpen"""
+        from osgeo import gdal
+        warped = gdal.Warp(
+            "", self._dataset(), format="MEM", outputBounds=bounds, width=width, height=height,
+            srcSRS=self.srs or None, dstSRS="EPSG:3857", resampleAlg=self.resampling, dstAlpha=True,
+        )
+        if warped is None:
+            raise RuntimeError(f"Warp fehlgeschlagen für {bounds}")
+        return warped
+
+    def render(self, z: int, x: int, y: int, profile: Optional[dict] = None) -> Optional[bytes]:
+        """Kachel rendern (PNG oder Kodierprofil); None, wenn sie außerhalb der Quelle liegt oder leer ist"""
+        tile_bounds = self.grid.tile_bounds(z, x, y)
+        if not intersects(tile_bounds, self.bounds):
+            return None
+        size = self.grid.tile_size
+        warped = self.warp(tile_bounds, size, size)
+        alpha = warped.GetRasterBand(warped.RasterCount)
+        if alpha.ComputeRasterMinMax(False)[1] == 0:
+            return None
+        if profile:
+            return encode_tile(warped.ReadAsArray(), profile)
+        return encode_dataset(warped, "PNG")
+
+
+def write_tile(layer_dir: str, z: int, x: int, y: int, data: bytes, ext: str = "png") -> None:
+    """Kachel atomar in den Kachelbaum des Layers schreiben"""
+    tile_dir = os.path.join(layer_dir, str(z), str(x))
+    os.makedirs(tile_dir, exist_ok=True)
+    tmp_path = os.path.join(tile_dir, f".{y}.{uuid.uuid4().hex}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, os.path.join(tile_dir, f"{y}.{ext}"))
+
+
+class DynamicTileService:
+    """Kacheln dynamischer Layer: LRU -> Kachelbaum -> Rendering (mit Zusammenfassen paralleler Anfragen)"""
+
+    def __init__(self, workers: int = TILE_RENDER_WORKERS, cache: Optional[TileMemoryCache] = None):
+        self.cache = cache or TileMemoryCache()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tile-render")
+        self._renderers: Dict[Tuple[str, Optional[str]], TileRenderer] = {}
+        # Renderer-Schlüssel je Layer-Verzeichnis, damit invalidate nur diese verwirft
+        self._layer_renderers: Dict[str, Set[Tuple[str, Optional[str]]]] = {}
+        self._renderers_lock = threading.Lock()
+        self._inflight: Dict[TileKey, asyncio.Future] = {}
+        self.renders = 0
+        self.coalesced = 0
+
+    def renderer(self, source_path: str, srs: Optional[str] = None) -> TileRenderer:
+        key = (source_path, srs)
+        with self._renderers_lock:
+            renderer = self._renderers.get(key)
+            if renderer is None:
+                renderer = self._renderers[key] = TileRenderer(source_path, srs)
+            return renderer
+
+    def _layer_renderer(self, layer_dir: str, config: dict) -> TileRenderer:
+        key = (config["source"], config.get("source_srs"))
+        with self._renderers_lock:
+            self._layer_renderers.setdefault(layer_dir, set()).add(key)
+        return self.renderer(*key)
+
+    def _load_or_render(self, layer_dir: str, config: dict, z: int, x: int, y: int) -> Optional[bytes]:
+        profile = config.get("encoding")
+        ext = encoding_extension(profile) if profile else "png"
+        tile_path = os.path.join(layer_dir, str(z), str(x), f"{y}.{ext}")
+        try:
+            with open(tile_path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            pass
+        index = load_layer_index(layer_dir)
+        if index is not None:
+            # Ohne Geometrie in der (gepufferten) Kachel gibt es nichts zu rendern
+            renderer = self._layer_renderer(layer_dir, config)
+            minx, miny, maxx, maxy = renderer.grid.tile_bounds(z, x, y)
+            pad = SPARSE_BUFFER_PX * renderer.grid.resolution(z)
+            if not index.intersects((minx - pad, miny - pad, maxx + pad, maxy + pad)):
+                return None
+        data = self._layer_renderer(layer_dir, config).render(z, x, y, profile)
+        self.renders += 1
+        if data is not None:
+            write_tile(layer_dir, z, x, y, data, ext)
+        return data
+
+    async def get_tile(self, layer_dir: str, config: dict, z: int, x: int, y: int) -> Optional[bytes]:
+        if z < config.get("minzoom", 0) or z > config.get("maxzoom", DYNAMIC_MAX_ZOOM):
+            return None
+        key = (layer_dir, z, x, y)
+        data = self.cache.get(key)
+        if data is not None:
+            return data
+        future = self._inflight.get(key)
+        if future is not None:
+            # Dieselbe Kachel wird bereits gerendert
+            self.coalesced += 1
+            return await asyncio.shield(future)
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, self._load_or_render, layer_dir, config, z, x, y)
+        self._inflight[key] = future
+        try:
+            data = await asyncio.shield(future)
+        finally:
+            self._inflight.pop(key, None)
+        if data is not None:
+            self.cache.put(key, data)
+        return data
+
+    def invalidate(self, layer_dir: str) -> None:
+        self.cache.invalidate(layer_dir)
+        with self._renderers_lock:
+            for key in self._layer_renderers.pop(layer_dir, ()):
+                self._renderers.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {**self.cache.stats(), "renders": self.renders, "coalesced": self.coalesced,
+                "inflight": len(self._inflight)}
+
+
+dynamic_tiles = DynamicTileService()
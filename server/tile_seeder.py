@@ -0,0 +1,236 @@
+# tile_seeder.py - Reihenfolge der Kachelung: angefragte Kacheln, Viewport, Hintergrund
+"""
+Der Tiler (tiler.render_levels) holt seine Metakacheln nicht aus einer festen
+Liste, sondern aus einem SeedScheduler. Während ein Layer gekachelt wird, ist
+sein Scheduler in der SeedRegistry (`seeding`) unter der Layer-ID eingetragen:
+
+* Die Vorschau (TmsPreviewDialog) meldet ihren Ausschnitt über
+  POST /api/tms/{id}/viewport; Blöcke darin werden vorgezogen.
+* Eine Kachelanfrage, die auf eine noch fehlende Kachel trifft, zieht deren
+  Block ganz nach vorne und wartet kurz (SEED_WAIT_MS) auf das Ergebnis.
+* Alles übrige wird im Hintergrund gefüllt, tiefe Zoomstufen zuerst und
+  innerhalb einer Stufe nach Abstand zum Viewport.
+
+Im Pyramidenmodus wird nur maxzoom gerendert. Mit set_derived_levels leitet
+der Lauf die Eltern fertiger Blöcke im Hintergrund ab (tile_pyramid.AncestorBuilder);
+eine Anfrage auf eine abgeleitete Stufe zieht dann die nächstgelegenen
+überdeckenden Blöcke vor und wartet auf den ersten. Solche Kacheln sind bis
+zum Ende des Laufs vorläufig (partial) und werden nicht gecacht.
+
+Priorität (kleiner = früher): (Klasse, Zoomstufe, Abstand) mit den Klassen
+angefragt (0), Viewport (1) und Hintergrund (2).
+
+Konfiguration über Umgebungsvariablen:
+    SEED_WAIT_MS            Wartezeit einer Kachelanfrage auf ihren vorgezogenen Block (Default: 3000)
+    SEED_VIEWPORT_MARGIN    Rand um den Viewport in Metakacheln (Default: 1)
+"""
+import os
+import heapq
+import itertools
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from tile_grid import MercatorGrid
+
+SEED_WAIT_MS = int(os.environ.get("SEED_WAIT_MS", "3000"))
+SEED_VIEWPORT_MARGIN = int(os.environ.get("SEED_VIEWPORT_MARGIN", "1"))
+# Höchstens so viele Blöcke einer tieferen gerenderten Stufe werden für eine abgeleitete Kachel vorgezogen
+SEED_MAX_BUMP_BLOCKS = 4
+
+PRIORITY_REQUESTED = 0
+PRIORITY_VIEWPORT = 1
+PRIORITY_BACKGROUND = 2
+
+BlockKey = Tuple[int, int, int]
+Tile = Tuple[int, int]
+
+
+class SeedScheduler:
+    """Prioritätswarteschlange der Metakacheln eines Kachel-Laufs (thread-sicher)"""
+
+    def __init__(self, metatile: int, grid: Optional[MercatorGrid] = None):
+        self.metatile = max(1, metatile)
+        self.grid = grid or MercatorGrid()
+        self._lock = threading.Lock()
+        self._pending: Dict[BlockKey, List[Tile]] = {}
+        self._running: Set[BlockKey] = set()
+        self._priority: Dict[BlockKey, tuple] = {}
+        self._heap: List[Tuple[tuple, int, BlockKey]] = []
+        self._events: Dict[BlockKey, threading.Event] = {}
+        self._seq = itertools.count()
+        self._viewport: Optional[Tuple[float, float, float, float]] = None
+        self._requested: Set[BlockKey] = set()
+        self._levels: Set[int] = set()
+        self._derived_min: Optional[int] = None
+        self.closed = False
+
+    def key(self, z: int, x: int, y: int) -> BlockKey:
+        return z, x // self.metatile, y // self.metatile
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def add(self, z: int, block: List[Tile]) -> BlockKey:
+        """Block (Kacheln einer Metakachel) einreihen"""
+        key = self.key(z, *block[0])
+        with self._lock:
+            self._pending[key] = block
+            self._levels.add(z)
+            self._push(key, self._base_priority(key))
+        return key
+
+    def _base_priority(self, key: BlockKey) -> tuple:
+        if key in self._requested:
+            return PRIORITY_REQUESTED, key[0], 0.0
+        if self._viewport is None:
+            return PRIORITY_BACKGROUND, key[0], 0.0
+        z, bx, by = key
+        x0, y0, x1, y1 = self.grid.tile_range(self._viewport, z)
+        m = self.metatile
+        # Abstand der Blockmitte zur Viewport-Mitte in Metakacheln
+        distance = abs(bx + 0.5 - (x0 + x1 + 1) / (2.0 * m)) + abs(by + 0.5 - (y0 + y1 + 1) / (2.0 * m))
+        margin = SEED_VIEWPORT_MARGIN
+        inside = x0 // m - margin <= bx <= x1 // m + margin and y0 // m - margin <= by <= y1 // m + margin
+        return (PRIORITY_VIEWPORT if inside else PRIORITY_BACKGROUND), z, distance
+
+    def _push(self, key: BlockKey, priority: tuple) -> None:
+        self._priority[key] = priority
+        heapq.heappush(self._heap, (priority, next(self._seq), key))
+
+    def pop(self) -> Optional[Tuple[BlockKey, int, List[Tile]]]:
+        """Nächsten Block holen: (Schlüssel, Zoomstufe, Kacheln); None, wenn nichts mehr aussteht"""
+        with self._lock:
+            while self._heap:
+                priority, _, key = heapq.heappop(self._heap)
+                # Veraltete Einträge (neu priorisiert oder schon vergeben) überspringen
+                if key not in self._pending or self._priority.get(key) != priority:
+                    continue
+                block = self._pending.pop(key)
+                self._priority.pop(key, None)
+                self._running.add(key)
+                return key, key[0], block
+            return None
+
+    def done(self, key: BlockKey) -> None:
+        """Block fertig: wartende Kachelanfragen wecken"""
+        with self._lock:
+            self._running.discard(key)
+            self._requested.discard(key)
+            event = self._events.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def close(self) -> None:
+        """Lauf beendet oder abgebrochen: alle Wartenden freigeben"""
+        with self._lock:
+            self.closed = True
+            events = list(self._events.values())
+            self._events.clear()
+        for event in events:
+            event.set()
+
+    def set_derived_levels(self, minzoom: int) -> None:
+        """Stufen ab minzoom unterhalb der gerenderten werden nach jedem Block fortgeschrieben"""
+        with self._lock:
+            self._derived_min = minzoom
+
+    def partial(self, z: int) -> bool:
+        """True, wenn Kacheln der Stufe z in diesem Lauf noch ergänzt werden (abgeleitete Stufe)"""
+        with self._lock:
+            return (not self.closed and self._derived_min is not None and bool(self._levels)
+                    and self._derived_min <= z < min(self._levels))
+
+    def set_viewport(self, bounds: Tuple[float, float, float, float]) -> None:
+        """Ausschnitt der Vorschau (EPSG:3857) setzen und ausstehende Blöcke neu priorisieren"""
+        with self._lock:
+            self._viewport = tuple(bounds)
+            self._priority = {key: self._base_priority(key) for key in self._pending}
+            self._heap = [(priority, next(self._seq), key) for key, priority in self._priority.items()]
+            heapq.heapify(self._heap)
+
+    def bump(self, z: int, x: int, y: int) -> Optional[threading.Event]:
+        """
+        Kachel z/x/y vorziehen.
+
+        Returns:
+            Event, das nach dem Rendern des Blocks (bei fortgeschriebenen abgeleiteten Stufen:
+            des nächstgelegenen überdeckenden Blocks) gesetzt wird; None, wenn in diesem Lauf
+            nichts mehr für die Kachel entsteht (fertig, leer oder erst am Ende abgeleitet)
+        """
+        with self._lock:
+            if self.closed:
+                return None
+            key = self.key(z, x, y)
+            if key in self._pending or key in self._running:
+                if key in self._pending:
+                    self._requested.add(key)
+                    self._push(key, self._base_priority(key))
+                return self._events.setdefault(key, threading.Event())
+            if self._derived_min is not None and self._levels and self._derived_min <= z < min(self._levels):
+                return self._bump_derived(z, x, y)
+            # Abgeleitete Stufe (Pyramide): die überdeckenden Blöcke der gerenderten Stufen vorziehen
+            for level in sorted(level for level in self._levels if level > z):
+                shift = level - z
+                x0, y0 = (x << shift) // self.metatile, (y << shift) // self.metatile
+                x1, y1 = (((x + 1) << shift) - 1) // self.metatile, (((y + 1) << shift) - 1) // self.metatile
+                if (x1 - x0 + 1) * (y1 - y0 + 1) > SEED_MAX_BUMP_BLOCKS:
+                    continue
+                for bx in range(x0, x1 + 1):
+                    for by in range(y0, y1 + 1):
+                        covering = (level, bx, by)
+                        if covering in self._pending:
+                            self._requested.add(covering)
+                            self._push(covering, self._base_priority(covering))
+            return None
+
+
+    def _bump_derived(self, z: int, x: int, y: int) -> Optional[threading.Event]:
+        """Nächstgelegene ausstehende Blöcke unter einer fortgeschriebenen Kachel vorziehen (mit Lock)"""
+        level = min(self._levels)
+        shift = level - z
+        m = self.metatile
+        x0, y0 = (x << shift) // m, (y << shift) // m
+        x1, y1 = (((x + 1) << shift) - 1) // m, (((y + 1) << shift) - 1) // m
+        cx, cy = ((x + 0.5) * (1 << shift)) / m, ((y + 0.5) * (1 << shift)) / m
+        candidates = sorted(
+            (abs(key[1] + 0.5 - cx) + abs(key[2] + 0.5 - cy), key in self._running, key)
+            for key in itertools.chain(self._running, self._pending)
+            if key[0] == level and x0 <= key[1] <= x1 and y0 <= key[2] <= y1
+        )
+        if not candidates:
+            return None
+        # Ein laufender Block liefert am schnellsten einen ersten Ausschnitt der Kachel
+        running = [key for _, is_running, key in candidates if is_running]
+        for _, is_running, key in candidates[:SEED_MAX_BUMP_BLOCKS]:
+            if not is_running:
+                self._requested.add(key)
+                self._push(key, self._base_priority(key))
+        first = running[0] if running else candidates[0][2]
+        return self._events.setdefault(first, threading.Event())
+
+
+class SeedRegistry:
+    """Scheduler der gerade laufenden Kachelungen, nach Layer-ID"""
+
+    def __init__(self):
+        self._schedulers: Dict[str, SeedScheduler] = {}
+        self._lock = threading.Lock()
+
+    def register(self, layer: str, scheduler: SeedScheduler) -> SeedScheduler:
+        with self._lock:
+            self._schedulers[layer] = scheduler
+        return scheduler
+
+    def unregister(self, layer: str) -> None:
+        with self._lock:
+            scheduler = self._schedulers.pop(layer, None)
+        if scheduler is not None:
+            scheduler.close()
+
+    def get(self, layer: str) -> Optional[SeedScheduler]:
+        with self._lock:
+            return self._schedulers.get(layer)
+
+
+seeding = SeedRegistry()
@@ -0,0 +1,659 @@
+# tile_store.py - Kachelablage als Verzeichnisbaum, MBTiles oder PMTiles
+"""
+Ein TMS-Layer liegt unter STATIC_ROOT/<layer_id>/ zusammen mit config.json.
+Die Kacheln selbst werden in einem von drei Formaten abgelegt:
+
+* directory  {z}/{x}/{y}.png wie von gdal2tiles erzeugt (bzw. .webp/.jpg laut "tile_format" in config.json)
+* mbtiles    tiles.mbtiles (SQLite, Kacheln nach Hash dedupliziert: map/images)
+* pmtiles    tiles.pmtiles (PMTiles v3, identische Kacheln teilen sich einen Offset)
+
+Alle Stores verwenden TMS-Koordinaten (y von unten), wie gdal2tiles und MBTiles.
+PMTiles adressiert intern XYZ; die Umrechnung erfolgt beim Schreiben und Lesen.
+
+Zum Ausliefern hält TileStorePool geöffnete Stores vor: PMTiles werden per mmap
+gelesen, MBTiles über einen Pool schreibgeschützter SQLite-Verbindungen mit mmap.
+
+Konfiguration über Umgebungsvariablen:
+    TILE_STORE              Standardformat für neue TMS-Layer (directory, mbtiles, pmtiles)
+    TILE_SQLITE_POOL_SIZE   Max. offene SQLite-Verbindungen pro MBTiles-Archiv (Default: 8)
+    TILE_SQLITE_MMAP_MB     mmap-Größe der SQLite-Verbindungen in MB (Default: 256)
+"""
+import io
+import os
+import abc
+import gzip
+import json
+import mmap
+import shutil
+import struct
+import sqlite3
+import hashlib
+import logging
+import tempfile
+import threading
+from queue import Empty, LifoQueue
+from bisect import bisect_right
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TILE_STORE_FORMATS = ("directory", "mbtiles", "pmtiles")
+DEFAULT_TILE_STORE = os.environ.get("TILE_STORE", "directory")
+ARCHIVE_NAMES = {"mbtiles": "tiles.mbtiles", "pmtiles": "tiles.pmtiles"}
+TILE_EXTENSIONS = ("png", "jpg", "jpeg", "webp", "pbf", "mvt")
+TILE_SQLITE_POOL_SIZE = int(os.environ.get("TILE_SQLITE_POOL_SIZE", "8"))
+TILE_SQLITE_MMAP_BYTES = int(os.environ.get("TILE_SQLITE_MMAP_MB", "256")) * 1024 * 1024
+
+
+def flip_y(z: int, y: int) -> int:
+    """Zwischen TMS- und XYZ-Zeilennummer umrechnen (symmetrisch)"""
+    return (1 << z) - 1 - y
+
+
+def tile_format(data: bytes) -> str:
+    """Bildformat einer Kachel anhand der Signatur bestimmen"""
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "png"
+    if data[:3] == b"\xff\xd8\xff":
+        return "jpg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    return "pbf"
+
+
+def iter_directory_tiles(tiles_dir: str) -> Iterator[Tuple[int, int, int, str]]:
+    """Kacheln eines {z}/{x}/{y}.ext-Baums liefern: (z, x, y, Pfad)"""
+    for z_name in os.listdir(tiles_dir):
+        z_dir = os.path.join(tiles_dir, z_name)
+        if not z_name.isdigit() or not os.path.isdir(z_dir):
+            continue
+        for x_name in os.listdir(z_dir):
+            x_dir = os.path.join(z_dir, x_name)
+            if not x_name.isdigit() or not os.path.isdir(x_dir):
+                continue
+            for tile_name in os.listdir(x_dir):
+                y_name, _, ext = tile_name.partition(".")
+                if y_name.isdigit() and ext.lower() in TILE_EXTENSIONS:
+                    yield int(z_name), int(x_name), int(y_name), os.path.join(x_dir, tile_name)
+
+
+# ---------------------------------------------------------------------------
+# Lesende Stores
+# ---------------------------------------------------------------------------
+
+class TileStoreClosed(RuntimeError):
+    """Der Store wurde geschlossen (Archiv ersetzt); beim Pool neu anfordern"""
+
+
+class TileStore(abc.ABC):
+    """Lesender Zugriff auf die Kacheln eines Layers (TMS-Koordinaten)"""
+    format = None
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @abc.abstractmethod
+    def get_tile(self, z: int, x: int, y: int) -> Optional[bytes]:
+        """Kachel oder None, wenn sie nicht vorhanden ist"""
+
+    def metadata(self) -> Dict[str, Any]:
+        return {}
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class DirectoryTileStore(TileStore):
+    format = "directory"
+
+    def __init__(self, path: str, ext: str = "png"):
+        super().__init__(path)
+        self.ext = ext
+
+    def get_tile(self, z: int, x: int, y: int) -> Optional[bytes]:
+        tile_path = os.path.join(self.path, str(z), str(x), f"{y}.{self.ext}")
+        try:
+            with open(tile_path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+
+class MBTilesStore(TileStore):
+    """MBTiles lesen; jede Abfrage leiht sich eine schreibgeschützte Verbindung aus dem Pool"""
+    format = "mbtiles"
+
+    def __init__(self, path: str, pool_size: int = TILE_SQLITE_POOL_SIZE):
+        super().__init__(path)
+        self.pool_size = max(1, pool_size)
+        self._pool: LifoQueue = LifoQueue()
+        self._opened = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._pool.put(self._connect())
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        conn.execute(f"PRAGMA mmap_size={TILE_SQLITE_MMAP_BYTES}")
+        conn.execute("PRAGMA query_only=1")
+        self._opened += 1
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._pool.get_nowait()
+        except Empty:
+            pass
+        while True:
+            with self._lock:
+                if self._opened < self.pool_size:
+                    return self._connect()
+            # Mit Timeout, damit Wartende nach close() nicht auf Rückgaben hängen bleiben
+            try:
+                return self._pool.get(timeout=1.0)
+            except Empty:
+                pass
+
+    def _discard(self, conn: sqlite3.Connection) -> None:
+        conn.close()
+        with self._lock:
+            self._opened -= 1
+
+    def _query(self, sql: str, params: tuple = ()) -> list:
+        conn = self._acquire()
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            # Nach close() werden ausgeliehene Verbindungen bei der Rückgabe geschlossen
+            if self._closed:
+                self._discard(conn)
+            else:
+                self._pool.put(conn)
+
+    def get_tile(self, z: int, x: int, y: int) -> Optional[bytes]:
+        rows = self._query(
+            "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?", (z, x, y)
+        )
+        return bytes(rows[0][0]) if rows else None
+
+    def metadata(self) -> Dict[str, Any]:
+        return dict(self._query("SELECT name, value FROM metadata"))
+
+    def close(self) -> None:
+        self._closed = True
+        while True:
+            try:
+                self._discard(self._pool.get_nowait())
+            except Empty:
+                break
+
+
+# ---------------------------------------------------------------------------
+# PMTiles v3
+# ---------------------------------------------------------------------------
+
+PMTILES_HEADER_SIZE = 127
+PMTILES_ROOT_MAX = 16384 - PMTILES_HEADER_SIZE
+COMPRESSION_NONE, COMPRESSION_GZIP = 1, 2
+PMTILES_TILE_TYPES = {"pbf": 1, "mvt": 1, "png": 2, "jpg": 3, "jpeg": 3, "webp": 4}
+
+
+def zxy_to_tileid(z: int, x: int, y: int) -> int:
+    """PMTiles-Tile-ID (Hilbert-Kurve je Zoomstufe, XYZ-Koordinaten)"""
+    n = 1 << z
+    if x >= n or y >= n or x < 0 or y < 0:
+        raise ValueError(f"Kachel {z}/{x}/{y} liegt außerhalb des Kachelschemas")
+    acc = ((1 << (2 * z)) - 1) // 3
+    d = 0
+    s = n >> 1
+    while s > 0:
+        rx = 1 if x & s else 0
+        ry = 1 if y & s else 0
+        d += s * s * ((3 * rx) ^ ry)
+        if ry == 0:
+            if rx == 1:
+                x = n - 1 - x
+                y = n - 1 - y
+            x, y = y, x
+        s >>= 1
+    return acc + d
+
+
+def _write_varint(out: io.BytesIO, value: int) -> None:
+    while value >= 0x80:
+        out.write(bytes(((value & 0x7F) | 0x80,)))
+        value >>= 7
+    out.write(bytes((value,)))
+
+
+def _read_varint(buf: bytes, pos: int) -> Tuple[int, int]:
+    result = shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _serialize_directory(entries: List[Tuple[int, int, int, int]]) -> bytes:
+    """Einträge (tile_id, offset, length, run_length) gzip-komprimiert serialisieren"""
+    out = io.BytesIO()
+    _write_varint(out, len(entries))
+    last_id = 0
+    for tile_id, _, _, _ in entries:
+        _write_varint(out, tile_id - last_id)
+        last_id = tile_id
+    for entry in entries:
+        _write_varint(out, entry[3])
+    for entry in entries:
+        _write_varint(out, entry[2])
+    for i, (_, offset, _, _) in enumerate(entries):
+        if i > 0 and offset == entries[i - 1][1] + entries[i - 1][2]:
+            _write_varint(out, 0)
+        else:
+            _write_varint(out, offset + 1)
+    return gzip.compress(out.getvalue(), compresslevel=6, mtime=0)
+
+
+def _deserialize_directory(data: bytes, compression: int) -> List[Tuple[int, int, int, int]]:
+    if compression == COMPRESSION_GZIP:
+        data = gzip.decompress(data)
+    count, pos = _read_varint(data, 0)
+    tile_ids, run_lengths, lengths, offsets = [], [], [], []
+    last_id = 0
+    for _ in range(count):
+        delta, pos = _read_varint(data, pos)
+        last_id += delta
+        tile_ids.append(last_id)
+    for _ in range(count):
+        value, pos = _read_varint(data, pos)
+        run_lengths.append(value)
+    for _ in range(count):
+        value, pos = _read_varint(data, pos)
+        lengths.append(value)
+    for i in range(count):
+        value, pos = _read_varint(data, pos)
+        offsets.append(offsets[i - 1] + lengths[i - 1] if value == 0 and i > 0 else value - 1)
+    return list(zip(tile_ids, offsets, lengths, run_lengths))
+
+
+def _build_directories(entries: List[Tuple[int, int, int, int]]) -> Tuple[bytes, bytes]:
+    """Root- und Leaf-Verzeichnisse bilden; die Root muss in die ersten 16 KiB passen"""
+    root = _serialize_directory(entries)
+    if len(root) <= PMTILES_ROOT_MAX:
+        return root, b""
+    leaf_size = 4096
+    while True:
+        leaves = io.BytesIO()
+        root_entries = []
+        for start in range(0, len(entries), leaf_size):
+            chunk = entries[start:start + leaf_size]
+            leaf = _serialize_directory(chunk)
+            root_entries.append((chunk[0][0], leaves.tell(), len(leaf), 0))
+            leaves.write(leaf)
+        root = _serialize_directory(root_entries)
+        if len(root) <= PMTILES_ROOT_MAX:
+            return root, leaves.getvalue()
+        leaf_size *= 2
+
+
+class PMTilesStore(TileStore):
+    """
+    PMTiles per mmap lesen
+
+    Laufende Leser werden gezählt: close() gibt mmap und Dateihandle erst frei,
+    wenn der letzte Leser fertig ist; danach beginnende Lesezugriffe lösen
+    TileStoreClosed aus.
+    """
+    format = "pmtiles"
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self._readers = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        header = self._mm[:PMTILES_HEADER_SIZE]
+        if header[:7] != b"PMTiles" or header[7] != 3:
+            raise ValueError(f"Keine PMTiles-v3-Datei: {path}")
+        (self.root_offset, self.root_length, self.metadata_offset, self.metadata_length,
+         self.leaf_offset, self.leaf_length, self.data_offset, self.data_length) = struct.unpack_from("<8Q", header, 8)
+        self.internal_compression = header[97]
+        self.min_zoom, self.max_zoom = header[100], header[101]
+        self._root = self._directory(self.root_offset, self.root_length)
+        self._leaves: Dict[int, Tuple[List[int], List[Tuple[int, int, int, int]]]] = {}
+
+    def _directory(self, offset: int, length: int) -> Tuple[List[int], List[Tuple[int, int, int, int]]]:
+        entries = _deserialize_directory(self._mm[offset:offset + length], self.internal_compression)
+        return [entry[0] for entry in entries], entries
+
+    def _acquire(self) -> None:
+        with self._lock:
+            if self._closed:
+                raise TileStoreClosed(f"Store geschlossen: {self.path}")
+            self._readers += 1
+
+    def _release(self) -> None:
+        with self._lock:
+            self._readers -= 1
+            if not (self._closed and self._readers == 0):
+                return
+        self._free()
+
+    def _free(self) -> None:
+        self._mm.close()
+        self._file.close()
+
+    def get_tile(self, z: int, x: int, y: int) -> Optional[bytes]:
+        if z < self.min_zoom or z > self.max_zoom:
+            return None
+        try:
+            tile_id = zxy_to_tileid(z, x, flip_y(z, y))
+        except ValueError:
+            return None
+        self._acquire()
+        try:
+            return self._find_tile(tile_id)
+        finally:
+            self._release()
+
+    def _find_tile(self, tile_id: int) -> Optional[bytes]:
+        ids, entries = self._root
+        for _ in range(4):
+            index = bisect_right(ids, tile_id) - 1
+            if index < 0:
+                return None
+            entry_id, offset, length, run_length = entries[index]
+            if run_length == 0:
+                # Verweis auf ein Leaf-Verzeichnis
+                leaf = self._leaves.get(offset)
+                if leaf is None:
+                    leaf = self._leaves[offset] = self._directory(self.leaf_offset + offset, length)
+                ids, entries = leaf
+                continue
+            if tile_id >= entry_id + run_length:
+                return None
+            start = self.data_offset + offset
+            return self._mm[start:start + length]
+        return None
+
+    def metadata(self) -> Dict[str, Any]:
+        self._acquire()
+        try:
+            raw = self._mm[self.metadata_offset:self.metadata_offset + self.metadata_length]
+        finally:
+            self._release()
+        if self.internal_compression == COMPRESSION_GZIP:
+            raw = gzip.decompress(raw)
+        return json.loads(raw or b"{}")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            if self._readers:
+                # Der letzte laufende Leser gibt frei (_release)
+                return
+        self._free()
+
+
+# ---------------------------------------------------------------------------
+# Schreibende Stores
+# ---------------------------------------------------------------------------
+
+class MBTilesWriter:
+    """MBTiles mit deduplizierten Kacheln (Schema map/images, View tiles)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tmp_path = f"{path}.tmp"
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+        self.conn = sqlite3.connect(self.tmp_path)
+        self.conn.executescript("""
+            PRAGMA journal_mode=OFF;
+            PRAGMA synchronous=OFF;
+            CREATE TABLE metadata (name TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE map (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_id TEXT);
+            CREATE TABLE images (tile_id TEXT PRIMARY KEY, tile_data BLOB);
+            CREATE UNIQUE INDEX map_index ON map (zoom_level, tile_column, tile_row);
+            CREATE VIEW tiles AS
+                SELECT map.zoom_level AS zoom_level, map.tile_column AS tile_column, map.tile_row AS tile_row,
+                       images.tile_data AS tile_data
+                FROM map JOIN images ON images.tile_id = map.tile_id;
+        """)
+        self.tiles = 0
+        self.unique_tiles = 0
+
+    def put_tile(self, z: int, x: int, y: int, data: bytes) -> None:
+        tile_id = hashlib.sha1(data).hexdigest()
+        cursor = self.conn.execute("INSERT OR IGNORE INTO images (tile_id, tile_data) VALUES (?, ?)", (tile_id, data))
+        self.unique_tiles += cursor.rowcount
+        self.conn.execute("INSERT OR REPLACE INTO map (zoom_level, tile_column, tile_row, tile_id) VALUES (?, ?, ?, ?)",
+                          (z, x, y, tile_id))
+        self.tiles += 1
+
+    def finish(self, metadata: Dict[str, Any]) -> None:
+        self.conn.executemany("INSERT OR REPLACE INTO metadata (name, value) VALUES (?, ?)",
+                              [(k, v if isinstance(v, str) else json.dumps(v)) for k, v in metadata.items()])
+        self.conn.commit()
+        self.conn.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self) -> None:
+        self.conn.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+class PMTilesWriter:
+    """PMTiles v3: Kacheldaten werden sofort in eine Temp-Datei geschrieben, nur der Index bleibt im Speicher"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._data = tempfile.TemporaryFile(dir=os.path.dirname(path) or ".")
+        self._offsets: Dict[bytes, Tuple[int, int]] = {}
+        self._entries: List[Tuple[int, int, int]] = []
+        self.tiles = 0
+        self.unique_tiles = 0
+        self.tile_type = None
+        self.min_zoom, self.max_zoom = 255, 0
+
+    def put_tile(self, z: int, x: int, y: int, data: bytes) -> None:
+        tile_id = zxy_to_tileid(z, x, flip_y(z, y))
+        digest = hashlib.sha1(data).digest()
+        location = self._offsets.get(digest)
+        if location is None:
+            location = self._offsets[digest] = (self._data.tell(), len(data))
+            self._data.write(data)
+            self.unique_tiles += 1
+        self._entries.append((tile_id, location[0], location[1]))
+        self.tiles += 1
+        if self.tile_type is None:
+            self.tile_type = PMTILES_TILE_TYPES.get(tile_format(data), 0)
+        self.min_zoom, self.max_zoom = min(self.min_zoom, z), max(self.max_zoom, z)
+
+    def _run_length_entries(self) -> List[Tuple[int, int, int, int]]:
+        entries = []
+        for tile_id, offset, length in sorted(self._entries):
+            if entries:
+                last_id, last_offset, last_length, run = entries[-1]
+                if last_id + run == tile_id and last_offset == offset:
+                    entries[-1] = (last_id, last_offset, last_length, run + 1)
+                    continue
+                if last_id == tile_id:
+                    entries[-1] = (tile_id, offset, length, 1)
+                    continue
+            entries.append((tile_id, offset, length, 1))
+        return entries
+
+    def finish(self, metadata: Dict[str, Any]) -> None:
+        entries = self._run_length_entries()
+        root, leaves = _build_directories(entries)
+        meta = gzip.compress(json.dumps(metadata).encode("utf-8"), mtime=0)
+        data_length = self._data.tell()
+
+        bounds = metadata.get("bounds_wgs84") or [-180.0, -85.0, 180.0, 85.0]
+        center = [(bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2]
+        min_zoom = self.min_zoom if self.tiles else 0
+        root_offset = PMTILES_HEADER_SIZE
+        meta_offset = root_offset + len(root)
+        leaf_offset = meta_offset + len(meta)
+        data_offset = leaf_offset + len(leaves)
+        header = b"PMTiles" + bytes((3,)) + struct.pack(
+            "<8Q3QBBBBBBiiiiBii",
+            root_offset, len(root), meta_offset, len(meta), leaf_offset, len(leaves), data_offset, data_length,
+            self.tiles, len(entries), self.unique_tiles,
+            0, COMPRESSION_GZIP, COMPRESSION_NONE, self.tile_type or 0, min_zoom, self.max_zoom,
+            int(bounds[0] * 1e7), int(bounds[1] * 1e7), int(bounds[2] * 1e7), int(bounds[3] * 1e7),
+            min_zoom, int(center[0] * 1e7), int(center[1] * 1e7),
+        )
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as out:
+            out.write(header)
+            out.write(root)
+            out.write(meta)
+            out.write(leaves)
+            self._data.seek(0)
+            shutil.copyfileobj(self._data, out, 1024 * 1024)
+        self._data.close()
+        os.replace(tmp_path, self.path)
+
+    def abort(self) -> None:
+        self._data.close()
+
+
+def create_writer(fmt: str, path: str):
+    if fmt == "mbtiles":
+        return MBTilesWriter(path)
+    if fmt == "pmtiles":
+        return PMTilesWriter(path)
+    raise ValueError(f"Unbekanntes Archivformat: {fmt}")
+
+
+# ---------------------------------------------------------------------------
+# Layer-Verwaltung
+# ---------------------------------------------------------------------------
+
+def detect_format(layer_dir: str) -> str:
+    """Format der Kachelablage eines Layer-Verzeichnisses bestimmen"""
+    for fmt, name in ARCHIVE_NAMES.items():
+        if os.path.exists(os.path.join(layer_dir, name)):
+            return fmt
+    return "directory"
+
+
+def open_tile_store(layer_dir: str) -> Optional[TileStore]:
+    """Kachelablage eines Layer-Verzeichnisses öffnen (None, falls es nicht existiert)"""
+    if not os.path.isdir(layer_dir):
+        return None
+    fmt = detect_format(layer_dir)
+    if fmt == "mbtiles":
+        return MBTilesStore(os.path.join(layer_dir, ARCHIVE_NAMES["mbtiles"]))
+    if fmt == "pmtiles":
+        return PMTilesStore(os.path.join(layer_dir, ARCHIVE_NAMES["pmtiles"]))
+    return DirectoryTileStore(layer_dir, _directory_extension(layer_dir))
+
+
+def _directory_extension(layer_dir: str) -> str:
+    """Dateiendung der Kacheln laut config.json (Kodierprofil des Layers), sonst png"""
+    try:
+        with open(os.path.join(layer_dir, "config.json")) as f:
+            return json.load(f).get("tile_format") or "png"
+    except (OSError, ValueError):
+        return "png"
+
+
+def pack_directory(tiles_dir: str, layer_dir: str, fmt: str, metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Kacheln eines {z}/{x}/{y}-Baums in ein Archiv im Layer-Verzeichnis übernehmen
+
+    Returns:
+        dict: {format, path, tiles, unique_tiles, size}
+    """
+    archive_path = os.path.join(layer_dir, ARCHIVE_NAMES[fmt])
+    writer = create_writer(fmt, archive_path)
+    minzoom, maxzoom, tile_ext = None, None, "png"
+    try:
+        for z, x, y, tile_path in sorted(iter_directory_tiles(tiles_dir)):
+            with open(tile_path, "rb") as f:
+                writer.put_tile(z, x, y, f.read())
+            minzoom = z if minzoom is None else min(minzoom, z)
+            maxzoom = z if maxzoom is None else max(maxzoom, z)
+            tile_ext = os.path.splitext(tile_path)[1].lstrip(".").lower()
+        meta = {"name": os.path.basename(layer_dir), "format": tile_ext, "type": "overlay", "version": "1.1",
+                "scheme": "tms", "minzoom": str(minzoom or 0), "maxzoom": str(maxzoom or 0)}
+        meta.update(metadata or {})
+        writer.finish(meta)
+    except BaseException:
+        writer.abort()
+        raise
+    info = {"format": fmt, "path": ARCHIVE_NAMES[fmt], "tiles": writer.tiles, "unique_tiles": writer.unique_tiles,
+            "size": os.path.getsize(archive_path)}
+    logger.info(f"Kacheln nach {archive_path} übernommen: {writer.tiles} Kacheln, {writer.unique_tiles} eindeutig")
+    return info
+
+
+class TileStorePool:
+    """
+    Geöffnete Stores je Layer-Verzeichnis vorhalten
+
+    Wird ein Archiv ersetzt (andere Inode/mtime) oder das Format gewechselt, wird
+    beim nächsten Zugriff neu geöffnet und der alte Store geschlossen. Parallele
+    Leser dürfen ihn noch zu Ende lesen: MBTiles schließt ausgeliehene
+    Verbindungen erst bei der Rückgabe, PMTiles gibt die mmap nach dem letzten
+    Leser frei. Beginnt ein Lesezugriff auf PMTiles erst nach close(), löst er
+    TileStoreClosed aus und der Store wird neu angefordert.
+    """
+
+    def __init__(self):
+        self._stores: Dict[str, Tuple[Tuple, TileStore]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _identity(layer_dir: str) -> Optional[Tuple]:
+        fmt = detect_format(layer_dir)
+        target = os.path.join(layer_dir, ARCHIVE_NAMES[fmt]) if fmt != "directory" else layer_dir
+        try:
+            stat = os.stat(target)
+        except FileNotFoundError:
+            return None
+        return fmt, stat.st_ino, stat.st_mtime_ns
+
+    def get(self, layer_dir: str) -> Optional[TileStore]:
+        identity = self._identity(layer_dir)
+        if identity is None:
+            self.invalidate(layer_dir)
+            return None
+        cached = self._stores.get(layer_dir)
+        if cached and cached[0] == identity:
+            return cached[1]
+        with self._lock:
+            cached = self._stores.get(layer_dir)
+            if cached and cached[0] == identity:
+                return cached[1]
+            store = open_tile_store(layer_dir)
+            self._stores[layer_dir] = (identity, store)
+        if cached and cached[1] is not None:
+            # Ersetzter Store: Verbindungen bzw. mmap und Dateihandle freigeben
+            cached[1].close()
+        return store
+
+    def invalidate(self, layer_dir: str) -> None:
+        with self._lock:
+            cached = self._stores.pop(layer_dir, None)
+        if cached and cached[1] is not None:
+            cached[1].close()
+
+
+tile_store_pool = TileStorePool()
@@ -0,0 +1,331 @@
+# tiler.py - Paralleler Kachel-Renderer (ersetzt den gdal2tiles-Subprozess)
+"""
+Statische TMS-Layer werden ohne gdal2tiles gekachelt. Die Kacheln einer
+Zoomstufe werden in Metakachel-Blöcke (TMS_METATILE x TMS_METATILE Kacheln)
+aufgeteilt und in einem Prozesspool gerendert. Jeder Prozess öffnet die
+Quelle (in der Regel das COG aus raster_source.py) genau einmal und warpt
+einen Block mit einem einzigen gdal.Warp in ein MEM-Dataset (siehe
+tile_renderer.TileRenderer.warp). Die Kacheln werden als NumPy-Views (ohne
+Kopie) aus dem Block geschnitten und in einem Thread-Pool mit dem
+Kodierprofil des Layers (tile_codec.encoding_profile) kodiert;
+Prozesse statt Threads für die Blöcke umgehen das GIL beim Schreiben.
+
+Nach jedem fertigen Block meldet ein Callback den Fortschritt (fertige /
+gesamte Kacheln), damit der Job-Eintrag aktualisiert werden kann.
+
+Kachelbaum im TMS-Schema wie gdal2tiles: {z}/{x}/{y}.{ext}, y = 0 unten. Leere
+Kacheln (vollständig transparent) werden nicht geschrieben.
+
+Lange Läufe sind fortsetzbar: fertige Metakacheln werden in einem Journal
+(TileJournal, .tiler-journal im Layer-Verzeichnis) vermerkt, nachdem alle ihre
+Kacheln atomar geschrieben sind. Ein abgebrochener Lauf mit gleicher Signatur
+(Quelle, Zoombereich, Kodierung, ...) überspringt diese Blöcke. Reste
+abgebrochener Schreibvorgänge (*.tmp, leere Dateien) werden beim Fortsetzen
+entfernt und ihre Blöcke neu gerendert.
+
+Konfiguration über Umgebungsvariablen:
+    TMS_TILER_PROCESSES   Prozesse für das Rendern (Default: Anzahl CPUs)
+    TMS_METATILE          Kantenlänge einer Metakachel in Kacheln, 1 = einzeln warpen (Default: 8)
+    TMS_ENCODE_THREADS    Threads pro Prozess für die Kodierung (Default: 4)
+"""
+import os
+import json
+import time
+import logging
+import multiprocessing as mp
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from tile_grid import MercatorGrid
+from tile_codec import decode_tile, encode_tile, encoding_extension
+
+logger = logging.getLogger(__name__)
+
+TILER_PROCESSES = int(os.environ.get("TMS_TILER_PROCESSES", str(os.cpu_count() or 2)))
+METATILE_SIZE = int(os.environ.get("TMS_METATILE", "8"))
+ENCODE_THREADS = int(os.environ.get("TMS_ENCODE_THREADS", "4"))
+
+JOURNAL_FILE = ".tiler-journal"
+
+Tile = Tuple[int, int]
+
+# Renderer, Kodier-Threads und Kodierprofil des Worker-Prozesses (in _init_worker gesetzt)
+_renderer = None
+_encoder: Optional[ThreadPoolExecutor] = None
+_profile: Optional[dict] = None
+
+
+def metatile_blocks(tiles: Iterable[Tile], size: int = METATILE_SIZE) -> List[List[Tile]]:
+    """Kacheln (x, y) in Blöcke von size x size benachbarten Kacheln gruppieren (sortiert)"""
+    size = max(1, size)
+    blocks: Dict[Tile, List[Tile]] = {}
+    for x, y in tiles:
+        blocks.setdefault((x // size, y // size), []).append((x, y))
+    return [sorted(blocks[key]) for key in sorted(blocks)]
+
+
+def level_tiles(bounds: Tuple[float, float, float, float], z: int, grid: Optional[MercatorGrid] = None) -> Set[Tile]:
+    """Alle Kacheln (x, y) im TMS-Schema, die die Ausdehnung (EPSG:3857) auf Zoomstufe z überdecken"""
+    grid = grid or MercatorGrid()
+    x0, y0, x1, y1 = grid.tile_range(bounds, z)
+    return {(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)}
+
+
+def slice_metatile(array, tiles: Iterable[Tile], x0: int, y1: int, tile_size: int = 256):
+    """
+    Kacheln als Views aus einer Metakachel (Bänder, Höhe, Breite) schneiden.
+
+    Args:
+        x0: kleinster x-Index der Metakachel
+        y1: größter y-Index (TMS, y zählt nach Norden: oberste Kachelzeile im Bild)
+    Yields:
+        (x, y, view) für jede Kachel
+    """
+    for x, y in tiles:
+        row, col = (y1 - y) * tile_size, (x - x0) * tile_size
+        yield x, y, array[:, row:row + tile_size, col:col + tile_size]
+
+
+class TileJournal:
+    """
+    Journal fertiger Arbeitsschritte eines Kachel-Laufs (eine Zeile pro Schritt).
+
+    Die erste Zeile enthält die Signatur des Laufs als JSON. Passt sie nicht zum
+    aktuellen Lauf, ist das Journal wertlos und wird neu begonnen.
+    """
+
+    def __init__(self, path: str, signature: dict):
+        self.path = path
+        self.signature = json.loads(json.dumps(signature))
+        self.resumed = False
+        self._done: Set[str] = set()
+        try:
+            with open(path) as f:
+                content = f.read()
+        except OSError:
+            content = ""
+        lines = content.split("\n")
+        # Die letzte Zeile ist bei einem Abbruch unvollständig (kein abschließendes "\n")
+        lines.pop()
+        if lines and _parse_json(lines[0]) == self.signature:
+            self.resumed = True
+            self._done = {line for line in lines[1:] if line}
+        # Journal bereinigt neu schreiben, danach nur noch anhängen
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write("".join(f"{line}\n" for line in [json.dumps(self.signature), *sorted(self._done)]))
+        os.replace(tmp_path, path)
+        self._file = open(path, "a")
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._done
+
+    def __len__(self) -> int:
+        return len(self._done)
+
+    def discard(self, key: str) -> None:
+        """Schritt als nicht erledigt behandeln (z. B. nach beschädigten Kacheln)"""
+        self._done.discard(key)
+
+    def record(self, key: str) -> None:
+        self._done.add(key)
+        self._file.write(key + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def remove(self) -> None:
+        """Lauf abgeschlossen: Journal löschen"""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _parse_json(line: str):
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+def block_key(z: int, x: int, y: int, metatile: int = METATILE_SIZE) -> str:
+    """Journal-Schlüssel der Metakachel, die Kachel z/x/y enthält"""
+    metatile = max(1, metatile)
+    return f"block {z} {x // metatile} {y // metatile}"
+
+
+def remove_partial_tiles(tiles_dir: str) -> List[Tuple[int, int, int]]:
+    """
+    Reste abgebrochener Schreibvorgänge entfernen: temporäre Dateien und leere Kacheln.
+
+    Returns:
+        list: (z, x, y) der entfernten leeren Kacheln (ihre Blöcke müssen neu gerendert werden)
+    """
+    removed = []
+    for root, _, files in os.walk(tiles_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            if name.startswith(".") and name.endswith(".tmp"):
+                os.remove(path)
+                continue
+            y_name, _, ext = name.partition(".")
+            if y_name.isdigit() and ext and os.path.getsize(path) == 0:
+                parts = os.path.relpath(path, tiles_dir).split(os.sep)
+                os.remove(path)
+                if len(parts) == 3 and parts[0].isdigit() and parts[1].isdigit():
+                    removed.append((int(parts[0]), int(parts[1]), int(y_name)))
+    return removed
+
+
+def _init_worker(source_path: str, srs: Optional[str], tile_size: int, resampling: str,
+                 profile: Optional[dict] = None) -> None:
+    global _renderer, _encoder, _profile
+    from tile_renderer import TileRenderer
+    _renderer = TileRenderer(source_path, srs, tile_size=tile_size, resampling=resampling)
+    _encoder = ThreadPoolExecutor(max_workers=ENCODE_THREADS, thread_name_prefix="tile-encode")
+    _profile = profile
+
+
+def _render_block(args: Tuple[str, int, List[Tile]]) -> Tuple[int, int]:
+    """Block als eine Metakachel warpen, in Kacheln schneiden und schreiben; (bearbeitet, geschrieben)"""
+    from tile_grid import intersects
+    from tile_renderer import write_tile
+    tiles_dir, z, tiles = args
+    grid, size = _renderer.grid, _renderer.grid.tile_size
+    x0, x1 = min(x for x, _ in tiles), max(x for x, _ in tiles)
+    y0, y1 = min(y for _, y in tiles), max(y for _, y in tiles)
+    west, south = grid.tile_bounds(z, x0, y0)[:2]
+    east, north = grid.tile_bounds(z, x1, y1)[2:]
+    if not intersects((west, south, east, north), _renderer.bounds):
+        return len(tiles), 0
+    warped = _renderer.warp((west, south, east, north), (x1 - x0 + 1) * size, (y1 - y0 + 1) * size)
+    array = warped.ReadAsArray()
+    warped = None
+    # Vollständig transparente Kacheln werden nicht geschrieben
+    views = [(x, y, view) for x, y, view in slice_metatile(array, tiles, x0, y1, size) if view[-1].any()]
+    ext = encoding_extension(_profile)
+
+    def encode_and_write(item):
+        x, y, view = item
+        write_tile(tiles_dir, z, x, y, encode_tile(view, _profile), ext)
+
+    if _encoder is not None and len(views) > 1:
+        list(_encoder.map(encode_and_write, views))
+    else:
+        for item in views:
+            encode_and_write(item)
+    return len(tiles), len(views)
+
+
+def render_levels(source_path: str, tiles_dir: str, zooms: Iterable[int], srs: Optional[str] = None,
+                  tiles_for: Optional[Callable[[int], Iterable[Tile]]] = None,
+                  processes: int = TILER_PROCESSES, metatile: int = METATILE_SIZE,
+                  tile_size: int = 256, resampling: str = "bilinear", profile: Optional[dict] = None,
+                  progress: Optional[Callable[[int, int], None]] = None,
+                  journal: Optional[TileJournal] = None, scheduler=None,
+                  on_block: Optional[Callable[[int, List[Tile]], None]] = None) -> Dict[int, int]:
+    """
+    Zoomstufen aus einer georeferenzierten Rasterquelle in den Kachelbaum rendern.
+
+    Args:
+        tiles_for: Kacheln je Zoomstufe (z. B. FeatureIndex.tiles); Default: alle Kacheln der Quelle
+        profile: Kodierprofil (tile_codec.encoding_profile); Default: TMS_TILE_ENCODING
+        progress: Callback (fertige Kacheln, Kacheln gesamt) nach jedem Block
+        journal: fertige Blöcke überspringen und neu fertige vermerken
+        scheduler: tile_seeder.SeedScheduler, der die Reihenfolge der Blöcke bestimmt
+                   (Viewport, angefragte Kacheln); Default: tiefe Zoomstufen zuerst
+        on_block: Callback (Zoomstufe, Kacheln) nach jedem fertigen Block, bevor wartende
+                  Kachelanfragen geweckt werden (z. B. tile_pyramid.AncestorBuilder.add)
+    Returns:
+        dict: {zoom: Anzahl geschriebener Kacheln} (ohne übersprungene Blöcke)
+    """
+    from tile_renderer import TileRenderer
+    from tile_seeder import SeedScheduler
+    # Ausdehnung im Hauptprozess bestimmen; wirft ValueError ohne Georeferenz
+    renderer = TileRenderer(source_path, srs, tile_size=tile_size, resampling=resampling)
+    scheduler = scheduler or SeedScheduler(metatile, renderer.grid)
+    metatile = scheduler.metatile
+    zooms = sorted(set(zooms))
+    total = skipped = blocks = 0
+    for z in zooms:
+        tiles = tiles_for(z) if tiles_for else level_tiles(renderer.bounds, z, renderer.grid)
+        for block in metatile_blocks(tiles, metatile):
+            total += len(block)
+            if journal is not None and block_key(z, *block[0], metatile) in journal:
+                skipped += len(block)
+            else:
+                scheduler.add(z, block)
+                blocks += 1
+    if skipped:
+        logger.info(f"Fortsetzung: {skipped} von {total} Kacheln bereits gerendert")
+    counts = {z: 0 for z in zooms}
+    done = skipped
+    started = time.perf_counter()
+
+    def finish(key, z: int, block: List[Tile], result: Tuple[int, int]) -> None:
+        nonlocal done
+        done += result[0]
+        counts[z] += result[1]
+        if on_block is not None:
+            on_block(z, block)
+        if journal is not None:
+            journal.record(block_key(z, *block[0], metatile))
+        scheduler.done(key)
+        if progress:
+            progress(done, total)
+
+    if processes > 1 and blocks > 1:
+        with ProcessPoolExecutor(max_workers=min(processes, blocks), mp_context=mp.get_context("spawn"),
+                                 initializer=_init_worker,
+                                 initargs=(source_path, srs, tile_size, resampling, profile)) as executor:
+            # Nur wenige Blöcke pro Prozess vergeben, damit neue Prioritäten sofort greifen
+            inflight = {}
+            while True:
+                while len(inflight) < 2 * processes:
+                    item = scheduler.pop()
+                    if item is None:
+                        break
+                    key, z, block = item
+                    inflight[executor.submit(_render_block, (tiles_dir, z, block))] = item
+                if not inflight:
+                    break
+                finished, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    finish(*inflight.pop(future), future.result())
+    else:
+        global _renderer, _encoder, _profile
+        _renderer, _profile = renderer, profile
+        _encoder = ThreadPoolExecutor(max_workers=ENCODE_THREADS, thread_name_prefix="tile-encode")
+        try:
+            while True:
+                item = scheduler.pop()
+                if item is None:
+                    break
+                key, z, block = item
+                finish(key, z, block, _render_block((tiles_dir, z, block)))
+        finally:
+            _encoder.shutdown()
+            _renderer = _encoder = _profile = None
+    duration = time.perf_counter() - started
+    logger.info(f"{total - skipped} Kacheln ({sum(counts.values())} mit Inhalt) in {blocks} Metakacheln "
+                f"({metatile}x{metatile}) mit {processes} Prozessen in {duration:.2f} s gerendert")
+    return counts
+
+
+def transcode_tiles(tiles_dir: str, profile: dict) -> int:
+    """PNG-Kachelbaum (z. B. von gdal2tiles) in ein anderes Kodierprofil umwandeln; Anzahl Kacheln"""
+    from tile_renderer import write_tile
+    from tile_store import iter_directory_tiles
+    ext = encoding_extension(profile)
+    count = 0
+    for z, x, y, path in list(iter_directory_tiles(tiles_dir)):
+        if not path.endswith(".png"):
+            continue
+        with open(path, "rb") as f:
+            data = encode_tile(decode_tile(f.read()), profile)
+        write_tile(tiles_dir, z, x, y, data, ext)
+        if ext != "png":
+            os.remove(path)
+        count += 1
+    return count
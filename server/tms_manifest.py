@@ -0,0 +1,56 @@
+# tms_manifest.py - Manifest eines TMS-Layers für inkrementelle Aktualisierung
+"""
+Jeder TMS-Layer trägt in config.json unter "manifest" den SHA-256 der Quelle
+(GeoPDF) und die Render-Parameter, mit denen seine Kacheln erzeugt wurden.
+Stimmen beide bei einer erneuten Anfrage überein, bleiben die vorhandenen
+Zoomstufen gültig und nur fehlende Stufen werden erzeugt. Weicht etwas ab,
+sind alle Kacheln veraltet und der Layer wird neu gerechnet.
+"""
+import os
+import json
+import uuid
+from datetime import datetime
+from typing import Optional, Tuple
+
+# Bei Änderungen an der Kachel-Pipeline erhöhen, damit alte Layer neu gerechnet werden
+MANIFEST_VERSION = 1
+
+
+def render_params(srs: Optional[str], tile_store: str, pyramid: bool, raster_cache: bool,
+                  resampling: str = "bilinear", tile_size: int = 256, sparse: bool = False,
+                  encoding: Optional[dict] = None, render: str = "pdf") -> dict:
+    """Parameter, die den Inhalt der Kacheln bestimmen (ohne Zoombereich)"""
+    return {"srs": srs, "tile_store": tile_store, "pyramid": pyramid, "raster_cache": raster_cache,
+            "resampling": resampling, "tile_size": tile_size, "sparse": sparse, "encoding": encoding,
+            "render": render}
+
+
+def build_manifest(source_sha256: str, params: dict, minzoom: int, maxzoom: int) -> dict:
+    return {"version": MANIFEST_VERSION, "source_sha256": source_sha256, "params": params,
+            "minzoom": minzoom, "maxzoom": maxzoom, "updated": datetime.now().isoformat()}
+
+
+def reusable_levels(config: dict, source_sha256: str, params: dict) -> Optional[Tuple[int, int]]:
+    """Zoombereich (min, max) vorhandener, noch gültiger Kacheln; None, wenn neu gerechnet werden muss"""
+    manifest = config.get("manifest") if config else None
+    if (not manifest or manifest.get("version") != MANIFEST_VERSION
+            or manifest.get("source_sha256") != source_sha256 or manifest.get("params") != params):
+        return None
+    return manifest["minzoom"], manifest["maxzoom"]
+
+
+def load_config(layer_dir: str) -> dict:
+    try:
+        with open(os.path.join(layer_dir, "config.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_config(layer_dir: str, config: dict) -> None:
+    """config.json atomar ersetzen (die Datei kann per Hardlink mit einem anderen Layer geteilt sein)"""
+    config_path = os.path.join(layer_dir, "config.json")
+    tmp_path = f"{config_path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(config, f, indent=2)
+    os.replace(tmp_path, config_path)
@@ -0,0 +1,177 @@
+# upload_store.py - Streamendes Speichern von Uploads
+"""
+Hochgeladene Dateien werden blockweise in eine temporäre Datei im Zielverzeichnis
+geschrieben. SHA-256 und Größe werden dabei mitgerechnet, erst am Ende wird die
+Datei atomar an ihren endgültigen Namen umbenannt. Der Speicherbedarf hängt
+damit nur von der Blockgröße ab, nicht von der Dateigröße.
+
+Identische Inhalte werden nur einmal abgelegt: Uploads landen nach ihrem
+SHA-256 in uploads/blobs, die Tabelle blobs zählt die Verweise aus files.
+Die Datei wird erst entfernt, wenn der letzte Verweis gelöscht ist.
+
+Konfiguration über Umgebungsvariablen:
+    UPLOAD_CHUNK_SIZE   Blockgröße in Bytes (Default: 1 MiB)
+"""
+import os
+import json
+import uuid
+import sqlite3
+import hashlib
+import logging
+from datetime import datetime
+from typing import Any, BinaryIO, Dict, Optional, Tuple
+
+from dxf_scan import scan_dxf, layer_info_from_scan
+from dxf_store import DXF_INDEX_ENABLED, build_dxf_store, remove_dxf_store
+from generalize import remove_generalized
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = "uploads"
+BLOB_DIR = os.path.join(UPLOAD_DIR, "blobs")
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+ALLOWED_UPLOAD_EXTENSIONS = ['.dxf', '.tif', '.tiff', '.geotiff']
+
+
+def stream_to_disk(source: BinaryIO, dest_path: str, chunk_size: int = UPLOAD_CHUNK_SIZE) -> Tuple[int, str]:
+    """
+    Dateiobjekt blockweise nach dest_path schreiben
+
+    Args:
+        source: Lesbares Binär-Dateiobjekt (z.B. UploadFile.file)
+        dest_path: Endgültiger Zielpfad
+        chunk_size: Blockgröße in Bytes
+
+    Returns:
+        tuple: (Größe in Bytes, SHA-256 als Hex-String)
+    """
+    tmp_path = os.path.join(os.path.dirname(dest_path) or ".", f".{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, "wb") as f:
+            for chunk in iter(lambda: source.read(chunk_size), b""):
+                digest.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, dest_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    logger.debug(f"Upload gespeichert: {dest_path} ({size} Bytes)")
+    return size, digest.hexdigest()
+
+
+def init_blob_table(conn) -> None:
+    """Erstellt die Tabelle der inhaltsadressierten Upload-Dateien"""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS blobs (
+        sha256 TEXT PRIMARY KEY,
+        path TEXT NOT NULL,
+        size INTEGER,
+        refcount INTEGER DEFAULT 0,
+        created_at TEXT
+    )
+    """)
+    conn.commit()
+
+
+def blob_path(db: sqlite3.Connection, sha256: Optional[str]) -> Optional[str]:
+    """Pfad der abgelegten Datei zu einem Hash (None, falls unbekannt oder nicht mehr vorhanden)"""
+    if not sha256:
+        return None
+    row = db.execute("SELECT path FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+    return row[0] if row and os.path.exists(row[0]) else None
+
+
+def store_blob(db: sqlite3.Connection, src_path: str, sha256: str, size: int) -> Tuple[str, bool]:
+    """
+    Datei inhaltsadressiert ablegen und einen Verweis zählen
+
+    Ist der Inhalt bereits vorhanden, wird src_path verworfen.
+
+    Returns:
+        tuple: (Pfad der abgelegten Datei, True falls der Inhalt schon vorhanden war)
+    """
+    existing = blob_path(db, sha256)
+    if existing:
+        os.remove(src_path)
+        path, duplicate = existing, True
+    else:
+        os.makedirs(BLOB_DIR, exist_ok=True)
+        path = os.path.join(BLOB_DIR, f"{sha256}{os.path.splitext(src_path)[1].lower()}")
+        os.replace(src_path, path)
+        duplicate = False
+    db.execute(
+        "INSERT INTO blobs (sha256, path, size, refcount, created_at) VALUES (?, ?, ?, 1, ?) "
+        "ON CONFLICT(sha256) DO UPDATE SET refcount = refcount + 1, path = excluded.path",
+        (sha256, path, size, datetime.utcnow().isoformat())
+    )
+    return path, duplicate
+
+
+def release_blob(db: sqlite3.Connection, sha256: str) -> bool:
+    """
+    Verweis auf eine abgelegte Datei freigeben, beim letzten Verweis die Datei löschen
+
+    Returns:
+        bool: True, wenn die Datei gelöscht wurde
+    """
+    row = db.execute("SELECT path, refcount FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+    if not row:
+        return False
+    path, refcount = row
+    if refcount > 1:
+        db.execute("UPDATE blobs SET refcount = refcount - 1 WHERE sha256 = ?", (sha256,))
+        return False
+    if os.path.exists(path):
+        os.remove(path)
+    remove_generalized(path)
+    remove_dxf_store(path)
+    db.execute("DELETE FROM blobs WHERE sha256 = ?", (sha256,))
+    logger.info(f"Upload-Datei {path} gelöscht (letzter Verweis)")
+    return True
+
+
+def register_upload(db: sqlite3.Connection, file_id: str, filename: str, path: str, size: int, sha256: str,
+                    user: str) -> Dict[str, Any]:
+    """
+    Gespeicherte Upload-Datei ablegen (Deduplizierung über den Hash) und in der files-Tabelle eintragen
+
+    Bei DXF-Dateien werden BBox und Layer-Info per Streaming-Scan (ohne QGIS) ermittelt und
+    die Geometrie einmalig in ein GeoPackage mit R-Tree übernommen (dxf_store).
+
+    Returns:
+        dict: Datei-Eintrag wie von /api/upload geliefert
+    """
+    path, duplicate = store_blob(db, path, sha256, size)
+    if duplicate:
+        logger.info(f"Inhalt von {filename} bereits vorhanden, verwende {path}")
+    bbox, layer_info = None, None
+    if os.path.splitext(path)[1].lower() == '.dxf':
+        try:
+            scan = scan_dxf(path)
+            bbox = scan["bbox"]
+            layer_info = layer_info_from_scan(scan)
+        except Exception as e:
+            logger.warning(f"DXF-Scan fehlgeschlagen für {filename}: {e}")
+        if DXF_INDEX_ENABLED:
+            # Bei deduplizierten Uploads ist der Index meist schon vorhanden
+            try:
+                build_dxf_store(path)
+            except Exception as e:
+                logger.warning(f"DXF-Index fehlgeschlagen für {filename}, Stufen lesen die DXF direkt: {e}")
+
+    uploaded_at = datetime.utcnow().isoformat()
+    db.execute(
+        "INSERT INTO files (id, name, path, size, converted, uploaded_at, uploaded_by, bbox, layer_info, sha256) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (file_id, filename, path, size, False, uploaded_at, user,
+         json.dumps(bbox) if bbox is not None else None, json.dumps(layer_info) if layer_info is not None else None, sha256)
+    )
+    db.commit()
+    return {"id": file_id, "name": filename, "path": path, "size": size, "sha256": sha256, "converted": False,
+            "uploaded_at": uploaded_at, "uploaded_by": user, "bbox": bbox, "layer_info": layer_info,
+            "deduplicated": duplicate}
@@ -0,0 +1,172 @@
+# vector_tiles.py - DXF als Mapbox Vector Tiles (MBTiles) für den Tileserver
+"""
+Rasterkacheln von Strichzeichnungen sind groß und werden beim Overzoom
+unscharf. Als Alternative zum TMS wird die DXF-Geometrie über OGR (aus dem
+DXF-Index oder mit dem DXF-Treiber, wie load_dxf_layer) gelesen und mit dem MVT-Treiber von GDAL direkt in ein
+MBTiles-Archiv mit Vektorkacheln geschrieben:
+
+* Geometrien werden auf jede Kachel (plus MVT_BUFFER) zugeschnitten und auf das
+  Kachelraster (MVT_EXTENT) quantisiert.
+* Linien und Flächen werden pro Zoomstufe vereinfacht: die Toleranz
+  MVT_SIMPLIFICATION gilt in Kacheleinheiten, entspricht also auf jeder Stufe
+  derselben Bildschirmgröße; auf maxzoom gilt MVT_SIMPLIFICATION_MAX_ZOOM.
+* Alle Entities landen im Vektorlayer "dxf", der DXF-Layername im Attribut "Layer".
+
+Die Archive liegen unter output/vector/<id>.mbtiles. Der Tileserver-Container
+bindet dieses Verzeichnis unter TILESERVER_VECTOR_PATH (relativ zu seiner
+Konfiguration) ein; die Archive werden als zusätzliche "data"-Einträge in die
+bestehende Konfiguration von tileserver-gl (TILESERVER_CONFIG, mit Styles,
+Fonts und Basisdaten) eingetragen. Der Tileserver wird danach per SIGHUP neu
+geladen und liefert die Kacheln unter /mapserver/data/<id>/{z}/{x}/{y}.pbf aus.
+
+Konfiguration über Umgebungsvariablen:
+    MVT_SIMPLIFICATION            Vereinfachung unterhalb von maxzoom in Kacheleinheiten (Default: 4.0)
+    MVT_SIMPLIFICATION_MAX_ZOOM   Vereinfachung auf maxzoom in Kacheleinheiten (Default: 1.0)
+    MVT_EXTENT                    Auflösung einer Kachel in Kacheleinheiten (Default: 4096)
+    MVT_BUFFER                    Puffer um jede Kachel in Kacheleinheiten (Default: 80)
+    MVT_MAX_SIZE                  Höchstgröße einer Kachel in Bytes, größere werden ausgedünnt (Default: 500000)
+    TILESERVER_CONFIG             Konfiguration von tileserver-gl (Default: tileserver/config.json)
+    TILESERVER_VECTOR_PATH        Verzeichnis der Archive aus Sicht des Tileservers (Default: vector)
+    TILESERVER_CONTAINER          Container, der nach Änderungen SIGHUP erhält (Default: tileserver-gl)
+"""
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+MVT_SIMPLIFICATION = float(os.environ.get("MVT_SIMPLIFICATION", "4.0"))
+MVT_SIMPLIFICATION_MAX_ZOOM = float(os.environ.get("MVT_SIMPLIFICATION_MAX_ZOOM", "1.0"))
+MVT_EXTENT = int(os.environ.get("MVT_EXTENT", "4096"))
+MVT_BUFFER = int(os.environ.get("MVT_BUFFER", "80"))
+MVT_MAX_SIZE = int(os.environ.get("MVT_MAX_SIZE", "500000"))
+TILESERVER_CONFIG = os.environ.get("TILESERVER_CONFIG", os.path.join("tileserver", "config.json"))
+TILESERVER_VECTOR_PATH = os.environ.get("TILESERVER_VECTOR_PATH", "vector")
+TILESERVER_CONTAINER = os.environ.get("TILESERVER_CONTAINER", "tileserver-gl")
+
+VECTOR_DIR = os.path.join("output", "vector")
+VECTOR_LAYER = "dxf"
+# Attribute der DXF-Entities, die in die Kacheln übernommen werden
+VECTOR_FIELDS = ["Layer", "Linetype", "Text"]
+
+_config_lock = threading.Lock()
+
+
+def vector_tiles_path(file_id: str) -> str:
+    """Pfad des MBTiles-Archivs mit den Vektorkacheln einer Datei"""
+    return os.path.join(VECTOR_DIR, f"{file_id}.mbtiles")
+
+
+def build_vector_tiles(dxf_path: str, mbtiles_path: str, minzoom: int = 0, maxzoom: int = 18,
+                       srs: Optional[str] = None, name: Optional[str] = None) -> dict:
+    """
+    DXF-Geometrie als MVT in ein MBTiles-Archiv schreiben (ersetzt ein vorhandenes atomar).
+
+    Args:
+        srs: Koordinatensystem des DXF (z.B. "EPSG:2056"); DXF-Dateien enthalten meist keines
+        name: Anzeigename in den MBTiles-Metadaten
+
+    Returns:
+        dict: {path, minzoom, maxzoom, tiles, size, duration_ms}
+    """
+    from osgeo import gdal
+    from dxf_store import feature_source
+    started = time.perf_counter()
+    os.makedirs(os.path.dirname(mbtiles_path) or ".", exist_ok=True)
+    tmp_path = f"{mbtiles_path}.{uuid.uuid4().hex}.tmp.mbtiles"
+    options = [f"MINZOOM={minzoom}", f"MAXZOOM={maxzoom}", f"EXTENT={MVT_EXTENT}", f"BUFFER={MVT_BUFFER}",
+               f"SIMPLIFICATION={MVT_SIMPLIFICATION}", f"SIMPLIFICATION_MAX_ZOOM={MVT_SIMPLIFICATION_MAX_ZOOM}",
+               f"MAX_SIZE={MVT_MAX_SIZE}", f"NAME={name or os.path.basename(dxf_path)}", "TYPE=overlay",
+               "COMPRESS=YES"]
+    try:
+        # Blockreferenzen kommen als GeometryCollection; MVT kennt nur einfache (Multi-)Geometrien
+        result = gdal.VectorTranslate(
+            tmp_path, feature_source(dxf_path), format="MBTILES", datasetCreationOptions=options,
+            layerName=VECTOR_LAYER, selectFields=VECTOR_FIELDS, srcSRS=srs or None, dstSRS="EPSG:3857",
+            explodeCollections=True, dim="XY", skipFailures=True,
+        )
+        if result is None:
+            raise RuntimeError(f"Vektorkacheln konnten nicht erzeugt werden: {dxf_path}")
+        result = None
+        os.replace(tmp_path, mbtiles_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    with sqlite3.connect(mbtiles_path) as conn:
+        tiles = conn.execute("SELECT COUNT(*) FROM tiles").fetchone()[0]
+    duration_ms = int((time.perf_counter() - started) * 1000)
+    size = os.path.getsize(mbtiles_path)
+    logger.info(f"Vektorkacheln erzeugt: {mbtiles_path} (Zoom {minzoom}-{maxzoom}, {tiles} Kacheln, "
+                f"{size / 1e6:.1f} MB, {duration_ms} ms)")
+    return {"path": mbtiles_path, "minzoom": minzoom, "maxzoom": maxzoom, "tiles": tiles, "size": size,
+            "duration_ms": duration_ms}
+
+
+def _load_tileserver_config(config_path: str) -> dict:
+    """Bestehende Konfiguration laden; eine unlesbare wird nicht überschrieben (ValueError)"""
+    try:
+        with open(config_path) as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        config = {}
+    except ValueError as e:
+        raise ValueError(f"Tileserver-Konfiguration {config_path} ist kein gültiges JSON: {e}")
+    # Pfade relativ zum Verzeichnis der Konfiguration (im Container /data)
+    config.setdefault("options", {}).setdefault("paths", {})
+    config.setdefault("data", {})
+    return config
+
+
+def _write_tileserver_config(config_path: str, config: dict) -> None:
+    os.makedirs(os.path.dirname(config_path) or ".", exist_ok=True)
+    tmp_path = f"{config_path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(config, f, indent=2)
+    os.replace(tmp_path, config_path)
+
+
+def ensure_tileserver_config(config_path: str = TILESERVER_CONFIG) -> None:
+    """Tileserver-Konfiguration anlegen, falls keine vorhanden ist (eine bestehende bleibt unverändert)"""
+    with _config_lock:
+        if not os.path.exists(config_path):
+            _write_tileserver_config(config_path, _load_tileserver_config(config_path))
+
+
+def register_tileserver_layer(layer_id: str, mbtiles_path: str, config_path: str = TILESERVER_CONFIG) -> None:
+    """
+    MBTiles-Archiv als Datenquelle in die Tileserver-Konfiguration eintragen und neu laden
+
+    Übrige Einträge (Styles, Fonts, andere Datenquellen) bleiben erhalten. Der Pfad gilt
+    im Tileserver-Container: TILESERVER_VECTOR_PATH/<archiv>.
+    """
+    with _config_lock:
+        config = _load_tileserver_config(config_path)
+        config["data"][layer_id] = {"mbtiles": f"{TILESERVER_VECTOR_PATH}/{os.path.basename(mbtiles_path)}"}
+        _write_tileserver_config(config_path, config)
+    reload_tileserver()
+
+
+def unregister_tileserver_layer(layer_id: str, config_path: str = TILESERVER_CONFIG) -> bool:
+    """Datenquelle aus der Tileserver-Konfiguration entfernen; False, wenn sie nicht eingetragen war"""
+    with _config_lock:
+        config = _load_tileserver_config(config_path)
+        if config["data"].pop(layer_id, None) is None:
+            return False
+        _write_tileserver_config(config_path, config)
+    reload_tileserver()
+    return True
+
+
+def reload_tileserver() -> None:
+    """tileserver-gl liest seine Konfiguration bei SIGHUP neu (ohne Docker nur Warnung)"""
+    try:
+        import docker
+        docker.from_env().containers.get(TILESERVER_CONTAINER).kill(signal="SIGHUP")
+    except Exception as e:
+        logger.warning(f"Tileserver {TILESERVER_CONTAINER} konnte nicht neu geladen werden: {e}")
@@ -0,0 +1,89 @@
+import sys
+import os
+import itertools
+
+import pytest
+
+# Ensure project root is on sys.path so 'server' can be imported
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from server import conversion_cache
+from server.conversion_cache import ConversionCache, file_sha256
+
+PARAMS = {"page_size": "A3", "dpi": 300, "crs_epsg": 2056}
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    # Streng monotone Zeit, damit die LRU-Reihenfolge eindeutig ist
+    clock = itertools.count(1)
+    monkeypatch.setattr(conversion_cache.time, "time", lambda: float(next(clock)))
+    return ConversionCache(str(tmp_path / "files.db"), str(tmp_path / "cache"), max_bytes=250)
+
+
+def make_pdf(tmp_path, name, size=100):
+    path = tmp_path / name
+    path.write_bytes(name.encode().ljust(size, b"\0"))
+    return str(path)
+
+
+def test_make_key_depends_on_source_and_params():
+    key = ConversionCache.make_key("abc", PARAMS)
+    assert key == ConversionCache.make_key("abc", dict(reversed(list(PARAMS.items()))))
+    assert key != ConversionCache.make_key("abd", PARAMS)
+    assert key != ConversionCache.make_key("abc", {**PARAMS, "dpi": 150})
+
+
+def test_store_and_lookup(cache, tmp_path):
+    key = ConversionCache.make_key(file_sha256(make_pdf(tmp_path, "plan.dxf")), PARAMS)
+    assert cache.lookup(key) is None
+
+    cache.store(key, make_pdf(tmp_path, "plan.pdf"), PARAMS, bbox=[1, 2, 3, 4], srs="EPSG:2056",
+                layer_info={"layers": []})
+
+    entry = cache.lookup(key)
+    assert entry["bbox"] == [1, 2, 3, 4]
+    assert entry["srs"] == "EPSG:2056"
+    assert entry["layer_info"] == {"layers": []}
+    with open(entry["path"], "rb") as f:
+        assert f.read().startswith(b"plan.pdf")
+    assert cache.params(key) == PARAMS
+
+
+def test_lookup_drops_entry_with_missing_file(cache, tmp_path):
+    cache.store("k", make_pdf(tmp_path, "a.pdf"), PARAMS)
+    os.remove(cache.lookup("k")["path"])
+    assert cache.lookup("k") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_evicts_least_recently_used(cache, tmp_path):
+    cache.store("a", make_pdf(tmp_path, "a.pdf"), PARAMS)
+    cache.store("b", make_pdf(tmp_path, "b.pdf"), PARAMS)
+    # "a" wird genutzt, "b" ist damit der älteste Eintrag
+    assert cache.lookup("a") is not None
+
+    cache.store("c", make_pdf(tmp_path, "c.pdf"), PARAMS)
+
+    assert cache.lookup("b") is None
+    assert cache.lookup("a") is not None
+    assert cache.lookup("c") is not None
+    assert not os.path.exists(os.path.join(cache.cache_dir, "b.pdf"))
+
+
+def test_stats_count_hits_misses_and_evictions(cache, tmp_path):
+    for name in ("a", "b", "c"):
+        cache.store(name, make_pdf(tmp_path, f"{name}.pdf"), PARAMS)
+    cache.lookup("c")
+    cache.lookup("missing")
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_ratio"] == 0.5
+    assert stats["evictions"] == 1
+    assert stats["entries"] == 2
+    assert stats["size_bytes"] == 200
+    assert stats["max_bytes"] == 250
@@ -0,0 +1,98 @@
+import sys
+import os
+
+import pytest
+
+# Ensure project root is on sys.path so 'server' can be imported
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from server.dxf_scan import scan_dxf, layer_info_from_scan
+
+EXAMPLE_DXF = os.path.join(ROOT_DIR, "examples", "AV Berninaplatz Bergauer.dxf")
+
+
+def write_dxf(path, header_extent=None, entities=()):
+    pairs = [("0", "SECTION"), ("2", "HEADER"), ("9", "$ACADVER"), ("1", "AC1032")]
+    if header_extent:
+        minx, miny, maxx, maxy = header_extent
+        pairs += [("9", "$EXTMIN"), ("10", minx), ("20", miny), ("30", 0),
+                  ("9", "$EXTMAX"), ("10", maxx), ("20", maxy), ("30", 0)]
+    pairs += [("0", "ENDSEC"), ("0", "SECTION"), ("2", "ENTITIES")]
+    for entity in entities:
+        pairs += entity
+    pairs += [("0", "ENDSEC"), ("0", "EOF")]
+    path.write_text("".join(f"{code}\n{value}\n" for code, value in pairs))
+    return str(path)
+
+
+def test_scan_entities_without_header_extent(tmp_path):
+    dxf = write_dxf(tmp_path / "plain.dxf", entities=[
+        [("0", "LINE"), ("8", "Strassen"), ("10", 10), ("20", 20), ("11", 30), ("21", 25)],
+        [("0", "CIRCLE"), ("8", "Schacht"), ("10", 50), ("20", 50), ("40", 5)],
+        [("0", "TEXT"), ("8", "Schacht"), ("10", 48), ("20", 49), ("1", "S1")],
+        # Blockreferenzen fließen nicht in den Extent ein
+        [("0", "INSERT"), ("8", "Symbole"), ("2", "BAUM"), ("10", 1e6), ("20", -1e6)],
+    ])
+    scan = scan_dxf(dxf)
+
+    assert scan["header_extent"] is None
+    assert scan["bbox"] == [10.0, 20.0, 55.0, 55.0]
+    assert scan["entity_count"] == 4
+    assert scan["dxf_version"] == "AC1032"
+    layers = {layer["name"]: layer for layer in scan["layers"]}
+    assert layers["Schacht"]["entity_types"] == {"CIRCLE": 1, "TEXT": 1}
+    assert layers["Schacht"]["geometry_types"] == {"LineString": 1, "Point": 1}
+    assert layers["Symbole"]["entity_count"] == 1
+
+
+def test_scan_prefers_header_extent(tmp_path):
+    dxf = write_dxf(tmp_path / "header.dxf", header_extent=(0, 0, 100, 200), entities=[
+        [("0", "POINT"), ("8", "0"), ("10", 5), ("20", 5)],
+    ])
+    scan = scan_dxf(dxf)
+    assert scan["bbox"] == [0.0, 0.0, 100.0, 200.0]
+    assert scan["entity_extent"] == [5.0, 5.0, 5.0, 5.0]
+
+    header_only = scan_dxf(dxf, walk_entities=False)
+    assert header_only["bbox"] == [0.0, 0.0, 100.0, 200.0]
+    assert header_only["entity_count"] == 0
+    assert layer_info_from_scan(header_only)["layers"] == []
+
+
+def test_arc_extent_uses_angles(tmp_path):
+    dxf = write_dxf(tmp_path / "arc.dxf", entities=[
+        # Viertelkreis von 0° bis 90° um (0, 0) mit Radius 10
+        [("0", "ARC"), ("8", "0"), ("10", 0), ("20", 0), ("40", 10), ("50", 0), ("51", 90)],
+    ])
+    minx, miny, maxx, maxy = scan_dxf(dxf)["bbox"]
+    assert (minx, miny, maxx, maxy) == pytest.approx((0.0, 0.0, 10.0, 10.0))
+
+
+def test_on_path_reports_polyline_vertices(tmp_path):
+    dxf = write_dxf(tmp_path / "paths.dxf", entities=[
+        [("0", "LWPOLYLINE"), ("8", "Rahmen"), ("70", 1), ("10", 0), ("20", 0), ("10", 100), ("20", 0),
+         ("10", 100), ("20", 50)],
+        [("0", "LINE"), ("8", "0"), ("10", 1), ("20", 2), ("11", 3), ("21", 4)],
+        # Polylinie mit Bogen: nur die Ausdehnung
+        [("0", "LWPOLYLINE"), ("8", "0"), ("70", 0), ("10", 0), ("20", 0), ("42", 1.0), ("10", 10), ("20", 0)],
+    ])
+    paths, entities = [], []
+    scan = scan_dxf(dxf, on_entity=lambda *args: entities.append(args), on_path=lambda *args: paths.append(args))
+
+    assert paths == [("Rahmen", "LWPOLYLINE", [0.0, 0.0, 100.0, 0.0, 100.0, 50.0, 0.0, 0.0]),
+                     ("0", "LINE", [1.0, 2.0, 3.0, 4.0])]
+    assert entities == [("0", "LWPOLYLINE", [0.0, 0.0, 10.0, 0.0])]
+    assert scan["entity_extent"] == [0.0, 0.0, 100.0, 50.0]
+
+
+@pytest.mark.skipif(not os.path.exists(EXAMPLE_DXF), reason="Beispieldatei fehlt")
+def test_scan_example_file():
+    scan = scan_dxf(EXAMPLE_DXF)
+    minx, miny, maxx, maxy = scan["bbox"]
+    # Schweizer Landeskoordinaten (LV95)
+    assert 2_600_000 < minx < maxx < 2_800_000
+    assert 1_200_000 < miny < maxy < 1_300_000
+    assert scan["entity_count"] > 0
+    assert scan["layers"]
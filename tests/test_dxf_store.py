@@ -0,0 +1,53 @@
+import sys
+import os
+import json
+import sqlite3
+
+# Ensure project root and server dir are on sys.path ('feature_index' imports 'dxf_store' directly)
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+for path in (ROOT_DIR, os.path.join(ROOT_DIR, "server")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from server.dxf_store import RTREE_TABLE, feature_source, store_boxes, store_paths, store_summary
+from server.feature_index import dxf_feature_boxes
+
+
+def make_store(tmp_path, boxes):
+    """DXF-Datei mit Index wie von build_dxf_store (nur R-Tree und Metadaten)"""
+    dxf_path = str(tmp_path / "plan.dxf")
+    with open(dxf_path, "w") as f:
+        f.write("0\nEOF\n")
+    gpkg_path, meta_path = store_paths(dxf_path)
+    with sqlite3.connect(gpkg_path) as conn:
+        conn.execute(f"CREATE VIRTUAL TABLE {RTREE_TABLE} USING rtree(id, minx, maxx, miny, maxy)")
+        conn.executemany(f"INSERT INTO {RTREE_TABLE} VALUES (?, ?, ?, ?, ?)",
+                         [(i + 1, b[0], b[2], b[1], b[3]) for i, b in enumerate(boxes)])
+    stat = os.stat(dxf_path)
+    with open(meta_path, "w") as f:
+        json.dump({"source_mtime_ns": stat.st_mtime_ns, "source_size": stat.st_size, "features": len(boxes),
+                   "extent": None}, f)
+    return dxf_path
+
+
+def test_feature_source_uses_current_store(tmp_path):
+    dxf_path = make_store(tmp_path, [(0, 0, 10, 10)])
+    assert feature_source(dxf_path) == store_paths(dxf_path)[0]
+    # Geänderte DXF: Index veraltet, Stufen lesen wieder die DXF
+    with open(dxf_path, "a") as f:
+        f.write("\n")
+    assert feature_source(dxf_path) == dxf_path
+    assert store_boxes(dxf_path) is None
+
+
+def test_store_boxes_filtered_by_bounds(tmp_path):
+    dxf_path = make_store(tmp_path, [(0, 0, 10, 10), (100, 100, 110, 120), (5, 50, 6, 60)])
+    assert len(store_boxes(dxf_path)) == 3
+    assert store_boxes(dxf_path, (90, 90, 200, 200)) == [(100.0, 100.0, 110.0, 120.0)]
+    assert store_summary(store_paths(dxf_path)[0]) == (3, [0.0, 0.0, 110.0, 120.0])
+
+
+def test_feature_boxes_from_store_buffer_points(tmp_path):
+    dxf_path = make_store(tmp_path, [(0, 0, 10, 10), (50, 50, 50, 50)])
+    boxes = sorted(dxf_feature_boxes(dxf_path, point_buffer=2.0))
+    assert boxes == [[0, 0, 10, 10], [48, 48, 52, 52]]
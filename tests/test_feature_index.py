@@ -0,0 +1,70 @@
+import sys
+import os
+
+# Ensure project root and server dir are on sys.path ('feature_index' imports 'tile_grid' directly)
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+for path in (ROOT_DIR, os.path.join(ROOT_DIR, "server")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from server.feature_index import FeatureIndex, dxf_feature_boxes, path_boxes
+from server.tile_grid import MercatorGrid
+
+EXAMPLE_DXF = os.path.join(ROOT_DIR, "examples", "AV Berninaplatz Bergauer.dxf")
+
+
+def test_intersects_and_tiles():
+    index = FeatureIndex([(0, 0, 10, 10), (1000, 1000, 1010, 1010), (-5e5, 2e5, 5e5, 2e5 + 1)])
+
+    assert index.intersects((5, 5, 6, 6))
+    assert index.intersects((0, 2e5, 1, 3e5))
+    assert not index.intersects((100, 100, 900, 900))
+    assert not index.intersects((2e6, 2e6, 3e6, 3e6))
+    # Auf Zoom 1 liegen alle Boxen in der nördlichen Hälfte (TMS y = 1)
+    assert index.tiles(1, buffer_px=0) == {(0, 1), (1, 1)}
+
+
+def test_sparse_tiles_cover_fraction_of_bbox():
+    index = FeatureIndex([(0, 0, 10, 10), (1000, 1000, 1010, 1010)])
+    x0, y0, x1, y1 = MercatorGrid().tile_range(index.bounds, 18)
+    assert len(index.tiles(18, buffer_px=0)) < (x1 - x0 + 1) * (y1 - y0 + 1) / 10
+
+
+def test_path_boxes_follow_segments():
+    # Rahmen 1000 x 1000: Boxen höchstens 100 groß, die Mitte bleibt frei
+    frame = [0, 0, 1000, 0, 1000, 1000, 0, 1000, 0, 0]
+    boxes = path_boxes(frame, max_size=100)
+    assert len(boxes) <= 40
+    assert all(b[2] - b[0] <= 100 and b[3] - b[1] <= 100 for b in boxes)
+    assert not FeatureIndex(boxes).intersects((200, 200, 800, 800))
+    # Kurze Segmente werden zusammengefasst, ohne Segmentierung bleibt die ganze Ausdehnung
+    assert path_boxes([0, 0, 1, 1, 2, 0, 3, 1], max_size=100) == [[0, 0, 3, 1]]
+    assert path_boxes(frame, max_size=0) == [[0, 0, 1000, 1000]]
+
+
+def test_frame_marks_only_crossed_tiles(tmp_path):
+    dxf_path = tmp_path / "frame.dxf"
+    pairs = [("0", "SECTION"), ("2", "ENTITIES"), ("0", "LWPOLYLINE"), ("8", "Rahmen"), ("70", 1),
+             ("10", 0), ("20", 0), ("10", 1000), ("20", 0), ("10", 1000), ("20", 1000), ("10", 0), ("20", 1000),
+             ("0", "ENDSEC"), ("0", "EOF")]
+    dxf_path.write_text("".join(f"{code}\n{value}\n" for code, value in pairs))
+    index = FeatureIndex(dxf_feature_boxes(str(dxf_path), segment_size=20))
+
+    tiles = index.tiles(16, buffer_px=0)
+    x0, y0, x1, y1 = MercatorGrid().tile_range(index.bounds, 16)
+    assert len(tiles) < (x1 - x0 + 1) * (y1 - y0 + 1)
+    assert not index.intersects((100, 100, 900, 900))
+
+
+def test_save_and_load(tmp_path):
+    index = FeatureIndex([(0.5, 1.5, 2.5, 3.5), (4, 5, 6, 7)])
+    index.save(str(tmp_path / "features.idx"))
+    loaded = FeatureIndex.load(str(tmp_path / "features.idx"))
+    assert loaded.boxes == index.boxes
+
+
+def test_dxf_feature_boxes_from_example():
+    boxes = dxf_feature_boxes(EXAMPLE_DXF, point_buffer=0)
+    assert len(boxes) > 0
+    minx = min(b[0] for b in boxes)
+    assert 2683000 < minx < 2684500
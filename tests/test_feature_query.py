@@ -0,0 +1,52 @@
+import sys
+import os
+
+# Ensure project root and server dir are on sys.path ('feature_query' imports 'tile_grid' directly)
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+for path in (ROOT_DIR, os.path.join(ROOT_DIR, "server")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from server.feature_query import FeatureCache, layer_filter, query_window
+from server.tile_grid import MercatorGrid, lonlat_to_mercator
+
+
+def test_query_window_snaps_to_tiles_of_zoom():
+    grid = MercatorGrid()
+    window = query_window([8.54, 47.37, 8.545, 47.375], 16)
+    x0, y0, x1, y1 = grid.tile_range(list(window), 16)
+    # Erweiterter Ausschnitt besteht aus ganzen Kacheln und enthält den angefragten
+    assert grid.tile_bounds(16, x0, y0)[:2] == window[:2]
+    assert grid.tile_bounds(16, x1, y1)[2:] == window[2:]
+    minx, miny = lonlat_to_mercator(8.54, 47.37)
+    maxx, maxy = lonlat_to_mercator(8.545, 47.375)
+    assert window[0] <= minx and window[1] <= miny and window[2] >= maxx and window[3] >= maxy
+    # Leicht verschobene Anfrage trifft denselben Cache-Schlüssel
+    assert query_window([8.5401, 47.3701, 8.5449, 47.3749], 16) == window
+    assert query_window([8.54, 47.37, 8.545, 47.375]) == (minx, miny, maxx, maxy)
+
+
+def test_layer_filter_quotes_names():
+    assert layer_filter(None) is None
+    assert layer_filter(["Gebäude", "O'Brien"]) == "\"Layer\" IN ('Gebäude', 'O''Brien')"
+
+
+def test_cache_stream_stores_complete_response():
+    cache = FeatureCache(max_bytes=1024)
+    chunks = list(cache.stream(("a",), iter(['{"features": [', "]}"])))
+    assert b"".join(chunks) == b'{"features": []}'
+    assert cache.get(("a",)) == b'{"features": []}'
+
+
+def test_cache_evicts_least_recently_used():
+    cache = FeatureCache(max_bytes=1000)
+    for key in ("a", "b", "c", "d"):
+        cache.put((key,), b"x" * 250)
+    cache.get(("a",))
+    cache.put(("e",), b"x" * 250)
+    assert cache.get(("b",)) is None
+    assert cache.get(("a",)) is not None
+    assert cache.size == 1000
+    # Zu große Antworten werden nicht zwischengespeichert
+    cache.put(("f",), b"x" * 251)
+    assert cache.get(("f",)) is None
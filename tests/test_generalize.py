@@ -0,0 +1,40 @@
+import sys
+import os
+
+# Ensure project root and server dir are on sys.path
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+for path in (ROOT_DIR, os.path.join(ROOT_DIR, "server")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from server import generalize
+from server.generalize import visvalingam
+
+
+def test_visvalingam_removes_collinear_points():
+    line = [(0, 0), (1, 0.001), (2, 0), (3, 0.001), (4, 0)]
+    assert visvalingam(line, 0.01) == [(0, 0), (4, 0)]
+
+
+def test_visvalingam_keeps_sharp_corner():
+    line = [(0, 0), (1, 0.001), (2, 0), (2, 5), (2.001, 6)]
+    result = visvalingam(line, 0.01)
+    assert (2, 0) in result
+    assert result[0] == (0, 0) and result[-1] == (2.001, 6)
+    assert (1, 0.001) not in result
+
+
+def test_visvalingam_closed_ring_keeps_four_points():
+    ring = [(0, 0), (1, 0), (1, 1), (0.5, 1.001), (0, 1), (0, 0)]
+    result = visvalingam(ring, 100.0, closed=True)
+    assert len(result) == 4
+    assert result[0] == result[-1] == (0, 0)
+
+
+def test_generalization_params_follow_settings(monkeypatch):
+    monkeypatch.setattr(generalize, "GENERALIZE_ENABLED", True)
+    monkeypatch.setattr(generalize, "GENERALIZE_TOLERANCE_PX", 0.5)
+    monkeypatch.setattr(generalize, "GENERALIZE_ALGORITHM", "visvalingam")
+    assert generalize.generalization_params() == {"tolerance_px": 0.5, "algorithm": "visvalingam"}
+    monkeypatch.setattr(generalize, "GENERALIZE_ENABLED", False)
+    assert generalize.generalization_params() is None
@@ -0,0 +1,82 @@
+import sys
+import os
+import multiprocessing as mp
+
+import pytest
+
+# Ensure project root and server dir are on sys.path (Worker importieren 'convert_dxf_to_geopdf' direkt)
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+for path in (ROOT_DIR, os.path.join(ROOT_DIR, "server")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from server import qgis_worker_pool
+from server.qgis_worker_pool import QgisWorkerPool
+
+
+def _echo(converter, value):
+    return value, os.getpid()
+
+
+def _crash(converter):
+    os._exit(3)
+
+
+def _hang(converter):
+    import time
+    time.sleep(60)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """Pool mit Test-Jobtypen; "fork", damit die Worker die zusätzlichen JOB_HANDLERS erben"""
+    monkeypatch.setitem(qgis_worker_pool.JOB_HANDLERS, "echo", _echo)
+    monkeypatch.setitem(qgis_worker_pool.JOB_HANDLERS, "crash", _crash)
+    monkeypatch.setitem(qgis_worker_pool.JOB_HANDLERS, "hang", _hang)
+    get_context = mp.get_context
+    monkeypatch.setattr(qgis_worker_pool.mp, "get_context", lambda method=None: get_context("fork"))
+    pools = []
+
+    def create(**kwargs):
+        created = QgisWorkerPool(**kwargs)
+        pools.append(created)
+        return created
+
+    yield create
+    for created in pools:
+        created.shutdown(timeout=2)
+
+
+def test_worker_is_recycled_after_max_jobs(pool):
+    workers = pool(size=1, max_jobs_per_worker=2)
+
+    results = [workers.submit("echo", i).result(timeout=30) for i in range(3)]
+
+    assert [value for value, _ in results] == [0, 1, 2]
+    # Jobs 1 und 2 im ersten Prozess, Job 3 im recycelten
+    assert results[0][1] == results[1][1] != results[2][1]
+    health = workers.health()
+    assert health["workers"][0]["restarts"] == 1
+    assert health["pending_jobs"] == 0
+
+
+def test_crashed_worker_fails_job_and_is_replaced(pool):
+    workers = pool(size=1, max_jobs_per_worker=0)
+
+    with pytest.raises(RuntimeError, match="Exit-Code 3"):
+        workers.submit("crash").result(timeout=30)
+    assert workers.submit("echo", "ok").result(timeout=30)[0] == "ok"
+    assert workers.health()["workers"][0]["restarts"] == 1
+
+
+def test_hanging_job_is_terminated_after_timeout(pool):
+    workers = pool(size=1, max_jobs_per_worker=0, job_timeout=0.5)
+
+    with pytest.raises(RuntimeError, match="Timeout"):
+        workers.submit("hang").result(timeout=30)
+    assert workers.submit("echo", 1).result(timeout=30)[0] == 1
+
+
+def test_unknown_job_type_is_rejected():
+    with pytest.raises(ValueError):
+        QgisWorkerPool(size=1).submit("does_not_exist")
@@ -0,0 +1,35 @@
+import sys
+import os
+
+import pytest
+
+# Ensure project root and server dir are on sys.path
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+for path in (ROOT_DIR, os.path.join(ROOT_DIR, "server")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from server.tile_codec import blank_png, encoding_extension, encoding_profile
+
+
+def test_encoding_profile_defaults_and_aliases():
+    assert encoding_profile("png") == {"format": "png", "zlevel": 6}
+    assert encoding_profile("jpg") == {"format": "jpeg", "quality": 85}
+    assert encoding_profile({"format": "webp", "lossless": False, "quality": "70"}) == {
+        "format": "webp", "lossless": False, "quality": 70}
+    assert encoding_profile({"format": "webp", "lossless": "false"})["lossless"] is False
+    assert encoding_profile({"format": "webp", "lossless": "1"})["lossless"] is True
+    assert encoding_extension(encoding_profile("png8")) == "png"
+    assert encoding_extension(encoding_profile("jpeg")) == "jpg"
+
+
+@pytest.mark.parametrize("spec", ["gif", {"format": "jpeg", "quality": 0}, {"format": "png8", "colors": 300},
+                                  {"format": "webp", "lossless": "maybe"}, {"format": "jpeg", "quality": None},
+                                  ["png"], 6])
+def test_encoding_profile_rejects_invalid(spec):
+    with pytest.raises(ValueError):
+        encoding_profile(spec)
+
+
+def test_blank_png_is_png():
+    assert blank_png(16).startswith(b"\x89PNG\r\n\x1a\n")
@@ -0,0 +1,181 @@
+import io
+import sys
+import os
+import time
+
+import pytest
+
+# Ensure project root and server dir are on sys.path ('tile_pyramid' imports 'tile_codec' directly)
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+for path in (ROOT_DIR, os.path.join(ROOT_DIR, "server")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+np = pytest.importorskip("numpy")
+
+from server import tile_pyramid
+from server.tile_pyramid import AncestorBuilder, build_ancestors, build_parent, build_pyramid, downsample
+
+
+@pytest.fixture
+def raw_codec(monkeypatch):
+    """Kacheln als .npy statt PNG, damit die Tests ohne GDAL laufen; zeichnet die Profile auf"""
+    profiles = []
+
+    def encode(array, profile=None):
+        profiles.append(profile)
+        buffer = io.BytesIO()
+        np.save(buffer, array)
+        return buffer.getvalue()
+
+    monkeypatch.setattr(tile_pyramid, "encode_tile", encode)
+    monkeypatch.setattr(tile_pyramid, "encode_array", lambda array, fmt="PNG": encode(array))
+    monkeypatch.setattr(tile_pyramid, "decode_tile", lambda data, bands=4: np.load(io.BytesIO(data)))
+    return profiles
+
+
+def write_tile(tiles_dir, z, x, y, value, size=2, alpha=255):
+    tile = np.full((4, size, size), value, dtype=np.uint8)
+    tile[3] = alpha
+    path = os.path.join(tiles_dir, str(z), str(x), f"{y}.png")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(tile_pyramid.encode_tile(tile))
+
+
+def read_tile(tiles_dir, z, x, y):
+    with open(os.path.join(tiles_dir, str(z), str(x), f"{y}.png"), "rb") as f:
+        return tile_pyramid.decode_tile(f.read())
+
+
+def test_downsample_averages_2x2_blocks():
+    mosaic = np.array([[[0, 4, 8, 8],
+                        [4, 8, 8, 8]]], dtype=np.uint8)
+    assert downsample(mosaic).tolist() == [[[4, 8]]]
+
+
+def test_downsample_weights_color_by_alpha():
+    mosaic = np.zeros((4, 2, 2), dtype=np.uint8)
+    # Ein deckendes weisses Pixel, drei transparente schwarze
+    mosaic[:3, 0, 0] = 255
+    mosaic[3, 0, 0] = 255
+    parent = downsample(mosaic)
+    assert parent[:3, 0, 0].tolist() == [255, 255, 255]
+    assert parent[3, 0, 0] == 64
+
+
+def test_build_ancestors_grows_with_each_block(tmp_path, raw_codec):
+    tiles_dir = str(tmp_path)
+    first = [(0, 0), (1, 0), (0, 1), (1, 1)]
+    for x, y in first:
+        write_tile(tiles_dir, 3, x, y, 200)
+    assert build_ancestors(tiles_dir, 3, first, 1, tile_size=2) == 2
+    assert read_tile(tiles_dir, 2, 0, 0)[3].tolist() == [[255, 255], [255, 255]]
+    # Auf Stufe 1 ist erst das Viertel unten links (TMS: y = 0 unten) gefüllt
+    assert read_tile(tiles_dir, 1, 0, 0)[3].tolist() == [[0, 0], [255, 0]]
+
+    second = [(2, 0), (3, 0), (2, 1), (3, 1)]
+    for x, y in second:
+        write_tile(tiles_dir, 3, x, y, 200)
+    build_ancestors(tiles_dir, 3, second, 1, tile_size=2)
+    assert read_tile(tiles_dir, 1, 0, 0)[3].tolist() == [[0, 0], [255, 255]]
+
+
+def test_ancestor_builder_derives_parents_in_background(tmp_path, raw_codec):
+    tiles_dir = str(tmp_path)
+    builder = AncestorBuilder(tiles_dir, 3, 1, tile_size=2, interval=0)
+    blocks = [[(0, 0), (1, 0), (0, 1), (1, 1)], [(2, 0), (3, 0), (2, 1), (3, 1)]]
+    try:
+        for block in blocks:
+            for x, y in block:
+                write_tile(tiles_dir, 3, x, y, 200)
+            builder.add(block)
+        # Der Thread arbeitet asynchron: warten, bis beide Blöcke auf Stufe 1 angekommen sind
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            if os.path.exists(os.path.join(tiles_dir, "2", "1", "0.png")) \
+                    and os.path.exists(os.path.join(tiles_dir, "1", "0", "0.png")) \
+                    and read_tile(tiles_dir, 1, 0, 0)[3].tolist() == [[0, 0], [255, 255]]:
+                break
+            time.sleep(0.01)
+    finally:
+        builder.close()
+    assert read_tile(tiles_dir, 2, 0, 0)[3].tolist() == [[255, 255], [255, 255]]
+    assert read_tile(tiles_dir, 2, 1, 0)[3].tolist() == [[255, 255], [255, 255]]
+    assert read_tile(tiles_dir, 1, 0, 0)[3].tolist() == [[0, 0], [255, 255]]
+
+
+def test_build_parent_places_children_in_tms_quadrants(tmp_path, raw_codec):
+    tiles_dir = str(tmp_path)
+    for (x, y), value in {(0, 0): 10, (1, 0): 20, (0, 1): 30, (1, 1): 40}.items():
+        write_tile(tiles_dir, 1, x, y, value)
+
+    assert build_parent(tiles_dir, 0, 0, 0, tile_size=2)
+    # Bildzeilen von oben: Kinder mit y = 1 oben, y = 0 unten
+    assert read_tile(tiles_dir, 0, 0, 0)[0].tolist() == [[30, 40], [10, 20]]
+
+
+def test_build_parent_treats_missing_children_as_transparent(tmp_path, raw_codec):
+    tiles_dir = str(tmp_path)
+    write_tile(tiles_dir, 1, 1, 0, 80)
+
+    assert build_parent(tiles_dir, 0, 0, 0, tile_size=2)
+    parent = read_tile(tiles_dir, 0, 0, 0)
+    assert parent[3].tolist() == [[0, 0], [0, 255]]
+    assert parent[0].tolist() == [[0, 0], [0, 80]]
+
+    # Ohne Kinder oder nur mit leeren Kindern entsteht keine Kachel
+    assert not build_parent(tiles_dir, 0, 1, 1, tile_size=2)
+    write_tile(tiles_dir, 1, 4, 4, 80, alpha=0)
+    assert not build_parent(tiles_dir, 0, 2, 2, tile_size=2)
+    assert not os.path.exists(os.path.join(tiles_dir, "0", "2", "2.png"))
+
+
+def test_build_parent_removes_stale_parent(tmp_path, raw_codec):
+    tiles_dir = str(tmp_path)
+    write_tile(tiles_dir, 1, 0, 0, 80)
+    assert build_parent(tiles_dir, 0, 0, 0, tile_size=2)
+    parent = os.path.join(tiles_dir, "0", "0", "0.png")
+
+    # Kind nur noch leer: die alte Elternkachel darf nicht stehen bleiben
+    write_tile(tiles_dir, 1, 0, 0, 80, alpha=0)
+    assert not build_parent(tiles_dir, 0, 0, 0, tile_size=2)
+    assert not os.path.exists(parent)
+
+    # Ebenso, wenn kein Kind mehr existiert
+    write_tile(tiles_dir, 0, 0, 0, 80)
+    os.remove(os.path.join(tiles_dir, "1", "0", "0.png"))
+    assert not build_parent(tiles_dir, 0, 0, 0, tile_size=2)
+    assert not os.path.exists(parent)
+
+
+def test_build_parent_encodes_with_layer_profile(tmp_path, raw_codec):
+    tiles_dir = str(tmp_path)
+    write_tile(tiles_dir, 1, 0, 0, 50)
+    del raw_codec[:]
+
+    build_parent(tiles_dir, 0, 0, 0, tile_size=2, profile={"format": "webp", "quality": 80})
+    build_parent(tiles_dir, 0, 0, 0, tile_size=2)
+
+    assert raw_codec == [{"format": "webp", "quality": 80}, None]
+
+
+def test_build_pyramid_derives_all_levels(tmp_path, raw_codec):
+    tiles_dir = str(tmp_path)
+    for x in range(4):
+        for y in range(4):
+            write_tile(tiles_dir, 2, x, y, 16 * x + y)
+    del raw_codec[:]
+    progress = []
+    profile = {"format": "png8", "colors": 64, "zlevel": 6}
+
+    counts = build_pyramid(tiles_dir, 0, 2, workers=1, tile_size=2, profile=profile,
+                           progress=lambda z, count: progress.append((z, count)))
+
+    assert counts == {1: 4, 0: 1}
+    assert progress == [(1, 4), (0, 1)]
+    assert raw_codec == [profile] * 5
+    # 1/0/1 setzt sich aus 2/0/3, 2/1/3 (oben) und 2/0/2, 2/1/2 (unten) zusammen
+    assert read_tile(tiles_dir, 1, 0, 1)[0].tolist() == [[3, 19], [2, 18]]
+    # Oben links auf Stufe 0 liegt 1/0/1, verkleinert auf den Mittelwert (3 + 19 + 2 + 18) / 4
+    assert read_tile(tiles_dir, 0, 0, 0)[0, 0, 0] == 11
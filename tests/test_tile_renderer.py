@@ -0,0 +1,77 @@
+import sys
+import os
+import asyncio
+import threading
+import time
+
+# Ensure project root and server dir are on sys.path ('tile_renderer' imports 'tile_grid' directly)
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+for path in (ROOT_DIR, os.path.join(ROOT_DIR, "server")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from server.tile_grid import MercatorGrid, ORIGIN_SHIFT
+from server import tile_renderer
+from server.tile_renderer import DynamicTileService, TileMemoryCache
+
+
+class SlowRenderer:
+    def __init__(self):
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def render(self, z, x, y, profile=None):
+        with self.lock:
+            self.calls += 1
+        time.sleep(0.05)
+        return f"{z}/{x}/{y}".encode()
+
+
+def test_grid_tile_bounds():
+    grid = MercatorGrid()
+    assert grid.tile_bounds(0, 0, 0) == (-ORIGIN_SHIFT, -ORIGIN_SHIFT, ORIGIN_SHIFT, ORIGIN_SHIFT)
+    assert grid.tile_range([1.0, 1.0, 2.0, 2.0], 1) == (1, 1, 1, 1)
+
+
+def test_memory_cache_evicts_by_size():
+    cache = TileMemoryCache(max_bytes=10)
+    cache.put(("a", 0, 0, 0), b"1234")
+    cache.put(("a", 1, 0, 0), b"5678")
+    cache.get(("a", 0, 0, 0))
+    cache.put(("b", 1, 1, 0), b"9012")
+    assert cache.get(("a", 1, 0, 0)) is None
+    assert cache.get(("a", 0, 0, 0)) == b"1234"
+    assert cache.stats()["size_bytes"] == 8
+    cache.invalidate("a")
+    assert cache.stats()["entries"] == 1
+
+
+def test_concurrent_requests_render_once(tmp_path):
+    service = DynamicTileService(workers=4)
+    renderer = SlowRenderer()
+    service.renderer = lambda source, srs=None: renderer
+    config = {"mode": "dynamic", "source": "dummy.pdf", "minzoom": 0, "maxzoom": 5}
+
+    async def fetch_all():
+        return await asyncio.gather(*[service.get_tile(str(tmp_path), config, 3, 2, 1) for _ in range(8)])
+
+    results = asyncio.run(fetch_all())
+    assert results == [b"3/2/1"] * 8
+    assert renderer.calls == 1
+    # write-through: Kachel liegt im Kachelbaum des Layers
+    assert (tmp_path / "3" / "2" / "1.png").read_bytes() == b"3/2/1"
+    # Außerhalb des Zoombereichs wird nicht gerendert
+    assert asyncio.run(service.get_tile(str(tmp_path), config, 6, 0, 0)) is None
+    assert renderer.calls == 1
+
+
+def test_invalidate_drops_only_renderers_of_layer(monkeypatch):
+    monkeypatch.setattr(tile_renderer, "TileRenderer", lambda source, srs=None: object())
+    service = DynamicTileService(workers=1)
+    first = service._layer_renderer("layer-a", {"source": "a.pdf"})
+    second = service._layer_renderer("layer-b", {"source": "b.pdf", "source_srs": "EPSG:2056"})
+
+    service.invalidate("layer-a")
+
+    assert service._layer_renderer("layer-a", {"source": "a.pdf"}) is not first
+    assert service._layer_renderer("layer-b", {"source": "b.pdf", "source_srs": "EPSG:2056"}) is second
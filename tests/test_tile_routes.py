@@ -0,0 +1,91 @@
+import sys
+import os
+import json
+
+import pytest
+
+# Ensure project root and server dir are on sys.path ('tile_routes' imports 'tile_store' directly)
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+for path in (ROOT_DIR, os.path.join(ROOT_DIR, "server")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+fastapi = pytest.importorskip("fastapi")
+testclient = pytest.importorskip("fastapi.testclient")
+
+from server.routes import tile_routes
+
+PNG = b"\x89PNG\r\n\x1a\n"
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(tile_routes, "TILE_ROOT", str(tmp_path))
+    app = fastapi.FastAPI()
+    app.include_router(tile_routes.router, prefix="/api")
+    return testclient.TestClient(app)
+
+
+def make_layer(tmp_path, name, config, tiles=()):
+    layer = tmp_path / name
+    layer.mkdir()
+    (layer / "config.json").write_text(json.dumps(config))
+    for z, x, y in tiles:
+        (layer / str(z) / str(x)).mkdir(parents=True, exist_ok=True)
+        (layer / str(z) / str(x) / f"{y}.png").write_bytes(PNG + f"{z}/{x}/{y}".encode())
+
+
+def test_etag_matches():
+    assert tile_routes.etag_matches('"a", W/"b"', '"b"')
+    assert tile_routes.etag_matches("*", '"c"')
+    assert not tile_routes.etag_matches('"a"', '"b"')
+    assert not tile_routes.etag_matches(None, '"b"')
+
+
+def test_etag_and_not_modified(client, tmp_path):
+    make_layer(tmp_path, "plan", {"minzoom": 0, "maxzoom": 2}, tiles=[(1, 0, 1)])
+
+    response = client.get("/api/tiles/plan/1/0/1.png")
+    assert response.status_code == 200
+    assert response.content == PNG + b"1/0/1"
+    etag = response.headers["etag"]
+    assert etag == tile_routes.tile_etag(response.content)
+    assert response.headers["cache-control"] == f"public, max-age={tile_routes.TILE_CACHE_MAX_AGE}"
+
+    not_modified = client.get("/api/tiles/plan/1/0/1.png", headers={"If-None-Match": f"W/{etag}"})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert not_modified.headers["etag"] == etag
+    # XYZ-Schema: y von oben
+    assert client.get("/api/tiles/plan/1/0/0.png?scheme=xyz").content == PNG + b"1/0/1"
+
+
+def test_versioned_request_is_immutable(client, tmp_path):
+    make_layer(tmp_path, "plan", {"minzoom": 0, "maxzoom": 2}, tiles=[(0, 0, 0)])
+    response = client.get("/api/tiles/plan/0/0/0.png?v=2024-01-01")
+    assert response.headers["cache-control"] == f"public, max-age={tile_routes.IMMUTABLE_MAX_AGE}, immutable"
+
+
+def test_empty_tiles_of_sparse_layer(client, tmp_path, monkeypatch):
+    make_layer(tmp_path, "sparse", {"minzoom": 0, "maxzoom": 2, "sparse": True}, tiles=[(0, 0, 0)])
+    make_layer(tmp_path, "dense", {"minzoom": 0, "maxzoom": 2}, tiles=[(0, 0, 0)])
+
+    blank = client.get("/api/tiles/sparse/2/1/1.png")
+    assert blank.status_code == 200
+    assert blank.content == tile_routes.blank_png()
+    assert blank.headers["content-type"] == "image/png"
+    # Außerhalb des Zoombereichs und bei vollständig gekachelten Layern gibt es keine leeren Kacheln
+    assert client.get("/api/tiles/sparse/3/0/0.png").status_code == 404
+    assert client.get("/api/tiles/dense/2/1/1.png").status_code == 404
+
+    monkeypatch.setattr(tile_routes, "TILE_EMPTY_RESPONSE", "204")
+    assert client.get("/api/tiles/sparse/2/1/1.png").status_code == 204
+    monkeypatch.setattr(tile_routes, "TILE_EMPTY_RESPONSE", "404")
+    assert client.get("/api/tiles/sparse/2/1/1.png").status_code == 404
+
+
+def test_invalid_layer_and_coordinates(client, tmp_path):
+    assert client.get("/api/tiles/..%2Fetc/0/0/0.png").status_code in (400, 404)
+    assert client.get("/api/tiles/missing/0/0/0.png").status_code == 404
+    make_layer(tmp_path, "plan", {"minzoom": 0, "maxzoom": 2})
+    assert client.get("/api/tiles/plan/31/0/0.png").status_code == 400
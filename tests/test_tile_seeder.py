@@ -0,0 +1,100 @@
+import sys
+import os
+
+# Ensure project root and server dir are on sys.path ('tile_seeder' imports 'tile_grid' directly)
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+for path in (ROOT_DIR, os.path.join(ROOT_DIR, "server")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from server.tile_seeder import SeedRegistry, SeedScheduler
+from server.tiler import metatile_blocks
+
+
+def fill(scheduler, z):
+    n = 1 << z
+    for block in metatile_blocks([(x, y) for x in range(n) for y in range(n)], scheduler.metatile):
+        scheduler.add(z, block)
+
+
+def drain(scheduler):
+    order = []
+    while True:
+        item = scheduler.pop()
+        if item is None:
+            return order
+        scheduler.done(item[0])
+        order.append(item[0])
+
+
+def test_low_zooms_first_without_viewport():
+    scheduler = SeedScheduler(metatile=2)
+    fill(scheduler, 3)
+    fill(scheduler, 1)
+    order = drain(scheduler)
+    assert order[0] == (1, 0, 0)
+    assert [key[0] for key in order] == sorted(key[0] for key in order)
+    assert len(scheduler) == 0
+
+
+def test_viewport_blocks_before_background():
+    scheduler = SeedScheduler(metatile=2)
+    fill(scheduler, 1)
+    fill(scheduler, 4)
+    # Viewport über Kachel 4/13/13 (TMS) in der nordöstlichen Ecke
+    scheduler.set_viewport(scheduler.grid.tile_bounds(4, 13, 13))
+    order = drain(scheduler)
+    assert order[0] == (1, 0, 0)
+    assert order[1] == (4, 6, 6)
+    # Blöcke am Rand des Viewports (SEED_VIEWPORT_MARGIN) folgen vor dem entfernten Hintergrund
+    assert order.index((4, 5, 5)) < order.index((4, 0, 0))
+
+
+def test_bump_requested_block_and_wake_on_done():
+    scheduler = SeedScheduler(metatile=2)
+    fill(scheduler, 2)
+    fill(scheduler, 3)
+    event = scheduler.bump(3, 7, 0)
+    assert event is not None and not event.is_set()
+    key, z, block = scheduler.pop()
+    assert key == (3, 3, 0)
+    assert (7, 0) in block
+    scheduler.done(key)
+    assert event.is_set()
+    # Fertige Blöcke werden nicht mehr vorgezogen
+    assert scheduler.bump(3, 7, 0) is None
+
+
+def test_bump_derived_level_pulls_covering_blocks():
+    scheduler = SeedScheduler(metatile=4)
+    fill(scheduler, 4)
+    # Zoom 2 entsteht aus der Pyramide: Kachel 2/3/3 wird von Block 4/3/3 überdeckt
+    assert scheduler.bump(2, 3, 3) is None
+    assert scheduler.pop()[0] == (4, 3, 3)
+
+
+def test_registry_unregister_releases_waiters():
+    registry = SeedRegistry()
+    scheduler = registry.register("layer", SeedScheduler(metatile=2))
+    fill(scheduler, 1)
+    event = scheduler.bump(1, 0, 0)
+    registry.unregister("layer")
+    assert registry.get("layer") is None
+    assert event.is_set()
+    assert scheduler.bump(1, 1, 1) is None
+
+
+def test_bump_progressive_derived_level_waits_for_nearest_block():
+    scheduler = SeedScheduler(metatile=2)
+    fill(scheduler, 4)
+    scheduler.set_derived_levels(0)
+    assert scheduler.partial(1) and not scheduler.partial(4)
+    # Kachel 1/1/1 überdeckt die Blöcke 4..7 in beiden Richtungen; die vier mittleren kommen zuerst
+    event = scheduler.bump(1, 1, 1)
+    assert event is not None and not event.is_set()
+    popped = [scheduler.pop()[0] for _ in range(4)]
+    assert sorted(popped) == [(4, 5, 5), (4, 5, 6), (4, 6, 5), (4, 6, 6)]
+    scheduler.done(popped[0])
+    assert event.is_set()
+    scheduler.close()
+    assert not scheduler.partial(1)
@@ -0,0 +1,103 @@
+import sys
+import os
+
+import pytest
+
+# Ensure project root is on sys.path so 'server' can be imported
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from server.tile_store import TileStore, TileStoreClosed, TileStorePool, detect_format, open_tile_store, pack_directory, zxy_to_tileid
+
+PNG = b"\x89PNG\r\n\x1a\n"
+
+
+def make_tiles(tiles_dir, maxzoom=3):
+    tiles = {}
+    for z in range(maxzoom + 1):
+        for x in range(2 ** z):
+            for y in range(2 ** z):
+                # Jede zweite Kachel ist identisch (leer)
+                data = PNG + (b"blank" if (x + y) % 2 else f"{z}/{x}/{y}".encode())
+                tile_dir = tiles_dir / str(z) / str(x)
+                tile_dir.mkdir(parents=True, exist_ok=True)
+                (tile_dir / f"{y}.png").write_bytes(data)
+                tiles[(z, x, y)] = data
+    return tiles
+
+
+def test_tileid_matches_pmtiles_spec():
+    assert [zxy_to_tileid(*t) for t in [(0, 0, 0), (1, 0, 0), (1, 0, 1), (1, 1, 1), (1, 1, 0), (2, 0, 0)]] == [0, 1, 2, 3, 4, 5]
+
+
+@pytest.mark.parametrize("fmt", ["mbtiles", "pmtiles"])
+def test_pack_and_read_archive(tmp_path, fmt):
+    tiles = make_tiles(tmp_path / "src")
+    layer_dir = tmp_path / "layer"
+    layer_dir.mkdir()
+
+    info = pack_directory(str(tmp_path / "src"), str(layer_dir), fmt)
+
+    assert info["tiles"] == len(tiles)
+    assert info["unique_tiles"] < len(tiles)
+    assert detect_format(str(layer_dir)) == fmt
+    with open_tile_store(str(layer_dir)) as store:
+        assert store.format == fmt
+        for (z, x, y), data in tiles.items():
+            assert bytes(store.get_tile(z, x, y)) == data
+        assert store.get_tile(4, 0, 0) is None
+        assert store.metadata()["maxzoom"] == "3"
+
+
+def test_directory_store(tmp_path):
+    tiles = make_tiles(tmp_path, maxzoom=1)
+    with open_tile_store(str(tmp_path)) as store:
+        assert store.format == "directory"
+        assert store.get_tile(1, 1, 0) == tiles[(1, 1, 0)]
+        assert store.get_tile(2, 0, 0) is None
+
+
+def test_tile_store_is_abstract():
+    with pytest.raises(TypeError):
+        TileStore("/tmp")
+
+
+def test_pool_closes_replaced_and_invalidated_stores(tmp_path):
+    make_tiles(tmp_path / "src", maxzoom=1)
+    layer_dir = tmp_path / "layer"
+    layer_dir.mkdir()
+    pack_directory(str(tmp_path / "src"), str(layer_dir), "mbtiles")
+    pool = TileStorePool()
+    first = pool.get(str(layer_dir))
+    assert pool.get(str(layer_dir)) is first
+
+    # Neu gepacktes Archiv: der alte Store wird ersetzt und geschlossen
+    pack_directory(str(tmp_path / "src"), str(layer_dir), "mbtiles")
+    second = pool.get(str(layer_dir))
+    assert second is not first
+    assert first._opened == 0
+    assert second.get_tile(1, 0, 0) is not None
+
+    pool.invalidate(str(layer_dir))
+    assert second._opened == 0
+
+
+def test_pmtiles_close_waits_for_running_readers(tmp_path):
+    tiles = make_tiles(tmp_path / "src", maxzoom=1)
+    layer_dir = tmp_path / "layer"
+    layer_dir.mkdir()
+    pack_directory(str(tmp_path / "src"), str(layer_dir), "pmtiles")
+    store = open_tile_store(str(layer_dir))
+
+    # Ein Leser ist mitten im Zugriff, während der Pool den Store schließt
+    store._acquire()
+    store.close()
+    assert not store._mm.closed
+    assert store._find_tile(zxy_to_tileid(1, 0, 1)) == tiles[(1, 0, 0)]
+    store._release()
+    assert store._mm.closed
+
+    # Später beginnende Leser erhalten TileStoreClosed statt eines Fehlers der mmap
+    with pytest.raises(TileStoreClosed):
+        store.get_tile(1, 0, 0)
@@ -0,0 +1,73 @@
+import sys
+import os
+
+import pytest
+
+# Ensure project root and server dir are on sys.path ('tiler' imports 'tile_grid' directly)
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+for path in (ROOT_DIR, os.path.join(ROOT_DIR, "server")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from server.tiler import TileJournal, block_key, level_tiles, metatile_blocks, remove_partial_tiles, slice_metatile
+from server.tile_grid import MercatorGrid
+
+
+def test_metatile_blocks_group_neighbours():
+    tiles = [(x, y) for x in range(6, 12) for y in range(3)]
+    blocks = metatile_blocks(tiles, size=4)
+    assert blocks == [
+        sorted((x, y) for x in range(6, 8) for y in range(3)),
+        sorted((x, y) for x in range(8, 12) for y in range(3)),
+    ]
+    assert sum(len(block) for block in blocks) == len(tiles)
+
+
+def test_level_tiles_cover_bounds():
+    grid = MercatorGrid()
+    bounds = grid.tile_bounds(3, 2, 5)
+    inner = (bounds[0] + 1, bounds[1] + 1, bounds[2] - 1, bounds[3] - 1)
+    assert level_tiles(inner, 3, grid) == {(2, 5)}
+    assert level_tiles(inner, 4, grid) == {(4, 10), (4, 11), (5, 10), (5, 11)}
+
+
+def test_slice_metatile_returns_views_in_tms_order():
+    np = pytest.importorskip("numpy")
+    # Metakachel 2x2 Kacheln à 2 px: x 4..5, y 6..7 (y = 7 ist die obere Zeile)
+    array = np.arange(4 * 4 * 4, dtype=np.uint8).reshape(4, 4, 4)
+    tiles = {(x, y): view for x, y, view in slice_metatile(array, [(4, 7), (5, 7), (4, 6), (5, 6)], 4, 7, 2)}
+    assert np.array_equal(tiles[(4, 7)], array[:, 0:2, 0:2])
+    assert np.array_equal(tiles[(5, 6)], array[:, 2:4, 2:4])
+    assert all(np.shares_memory(view, array) for view in tiles.values())
+
+
+def test_journal_resumes_matching_run(tmp_path):
+    path = str(tmp_path / ".tiler-journal")
+    journal = TileJournal(path, {"source": "a.pdf", "maxzoom": 18})
+    journal.record(block_key(18, 17, 9, metatile=8))
+    journal.record("pyramid 17")
+    journal.close()
+    # Abbruch mitten in einer Zeile
+    with open(path, "a") as f:
+        f.write("block 18 1")
+
+    resumed = TileJournal(path, {"source": "a.pdf", "maxzoom": 18})
+    assert resumed.resumed
+    assert "block 18 2 1" in resumed and "pyramid 17" in resumed
+    assert "block 18 1" not in resumed and len(resumed) == 2
+    resumed.close()
+
+    other = TileJournal(path, {"source": "a.pdf", "maxzoom": 19})
+    assert not other.resumed and len(other) == 0
+    other.remove()
+    assert not os.path.exists(path)
+
+
+def test_remove_partial_tiles(tmp_path):
+    tile_dir = tmp_path / "18" / "5"
+    tile_dir.mkdir(parents=True)
+    (tile_dir / "3.png").write_bytes(b"png")
+    (tile_dir / "4.png").write_bytes(b"")
+    (tile_dir / ".7.abc123.tmp").write_bytes(b"half")
+    assert remove_partial_tiles(str(tmp_path)) == [(18, 5, 4)]
+    assert sorted(p.name for p in tile_dir.iterdir()) == ["3.png"]
@@ -0,0 +1,36 @@
+import sys
+import os
+
+# Ensure project root is on sys.path so 'server' can be imported
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from server.tms_manifest import build_manifest, load_config, render_params, reusable_levels, write_config
+
+
+def test_reusable_levels_requires_same_source_and_params(tmp_path):
+    params = render_params("EPSG:2056", "directory", True, True)
+    write_config(str(tmp_path), {"srs": "EPSG:2056", "manifest": build_manifest("abc", params, 0, 6)})
+    config = load_config(str(tmp_path))
+
+    assert reusable_levels(config, "abc", params) == (0, 6)
+    assert reusable_levels(config, "def", params) is None
+    assert reusable_levels(config, "abc", render_params("EPSG:21781", "directory", True, True)) is None
+    assert reusable_levels({}, "abc", params) is None
+    # Direkt aus dem DXF gerasterte Kacheln ersetzen keine Kacheln aus dem GeoPDF
+    assert reusable_levels(config, "abc", render_params("EPSG:2056", "directory", True, True, render="direct")) is None
+
+
+def test_write_config_replaces_hardlinked_file(tmp_path):
+    shared = tmp_path / "a"
+    layer = tmp_path / "b"
+    shared.mkdir()
+    layer.mkdir()
+    write_config(str(shared), {"layer": "a"})
+    os.link(shared / "config.json", layer / "config.json")
+
+    write_config(str(layer), {"layer": "b"})
+
+    assert load_config(str(shared)) == {"layer": "a"}
+    assert load_config(str(layer)) == {"layer": "b"}
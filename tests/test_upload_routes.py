@@ -0,0 +1,157 @@
+import sys
+import os
+import hashlib
+import sqlite3
+
+import pytest
+
+# Ensure project root and server dir are on sys.path ('upload_routes' imports 'deps' directly)
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+for path in (ROOT_DIR, os.path.join(ROOT_DIR, "server")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+fastapi = pytest.importorskip("fastapi")
+testclient = pytest.importorskip("fastapi.testclient")
+pytest.importorskip("jwt")
+
+from server.routes import upload_routes
+from deps import get_db, verify_token
+
+DATA = bytes(range(256)) * 40
+CHUNK = 4096
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    upload_dir = str(tmp_path / "uploads")
+    store_module = sys.modules[upload_routes.register_upload.__module__]
+    monkeypatch.setattr(upload_routes, "UPLOAD_DIR", upload_dir)
+    monkeypatch.setattr(upload_routes, "BLOB_DIR", os.path.join(upload_dir, "blobs"))
+    monkeypatch.setattr(store_module, "BLOB_DIR", os.path.join(upload_dir, "blobs"))
+    db_path = str(tmp_path / "files.db")
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE files (id TEXT PRIMARY KEY, name TEXT, path TEXT, size INTEGER, converted BOOLEAN, "
+                     "uploaded_at TEXT, uploaded_by TEXT, bbox TEXT, layer_info TEXT, sha256 TEXT)")
+        upload_routes.init_upload_tables(conn)
+
+    def db():
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    app = fastapi.FastAPI()
+    app.include_router(upload_routes.router, prefix="/api")
+    app.dependency_overrides[verify_token] = lambda: "tester"
+    app.dependency_overrides[get_db] = db
+    return testclient.TestClient(app)
+
+
+def create(client, **extra):
+    response = client.post("/api/uploads", json={"filename": "ortho.tif", "size": len(DATA), "chunk_size": CHUNK,
+                                                 **extra})
+    assert response.status_code == 200
+    return response.json()["upload_id"]
+
+
+def put_chunk(client, upload_id, offset, data=None, checksum=None):
+    data = DATA[offset:offset + CHUNK] if data is None else data
+    headers = {"X-Chunk-SHA256": checksum or hashlib.sha256(data).hexdigest()}
+    return client.put(f"/api/uploads/{upload_id}?offset={offset}", content=data, headers=headers)
+
+
+def test_missing_ranges():
+    ranges = [{"offset": 0, "length": 10}, {"offset": 20, "length": 10}, {"offset": 25, "length": 10}]
+    assert upload_routes._missing_ranges(ranges, 50) == [{"offset": 10, "length": 10}, {"offset": 35, "length": 15}]
+    assert upload_routes._missing_ranges([], 5) == [{"offset": 0, "length": 5}]
+
+
+def test_out_of_order_chunks_and_finalize(client):
+    upload_id = create(client, sha256=hashlib.sha256(DATA).hexdigest())
+    for offset in (8192, 0):
+        assert put_chunk(client, upload_id, offset).status_code == 200
+
+    status = client.get(f"/api/uploads/{upload_id}").json()
+    # Der letzte Block ist kürzer (DATA ist 10240 Bytes lang)
+    assert status["received_bytes"] == CHUNK + 2048
+    assert status["missing"] == [{"offset": 4096, "length": 4096}]
+    incomplete = client.post(f"/api/uploads/{upload_id}/finalize")
+    assert incomplete.status_code == 409
+    assert incomplete.json()["detail"]["missing"] == [{"offset": 4096, "length": 4096}]
+
+    assert put_chunk(client, upload_id, 4096).status_code == 200
+    result = client.post(f"/api/uploads/{upload_id}/finalize").json()
+    assert result["status"] == "completed"
+    assert result["sha256"] == hashlib.sha256(DATA).hexdigest()
+    with open(result["path"], "rb") as f:
+        assert f.read() == DATA
+    # Erneutes finalize liefert dieselbe Datei
+    assert client.post(f"/api/uploads/{upload_id}/finalize").json()["file_id"] == result["id"]
+
+
+def test_sequential_upload_is_not_read_again(client, monkeypatch):
+    def unexpected(path):
+        raise AssertionError("Datei wurde erneut gelesen")
+
+    monkeypatch.setattr(upload_routes, "file_sha256", unexpected)
+    upload_id = create(client)
+    for offset in range(0, len(DATA), CHUNK):
+        assert put_chunk(client, upload_id, offset).status_code == 200
+    assert client.post(f"/api/uploads/{upload_id}/finalize").json()["sha256"] == hashlib.sha256(DATA).hexdigest()
+
+
+def test_chunk_checksum_mismatch_is_not_recorded(client):
+    upload_id = create(client)
+    response = put_chunk(client, upload_id, 0, checksum="0" * 64)
+    assert response.status_code == 422
+    assert client.get(f"/api/uploads/{upload_id}").json()["received"] == []
+
+
+def test_failed_retry_invalidates_overwritten_chunks(client):
+    upload_id = create(client)
+    for offset in range(0, len(DATA), CHUNK):
+        put_chunk(client, upload_id, offset)
+    # Wiederholung mit beschädigten Daten: abgelehnt, aber bereits auf die Platte geschrieben
+    corrupted = b"x" * CHUNK
+    checksum = hashlib.sha256(DATA[:CHUNK]).hexdigest()
+    assert put_chunk(client, upload_id, 0, data=corrupted, checksum=checksum).status_code == 422
+
+    status = client.get(f"/api/uploads/{upload_id}").json()
+    assert status["missing"] == [{"offset": 0, "length": CHUNK}]
+    assert client.post(f"/api/uploads/{upload_id}/finalize").status_code == 409
+
+    assert put_chunk(client, upload_id, 0).status_code == 200
+    result = client.post(f"/api/uploads/{upload_id}/finalize").json()
+    assert result["sha256"] == hashlib.sha256(DATA).hexdigest()
+    with open(result["path"], "rb") as f:
+        assert f.read() == DATA
+
+
+def test_file_checksum_mismatch_keeps_upload_active(client):
+    upload_id = create(client, sha256="0" * 64)
+    for offset in range(0, len(DATA), CHUNK):
+        put_chunk(client, upload_id, offset)
+
+    assert client.post(f"/api/uploads/{upload_id}/finalize").status_code == 422
+    assert client.get(f"/api/uploads/{upload_id}").json()["status"] == "active"
+
+
+def test_failed_registration_rolls_back(client, monkeypatch):
+    upload_id = create(client)
+    for offset in range(0, len(DATA), CHUNK):
+        put_chunk(client, upload_id, offset)
+    register_upload = upload_routes.register_upload
+
+    def failing(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(upload_routes, "register_upload", failing)
+    with pytest.raises(sqlite3.OperationalError):
+        client.post(f"/api/uploads/{upload_id}/finalize")
+    assert client.get(f"/api/uploads/{upload_id}").json()["status"] == "active"
+
+    # Daten liegen wieder bereit, finalize kann wiederholt werden
+    monkeypatch.setattr(upload_routes, "register_upload", register_upload)
+    assert client.post(f"/api/uploads/{upload_id}/finalize").json()["status"] == "completed"
@@ -0,0 +1,62 @@
+import sys
+import os
+import json
+
+import pytest
+
+# Ensure project root and server dir are on sys.path
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+for path in (ROOT_DIR, os.path.join(ROOT_DIR, "server")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from server.vector_tiles import ensure_tileserver_config, register_tileserver_layer, unregister_tileserver_layer
+
+
+def test_tileserver_config_register_and_unregister(tmp_path):
+    config_path = str(tmp_path / "tileserver.json")
+    ensure_tileserver_config(config_path)
+    with open(config_path) as f:
+        assert json.load(f) == {"options": {"paths": {}}, "data": {}}
+
+    register_tileserver_layer("abc", str(tmp_path / "output" / "vector" / "abc.mbtiles"), config_path)
+    with open(config_path) as f:
+        # Pfad aus Sicht des Tileservers (output/vector ist dort unter vector eingebunden)
+        assert json.load(f)["data"] == {"abc": {"mbtiles": "vector/abc.mbtiles"}}
+
+    assert unregister_tileserver_layer("abc", config_path)
+    assert not unregister_tileserver_layer("abc", config_path)
+    with open(config_path) as f:
+        assert json.load(f)["data"] == {}
+
+
+def test_register_keeps_existing_tileserver_config(tmp_path):
+    config_path = str(tmp_path / "config.json")
+    existing = {
+        "options": {"paths": {"fonts": "fonts", "styles": "styles"}},
+        "styles": {"test-style": {"style": "osm-bright/style.json"}},
+        "data": {"openmaptiles": {"mbtiles": "zurich_switzerland.mbtiles"}},
+    }
+    with open(config_path, "w") as f:
+        json.dump(existing, f)
+    ensure_tileserver_config(config_path)
+    register_tileserver_layer("abc", "output/vector/abc.mbtiles", config_path)
+    with open(config_path) as f:
+        config = json.load(f)
+    assert config["options"] == existing["options"]
+    assert config["styles"] == existing["styles"]
+    assert config["data"] == {"openmaptiles": {"mbtiles": "zurich_switzerland.mbtiles"},
+                              "abc": {"mbtiles": "vector/abc.mbtiles"}}
+    unregister_tileserver_layer("abc", config_path)
+    with open(config_path) as f:
+        assert json.load(f) == existing
+
+
+def test_invalid_tileserver_config_is_not_overwritten(tmp_path):
+    config_path = str(tmp_path / "config.json")
+    with open(config_path, "w") as f:
+        f.write("{kaputt")
+    with pytest.raises(ValueError):
+        register_tileserver_layer("abc", "output/vector/abc.mbtiles", config_path)
+    with open(config_path) as f:
+        assert f.read() == "{kaputt"